@@ -0,0 +1,8 @@
+# Interface de linha de comando do gerenciador, para máquinas sem interface gráfica
+# Autores: Henrique Rodrigues, Daniel Lisboa & Gabriel Pink
+
+import sys
+from modules.CLI import main
+
+if __name__ == "__main__":
+    sys.exit(main())
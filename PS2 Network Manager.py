@@ -4,27 +4,36 @@
 import os
 import sys
 import shutil
+from modules.StartupProfiler import StartupProfiler
+
+# The profiler starts before the other imports, so they are measured too
+profiler = StartupProfiler() if "--profile-startup" in sys.argv[1:] else None
+
+if profiler is not None:
+    profiler.start()
+
 import colorama
-from PyQt6.QtWidgets import QApplication
 from colorama import Fore
 
-# Importing our custom modules
-from modules.SambaManager import SambaManager
+# Importing our custom modules. PyQt6, the GUI and the SambaManager are only imported after the checks,
+# so a failed check or the help message don't wait for them
 from modules.Exceptions import *
-from modules.GUI.GUI import PS2NetManagerGUI
+from modules.Logger import get_logger, setup_logging, set_debug, add_sink, create_file_sink, LOG_FILE_PATH
+
+logger = get_logger()
 
 def check_root():
     """Checks if the script is running as root. If not, it exits the script with an error message."""
 
     if os.geteuid() != 0:
-        print(Fore.RED + "Este script precisa ser executado como root.")
+        logger.error("Este script precisa ser executado como root.")
         sys.exit(1)
 
 def check_os_support():
     """Checks if the script is running on a supported OS. If not, print an error message and exit the script."""
 
     if not sys.platform.startswith("linux"):
-        print(Fore.RED + "Desculpe, mas este script só pode ser executado em sistemas operacionais Linux.")
+        logger.error("Desculpe, mas este script só pode ser executado em sistemas operacionais Linux.")
         sys.exit(1)
 
 def is_samba_installed():
@@ -34,37 +43,57 @@ def check_samba_installed():
     """Checks if Samba is installed on the system. If not, print an error message and exit the script."""
 
     if not is_samba_installed():
-        print(Fore.RED + "O Samba não está instalado. Por favor, instale o Samba para usar este script.")
-        print(Fore.RED + "Você pode instalar o Samba usando o seguinte comando:")
-        print(Fore.CYAN + "sudo apt install samba")
+        logger.error("O Samba não está instalado. Por favor, instale o Samba para usar este script.")
+        logger.error("Você pode instalar o Samba usando o seguinte comando:")
+        logger.info("sudo apt install samba")
         sys.exit(1)
 
 def process_args():
-    """Processes the command line arguments and returns the debug flag."""
+    """Processes the command line arguments and returns the debug flag.
+
+    The --profile-startup flag is read before the imports, it is only accepted here.
+    """
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "-d" or sys.argv[1] == "--debug":
-            print(Fore.YELLOW + "Modo debug ativado.")
-            return True
-        else:
-            if not (sys.argv[1] == "-h" or sys.argv[1] == "--help"):
-                print(Fore.RED + "Erro: Argumento inválido.")
-                print(Fore.RED + "Use -h ou --help para obter ajuda.")
-                sys.exit(1)
-            else:
-                # Print help message
-                print(f"USO: {Fore.LIGHTYELLOW_EX}python3 {Fore.WHITE}'PS2 Network Manager.py' {Fore.LIGHTBLUE_EX}[OPÇÕES]\n")
-                print(f"OPÇÕES:")
-                print(f"  {Fore.LIGHTBLUE_EX}-d, --debug{Fore.RESET}  Ativa o modo de depuração.")
-                print(f"  {Fore.LIGHTBLUE_EX}-h, --help{Fore.RESET}   Mostra esta mensagem de ajuda.")
+    debug = False
+    
+    for arg in sys.argv[1:]:
+        if arg == "-d" or arg == "--debug":
+            debug = True
+        elif arg == "--profile-startup":
+            continue
+        elif arg == "-h" or arg == "--help":
+            # Print help message
+            print(f"USO: {Fore.LIGHTYELLOW_EX}python3 {Fore.WHITE}'PS2 Network Manager.py' {Fore.LIGHTBLUE_EX}[OPÇÕES]\n")
+            print(f"OPÇÕES:")
+            print(f"  {Fore.LIGHTBLUE_EX}-d, --debug{Fore.RESET}         Ativa o modo de depuração e salva o log em {LOG_FILE_PATH}.")
+            print(f"  {Fore.LIGHTBLUE_EX}--profile-startup{Fore.RESET}   Mostra o tempo de cada fase da inicialização e das importações, até o primeiro quadro da janela.")
+            print(f"  {Fore.LIGHTBLUE_EX}-h, --help{Fore.RESET}          Mostra esta mensagem de ajuda.")
             
             sys.exit(0)
+        else:
+            logger.error("Erro: Argumento inválido.")
+            logger.error("Use -h ou --help para obter ajuda.")
+            sys.exit(1)
+    
+    if debug:
+        logger.warning("Modo debug ativado.")
+    
+    return debug
 
-    return False
+def mark_startup_phase(phase: str) -> None:
+    """Marks the end of a startup phase, if the startup is being profiled."""
+    
+    if profiler is not None:
+        profiler.mark(phase)
 
 if __name__ == "__main__":
+    mark_startup_phase("importações iniciais")
+    
     # Initializing colorama
     colorama.init(autoreset=True)
+    
+    # Start the logging thread. The messages are written to the terminal by it
+    setup_logging()
 
     # Check if the script is running on a supported OS
     check_os_support()
@@ -77,37 +106,61 @@ if __name__ == "__main__":
     
     # Process command line arguments and return the debug flag
     debug_flag = process_args()
+    
+    if debug_flag:
+        set_debug(True)
+        
+        # In debug mode the log is also saved to a file
+        try:
+            add_sink(create_file_sink())
+        except OSError as e:
+            logger.warning("Não foi possível criar o arquivo de log %s: %s", LOG_FILE_PATH, e)
+
+    mark_startup_phase("verificações")
 
     try:
-        # Create a SambaManager instance
-        samba_manager = SambaManager(debug_flag)
+        from modules.SambaManager import SambaManager
+        
+        # Create a SambaManager instance. The server is stopped by the GUI in a worker thread, after the window is shown
+        samba_manager = SambaManager(debug_flag, stop_on_init=False)
 
         if samba_manager.check_global_samba_conf() == False:
-            print()
-            print(Fore.YELLOW + "Parece que algumas configurações globais do compartilhamento SAMBA não estão corretas para se comunicar com o PS2.")
-            print(Fore.YELLOW + "Iremos consertar isso para você.")
-            print()
+            logger.warning("Parece que algumas configurações globais do compartilhamento SAMBA não estão corretas para se comunicar com o PS2.")
+            logger.warning("Iremos consertar isso para você.")
 
             samba_manager.backup_and_fix_global_conf()
         else:
-            print(Fore.GREEN + "Configurações globais do compartilhamento SAMBA estão corretas.")
+            logger.success("Configurações globais do compartilhamento SAMBA estão corretas.")
     
     except BaseManagerException as e:
-        print(Fore.RED + "PS2 Network Manager encontrou um erro:\n")
-        print(e)
+        logger.error("PS2 Network Manager encontrou um erro:\n\n%s", e)
         sys.exit(1)
     
     except Exception as e:
-        print(Fore.RED + "Um erro inesperado ocorreu:\n")
-        print(e)
+        logger.exception("Um erro inesperado ocorreu:\n\n%s", e)
         sys.exit(1)
 
+    mark_startup_phase("SambaManager")
+
     # Setup the PyQt6 application
+    from PyQt6.QtWidgets import QApplication
+    
     app = QApplication([])
+    mark_startup_phase("QApplication")
 
     # Create the main window
+    from modules.GUI.GUI import PS2NetManagerGUI
+    
+    mark_startup_phase("importação da GUI")
+    
     window = PS2NetManagerGUI(samba_manager)
+    mark_startup_phase("construção da janela")
+    
+    if profiler is not None:
+        profiler.watch_first_frame(window, profiler.report)
+    
     window.show()
+    mark_startup_phase("show")
     
     # Execute the application
     app_return = app.exec()
@@ -0,0 +1,473 @@
+import os
+import re
+import time
+import errno
+import tempfile
+
+from modules.Logger import get_logger
+from modules.GameLibrary import GameLibrary
+
+logger = get_logger("library")
+
+class CueTrack:
+    """A track of a CUE sheet.
+
+    Attributes:
+        number (int): Number of the track.
+        mode (str): Mode of the track as written in the CUE sheet (e.g. 'MODE2/2352', 'AUDIO').
+        file (str): Path of the BIN file of the track.
+        sector_size (int): Size of each sector in the BIN file.
+        data_offset (int): Offset of the 2048 bytes of user data in each sector.
+        start (int): First sector of the track (INDEX 01) in the BIN file.
+        end (int): Sector after the last one of the track in the BIN file. -1 if the track goes to the end of the file.
+    """
+
+    __slots__ = ("number", "mode", "file", "sector_size", "data_offset", "start", "end")
+
+    def __init__(self, number: int, mode: str, file: str, sector_size: int, data_offset: int):
+        self.number = number
+        self.mode = mode
+        self.file = file
+        self.sector_size = sector_size
+        self.data_offset = data_offset
+        self.start = 0
+        self.end = -1
+
+    @property
+    def is_data(self) -> bool:
+        """If the track has data sectors (the ones converted to ISO). Audio tracks are ignored."""
+
+        return self.mode != "AUDIO"
+
+    def __repr__(self) -> str:
+        return f"CueTrack({self.number}, {self.mode}, {self.file!r}, start={self.start}, end={self.end})"
+
+class CueSheet:
+    """Parses CUE sheets of CD images (BIN/CUE).
+
+    Only the FILE, TRACK and INDEX commands are used. The sector of each INDEX is relative to its FILE, so
+    games split in one BIN per track and games in a single BIN are both supported.
+    """
+
+    # Sector size and offset of the user data of each track mode
+    TRACK_MODES = {
+        "MODE1/2048": (2048, 0),
+        "MODE1/2352": (2352, 16),  # 12 bytes of sync, 4 of header
+        "MODE2/2048": (2048, 0),
+        "MODE2/2324": (2324, 0),
+        "MODE2/2336": (2336, 8),  # 8 bytes of subheader
+        "MODE2/2352": (2352, 24),  # 12 bytes of sync, 4 of header, 8 of subheader (PS1 and PS2 CDs are Mode 2 Form 1)
+        "AUDIO": (2352, 0),
+    }
+
+    # Words of a line, the ones in double quotes can have spaces (e.g. 'FILE "Game (Track 1).bin" BINARY')
+    TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+    # 'INDEX 01 mm:ss:ff', with 75 frames (sectors) per second
+    INDEX_PATTERN = re.compile(r"^(\d+):(\d+):(\d+)$")
+    FRAMES_PER_SECOND = 75
+
+    @classmethod
+    def parse(cls, cue_path: str) -> list[CueTrack]:
+        """Parses a CUE sheet.
+
+        Args:
+            cue_path (str): The path of the CUE sheet.
+
+        Returns:
+            list[CueTrack]: The tracks, in order, with the paths of their BIN files resolved.
+
+        Raises:
+            OSError: If the CUE sheet can't be read.
+            ValueError: If the CUE sheet is invalid or one of its BIN files doesn't exist.
+        """
+
+        # CUE sheets come from Windows tools, usually in latin-1 or UTF-8 with BOM. A latin-1 file with accented
+        # names is almost never valid UTF-8, so it is only decoded as latin-1 (which never fails) if UTF-8 fails
+        with open(cue_path, "rb") as cue_file:
+            data = cue_file.read()
+
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = data.decode("latin-1")
+
+        folder = os.path.dirname(os.path.abspath(cue_path))
+        tracks = []
+        current_file = None
+
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            tokens = [quoted or word for quoted, word in cls.TOKEN_PATTERN.findall(line)]
+
+            if not tokens:
+                continue
+
+            command = tokens[0].upper()
+
+            if command == "FILE" and len(tokens) >= 2:
+                current_file = cls.resolve_file(folder, tokens[1])
+
+            elif command == "TRACK" and len(tokens) >= 3:
+                if current_file is None:
+                    raise ValueError(f"TRACK antes de FILE na linha {line_number} do arquivo CUE.")
+
+                mode = tokens[2].upper()
+
+                if mode not in cls.TRACK_MODES:
+                    raise ValueError(f"Modo de trilha não suportado na linha {line_number}: {tokens[2]}")
+
+                tracks.append(CueTrack(int(tokens[1]), mode, current_file, *cls.TRACK_MODES[mode]))
+
+            elif command == "INDEX" and len(tokens) >= 3 and tracks:
+                match = cls.INDEX_PATTERN.match(tokens[2])
+
+                if match is None:
+                    raise ValueError(f"INDEX inválido na linha {line_number} do arquivo CUE: {tokens[2]}")
+
+                minutes, seconds, frames = (int(group) for group in match.groups())
+                sector = (minutes * 60 + seconds) * cls.FRAMES_PER_SECOND + frames
+                track = tracks[-1]
+                index = int(tokens[1])
+
+                if index == 1:
+                    track.start = sector
+
+                # The previous track of the same file ends where the pregap (INDEX 00) or the track begins
+                if len(tracks) > 1 and tracks[-2].file == track.file and (tracks[-2].end == -1 or index <= 1):
+                    tracks[-2].end = sector if tracks[-2].end == -1 else min(tracks[-2].end, sector)
+
+        if not tracks:
+            raise ValueError("O arquivo CUE não tem trilhas.")
+
+        return tracks
+
+    @staticmethod
+    def resolve_file(folder: str, name: str) -> str:
+        """Returns the path of a FILE of the CUE sheet, ignoring the case of the name if it doesn't match exactly.
+
+        Raises:
+            ValueError: If the file doesn't exist.
+        """
+
+        path = os.path.join(folder, name.replace("\\", "/"))
+
+        if os.path.isfile(path):
+            return path
+
+        # The CUE sheets made on Windows often don't match the case of the file names
+        directory, file_name = os.path.split(path)
+
+        try:
+            for entry in os.listdir(directory):
+                if entry.lower() == file_name.lower():
+                    return os.path.join(directory, entry)
+        except OSError:
+            pass
+
+        raise ValueError(f"O arquivo {name} do CUE não foi encontrado.")
+
+    @classmethod
+    def get_data_track(cls, tracks: list[CueTrack]) -> CueTrack:
+        """Returns the first data track, which has the ISO9660 file system of the game.
+
+        Raises:
+            ValueError: If the CUE sheet has only audio tracks.
+        """
+
+        for track in tracks:
+            if track.is_data:
+                return track
+
+        raise ValueError("O arquivo CUE não tem trilhas de dados.")
+
+class BinCueConverter:
+    """Converts the data track of a BIN/CUE image (raw sectors of 2352 bytes) to an ISO image (sectors of 2048 bytes).
+
+    The BIN is read with readv in batches of sectors: the 2048 bytes of data of each sector go straight to their
+    place in a reused output buffer, and the sync, header, subheader and error correction bytes go to a scratch
+    buffer. The lists of buffers (memoryviews of the output buffer) are built once, so no Python object is created
+    per sector and the memory used is the same for images of any size.
+
+    The ISO is written to a hidden temporary file in the destination folder and renamed when it is complete, so
+    OPL and the library watcher never see a partial image.
+    """
+
+    ISO_SECTOR_SIZE = 2048
+
+    # Sync pattern of the raw sectors (Mode 1 and Mode 2), and the offset of the mode byte
+    SYNC_PATTERN = b"\x00" + b"\xff" * 10 + b"\x00"
+    MODE_OFFSET = 15
+
+    # Sectors written to the ISO at once (8 MB)
+    SECTORS_PER_BATCH = 4096
+
+    # Maximum number of buffers of each readv call
+    IOV_MAX = 1024
+
+    # Interval in seconds between the calls of the progress callback
+    PROGRESS_INTERVAL = 1.0
+
+    # Same permissions of the files created through SAMBA (see GameImporter)
+    FILE_MODE = 0o777
+
+    def __init__(self, owner: tuple[int, int] | None = None):
+        """
+        Args:
+            owner (tuple[int, int]): User and group IDs given to the ISO images. None keeps the current user.
+        """
+
+        self.owner = owner
+
+    @classmethod
+    def get_sectors(cls, track: CueTrack) -> int:
+        """Returns the number of sectors of a track.
+
+        Raises:
+            OSError: If the BIN file can't be read.
+        """
+
+        end = track.end
+
+        if end == -1:
+            end = os.stat(track.file).st_size // track.sector_size
+
+        return max(end - track.start, 0)
+
+    @classmethod
+    def check_mode(cls, track: CueTrack) -> None:
+        """Checks the first sector of a raw track, fixing the offset of the data if the CUE sheet has the wrong mode.
+
+        Raises:
+            OSError: If the BIN file can't be read.
+            ValueError: If the sector is not a raw data sector.
+        """
+
+        if track.sector_size != 2352:
+            return
+
+        with open(track.file, "rb") as bin_file:
+            header = os.pread(bin_file.fileno(), cls.MODE_OFFSET + 1, track.start * track.sector_size)
+
+        if len(header) <= cls.MODE_OFFSET or header[:len(cls.SYNC_PATTERN)] != cls.SYNC_PATTERN:
+            raise ValueError(f"A trilha {track.number} não tem setores de dados no formato {track.mode}.")
+
+        mode = header[cls.MODE_OFFSET]
+
+        if mode in (1, 2) and track.data_offset != (16 if mode == 1 else 24):
+            logger.debug("A trilha %d é Mode %d, mas o CUE diz %s.", track.number, mode, track.mode)
+            track.data_offset = 16 if mode == 1 else 24
+
+    def convert(self, cue_path: str, destination: str, progress: callable = None, should_stop: callable = None) -> int | None:
+        """Converts the data track of a BIN/CUE image to an ISO image. Can be called from a worker thread.
+
+        Args:
+            cue_path (str): The path of the CUE sheet.
+            destination (str): The path of the ISO image.
+            progress (callable): Called about once per second with the bytes of the ISO written and its size.
+            should_stop (callable): Checked after each batch of sectors. If it returns True, the conversion stops.
+
+        Returns:
+            int: The size of the ISO image. None if the conversion was stopped.
+
+        Raises:
+            OSError: If the images can't be read or written.
+            ValueError: If the CUE sheet is invalid.
+        """
+
+        track = CueSheet.get_data_track(CueSheet.parse(cue_path))
+        self.check_mode(track)
+
+        sectors = self.get_sectors(track)
+        total_bytes = sectors * self.ISO_SECTOR_SIZE
+
+        folder, file_name = os.path.split(os.path.abspath(destination))
+        temp_path = os.path.join(folder, f".{file_name}.part")
+
+        source_fd = os.open(track.file, os.O_RDONLY | os.O_CLOEXEC)
+
+        try:
+            output_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, self.FILE_MODE)
+
+            try:
+                self.__preallocate(output_fd, total_bytes)
+
+                converted = self.__convert_sectors(source_fd, output_fd, track, sectors, progress, should_stop)
+            finally:
+                os.close(output_fd)
+
+            if not converted:
+                os.unlink(temp_path)
+                return None
+
+            if self.owner is not None:
+                os.chown(temp_path, *self.owner)
+
+            os.chmod(temp_path, self.FILE_MODE)
+            os.replace(temp_path, destination)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        finally:
+            os.close(source_fd)
+
+        return total_bytes
+
+    @staticmethod
+    def __preallocate(fd: int, size: int) -> None:
+        if size == 0:
+            return
+
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            # Some file systems (e.g. FUSE or network mounts) can't preallocate, but a full disk is an error
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise
+
+    def __convert_sectors(self, source_fd: int, output_fd: int, track: CueTrack, sectors: int,
+                          progress: callable, should_stop: callable) -> bool:
+        """Streams the data of the sectors of a track to the output file.
+
+        Returns:
+            bool: True if all the sectors were converted, False if should_stop returned True.
+        """
+
+        output = bytearray(self.SECTORS_PER_BATCH * self.ISO_SECTOR_SIZE)
+        scratch = bytearray(max(track.sector_size - self.ISO_SECTOR_SIZE, 1))
+
+        full_batch = self.__create_read_calls(memoryview(output), memoryview(scratch), track, self.SECTORS_PER_BATCH)
+        total_bytes = sectors * self.ISO_SECTOR_SIZE
+        written = 0
+
+        os.lseek(source_fd, track.start * track.sector_size, os.SEEK_SET)
+        os.posix_fadvise(source_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        start = time.monotonic()
+        last_progress = start
+
+        while written < total_bytes:
+            batch_sectors = min(self.SECTORS_PER_BATCH, (total_bytes - written) // self.ISO_SECTOR_SIZE)
+
+            if batch_sectors == self.SECTORS_PER_BATCH:
+                calls = full_batch
+            else:
+                # Only the last batch is smaller, its buffers are created once too
+                calls = self.__create_read_calls(memoryview(output), memoryview(scratch), track, batch_sectors)
+
+            position = os.lseek(source_fd, 0, os.SEEK_CUR)
+
+            for buffers, length in calls:
+                if os.readv(source_fd, buffers) != length:
+                    raise OSError(errno.EIO, "O arquivo BIN terminou antes do esperado", track.file)
+
+            # The pages of the BIN won't be read again, so they don't push the files smbd is serving out of the cache
+            os.posix_fadvise(source_fd, position, batch_sectors * track.sector_size, os.POSIX_FADV_DONTNEED)
+
+            view = memoryview(output)[:batch_sectors * self.ISO_SECTOR_SIZE]
+
+            while view:
+                view = view[os.write(output_fd, view):]
+
+            written += batch_sectors * self.ISO_SECTOR_SIZE
+
+            if should_stop is not None and should_stop():
+                return False
+
+            now = time.monotonic()
+            if progress is not None and (now - last_progress >= self.PROGRESS_INTERVAL or written == total_bytes):
+                progress(written, total_bytes)
+                last_progress = now
+
+        return True
+
+    def __create_read_calls(self, output: memoryview, scratch: memoryview, track: CueTrack, sectors: int) -> list[tuple[list[memoryview], int]]:
+        """Creates the buffers of the readv calls that read sectors of a track into the output buffer.
+
+        The data of each sector goes to its place in the output. The bytes between the data of two sectors (the end
+        of one and the start of the next) go to the scratch buffer, with one buffer for both.
+
+        Returns:
+            list[tuple[list[memoryview], int]]: The buffers of each call and the bytes it reads.
+        """
+
+        header = track.data_offset
+        trailer = track.sector_size - track.data_offset - self.ISO_SECTOR_SIZE
+        buffers = []
+
+        for sector in range(sectors):
+            gap = header if sector == 0 else header + trailer
+
+            if gap:
+                buffers.append(scratch[:gap])
+
+            buffers.append(output[sector * self.ISO_SECTOR_SIZE:(sector + 1) * self.ISO_SECTOR_SIZE])
+
+        if trailer and sectors:
+            buffers.append(scratch[:trailer])
+
+        iov_max = min(os.sysconf("SC_IOV_MAX"), self.IOV_MAX)
+        calls = []
+
+        for first in range(0, len(buffers), iov_max):
+            call = buffers[first:first + iov_max]
+            calls.append((call, sum(len(buffer) for buffer in call)))
+
+        return calls
+
+    @classmethod
+    def get_destination(cls, share_path: str, cue_path: str) -> tuple[str, str]:
+        """Returns the media folder ('CD', or 'DVD' for images bigger than a CD) and the path of the ISO in the share folder.
+
+        Raises:
+            OSError: If the BIN file can't be read.
+            ValueError: If the CUE sheet is invalid.
+        """
+
+        track = CueSheet.get_data_track(CueSheet.parse(cue_path))
+        media = "CD" if cls.get_sectors(track) <= GameLibrary.MAX_CD_SECTORS else "DVD"
+        file_name = os.path.splitext(os.path.basename(cue_path))[0] + ".iso"
+
+        return media, os.path.join(share_path, media, file_name)
+
+    def benchmark(self, size: int, folder: str | None = None) -> tuple[float, float]:
+        """Measures the throughput of the conversion with a synthetic MODE2/2352 image.
+
+        The BIN is written, flushed and dropped from the page cache before the conversion, so it is read from the disk.
+
+        Args:
+            size (int): Size of the ISO in bytes (the BIN is 2352/2048 times bigger).
+            folder (str): Folder of the temporary files. None uses the default temporary folder.
+
+        Returns:
+            tuple[float, float]: The seconds spent and the throughput in MB of BIN read per second.
+        """
+
+        sectors = max(size // self.ISO_SECTOR_SIZE, 1)
+
+        # One batch of raw sectors (sync, header, subheader, data, EDC/ECC) is written again and again
+        sector = bytearray(2352)
+        sector[:len(self.SYNC_PATTERN)] = self.SYNC_PATTERN
+        sector[self.MODE_OFFSET] = 2
+        batch = bytes(sector) * self.SECTORS_PER_BATCH
+
+        with tempfile.TemporaryDirectory(prefix="ps2nm-bin2iso.", dir=folder) as temp_folder:
+            bin_path = os.path.join(temp_folder, "benchmark.bin")
+            cue_path = os.path.join(temp_folder, "benchmark.cue")
+
+            with open(bin_path, "wb") as bin_file:
+                for first in range(0, sectors, self.SECTORS_PER_BATCH):
+                    bin_file.write(batch[:min(self.SECTORS_PER_BATCH, sectors - first) * 2352])
+
+                bin_file.flush()
+                os.fsync(bin_file.fileno())
+                os.posix_fadvise(bin_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+            with open(cue_path, "w") as cue_file:
+                cue_file.write('FILE "benchmark.bin" BINARY\n  TRACK 01 MODE2/2352\n    INDEX 01 00:00:00\n')
+
+            start = time.perf_counter()
+            self.convert(cue_path, os.path.join(temp_folder, "benchmark.iso"))
+            elapsed = time.perf_counter() - start
+
+        return elapsed, sectors * 2352 / max(elapsed, 1e-9) / 1024 ** 2
@@ -0,0 +1,663 @@
+"""Command line front end of the PS2 Network Manager, for headless machines.
+
+Only the modules needed by each command are imported, so PyQt6 is never loaded.
+Usage: python3 'PS2 Network Manager CLI.py' <command> [options]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Commands that change the system and need to run as root
+ROOT_COMMANDS = {"set-netbios", "set-path", "set-interface", "start", "stop", "import", "defrag"}
+
+def create_parser() -> argparse.ArgumentParser:
+    """Creates the parser of the command line arguments."""
+
+    parser = argparse.ArgumentParser(
+        prog="PS2 Network Manager CLI",
+        description="Gerencia o servidor SAMBA usado pelo OPL sem interface gráfica."
+    )
+    parser.add_argument("-d", "--debug", action="store_true", help="Ativa o modo de depuração.")
+
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMANDO")
+
+    status = commands.add_parser("status", help="Mostra o estado do servidor e as configurações do PS2.")
+    status.add_argument("--json", action="store_true", help="Mostra o estado em JSON.")
+
+    set_netbios = commands.add_parser("set-netbios", help="Altera o nome NetBIOS do servidor.")
+    set_netbios.add_argument("name", help="O novo nome NetBIOS.")
+
+    set_path = commands.add_parser("set-path", help="Altera a pasta compartilhada com o PS2.")
+    set_path.add_argument("path", help="O caminho da pasta.")
+
+    set_interface = commands.add_parser("set-interface", help="Altera a interface de rede e o IP usados pelo servidor.")
+    set_interface.add_argument("interface", help="A interface de rede, ou 'none' para remover a interface.")
+    set_interface.add_argument("ip", nargs="?", help="O endereço IPv4 da interface.")
+
+    commands.add_parser("start", help="Inicia o servidor SAMBA.")
+    commands.add_parser("stop", help="Para o servidor SAMBA.")
+
+    monitor = commands.add_parser("monitor", help="Mostra a velocidade de transmissão em linhas JSON.")
+    monitor.add_argument("-i", "--interface", action="append", dest="interfaces",
+                         help="Interface a monitorar. Pode ser usada mais de uma vez. Padrão: a interface do servidor.")
+    monitor.add_argument("--interval", type=float, default=1.0, help="Intervalo entre as linhas, em segundos. Padrão: 1.")
+    monitor.add_argument("--count", type=int, default=0, help="Número de linhas a mostrar. Padrão: sem limite.")
+    monitor.add_argument("--clients", action="store_true", help="Inclui os consoles conectados (smbstatus).")
+
+    import_parser = commands.add_parser("import", help="Copia imagens ISO ou ZSO para as pastas DVD e CD da pasta compartilhada. "
+                                                       "Imagens BIN/CUE (o arquivo CUE) são convertidas para ISO.")
+    import_parser.add_argument("sources", nargs="+", metavar="IMAGEM", help="As imagens a importar (ISO, ZSO ou CUE).")
+    import_parser.add_argument("--overwrite", action="store_true", help="Substitui as imagens que já existem na pasta compartilhada.")
+
+    verify = commands.add_parser("verify", help="Verifica a integridade das imagens (CRC32 e SHA-1).")
+    verify.add_argument("paths", nargs="*", help="Imagens a verificar. Padrão: os jogos da pasta compartilhada.")
+    verify.add_argument("-j", "--jobs", type=int, default=0, help="Número de processos. Padrão: o número de núcleos.")
+    verify.add_argument("--no-xattrs", action="store_true", help="Não lê nem grava os hashes nos atributos estendidos dos arquivos.")
+    verify.add_argument("--dat", action="append", dest="dats", metavar="DAT",
+                        help="Arquivo DAT (Redump / No-Intro) ou pasta com arquivos DAT para reconhecer as imagens. "
+                             "Pode ser usado mais de uma vez. Padrão: os DATs indexados anteriormente.")
+    verify.add_argument("--json", action="store_true", help="Mostra os resultados em linhas JSON.")
+
+    fragmentation = commands.add_parser("fragmentation", help="Mostra a fragmentação das imagens no disco (FIEMAP).")
+    fragmentation.add_argument("paths", nargs="*", help="Imagens a analisar. Padrão: os jogos da pasta compartilhada.")
+    fragmentation.add_argument("--top", type=int, default=0, help="Mostra só as N imagens mais fragmentadas. Padrão: todas.")
+    fragmentation.add_argument("--json", action="store_true", help="Mostra os resultados em linhas JSON.")
+
+    defrag = commands.add_parser("defrag", help="Regrava imagens fragmentadas em uma área contígua do disco.")
+    defrag.add_argument("paths", nargs="+", metavar="ISO", help="As imagens a desfragmentar.")
+    defrag.add_argument("--rate", type=float, default=64, help="Velocidade máxima em MB/s (0 para não limitar). Padrão: 64.")
+
+    convert = commands.add_parser("convert", help="Comprime imagens ISO em ZSO (LZ4) e descomprime imagens ZSO em ISO.")
+    convert.add_argument("paths", nargs="+", metavar="IMAGEM", help="As imagens a converter. Cada uma é gravada ao lado da original.")
+    convert.add_argument("-j", "--jobs", type=int, default=0, help="Número de processos. Padrão: o número de núcleos.")
+    convert.add_argument("--level", type=int, default=0, choices=range(13), metavar="0-12",
+                         help="0 para a compressão LZ4 rápida, ou o nível do LZ4 HC (1 a 12), que comprime mais. Padrão: 0.")
+    convert.add_argument("--replace", action="store_true", help="Remove a imagem original depois da conversão.")
+
+    bin2iso_benchmark = commands.add_parser("bin2iso-benchmark", help="Mede a velocidade da conversão de BIN/CUE para ISO.")
+    bin2iso_benchmark.add_argument("--size", type=int, default=512, help="Tamanho da ISO de teste em MB. Padrão: 512.")
+    bin2iso_benchmark.add_argument("--dir", default=None, help="Pasta dos arquivos de teste (o disco medido). Padrão: a pasta temporária.")
+
+    return parser
+
+def get_share_folder_path() -> str:
+    """Returns the path of the PS2 share folder from the SAMBA configuration file, without creating the SambaManager."""
+
+    from modules.SambaManager import SambaManager
+    from modules.SambaConf import SambaConfCache
+    from modules.Exceptions import SettingNotFound, TagNotFound
+
+    try:
+        return SambaConfCache(SambaManager.SAMBA_CONF_PATH).load().get(SambaManager.PS2_SHARE_NAME, "path")
+    except (SettingNotFound, TagNotFound):
+        return ""
+
+def create_samba_manager(debug: bool):
+    """Creates the SambaManager without stopping the server, and loads its current state."""
+
+    from modules.SambaManager import SambaManager
+
+    samba_manager = SambaManager(debug, stop_on_init=False)
+    samba_manager.load_interface_and_ip_from_conf()
+    samba_manager.refresh_server_status()
+
+    return samba_manager
+
+def command_status(args, logger) -> int:
+    from modules.Exceptions import BaseManagerException
+
+    samba_manager = create_samba_manager(args.debug)
+
+    try:
+        samba_manager.check_ps2_share_settings()
+        share_ok = True
+    except BaseManagerException:
+        share_ok = False
+
+    status = {
+        "server_active": samba_manager.get_server_status(),
+        "netbios_name": samba_manager.get_netbios_name(),
+        "share_name": samba_manager.PS2_SHARE_NAME,
+        "share_path": samba_manager.get_ps2_share_folder_path(),
+        "share_settings_ok": share_ok,
+        "global_settings_ok": samba_manager.check_global_samba_conf(),
+        "interface": samba_manager.get_current_interface(),
+        "ip": samba_manager.get_current_ip(),
+    }
+
+    if args.json:
+        print(json.dumps(status))
+    else:
+        print(f"Servidor:            {'ATIVO' if status['server_active'] else 'INATIVO'}")
+        print(f"Nome NetBIOS:        {status['netbios_name']}")
+        print(f"Compartilhamento:    {status['share_name']} ({'ok' if share_ok else 'incorreto'})")
+        print(f"Pasta compartilhada: {status['share_path']}")
+        print(f"Interface:           {status['interface'] or 'NENHUMA'}")
+        print(f"IP:                  {status['ip'] or 'X.X.X.X'}")
+
+    return 0
+
+def command_set_netbios(args, logger) -> int:
+    samba_manager = create_samba_manager(args.debug)
+    samba_manager.set_netbios_name(args.name)
+
+    logger.success("O nome NetBIOS foi alterado para: %s com sucesso.", args.name)
+    return 0
+
+def command_set_path(args, logger) -> int:
+    samba_manager = create_samba_manager(args.debug)
+    samba_manager.set_ps2_share_folder_path(os.path.abspath(args.path))
+
+    return 0
+
+def command_set_interface(args, logger) -> int:
+    samba_manager = create_samba_manager(args.debug)
+
+    if args.interface.lower() == "none":
+        samba_manager.set_interface_and_ip(None, None)
+        logger.success("A interface e o IP foram removidos do arquivo de configuração.")
+        return 0
+
+    if args.ip is None:
+        logger.error("Informe o endereço IP da interface %s.", args.interface)
+        return 1
+
+    if not samba_manager.check_if_interface_exists(args.interface):
+        logger.error("A interface de rede %s não existe.", args.interface)
+        return 1
+
+    if not samba_manager.check_if_ip_is_valid(args.ip):
+        logger.error("O endereço IP %s não é válido.", args.ip)
+        return 1
+
+    if not samba_manager.check_if_ip_is_bound(args.ip, args.interface):
+        logger.error("O IP %s não está configurado na interface %s. Adicione-o com: ip addr add %s/24 dev %s",
+                     args.ip, args.interface, args.ip, args.interface)
+        return 1
+
+    samba_manager.set_interface_and_ip(args.interface, args.ip)
+    logger.success("Interface de rede %s e endereço IP %s escolhidos com sucesso.", args.interface, args.ip)
+
+    return 0
+
+def command_start(args, logger) -> int:
+    samba_manager = create_samba_manager(args.debug)
+
+    if samba_manager.get_current_interface() is None:
+        logger.error("Nenhuma interface válida está configurada. Use o comando set-interface antes de iniciar o servidor.")
+        return 1
+
+    samba_manager.start_server()
+    return 0
+
+def command_stop(args, logger) -> int:
+    samba_manager = create_samba_manager(args.debug)
+    samba_manager.stop_server()
+
+    return 0
+
+def command_monitor(args, logger) -> int:
+    import time
+    from modules.NetSampler import NetSampler, counter_delta
+
+    interfaces = args.interfaces
+
+    if not interfaces:
+        from modules.SambaManager import SambaManager
+        from modules.SambaConf import SambaConfCache
+        from modules.Exceptions import SettingNotFound, TagNotFound
+
+        # Only the configuration file is needed, so the SambaManager is not created
+        try:
+            interfaces = SambaConfCache(SambaManager.SAMBA_CONF_PATH).load().get("global", "interfaces").split()[:1]
+        except (SettingNotFound, TagNotFound):
+            interfaces = []
+
+        if not interfaces:
+            logger.error("Nenhuma interface configurada no SAMBA. Informe a interface com -i.")
+            return 1
+
+    tracker = None
+    if args.clients:
+        from modules.SmbSessions import SmbSessionTracker
+        tracker = SmbSessionTracker()
+
+    sampler = NetSampler.create(interfaces)
+    interval_ns = int(args.interval * 1_000_000_000)
+    lines = 0
+
+    try:
+        sampler.sample()
+        previous_time = time.monotonic_ns()
+        previous = [(sent, recv) for sent, recv in zip(sampler.bytes_sent, sampler.bytes_recv)]
+        next_tick = previous_time + interval_ns
+
+        while args.count <= 0 or lines < args.count:
+            delay = next_tick - time.monotonic_ns()
+            if delay > 0:
+                time.sleep(delay / 1_000_000_000)
+
+            sampler.sample()
+            now = time.monotonic_ns()
+            elapsed = (now - previous_time) / 1_000_000_000
+            next_tick = max(next_tick + interval_ns, now)
+
+            line = {"timestamp": round(time.time(), 3), "interfaces": {}, "up_kbps": 0.0, "down_kbps": 0.0}
+
+            for index, interface in enumerate(sampler.interfaces):
+                if not sampler.found[index]:
+                    line["interfaces"][interface] = None
+                    continue
+
+                up = counter_delta(previous[index][0], sampler.bytes_sent[index]) / elapsed / 1024
+                down = counter_delta(previous[index][1], sampler.bytes_recv[index]) / elapsed / 1024
+                previous[index] = (sampler.bytes_sent[index], sampler.bytes_recv[index])
+
+                line["interfaces"][interface] = {"up_kbps": round(up, 2), "down_kbps": round(down, 2)}
+                line["up_kbps"] += up
+                line["down_kbps"] += down
+
+            line["up_kbps"] = round(line["up_kbps"], 2)
+            line["down_kbps"] = round(line["down_kbps"], 2)
+            previous_time = now
+
+            if tracker is not None:
+                try:
+                    clients = tracker.poll()
+                except Exception as e:
+                    logger.error("Não foi possível consultar o smbstatus: %s", e)
+                    clients = tracker.get_clients()
+
+                line["clients"] = [
+                    {
+                        "address": client.address,
+                        "open_files": client.open_files,
+                        "up_kbps": round(client.up_speed, 2),
+                        "down_kbps": round(client.down_speed, 2),
+                    }
+                    for client in clients
+                ]
+
+            print(json.dumps(line), flush=True)
+            lines += 1
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        sampler.close()
+
+    return 0
+
+def command_import(args, logger) -> int:
+    from modules.GameImporter import GameImporter
+
+    samba_manager = create_samba_manager(args.debug)
+    share_path = samba_manager.get_ps2_share_folder_path()
+
+    if not share_path or not os.path.isdir(share_path):
+        logger.error("A pasta compartilhada não existe. Use o comando set-path antes de importar os jogos.")
+        return 1
+
+    # The copies belong to the user, like the share folder
+    user_info = samba_manager.get_user_info()
+    importer = GameImporter(share_path, (user_info["user_id"], user_info["group_id"]))
+    jobs = importer.plan(args.sources, overwrite=args.overwrite)
+
+    def progress(copied, total, files_done, files_total, speed, eta):
+        minutes, seconds = divmod(int(eta), 60)
+        logger.info("Importando: %.1f/%.1f GB, %d/%d imagem(ns), %.0f MB/s, faltam %02d:%02d", copied / 1024 ** 3,
+                    total / 1024 ** 3, files_done, files_total, speed / 1024 ** 2, minutes, seconds)
+
+    try:
+        jobs = importer.import_games(jobs, progress=progress)
+    except KeyboardInterrupt:
+        return 130
+    except OSError as e:
+        logger.error("Não foi possível importar os jogos: %s", e)
+        return 1
+
+    for job in jobs:
+        if job.error:
+            logger.error("%s não foi importado: %s", job.source, job.error)
+        else:
+            print(f"{job.media:<4} {job.destination}")
+
+    failed = sum(1 for job in jobs if job.error)
+
+    if failed:
+        logger.error("%d de %d imagem(ns) não foram importadas.", failed, len(jobs))
+        return 1
+
+    logger.success("%d jogo(s) importado(s) para %s.", len(jobs), share_path)
+    return 0
+
+def command_verify(args, logger) -> int:
+    import time
+    from modules.ImageVerifier import ImageVerifier
+    from modules.GameLibrary import GameLibrary
+    from modules.DatIndex import DatIndex
+
+    paths = [os.path.abspath(path) for path in args.paths]
+
+    if not paths:
+        share_path = get_share_folder_path()
+
+        if not share_path:
+            logger.error("A pasta compartilhada não está configurada no SAMBA. Informe as imagens a verificar.")
+            return 1
+
+        paths = [entry.path for _, _, entry in GameLibrary(share_path).list_images()]
+
+    # The DAT files are only parsed again if they changed since the index was built
+    dat_index = DatIndex()
+
+    if args.dats:
+        try:
+            if dat_index.build(args.dats):
+                logger.info("%d entrada(s) indexada(s) dos arquivos DAT.", dat_index.get_count())
+        except OSError as e:
+            logger.error("Não foi possível indexar os arquivos DAT: %s", e)
+            return 1
+    else:
+        dat_index.load()
+
+    verifier = ImageVerifier(use_xattrs=not args.no_xattrs, max_workers=args.jobs or None)
+    verifier.load_cache()
+
+    start = time.monotonic()
+
+    def progress(bytes_done, bytes_total, files_done, files_total):
+        speed = bytes_done / max(time.monotonic() - start, 0.001) / 1024 ** 2
+        logger.info("Verificando: %.1f/%.1f GB, %d/%d arquivo(s), %.0f MB/s", bytes_done / 1024 ** 3,
+                    bytes_total / 1024 ** 3, files_done, files_total, speed)
+
+    try:
+        results = verifier.verify(paths, progress=progress)
+    except KeyboardInterrupt:
+        return 130
+
+    failed = 0
+
+    for result in results:
+        match = None
+
+        if dat_index.get_count() > 0:
+            match = dat_index.match(result, GameLibrary.parse_file_name(os.path.basename(result.path))[1])
+
+        bad_dump = match is not None and match.status == DatIndex.BAD_DUMP
+        failed += not result.ok or bad_dump
+
+        if args.json:
+            print(json.dumps({
+                "path": result.path,
+                "size": result.size,
+                "crc32": f"{result.crc32:08x}" if not result.error else None,
+                "sha1": result.sha1 or None,
+                "cached": result.cached,
+                "problems": result.problems,
+                "error": result.error or None,
+                "dat": None if match is None else {"status": match.status, "game": match.game or None, "rom": match.rom or None},
+            }))
+        elif result.error:
+            print(f"{'ERRO':<10} {result.path}: {result.error}")
+        else:
+            if not result.ok:
+                status = "PROBLEMA"
+            elif match is not None and match.status != DatIndex.UNKNOWN:
+                status = {DatIndex.BAD_DUMP: "BAD DUMP", DatIndex.MISMATCH: "DIVERGENTE"}.get(match.status, "VERIFICADO")
+            else:
+                status = "OK"
+
+            print(f"{status:<10} {result.crc32:08x} {result.sha1} {result.path}")
+
+            for problem in result.problems:
+                print(f"{'':<10} {problem}")
+
+            if match is not None and match.status != DatIndex.UNKNOWN:
+                print(f"{'':<10} DAT: {match.game}{' - ' + match.reason if match.reason else ''}")
+
+    if failed:
+        logger.error("%d de %d imagem(ns) com problemas.", failed, len(results))
+        return 1
+
+    logger.success("%d imagem(ns) verificada(s) sem problemas.", len(results))
+    return 0
+
+def command_fragmentation(args, logger) -> int:
+    from modules.Fragmentation import FragmentationScanner
+    from modules.GameLibrary import GameLibrary
+    from modules.ImageVerifier import ImageVerifier
+
+    paths = [os.path.abspath(path) for path in args.paths]
+
+    if not paths:
+        share_path = get_share_folder_path()
+
+        if not share_path:
+            logger.error("A pasta compartilhada não está configurada no SAMBA. Informe as imagens a analisar.")
+            return 1
+
+        paths = [entry.path for _, _, entry in GameLibrary(share_path).list_images()]
+
+    scanner = FragmentationScanner()
+    scanner.load_cache()
+
+    try:
+        results = scanner.scan(paths)
+    except KeyboardInterrupt:
+        return 130
+
+    for info in results[:args.top or None]:
+        if args.json:
+            print(json.dumps({
+                "path": info.path,
+                "size": info.size,
+                "extents": info.extents if not info.error else None,
+                "fragments": info.fragments if not info.error else None,
+                "seeks_per_gib": round(info.seeks_per_gib, 1) if not info.error else None,
+                "max_seek": info.max_seek if not info.error else None,
+                "cached": info.cached,
+                "error": info.error or None,
+            }))
+        elif info.error:
+            print(f"{'ERRO':<10} {info.path}: {info.error}")
+        else:
+            print(f"{info.fragments:>6} frag {info.extents:>6} ext {info.seeks_per_gib:>8.1f}/GiB "
+                  f"{info.max_seek / 1024 ** 2:>10.1f} MB {info.path}")
+
+    failed = sum(1 for info in results if info.error)
+    stutter = 0
+
+    for info in results:
+        if not info.error and info.seeks_per_gib >= FragmentationScanner.STUTTER_SEEKS_PER_GIB:
+            # SSDs don't seek, so the warning is only for rotational (or unknown) disks
+            try:
+                stutter += ImageVerifier.is_rotational(os.stat(info.path).st_dev) is not False
+            except OSError:
+                continue
+
+    if stutter:
+        logger.warning("%d imagem(ns) muito fragmentada(s) em disco rotativo podem travar no OPL.", stutter)
+
+    if failed:
+        logger.error("Não foi possível analisar %d imagem(ns).", failed)
+        return 1
+
+    return 0
+
+def command_defrag(args, logger) -> int:
+    from modules.Defragmenter import Defragmenter
+    from modules.Fragmentation import FragmentationScanner
+
+    scanner = FragmentationScanner()
+    scanner.load_cache()
+
+    max_rate = int(args.rate * 1024 ** 2)
+    defragmenter = Defragmenter(scanner, max_rate=max_rate, playing_rate=min(max_rate or Defragmenter.PLAYING_RATE, Defragmenter.PLAYING_RATE))
+    failed = 0
+
+    for path in args.paths:
+        def progress(done, total):
+            logger.info("Desfragmentando %s: %d%%", path, done * 100 // total)
+
+        try:
+            result = defragmenter.defragment(path, progress=progress)
+        except KeyboardInterrupt:
+            return 130
+
+        if result.error:
+            failed += 1
+            logger.error("%s não foi desfragmentada: %s", result.path, result.error)
+        elif result.replaced:
+            print(f"{result.extents_before:>6} -> {result.extents_after:<6} extent(s) {result.path}")
+        else:
+            print(f"{result.extents_before:>6} (contígua)      {result.path}")
+
+    try:
+        scanner.save_cache()
+    except OSError as e:
+        logger.warning("Não foi possível salvar o cache de fragmentação: %s", e)
+
+    if failed:
+        logger.error("%d de %d imagem(ns) não foram desfragmentadas.", failed, len(args.paths))
+        return 1
+
+    return 0
+
+def command_convert(args, logger) -> int:
+    import time
+    from modules.ZsoConverter import ZsoConverter
+    from modules.Defragmenter import Defragmenter
+
+    try:
+        converter = ZsoConverter(max_workers=args.jobs or None, level=args.level)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+
+    failed = 0
+
+    for source in args.paths:
+        destination = ZsoConverter.get_destination(source)
+
+        if os.path.exists(destination):
+            failed += 1
+            logger.error("%s não foi convertida: %s já existe.", source, destination)
+            continue
+
+        start = time.monotonic()
+
+        def progress(done, total):
+            speed = done / max(time.monotonic() - start, 0.001) / 1024 ** 2
+            logger.info("Convertendo %s: %.1f/%.1f GB, %.0f MB/s", source, done / 1024 ** 3, total / 1024 ** 3, speed)
+
+        try:
+            if source.lower().endswith(".zso"):
+                sizes = converter.decompress(source, destination, progress=progress)
+            else:
+                sizes = converter.compress(source, destination, progress=progress)
+        except KeyboardInterrupt:
+            return 130
+        except (OSError, ValueError) as e:
+            failed += 1
+            logger.error("%s não foi convertida: %s", source, e)
+            continue
+
+        elapsed = time.monotonic() - start
+        iso_size = sizes[1] if source.lower().endswith(".zso") else sizes[0]
+        print(f"{sizes[0] / 1024 ** 2:>10.1f} MB -> {sizes[1] / 1024 ** 2:>10.1f} MB "
+              f"({iso_size / max(elapsed, 0.001) / 1024 ** 2:.0f} MB/s) {destination}")
+
+        if args.replace:
+            # An image being played is kept, smbd would keep serving the deleted file until the console closes it.
+            # The conversion already succeeded, so an error here only keeps the original
+            try:
+                stat = os.stat(source)
+
+                if (stat.st_dev, stat.st_ino) in Defragmenter.get_smbd_open_files():
+                    logger.warning("%s está aberta pelo SAMBA (um console está jogando) e foi mantida.", source)
+                else:
+                    os.unlink(source)
+            except PermissionError:
+                logger.warning("Sem permissão para ver os arquivos abertos pelo SAMBA ou remover %s. A original foi mantida.", source)
+            except OSError as e:
+                logger.warning("%s não pôde ser removida e foi mantida: %s", source, e)
+
+    if failed:
+        logger.error("%d de %d imagem(ns) não foram convertidas.", failed, len(args.paths))
+        return 1
+
+    return 0
+
+def command_bin2iso_benchmark(args, logger) -> int:
+    from modules.BinCueConverter import BinCueConverter
+
+    if args.size <= 0:
+        logger.error("O tamanho deve ser maior que zero.")
+        return 1
+
+    size = args.size * 1024 ** 2
+
+    try:
+        elapsed, speed = BinCueConverter().benchmark(size, args.dir)
+    except KeyboardInterrupt:
+        return 130
+    except OSError as e:
+        logger.error("Não foi possível medir a conversão: %s", e)
+        return 1
+
+    print(f"{size * 2352 // 2048 / 1024 ** 2:.0f} MB de BIN convertidos em {elapsed:.2f} s ({speed:.0f} MB/s)")
+
+    return 0
+
+COMMANDS = {
+    "status": command_status,
+    "set-netbios": command_set_netbios,
+    "set-path": command_set_path,
+    "set-interface": command_set_interface,
+    "start": command_start,
+    "stop": command_stop,
+    "monitor": command_monitor,
+    "import": command_import,
+    "verify": command_verify,
+    "fragmentation": command_fragmentation,
+    "defrag": command_defrag,
+    "convert": command_convert,
+    "bin2iso-benchmark": command_bin2iso_benchmark,
+}
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs a command of the CLI and returns the exit code."""
+
+    args = create_parser().parse_args(argv)
+
+    from modules.Logger import get_logger, setup_logging
+
+    # The messages go to stderr, so the output of the commands (e.g. the JSON lines of monitor) can be piped
+    setup_logging(args.debug, stream=sys.stderr)
+    logger = get_logger("cli")
+
+    if not sys.platform.startswith("linux"):
+        logger.error("Desculpe, mas este script só pode ser executado em sistemas operacionais Linux.")
+        return 1
+
+    if args.command in ROOT_COMMANDS and os.geteuid() != 0:
+        logger.error("O comando %s precisa ser executado como root.", args.command)
+        return 1
+
+    from modules.Exceptions import BaseManagerException
+
+    try:
+        return COMMANDS[args.command](args, logger)
+
+    except BaseManagerException as e:
+        logger.error("PS2 Network Manager encontrou um erro:\n\n%s", e)
+
+    except ValueError as e:
+        logger.error("ERRO: %s", e)
+
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
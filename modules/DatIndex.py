@@ -0,0 +1,476 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import zipfile
+import tempfile
+import threading
+import xml.etree.ElementTree as ElementTree
+
+from modules.Logger import get_logger
+from modules.ImageVerifier import ImageHash
+
+logger = get_logger("library")
+
+# File where the index of the DAT files is kept between the executions
+DAT_INDEX_PATH = "/var/cache/ps2_network_manager/dat.idx"
+
+class DatMatch:
+    """The result of matching an image against the DAT files.
+
+    Attributes:
+        status (str): DatIndex.VERIFIED, DatIndex.BAD_DUMP, DatIndex.MISMATCH or DatIndex.UNKNOWN.
+        game (str): Name of the game in the DAT. Empty if unknown.
+        rom (str): Name of the file in the DAT. Empty if unknown.
+        reason (str): Why the image is a bad dump or doesn't match the DAT. Empty otherwise.
+    """
+
+    __slots__ = ("status", "game", "rom", "reason")
+
+    def __init__(self, status: str, game: str = "", rom: str = "", reason: str = ""):
+        self.status = status
+        self.game = game
+        self.rom = rom
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"DatMatch({self.status!r}, {self.game!r}, {self.rom!r})"
+
+class DatIndex:
+    """Index of the ROM entries of Redump / No-Intro DAT files (Logiqx XML), to recognize the images of the library.
+
+    The DAT files are parsed once, as a stream, into a compact binary file that is memory mapped: the entries are
+    sorted by CRC32 and size, so each lookup is a binary search that only touches a few pages, and a second table
+    sorted by the hash of the names finds the game of an image whose hashes don't match. The index is only rebuilt
+    when the DAT files change.
+    """
+
+    VERIFIED = "verified"
+    BAD_DUMP = "bad_dump"
+    MISMATCH = "mismatch"
+    UNKNOWN = "unknown"
+
+    DAT_EXTENSIONS = (".dat", ".xml", ".zip")
+
+    # Entries parsed between the checks of should_stop while the index is built
+    STOP_CHECK_INTERVAL = 4096
+
+    # Index file: magic, version, number of entries, length of the sources and length of the names,
+    # then the sources (JSON), the entries, the name table and the names
+    INDEX_MAGIC = b"PS2NMDAT"
+    INDEX_VERSION = 1
+    INDEX_HEADER = struct.Struct("<8sHIII")
+    INDEX_ENTRY = struct.Struct("<IQ20sIB")  # crc32, size, sha1, offset of the names, flags
+    INDEX_NAME = struct.Struct("<II")  # hash of the name, entry
+
+    FLAG_BAD_DUMP = 0x01
+
+    NO_SHA1 = bytes(20)
+
+    def __init__(self, index_path: str = DAT_INDEX_PATH):
+        """
+        Args:
+            index_path (str): The file where the index is saved.
+        """
+
+        self.index_path = index_path
+
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__map = None
+        self.__count = 0
+        self.__names_count = 0
+        self.__sources = []
+        self.__entries_offset = 0
+        self.__names_table_offset = 0
+        self.__names_offset = 0
+
+    def get_count(self) -> int:
+        """Returns the number of ROM entries of the index."""
+
+        return self.__count
+
+    def get_sources(self) -> list[str]:
+        """Returns the DAT files the index was built from."""
+
+        return [source[0] for source in self.__sources]
+
+    # --- BUILD ---
+
+    @classmethod
+    def find_dat_files(cls, paths: list[str]) -> list[str]:
+        """Returns the DAT files of the given paths. Folders are searched (not recursively) for .dat, .xml and .zip files."""
+
+        dat_files = []
+
+        for path in paths:
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    dat_files.extend(sorted(entry.path for entry in entries if entry.name.lower().endswith(cls.DAT_EXTENSIONS) and entry.is_file()))
+            else:
+                dat_files.append(path)
+
+        return [os.path.abspath(path) for path in dat_files]
+
+    @staticmethod
+    def __get_sources(dat_files: list[str]) -> list[list]:
+        sources = []
+
+        for path in dat_files:
+            stat = os.stat(path)
+            sources.append([path, stat.st_size, stat.st_mtime_ns])
+
+        return sources
+
+    def build(self, dat_paths: list[str], force: bool = False, should_stop: callable = None) -> bool | None:
+        """Builds the index from DAT files and loads it. Nothing is done if the index was built from the same, unchanged files.
+
+        Args:
+            dat_paths (list[str]): DAT files or folders with DAT files.
+            force (bool): Rebuild the index even if the DAT files didn't change.
+            should_stop (callable): Checked while the DAT files are parsed. If it returns True, the build stops and the
+                current index is kept.
+
+        Returns:
+            bool | None: True if the index was rebuilt, False if it was up to date, None if it was stopped.
+
+        Raises:
+            OSError: If a DAT file can't be read or the index can't be written.
+            ValueError: If a DAT file is not a valid XML file or has no ROM entries.
+        """
+
+        dat_files = self.find_dat_files(dat_paths)
+        sources = self.__get_sources(dat_files)
+
+        if not dat_files:
+            raise ValueError("Nenhum arquivo DAT foi encontrado.")
+
+        if not force and (self.__map is not None or self.load()) and self.__sources == sources:
+            return False
+
+        entries = []
+        names = bytearray()
+
+        for path in dat_files:
+            count = len(entries)
+
+            if should_stop is not None and should_stop():
+                return None
+
+            for game, rom, size, crc32, sha1, bad_dump in self.parse_dat(path):
+                entries.append((crc32, size, sha1, len(names), self.FLAG_BAD_DUMP if bad_dump else 0))
+                names += self.__encode_names(game, rom)
+
+                if len(entries) % self.STOP_CHECK_INTERVAL == 0 and should_stop is not None and should_stop():
+                    return None
+
+            if len(entries) == count:
+                raise ValueError(f"O arquivo DAT {path} não tem entradas de ROM.")
+
+            logger.debug("DAT %s: %d entrada(s).", path, len(entries) - count)
+
+        self.__save(sources, entries, bytes(names))
+        self.load()
+
+        return True
+
+    @classmethod
+    def parse_dat(cls, path: str):
+        """Reads the ROM entries of a DAT file as a stream, so the whole XML tree is never kept in memory.
+
+        Zip files (as the DATs are distributed by Redump) are read without being extracted.
+
+        Yields:
+            tuple[str, str, int, int, bytes, bool]: Game name, ROM name, size, CRC32, SHA-1 (zeros if absent) and if it is a bad dump.
+
+        Raises:
+            OSError: If the file can't be read.
+            ValueError: If the file is not a valid XML file.
+        """
+
+        if path.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(path)
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"O arquivo {path} não é um zip válido: {e}") from e
+
+            with archive:
+                for member in archive.namelist():
+                    if member.lower().endswith((".dat", ".xml")):
+                        with archive.open(member) as dat_file:
+                            yield from cls.__parse_dat_file(dat_file, path)
+            return
+
+        with open(path, "rb") as dat_file:
+            yield from cls.__parse_dat_file(dat_file, path)
+
+    @classmethod
+    def __parse_dat_file(cls, dat_file, path: str):
+        game = ""
+        root = None
+
+        try:
+            for event, element in ElementTree.iterparse(dat_file, events=("start", "end")):
+                if root is None:
+                    root = element
+
+                if element.tag in ("game", "machine"):
+                    if event == "start":
+                        game = element.get("name", "")
+                    else:
+                        # Free the games already read, so the memory doesn't grow with the size of the DAT
+                        root.clear()
+
+                elif element.tag == "rom" and event == "end":
+                    try:
+                        size = int(element.get("size", ""))
+                        crc32 = int(element.get("crc", ""), 16)
+                    except ValueError:
+                        # Entries without hashes (e.g. status="nodump") can't be matched
+                        continue
+
+                    sha1 = element.get("sha1")
+                    sha1 = bytes.fromhex(sha1) if sha1 and len(sha1) == 40 else cls.NO_SHA1
+
+                    yield game, element.get("name", ""), size, crc32, sha1, element.get("status") == "baddump"
+
+        except ElementTree.ParseError as e:
+            raise ValueError(f"O arquivo DAT {path} é inválido: {e}") from e
+
+    @staticmethod
+    def __encode_names(game: str, rom: str) -> bytes:
+        encoded = f"{game}\0{rom}".encode("utf-8")
+        return struct.pack("<H", len(encoded)) + encoded
+
+    @staticmethod
+    def get_name_key(name: str) -> int:
+        """Returns the hash of a name, used to find a game by name. Case and the file extension are ignored."""
+
+        stem, extension = os.path.splitext(name)
+
+        if extension.lower() in (".iso", ".bin", ".cue", ".zso", ".cso"):
+            name = stem
+
+        return zlib.crc32(name.casefold().encode("utf-8"))
+
+    def __save(self, sources: list[list], entries: list[tuple], names: bytes) -> None:
+        entries.sort()
+
+        # Each entry is found by the game and the ROM name, as OPL shows the game by the name of the file
+        name_table = set()
+
+        for index, (_, _, _, names_offset, _) in enumerate(entries):
+            length = struct.unpack_from("<H", names, names_offset)[0]
+            game, rom = names[names_offset + 2:names_offset + 2 + length].decode("utf-8").split("\0")
+
+            name_table.add((self.get_name_key(game), index))
+            name_table.add((self.get_name_key(rom), index))
+
+        name_table = sorted(name_table)
+
+        encoded_sources = json.dumps(sources).encode("utf-8")
+        parts = [self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, len(entries), len(encoded_sources), len(name_table)), encoded_sources]
+        parts.extend(self.INDEX_ENTRY.pack(*entry) for entry in entries)
+        parts.extend(self.INDEX_NAME.pack(*name) for name in name_table)
+        parts.append(names)
+
+        index_dir = os.path.dirname(self.index_path)
+        os.makedirs(index_dir, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".dat.", dir=index_dir)
+
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(b"".join(parts))
+
+            os.replace(temp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    # --- LOOKUP ---
+
+    def load(self) -> bool:
+        """Maps the index file.
+
+        Returns:
+            bool: True if the index was loaded, False if it doesn't exist or is invalid.
+        """
+
+        try:
+            index_file = open(self.index_path, "rb")
+        except OSError:
+            return False
+
+        try:
+            index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count, sources_length, names_count = self.INDEX_HEADER.unpack_from(index_map, 0)
+
+            if magic != self.INDEX_MAGIC or version != self.INDEX_VERSION:
+                raise ValueError("assinatura ou versão inválida")
+
+            offset = self.INDEX_HEADER.size
+            sources = json.loads(index_map[offset:offset + sources_length])
+            offset += sources_length
+
+            entries_offset = offset
+            names_table_offset = entries_offset + count * self.INDEX_ENTRY.size
+            names_offset = names_table_offset + names_count * self.INDEX_NAME.size
+
+            if names_offset > len(index_map):
+                raise ValueError("tamanho inconsistente")
+
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("O índice de DATs %s é inválido e será ignorado: %s", self.index_path, e)
+            index_file.close()
+            return False
+
+        with self.__lock:
+            self.__close()
+
+            self.__file = index_file
+            self.__map = index_map
+            self.__count = count
+            self.__names_count = names_count
+            self.__sources = sources
+            self.__entries_offset = entries_offset
+            self.__names_table_offset = names_table_offset
+            self.__names_offset = names_offset
+
+        return True
+
+    def lookup(self, crc32: int, size: int) -> list[tuple[str, str, bytes, bool]]:
+        """Returns the ROM entries with the given CRC32 and size.
+
+        Returns:
+            list[tuple[str, str, bytes, bool]]: Game name, ROM name, SHA-1 and if it is a bad dump, of each entry.
+        """
+
+        with self.__lock:
+            if self.__map is None:
+                return []
+
+            index = self.__bisect(self.__count, lambda i: self.__read_entry(i)[:2], (crc32, size))
+            matches = []
+
+            while index < self.__count:
+                entry_crc32, entry_size, sha1, names_offset, flags = self.__read_entry(index)
+
+                if (entry_crc32, entry_size) != (crc32, size):
+                    break
+
+                matches.append((*self.__read_names(names_offset), sha1, bool(flags & self.FLAG_BAD_DUMP)))
+                index += 1
+
+            return matches
+
+    def lookup_name(self, name: str) -> list[tuple[str, str]]:
+        """Returns the game and ROM names of the entries whose game or ROM has the given name (without the extension)."""
+
+        key = self.get_name_key(name)
+
+        with self.__lock:
+            if self.__map is None:
+                return []
+
+            index = self.__bisect(self.__names_count, lambda i: self.__read_name_key(i)[0], key)
+            matches = []
+
+            while index < self.__names_count:
+                name_key, entry = self.__read_name_key(index)
+
+                if name_key != key:
+                    break
+
+                game, rom = self.__read_names(self.__read_entry(entry)[3])
+
+                if key in (self.get_name_key(game), self.get_name_key(rom)):
+                    matches.append((game, rom))
+
+                index += 1
+
+            return matches
+
+    def match(self, result: ImageHash, name: str) -> DatMatch:
+        """Matches a verified image against the DAT files.
+
+        Args:
+            result (ImageHash): The hashes of the image.
+            name (str): The name of the game (e.g. the title of the file), used to find the game when the hashes don't match.
+
+        Returns:
+            DatMatch: VERIFIED if the hashes match a good dump, BAD_DUMP if they match an entry marked as a bad dump,
+            MISMATCH if the game is known with other hashes, UNKNOWN otherwise.
+        """
+
+        if result.error:
+            return DatMatch(self.UNKNOWN)
+
+        sha1 = bytes.fromhex(result.sha1)
+
+        for game, rom, entry_sha1, bad_dump in self.lookup(result.crc32, result.data_size):
+            # No-Intro DATs may not have the SHA-1, then the CRC32 and the size are enough
+            if entry_sha1 not in (sha1, self.NO_SHA1):
+                continue
+
+            if bad_dump:
+                return DatMatch(self.BAD_DUMP, game, rom, "A imagem é um bad dump conhecido.")
+
+            return DatMatch(self.VERIFIED, game, rom)
+
+        # Not necessarily a bad image: Redump lists the CD games as BIN/CUE tracks, so their ISOs never match
+        known = self.lookup_name(name)
+
+        if known:
+            game, rom = known[0]
+            return DatMatch(self.MISMATCH, game, rom, "Os hashes não conferem com os do DAT (imagem convertida, "
+                                                      "como de BIN/CUE, modificada ou corrompida). A imagem não pôde ser verificada.")
+
+        return DatMatch(self.UNKNOWN)
+
+    def __bisect(self, count: int, read_key: callable, key) -> int:
+        """Returns the first position whose key is not less than the given key."""
+
+        low, high = 0, count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if read_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def __read_entry(self, index: int) -> tuple[int, int, bytes, int, int]:
+        return self.INDEX_ENTRY.unpack_from(self.__map, self.__entries_offset + index * self.INDEX_ENTRY.size)
+
+    def __read_name_key(self, index: int) -> tuple[int, int]:
+        return self.INDEX_NAME.unpack_from(self.__map, self.__names_table_offset + index * self.INDEX_NAME.size)
+
+    def __read_names(self, names_offset: int) -> tuple[str, str]:
+        offset = self.__names_offset + names_offset
+        length = struct.unpack_from("<H", self.__map, offset)[0]
+
+        game, rom = self.__map[offset + 2:offset + 2 + length].decode("utf-8").split("\0")
+        return game, rom
+
+    def __close(self) -> None:
+        if self.__map is not None:
+            self.__map.close()
+            self.__file.close()
+
+        self.__map = None
+        self.__file = None
+        self.__count = 0
+        self.__names_count = 0
+        self.__sources = []
+
+    def close(self) -> None:
+        """Unmaps the index file."""
+
+        with self.__lock:
+            self.__close()
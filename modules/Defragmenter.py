@@ -0,0 +1,335 @@
+import os
+import time
+import errno
+import shutil
+import hashlib
+
+from modules.Logger import get_logger
+from modules.Fragmentation import FragmentationScanner
+
+logger = get_logger("library")
+
+class DefragResult:
+    """The result of the re-layout of an image.
+
+    Attributes:
+        path (str): The path of the image.
+        size (int): Size of the image in bytes.
+        extents_before (int): Extents of the image before the re-layout.
+        fragments_before (int): Fragments (contiguous runs of extents) of the image before the re-layout.
+        extents_after (int): Extents of the new copy. Equal to extents_before if the image was not replaced.
+        fragments_after (int): Fragments of the new copy. Equal to fragments_before if the image was not replaced.
+        replaced (bool): If the image was replaced by the contiguous copy.
+        error (str): Why the image was not replaced. Empty if it was, or if it was already contiguous.
+    """
+
+    __slots__ = ("path", "size", "extents_before", "fragments_before", "extents_after", "fragments_after", "replaced", "error")
+
+    def __init__(self, path: str, size: int = 0, extents_before: int = 0, fragments_before: int = 0, error: str = ""):
+        self.path = path
+        self.size = size
+        self.extents_before = extents_before
+        self.fragments_before = fragments_before
+        self.extents_after = extents_before
+        self.fragments_after = fragments_before
+        self.replaced = False
+        self.error = error
+
+    def __repr__(self) -> str:
+        return (f"DefragResult({self.path!r}, extents={self.extents_before}->{self.extents_after}, "
+                f"replaced={self.replaced}, error={self.error!r})")
+
+class Defragmenter:
+    """Rewrites fragmented images of the share into contiguous files.
+
+    The image is copied with large sequential reads and writes to a hidden file in the same folder, preallocated
+    with posix_fallocate so the file system gives it as few extents as it can. The copy is read back and compared
+    with the SHA-1 of the original, and then renamed over it, so the image is never missing or partial. The copy
+    keeps the owner, the permissions, the times and the xattrs of the original (the hashes of ImageVerifier stay valid).
+    copy_file_range is not used: on file systems with reflinks it would share the old extents instead of moving the data.
+
+    Images opened by smbd (a console playing them) are refused, and checked again during the copy and right before
+    the rename. The copy is throttled, and slowed down further while smbd has any file of the same disk open, so
+    the console that is playing doesn't stutter.
+
+    Must run as root, to read the open files of the smbd processes.
+    """
+
+    # Bytes read and written at once
+    CHUNK_SIZE = 8 * 1024 * 1024
+
+    # Maximum throughput of the copy and of the verification in bytes per second, and while a console reads the disk
+    MAX_RATE = 64 * 1024 * 1024
+    PLAYING_RATE = 8 * 1024 * 1024
+
+    # Interval in seconds between the checks of the files opened by smbd, and between the calls of the progress callback
+    OPEN_CHECK_INTERVAL = 1.0
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(self, scanner: FragmentationScanner | None = None, max_rate: int = MAX_RATE, playing_rate: int = PLAYING_RATE):
+        """
+        Args:
+            scanner (FragmentationScanner): Scanner whose cache forgets the replaced images, if any.
+            max_rate (int): Maximum throughput in bytes per second. 0 disables the throttling.
+            playing_rate (int): Maximum throughput while smbd has a file of the same disk open.
+        """
+
+        self.scanner = scanner
+        self.max_rate = max_rate
+        self.playing_rate = playing_rate
+
+    @staticmethod
+    def get_smbd_open_files() -> dict[tuple[int, int], str]:
+        """Returns the files opened by the smbd processes, by (st_dev, st_ino).
+
+        Raises:
+            PermissionError: If the open files of an smbd process can't be read (not running as root).
+        """
+
+        open_files = {}
+
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+
+            try:
+                with open(f"/proc/{pid}/comm") as comm_file:
+                    # Samba 4.17+ changes the name of the client processes to 'smbd[address]'
+                    if not comm_file.read().startswith("smbd"):
+                        continue
+
+                fds = os.listdir(f"/proc/{pid}/fd")
+            except (FileNotFoundError, ProcessLookupError):
+                # The process ended
+                continue
+
+            for fd in fds:
+                fd_path = f"/proc/{pid}/fd/{fd}"
+
+                try:
+                    stat = os.stat(fd_path)
+                    open_files[(stat.st_dev, stat.st_ino)] = os.readlink(fd_path)
+                except (FileNotFoundError, ProcessLookupError):
+                    continue
+
+        return open_files
+
+    def defragment(self, path: str, progress: callable = None, should_stop: callable = None) -> DefragResult | None:
+        """Rewrites an image into a contiguous copy and replaces it, if the copy has fewer fragments.
+
+        Args:
+            path (str): The path of the image.
+            progress (callable): Called about once per second with the bytes processed and the bytes to process
+                (the image is read twice: once to copy it and once to verify the copy).
+            should_stop (callable): Checked during the copy. If it returns True, the copy stops and is removed.
+
+        Returns:
+            DefragResult: The extents before and after. None if the re-layout was stopped.
+        """
+
+        path = os.path.abspath(path)
+
+        try:
+            stat = os.stat(path)
+            extents = FragmentationScanner.read_extents(path)
+        except OSError as e:
+            return DefragResult(path, error=e.strerror or str(e))
+
+        fragments = FragmentationScanner.analyze(extents)[0]
+        result = DefragResult(path, stat.st_size, len(extents), fragments)
+
+        if fragments <= 1:
+            return result
+
+        try:
+            self.__check_not_open(stat)
+
+            if shutil.disk_usage(os.path.dirname(path)).free < stat.st_size:
+                raise OSError(errno.ENOSPC, "Não há espaço livre para a cópia contígua da imagem")
+
+            temp_path = self.__copy(path, stat, progress, should_stop)
+        except InterruptedError:
+            return None
+        except OSError as e:
+            result.error = e.strerror or str(e)
+            return result
+
+        try:
+            new_extents = FragmentationScanner.read_extents(temp_path)
+            new_fragments = FragmentationScanner.analyze(new_extents)[0]
+
+            if new_fragments >= fragments:
+                # The free space is as fragmented as the image, the copy wouldn't help
+                os.unlink(temp_path)
+                result.error = f"Não há espaço livre contíguo suficiente (a cópia teria {new_fragments} fragmento(s))"
+                return result
+
+            # The image is only replaced if nothing opened or changed it during the copy
+            self.__check_not_open(stat)
+
+            if FragmentationScanner.get_signature(os.stat(path))[:2] != (stat.st_size, stat.st_mtime_ns):
+                raise OSError(errno.EBUSY, "A imagem foi alterada durante a cópia", path)
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+            result.error = e.strerror or str(e)
+            return result
+
+        if self.scanner is not None:
+            self.scanner.forget(path)
+
+        result.extents_after = len(new_extents)
+        result.fragments_after = new_fragments
+        result.replaced = True
+
+        return result
+
+    def __check_not_open(self, stat: os.stat_result) -> None:
+        if (stat.st_dev, stat.st_ino) in self.get_smbd_open_files():
+            raise OSError(errno.EBUSY, "A imagem está aberta pelo SAMBA (um console está jogando)")
+
+    def __copy(self, path: str, stat: os.stat_result, progress: callable, should_stop: callable) -> str:
+        """Copies the image to a preallocated temporary file, verifies it and returns its path.
+
+        Raises:
+            OSError: If the copy fails, doesn't match the image or the image is opened by smbd. The temporary file is removed.
+            InterruptedError: If the copy was stopped. The temporary file is removed.
+        """
+
+        folder, file_name = os.path.split(path)
+        temp_path = os.path.join(folder, f".{file_name}.defrag")
+
+        throttle = _Throttle(self, stat, progress, should_stop)
+        source_fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+
+        try:
+            destination_fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, stat.st_mode & 0o7777)
+
+            try:
+                os.posix_fallocate(destination_fd, 0, stat.st_size)
+
+                source_hash = self.__transfer(source_fd, destination_fd, stat.st_size, throttle)
+                os.fsync(destination_fd)
+
+                # The copy is read from the disk, not from the page cache
+                os.posix_fadvise(destination_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+                if self.__transfer(destination_fd, None, stat.st_size, throttle) != source_hash:
+                    raise OSError(errno.EIO, "A cópia não confere com a imagem original", path)
+            finally:
+                os.close(destination_fd)
+
+            self.__copy_metadata(path, temp_path, stat)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        finally:
+            os.close(source_fd)
+
+        return temp_path
+
+    def __transfer(self, source_fd: int, destination_fd: int | None, size: int, throttle: "_Throttle") -> str:
+        """Reads a file in order, writing it to destination_fd (if not None), and returns its SHA-1."""
+
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+        digest = hashlib.sha1()
+        offset = 0
+
+        os.posix_fadvise(source_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while offset < size:
+            count = os.preadv(source_fd, [view[:min(self.CHUNK_SIZE, size - offset)]], offset)
+
+            if count == 0:
+                raise OSError(errno.EIO, "O arquivo terminou antes do esperado (foi alterado durante a cópia?)")
+
+            chunk = view[:count]
+            digest.update(chunk)
+
+            if destination_fd is not None:
+                written = 0
+                while written < count:
+                    written += os.pwrite(destination_fd, chunk[written:], offset + written)
+
+            # The pages won't be read again, so they don't push the game being played out of the cache
+            os.posix_fadvise(source_fd, offset, count, os.POSIX_FADV_DONTNEED)
+
+            offset += count
+            throttle.wait(count)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def __copy_metadata(path: str, temp_path: str, stat: os.stat_result) -> None:
+        for name in os.listxattr(path):
+            try:
+                os.setxattr(temp_path, name, os.getxattr(path, name))
+            except OSError as e:
+                logger.debug("Não foi possível copiar o xattr %s de '%s': %s", name, path, e)
+
+        os.chown(temp_path, stat.st_uid, stat.st_gid)
+        os.chmod(temp_path, stat.st_mode & 0o7777)
+
+        # The same mtime keeps the index of the library and the hashes of the xattr valid
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+class _Throttle:
+    """Limits the throughput of a re-layout, reports its progress and checks if it must stop."""
+
+    def __init__(self, defragmenter: Defragmenter, stat: os.stat_result, progress: callable, should_stop: callable):
+        self.defragmenter = defragmenter
+        self.stat = stat
+        self.progress = progress
+        self.should_stop = should_stop
+
+        self.total = stat.st_size * 2
+        self.done = 0
+        self.playing = False
+
+        self.next_time = time.monotonic()
+        self.last_check = 0.0
+        self.last_progress = 0.0
+
+    def wait(self, count: int) -> None:
+        """Accounts count bytes and sleeps as needed to keep the throughput under the limit.
+
+        Raises:
+            OSError: If smbd opened the image.
+            InterruptedError: If should_stop returned True.
+        """
+
+        self.done += count
+        now = time.monotonic()
+
+        if self.should_stop is not None and self.should_stop():
+            raise InterruptedError(errno.EINTR, "Desfragmentação interrompida", self.stat.st_ino)
+
+        if now - self.last_check >= Defragmenter.OPEN_CHECK_INTERVAL:
+            open_files = Defragmenter.get_smbd_open_files()
+
+            if (self.stat.st_dev, self.stat.st_ino) in open_files:
+                raise OSError(errno.EBUSY, "A imagem foi aberta pelo SAMBA durante a cópia (um console está jogando)")
+
+            # A console reading any file of the same disk gets most of its bandwidth
+            self.playing = any(device == self.stat.st_dev for device, _ in open_files)
+            self.last_check = now
+
+        if self.progress is not None and now - self.last_progress >= Defragmenter.PROGRESS_INTERVAL:
+            self.progress(self.done, self.total)
+            self.last_progress = now
+
+        rate = self.defragmenter.playing_rate if self.playing else self.defragmenter.max_rate
+
+        if rate <= 0:
+            return
+
+        self.next_time = max(self.next_time, now) + count / rate
+        delay = self.next_time - now
+
+        if delay > 0:
+            time.sleep(delay)
@@ -39,4 +39,16 @@ class PS2ShareFolderNotFound(BaseManagerException):
     def __init__(self, ps2_share_path):
         self.error_message = "Pasta compartilhada com o PS2 não encontrada."
         self.description = f"Por favor, verifique se a pasta {ps2_share_path} existe e tente novamente."
-        super().__init__(self.error_message, self.description)
\ No newline at end of file
+        super().__init__(self.error_message, self.description)
+
+class ServiceCommandTimeout(SambaServiceFailure):
+    def __init__(self, command, timeout):
+        self.error_message = f"O comando '{command}' não terminou em {timeout} segundos."
+        self.description = "O comando foi interrompido. Verifique o estado do serviço e tente novamente."
+        BaseManagerException.__init__(self, self.error_message, self.description)
+
+class ServiceCommandCancelled(SambaServiceFailure):
+    def __init__(self, command):
+        self.error_message = f"O comando '{command}' foi cancelado."
+        self.description = "A operação foi interrompida antes de terminar."
+        BaseManagerException.__init__(self, self.error_message, self.description)
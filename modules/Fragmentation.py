@@ -0,0 +1,344 @@
+import os
+import fcntl
+import struct
+import tempfile
+import threading
+
+from modules.Logger import get_logger
+
+logger = get_logger("library")
+
+# File where the extent maps of the images are kept between the executions
+FRAGMENTATION_CACHE_PATH = "/var/cache/ps2_network_manager/fragmentation.idx"
+
+class FragmentationInfo:
+    """The layout of an image on the disk.
+
+    Attributes:
+        path (str): The path of the image.
+        size (int): Size of the image in bytes.
+        extents (int): Number of extents reported by the file system.
+        fragments (int): Number of physically contiguous runs of extents. 1 means the image is not fragmented.
+        max_seek (int): Largest distance in bytes the disk has to seek between two fragments, while the image is read in order.
+        total_seek (int): Sum of the distances of all the seeks.
+        cached (bool): If the layout came from the cache instead of the file system.
+        error (str): Why the layout couldn't be read. Empty if it was read.
+    """
+
+    __slots__ = ("path", "size", "extents", "fragments", "max_seek", "total_seek", "cached", "error")
+
+    def __init__(self, path: str, size: int = 0, extents: int = 0, fragments: int = 0, max_seek: int = 0,
+                 total_seek: int = 0, cached: bool = False, error: str = ""):
+        self.path = path
+        self.size = size
+        self.extents = extents
+        self.fragments = fragments
+        self.max_seek = max_seek
+        self.total_seek = total_seek
+        self.cached = cached
+        self.error = error
+
+    @property
+    def seeks_per_gib(self) -> float:
+        """Seeks needed to read each GiB of the image. The higher, the more likely OPL stutters while streaming it."""
+
+        return max(self.fragments - 1, 0) / max(self.size / 1024 ** 3, 1 / 1024)
+
+    def __repr__(self) -> str:
+        return f"FragmentationInfo({self.path!r}, extents={self.extents}, fragments={self.fragments}, max_seek={self.max_seek})"
+
+class FragmentationScanner:
+    """Reads the extent maps of the images with the FS_IOC_FIEMAP ioctl and ranks the images most likely to stutter.
+
+    An image read by OPL over SMB is streamed in order, so each jump between two fragments that are not contiguous
+    on the disk is a seek, which on a rotational disk can delay a read past what the game tolerates. Extents that
+    continue each other on the disk (file systems split big files in extents of a maximum size) are merged into one
+    fragment.
+
+    The results are cached by the (size, mtime_ns, ctime_ns, inode) signature of each file, so a rescan only calls
+    the ioctl for the images that changed or were moved on the disk.
+    """
+
+    # From <linux/fs.h> and <linux/fiemap.h>
+    FS_IOC_FIEMAP = 0xC020660B
+    FIEMAP_FLAG_SYNC = 0x00000001
+    FIEMAP_EXTENT_LAST = 0x00000001
+    FIEMAP_EXTENT_UNKNOWN = 0x00000002
+
+    FIEMAP_HEADER = struct.Struct("=QQIIII")  # start, length, flags, mapped extents, extent count, reserved
+    FIEMAP_EXTENT = struct.Struct("=QQQ16xI12x")  # logical, physical, length, flags
+
+    # Extents read by each ioctl call
+    EXTENTS_PER_CALL = 512
+
+    # Seeks per GiB from which an image on a rotational disk is likely to stutter in OPL
+    STUTTER_SEEKS_PER_GIB = 100
+
+    # Cache file: magic, version and number of entries, then the entries
+    CACHE_MAGIC = b"PS2NMFRG"
+    CACHE_VERSION = 1
+    CACHE_HEADER = struct.Struct("<8sHI")
+    CACHE_ENTRY = struct.Struct("<QqqQIIQQH")  # size, mtime_ns, ctime_ns, inode, extents, fragments, max seek, total seek, len(path)
+
+    def __init__(self, cache_path: str = FRAGMENTATION_CACHE_PATH):
+        """
+        Args:
+            cache_path (str): The file where the extent maps are saved.
+        """
+
+        self.cache_path = cache_path
+
+        self.__cache = {}  # path -> (signature, extents, fragments, max seek, total seek)
+        self.__cache_changed = False
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def get_signature(stat: os.stat_result) -> tuple[int, int, int, int]:
+        """Returns the signature of a file. The ctime changes when the data is moved on the disk without being modified."""
+
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino)
+
+    # --- EXTENTS ---
+
+    @classmethod
+    def read_extents(cls, path: str) -> list[tuple[int, int, int, int]]:
+        """Reads the extent map of a file.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            list[tuple[int, int, int, int]]: The logical offset, physical offset, length and flags of each extent, in bytes.
+
+        Raises:
+            OSError: If the file can't be opened or the file system doesn't support FIEMAP (e.g. network mounts).
+        """
+
+        extents = []
+        start = 0
+        buffer = bytearray(cls.FIEMAP_HEADER.size + cls.EXTENTS_PER_CALL * cls.FIEMAP_EXTENT.size)
+
+        with open(path, "rb") as image_file:
+            while True:
+                # Delayed allocations are written first, so every extent has its place on the disk
+                cls.FIEMAP_HEADER.pack_into(buffer, 0, start, 0xFFFFFFFFFFFFFFFF - start, cls.FIEMAP_FLAG_SYNC, 0, cls.EXTENTS_PER_CALL, 0)
+                fcntl.ioctl(image_file.fileno(), cls.FS_IOC_FIEMAP, buffer, True)
+
+                mapped = cls.FIEMAP_HEADER.unpack_from(buffer, 0)[3]
+
+                if mapped == 0:
+                    return extents
+
+                for index in range(mapped):
+                    extent = cls.FIEMAP_EXTENT.unpack_from(buffer, cls.FIEMAP_HEADER.size + index * cls.FIEMAP_EXTENT.size)
+                    extents.append(extent)
+
+                    if extent[3] & cls.FIEMAP_EXTENT_LAST:
+                        return extents
+
+                logical, _, length, _ = extents[-1]
+                start = logical + length
+
+    @classmethod
+    def analyze(cls, extents: list[tuple[int, int, int, int]]) -> tuple[int, int, int]:
+        """Merges the contiguous extents and measures the seeks needed to read the file in order.
+
+        Returns:
+            tuple[int, int, int]: The number of fragments, the largest seek and the sum of the seeks, in bytes.
+        """
+
+        fragments = 0
+        max_seek = 0
+        total_seek = 0
+        end = None
+
+        for _, physical, length, flags in extents:
+            if flags & cls.FIEMAP_EXTENT_UNKNOWN:
+                # The location is unknown (e.g. inline or encoded data), it can't be compared with the others
+                continue
+
+            if end is None or physical != end:
+                fragments += 1
+
+                if end is not None:
+                    seek = abs(physical - end)
+                    max_seek = max(max_seek, seek)
+                    total_seek += seek
+
+            end = physical + length
+
+        return fragments, max_seek, total_seek
+
+    # --- SCAN ---
+
+    def scan(self, paths: list[str], progress: callable = None, should_stop: callable = None) -> list[FragmentationInfo] | None:
+        """Reads the layout of the images, using the cache for the ones that didn't change, and saves the cache.
+
+        Args:
+            paths (list[str]): The paths of the images.
+            progress (callable): Called with the number of images read and the total, every 100 images.
+            should_stop (callable): Checked before each image. If it returns True, the scan stops.
+
+        Returns:
+            list[FragmentationInfo]: The layouts, the images most likely to stutter first. None if the scan was stopped.
+        """
+
+        results = []
+
+        for count, path in enumerate(paths, start=1):
+            if should_stop is not None and should_stop():
+                return None
+
+            results.append(self.get_info(path))
+
+            if progress is not None and count % 100 == 0:
+                progress(count, len(paths))
+
+        try:
+            self.save_cache()
+        except OSError as e:
+            logger.warning("Não foi possível salvar o cache de fragmentação em %s: %s", self.cache_path, e)
+
+        return self.rank(results)
+
+    @staticmethod
+    def rank(results: list[FragmentationInfo]) -> list[FragmentationInfo]:
+        """Sorts the layouts by the seeks per GiB and the largest seek, the images most likely to stutter first."""
+
+        return sorted(results, key=lambda info: (not info.error, info.seeks_per_gib, info.max_seek), reverse=True)
+
+    def get_info(self, path: str) -> FragmentationInfo:
+        """Returns the layout of an image, from the cache if it didn't change."""
+
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return FragmentationInfo(path, error=e.strerror or str(e))
+
+        signature = self.get_signature(stat)
+
+        with self.__lock:
+            entry = self.__cache.get(path)
+
+        if entry is not None and entry[0] == signature:
+            return FragmentationInfo(path, stat.st_size, *entry[1:], cached=True)
+
+        try:
+            extents = self.read_extents(path)
+        except OSError as e:
+            return FragmentationInfo(path, stat.st_size, error=e.strerror or str(e))
+
+        fragments, max_seek, total_seek = self.analyze(extents)
+
+        # FIEMAP_FLAG_SYNC may have written delayed data, which changes the ctime on some file systems
+        try:
+            signature = self.get_signature(os.stat(path))
+        except OSError:
+            pass
+
+        with self.__lock:
+            self.__cache[path] = (signature, len(extents), fragments, max_seek, total_seek)
+            self.__cache_changed = True
+
+        return FragmentationInfo(path, stat.st_size, len(extents), fragments, max_seek, total_seek)
+
+    def forget(self, path: str) -> None:
+        """Removes an image from the cache, so its layout is read again in the next scan."""
+
+        with self.__lock:
+            if self.__cache.pop(path, None) is not None:
+                self.__cache_changed = True
+
+    # --- CACHE ---
+
+    def load_cache(self) -> bool:
+        """Loads the extent maps from the cache file.
+
+        Returns:
+            bool: True if the cache was loaded, False if it doesn't exist or is invalid.
+        """
+
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return False
+
+        try:
+            cache = self.__decode_cache(data)
+        except (ValueError, struct.error) as e:
+            logger.warning("O cache de fragmentação %s é inválido e será ignorado: %s", self.cache_path, e)
+            return False
+
+        with self.__lock:
+            self.__cache = cache
+            self.__cache_changed = False
+
+        return True
+
+    def save_cache(self) -> None:
+        """Saves the extent maps to the cache file atomically, if they changed.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+
+        with self.__lock:
+            if not self.__cache_changed:
+                return
+
+            self.__cache = {path: entry for path, entry in self.__cache.items() if os.path.exists(path)}
+            data = self.__encode_cache(self.__cache)
+            self.__cache_changed = False
+
+        cache_dir = os.path.dirname(self.cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".fragmentation.", dir=cache_dir)
+
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+
+            os.replace(temp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def __encode_cache(self, cache: dict) -> bytes:
+        parts = [self.CACHE_HEADER.pack(self.CACHE_MAGIC, self.CACHE_VERSION, len(cache))]
+
+        for path, (signature, extents, fragments, max_seek, total_seek) in cache.items():
+            encoded_path = os.fsencode(path)
+
+            parts.append(self.CACHE_ENTRY.pack(*signature, extents, fragments, max_seek, total_seek, len(encoded_path)))
+            parts.append(encoded_path)
+
+        return b"".join(parts)
+
+    def __decode_cache(self, data: bytes) -> dict:
+        magic, version, count = self.CACHE_HEADER.unpack_from(data, 0)
+
+        if magic != self.CACHE_MAGIC:
+            raise ValueError("assinatura inválida")
+
+        if version != self.CACHE_VERSION:
+            return {}
+
+        offset = self.CACHE_HEADER.size
+        cache = {}
+
+        for _ in range(count):
+            size, mtime_ns, ctime_ns, inode, extents, fragments, max_seek, total_seek, path_length = self.CACHE_ENTRY.unpack_from(data, offset)
+            offset += self.CACHE_ENTRY.size
+
+            path = os.fsdecode(data[offset:offset + path_length])
+            offset += path_length
+
+            cache[path] = ((size, mtime_ns, ctime_ns, inode), extents, fragments, max_seek, total_seek)
+
+        if offset != len(data):
+            raise ValueError("tamanho inconsistente")
+
+        return cache
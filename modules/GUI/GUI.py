@@ -9,6 +9,7 @@ from modules.GUI.GUIFonts import GUIFonts as Fonts
 from modules.GUI.GUICustomWidgets import GUICustomWidgets as Widgets
 from modules.GUI.GUIController import PS2NetManagerGUIController
 from modules.GUI.WidgetsNames import WidgetsNames as WN
+from modules.GUI.WidgetRegistry import WidgetRegistry, WidgetRenderer
 from modules.SambaManager import SambaManager
 
 class WindowDimensions(Enum):
@@ -85,6 +86,10 @@ class PS2NetManagerGUI(QMainWindow):
         main_widget.setStyleSheet(f"background-color: {Colors.DEEP_PURPLE};")
 
         self.setCentralWidget(main_widget)
+
+        # Resolving the named widgets once, so the controller doesn't have to search for them on every update
+        self.widgets = WidgetRegistry(self)
+        self.renderer = WidgetRenderer(self.widgets)
     
     def show(self):
         """Override the show method to load the Samba settings when the window is shown."""
@@ -253,9 +258,23 @@ class PS2NetManagerGUI(QMainWindow):
         transmition_speed_layout.addWidget(transmition_speed_label)
         transmition_speed_layout.addWidget(transmission_speed_value_label)
 
+        # Connected clients line
+        connected_clients_layout = QHBoxLayout()
+        connected_clients_layout.setContentsMargins(0, 0, 0, 0)
+
+        connected_clients_label = Widgets.create_label(self, "CONSOLES CONECTADOS:")
+
+        connected_clients_value_label = Widgets.create_label(self, "0", font=Fonts.BOLD_FONT)
+        connected_clients_value_label.setObjectName(WN.CONNECTED_CLIENTS_LABEL.value)
+        connected_clients_value_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+
+        connected_clients_layout.addWidget(connected_clients_label)
+        connected_clients_layout.addWidget(connected_clients_value_label)
+
         # Adding the widgets to the main layout
         main_samba_status_layout.addLayout(status_layout)
         main_samba_status_layout.addLayout(transmition_speed_layout)
+        main_samba_status_layout.addLayout(connected_clients_layout)
         
         # Adding the log messages container
         main_samba_status_layout.addWidget(log_msg_container)
@@ -273,6 +292,10 @@ class PS2NetManagerGUI(QMainWindow):
         change_interface_button.setObjectName(WN.CHANGE_INTERFACE_BUTTON.value)
         change_interface_button.clicked.connect(self.gui_controller.on_change_interface_button_clicked)
 
+        library_button = Widgets.create_button(self, "JOGOS")
+        library_button.setObjectName(WN.LIBRARY_BUTTON.value)
+        library_button.clicked.connect(self.gui_controller.on_library_button_clicked)
+
         start_button = Widgets.create_button(self, "INICIAR", bg_color=Colors.LIGHT_GREEN)
         start_button.setObjectName(WN.START_SERVER_BUTTON.value)
         start_button.clicked.connect(self.gui_controller.on_start_server_button_clicked)
@@ -282,6 +305,7 @@ class PS2NetManagerGUI(QMainWindow):
         stop_button.clicked.connect(self.gui_controller.on_stop_server_button_clicked)
 
         buttons_layout.addWidget(change_interface_button)
+        buttons_layout.addWidget(library_button)
         buttons_layout.addStretch()
         buttons_layout.addWidget(start_button)
         buttons_layout.addWidget(stop_button)
@@ -1,24 +1,48 @@
 import sys
 import os
+import time
 import subprocess
-import ipaddress
-from colorama import Fore
+import logging
+from typing import TYPE_CHECKING
 from PyQt6.QtWidgets import *
 
 from modules.SambaManager import SambaManager
 from modules.GUI.GUIInterface import GUIInterface
 from modules.GUI.WidgetsNames import WidgetsNames as WN
-from modules.GUI.ThreeOptionsDialog import ThreeOptionsDialog as TODialog
-from modules.GUI.ListSelectDialog import ListSelectDialog as LSDialog
-from modules.GUI.ListAddSelectDialog import ListAddSelectDialog as LASDialog
-from modules.GUI.CreateNewIPDialog import CreateNewIPDialog as IPDialog
 from modules.GUI.GUIColors import GUIColors as Colors
-from modules.NetSpeedMonitor import NetSpeedMonitor
+from modules.GUI.LogPane import LogPane
+from modules.ServiceCommandRunner import ServiceCommandRunner
 from modules.Exceptions import *
+from modules.Logger import get_logger, setup_logging, shutdown_logging, add_sink, CallbackSink, SUCCESS
+
+# The dialogs and the monitors are imported when they are first used, so they don't delay the first window
+if TYPE_CHECKING:
+    from modules.GUI.ListAddSelectDialog import ListAddSelectDialog as LASDialog
+    from modules.ThroughputHistory import ThroughputStats
+
+logger = get_logger("gui")
 
 class PS2NetManagerGUIController:
     """This class handles the logic for events in the 'PS2 Network Manager' GUI."""
     
+    # Conflict groups of the commands executed by the ServiceCommandRunner
+    SAMBA_SERVICE_COMMANDS = "samba_service"
+    NETWORK_COMMANDS = "network"
+    LIBRARY_COMMANDS = "library"
+    FRAGMENTATION_COMMANDS = "fragmentation"
+    
+    # Maximum time (in seconds) the 'ip' command can take
+    IP_COMMAND_TIMEOUT = 15
+    
+    # Samples per second taken by the NetSpeedMonitor
+    NET_SPEED_SAMPLE_RATE = 20
+    
+    # Maximum time (in seconds) the cancelled commands can take to finish when the program is closed
+    SHUTDOWN_TIMEOUT = 10
+    
+    # Buttons disabled while a SAMBA service command is running
+    SERVICE_BUTTONS = [WN.START_SERVER_BUTTON, WN.STOP_SERVER_BUTTON, WN.CHANGE_INTERFACE_BUTTON, WN.CHANGE_FOLDER_BUTTON]
+    
     def __init__(self, samba_manager: SambaManager, gui: GUIInterface, log_display_widget: QPlainTextEdit):
         """Initializes the GUI controller with a SambaManager instance."""
         
@@ -26,32 +50,120 @@ class PS2NetManagerGUIController:
         self.log_display_widget = log_display_widget
         self.gui = gui
         self.net_speed_monitor = None
+        self.smb_session_monitor = None
+        self.library_watcher = None
+        
+        # Stages of the initial load that are still running
+        self.__pending_setup_stages = set()
+        
+        # Index of the games of the PS2 share folder, created when the library is opened or the server is started
+        self.game_library = None
+        self.library_dialog = None
+        
+        # Hashes of the images and index of the DAT files, created when the library is verified for the first time
+        self.image_verifier = None
+        self.dat_index = None
+        
+        # Extent maps of the images, read when the library is shown
+        self.fragmentation_scanner = None
+        
+        # The messages are written to the log widget in batches, so logging never slows down the GUI
+        self.log_pane = LogPane(log_display_widget)
+        
+        # The messages of the controller are shown in the log widget. They are delivered by the logging thread
+        setup_logging(samba_manager.debug)
+        self.log_sink = CallbackSink(self.__on_log_record)
+        self.log_sink.addFilter(logging.Filter(logger.logger.name))
+        add_sink(self.log_sink)
+        
+        # The changes made to smb.conf are applied to the running server by the command runner, out of the GUI thread
+        self.samba_manager.apply_changes_automatically = False
+        
+        # Runs the blocking commands (systemctl, smbcontrol, ip) in worker threads. The stages of the initial load
+        # run at the same time, so there is one thread for each of them
+        self.command_runner = ServiceCommandRunner(max_threads=3)
+        self.command_runner.command_progress.connect(lambda name, message: self.log(message))
+        self.command_runner.command_started.connect(self.__update_service_buttons)
+        self.command_runner.command_finished.connect(self.__update_service_buttons)
+        self.command_runner.command_failed.connect(self.__update_service_buttons)
         
     def setup_samba_settings(self):
         """
-        Loads and sets the proper SAMBA share settings relevant to the PS2 sharing into the GUI.
-
-        Steps:
-        1. Stops the SAMBA service.
-        2. Loads the NetBIOS name and sets it in the GUI.
-        3. Checks and creates the PS2 share settings in smb.conf if necessary.
-        4. Validates the PS2 shared folder and sets permissions if needed.
-        5. Loads the network interface data.
-        6. Loads the remaining settings into the GUI, including PS2 share name and folder path.
-        7. Updates the server status in the GUI.
-        8. Resets the network speed values.
+        Loads the SAMBA settings relevant to the PS2 sharing into the GUI, progressively.
+        
+        The window is shown right away and each section is filled in as soon as its data arrives. The independent
+        stages run at the same time in worker threads:
+        1. Stops the SAMBA service and updates the server status.
+        2. Loads the NetBIOS name, checks (and creates) the PS2 share settings in smb.conf and validates the
+           PS2 shared folder and its permissions.
+        3. Loads the network interface and IP from smb.conf and validates them against the system.
+        
+        Only the steps that need the user (creating the shared folder, adding the IP to the interface) run
+        in the GUI thread. The service buttons stay disabled until all the stages are done.
+        """
+        
+        # The values that don't depend on the system are shown immediately
+        self.gui.widgets.get(WN.SHARE_NAME_LABEL).setText(self.samba_manager.PS2_SHARE_NAME)
+        self.__load_interface_blank_labels()
+        self.__update_server_status(self.samba_manager.get_server_status())
+        self.reset_net_speed_values()
+        
+        self.__run_setup_stage("setup_stop_server", self.__stop_server_on_setup, self.__update_server_status,
+                               conflicts=[self.SAMBA_SERVICE_COMMANDS])
+        self.__run_setup_stage("setup_share_settings", self.__load_share_settings, self.__on_share_settings_loaded)
+        self.__run_setup_stage("setup_network_interface", self.__load_network_interface, self.__on_network_interface_loaded)
+    
+    def __run_setup_stage(self, name: str, function: callable, on_finished: callable, conflicts: list[str] = ()) -> None:
+        """Runs a stage of the initial load in a worker thread. The service buttons are enabled again when the last stage ends.
+        
+        Args:
+            name (str): The name of the stage.
+            function (callable): The work of the stage. It receives the ServiceTask and runs in a worker thread.
+            on_finished (callable): Called in the GUI thread with the result of the function.
+            conflicts (list[str]): Conflict groups of the stage.
         """
         
-        # Stop the SAMBA service when initializing the Manager
+        self.__pending_setup_stages.add(name)
+        
+        def finish_stage():
+            self.__pending_setup_stages.discard(name)
+            self.__update_service_buttons()
+        
+        def on_stage_finished(result):
+            try:
+                on_finished(result)
+            finally:
+                finish_stage()
+        
+        def on_stage_failed(error):
+            if isinstance(error, BaseManagerException):
+                self.log_error(f"ERRO: {error}")
+            else:
+                self.log_error(f"ERRO DESCONHECIDO: {error}")
+            
+            finish_stage()
+        
+        self.command_runner.run(name, function, conflicts, on_finished=on_stage_finished, on_failed=on_stage_failed)
+        self.__update_service_buttons()
+    
+    def __stop_server_on_setup(self, task) -> bool:
+        """Stops the SAMBA service when the Manager is initialized. Runs in a worker thread and returns the server status."""
+        
+        task.report_progress("Parando o servidor SAMBA...")
         self.samba_manager.stop_server()
         
+        return self.samba_manager.get_server_status()
+    
+    def __load_share_settings(self, task) -> tuple[str, bool]:
+        """Loads the NetBIOS name and checks the PS2 share settings, creating them if necessary. Runs in a worker thread.
+        
+        Returns:
+            tuple[str, bool]: The NetBIOS name and if the PS2 share folder exists.
+        """
+        
         # NetBIOS name
         netbios_name = self.samba_manager.get_netbios_name()
         
-        # Load the NetBIOS name in the GUI
-        line_edit = self.gui.findChild(QLineEdit, WN.NETBIOS_LINE_EDIT.value)
-        line_edit.setText(netbios_name)
-        
         # Check PS2 share settings
         try:
             self.samba_manager.check_ps2_share_settings()
@@ -73,11 +185,13 @@ class PS2NetManagerGUIController:
                 # If the missing setting is not the path, we will save the path that was found
                 # and then recreate the default configuration
                 path = self.samba_manager.get_ps2_share_folder_path()
-                
-                self.samba_manager.create_default_ps2_share_config()
-                
-                # Now we can set the path again
-                self.samba_manager.set_ps2_share_folder_path(path)
+
+                # Both changes are written to smb.conf at once
+                with self.samba_manager.transaction():
+                    self.samba_manager.create_default_ps2_share_config()
+
+                    # Now we can set the path again
+                    self.samba_manager.set_ps2_share_folder_path(path)
                 
                 self.log_success("Configuração padrão criada.")
             
@@ -87,10 +201,32 @@ class PS2NetManagerGUIController:
                 self.log_success("Configuração padrão criada.")
         
         # At this point, we have the global and PS2 share settings checked and created, if necessary.
-        # Now let's do the final validations to the PS2 shared folder.
-        self.__setup_ps2_share_folder()
+        # Now let's check the PS2 shared folder
+        self.samba_manager.load_from_conf_ps2_folder_path()
+        
+        return netbios_name, self.samba_manager.check_ps2_share_folder_exists()
+    
+    def __on_share_settings_loaded(self, result: tuple[str, bool]) -> None:
+        """Shows the share settings in the GUI and validates the PS2 shared folder. Runs in the GUI thread."""
+        
+        netbios_name, folder_exists = result
+        
+        # Load the NetBIOS name in the GUI
+        self.gui.widgets.get(WN.NETBIOS_LINE_EDIT).setText(netbios_name)
+        
+        # If the folder doesn't exist, the user has to choose where to create it
+        if not folder_exists and not self.__setup_ps2_share_folder():
+            return
+        
+        # Set the PS2 share path in the GUI
+        self.gui.widgets.get(WN.SHARE_FOLDER_PATH).setText(self.samba_manager.get_ps2_share_folder_path())
         
         # Now we can check if the PS2 share folder is writable and readable
+        self.__run_setup_stage("setup_share_folder_permissions", self.__check_share_folder_permissions, lambda _: None)
+    
+    def __check_share_folder_permissions(self, task) -> None:
+        """Checks if the PS2 share folder is writable and readable, and fixes its permissions if it isn't. Runs in a worker thread."""
+        
         if not self.samba_manager.check_ps2_share_folder_permissions():
             err_msg = "ERRO: A pasta compartilhada do PS2 não possui permissão de leitura e escrita. Vamos corrigir isso."
             
@@ -101,37 +237,6 @@ class PS2NetManagerGUIController:
             msg = "As permissões foram adicionadas com sucesso."
             
             self.log_success(msg)
-        
-        # At this point, we have the global and the PS2 share settings checked and created if necessary
-    
-        # Now, let's load the network interface data, but first, we will load the default blank values
-        # in the GUI, so the user can see that there is no interface selected when the GUI is loaded
-        self.__load_interface_blank_labels()
-        
-        # Now we can load the network interface data from the Samba configuration file
-        self.__setup_network_interface()
-
-        # Now let's load the remaining settings into the GUI
-        # PS2 share name
-        ps2_share_name = self.samba_manager.PS2_SHARE_NAME
-                
-        # Set the PS2 share path in the GUI
-        share_name_label = self.gui.findChild(QLabel, WN.SHARE_NAME_LABEL.value)
-        share_name_label.setText(ps2_share_name)
-        
-        # PS2 share folder path
-        ps2_share_folder_path = self.samba_manager.get_ps2_share_folder_path()
-        
-        # Set the PS2 share path in the GUI
-        share_folder_path_label = self.gui.findChild(QLabel, WN.SHARE_FOLDER_PATH.value)
-        share_folder_path_label.setText(ps2_share_folder_path)
-        
-        # Update the server status
-        server_status = self.samba_manager.get_server_status()
-        self.__update_server_status(server_status)
-        
-        # Reset net speed values
-        self.reset_net_speed_values()
     
     def __get_folder_path_from_file_dialog(self) -> str:
         """Opens a file dialog to choose the folder where to create the PS2 share folder.
@@ -161,10 +266,13 @@ class PS2NetManagerGUIController:
         
         return folder_path
     
-    def __setup_ps2_share_folder(self):
+    def __setup_ps2_share_folder(self) -> bool:
         """Checks if the PS2 share folder exists and creates it if it doesn't.
         
         It also updates the SambaManager internally with the new path.
+        
+        Returns:
+            bool: True if the folder exists, False if the user canceled and the window is closing.
         """
         
         while True:
@@ -176,6 +284,8 @@ class PS2NetManagerGUIController:
                 self.log_error("ERRO: A pasta compartilhada do PS2 não existe.")
                 
                 # Launch a dialog to ask the user where to create the PS2 share folder
+                from modules.GUI.ThreeOptionsDialog import ThreeOptionsDialog as TODialog
+
                 dialog = TODialog(
                     self.gui,
                     "Criar pasta compartilhada com o PS2",
@@ -184,7 +294,7 @@ class PS2NetManagerGUIController:
                 )
                 response = dialog.exec()
                 
-                print(f"Retorno do diálogo: {response}")
+                logger.debug("Retorno do diálogo: %s", response)
                 folder_path = ""
                 
                 if response == 1:
@@ -211,9 +321,10 @@ class PS2NetManagerGUIController:
                     self.log_success(msg)
                 
                 else:
-                    # User canceled the operation
+                    # User canceled the operation. The Manager can't work without the folder
                     self.log("Operação cancelada pelo usuário.")
-                    sys.exit(0)
+                    self.gui.close()
+                    return False
                 
                 # Now, let's save the new folder path in the configuration file and internally
                 try:
@@ -225,31 +336,33 @@ class PS2NetManagerGUIController:
                     
                     self.log_error(f"{err_msg}\n{err_description}")
                 
-                break
+                return True
             else:
                 # If the folder already exists, there's nothing to do
-                return
+                return True
 
     def __update_server_status(self, status: bool) -> None:
         """Updates the server status label in the GUI."""
 
-        status_label = self.gui.findChild(QLabel, WN.SERVER_STATUS_LABEL.value)
         if status:
-            status_label.setText("ATIVO")
-            status_label.setStyleSheet(f"color: {Colors.LIGHT_GREEN};")
+            self.gui.renderer.set_text(WN.SERVER_STATUS_LABEL, "ATIVO")
+            self.gui.renderer.set_style(WN.SERVER_STATUS_LABEL, f"color: {Colors.LIGHT_GREEN};")
         else:
-            status_label.setText("INATIVO")
-            status_label.setStyleSheet(f"color: {Colors.SOFT_RED};")
+            self.gui.renderer.set_text(WN.SERVER_STATUS_LABEL, "INATIVO")
+            self.gui.renderer.set_style(WN.SERVER_STATUS_LABEL, f"color: {Colors.SOFT_RED};")
 
-    def __setup_network_interface(self):
+    def __load_network_interface(self, task) -> tuple[str | None, str | None, str | None, list[str]]:
         """
-        Loads and sets the network interface information from the Samba config file into the GUI and internally in the SambaManager.
+        Loads the network interface information from the Samba config file and sets it internally in the SambaManager.
+        Runs in a worker thread.
 
         Steps:
         1. Retrieve the interfaces from the Samba configuration file.
         2. Parse the interface settings to get the interface and IP address.
-        3. Validate and set the interface and IP address in the SambaManager and GUI.
-        4. Log a message if no valid interface and IP address are found.
+        3. Validate and set the interface and IP address in the SambaManager.
+        
+        Returns:
+            tuple: The interface, the IP address and its subnet mask (None if not valid) and the interfaces found in the file.
         """
         
         # Let's check what we have in the SAMBA configuration file
@@ -258,7 +371,22 @@ class PS2NetManagerGUIController:
         
         if interface is not None and ip_address is not None:
             self.samba_manager.set_interface_and_ip(interface, ip_address)
-            self.__set_interface_and_ip_on_gui(interface, ip_address)
+            return interface, ip_address, self.samba_manager.get_subnet_mask_for_ip(ip_address), samba_interfaces
+        
+        return interface, ip_address, None, samba_interfaces
+    
+    def __on_network_interface_loaded(self, result: tuple[str | None, str | None, str | None, list[str]]) -> None:
+        """
+        Shows the network interface information in the GUI. Runs in the GUI thread.
+        
+        If the interface was found but not the IP address, asks the user if the IP should be added to it.
+        Logs a message if no valid interface and IP address are found.
+        """
+        
+        interface, ip_address, subnet_mask, samba_interfaces = result
+        
+        if interface is not None and ip_address is not None:
+            self.__set_interface_and_ip_on_gui(interface, ip_address, subnet_mask)
         
         elif interface is not None and ip_address is None:
             # If we have an interface but the IP address wasn't found, we can ask the user
@@ -266,7 +394,7 @@ class PS2NetManagerGUIController:
             
             # We know the second element in the samba_interfaces list is the IP address
             # because we are using the __parse_smb_conf_interface_settings method
-            ip_address = self.samba_manager.get_interfaces_in_samba_conf()[1]
+            ip_address = samba_interfaces[1]
             
             
             msg = f"A interface de rede {interface} foi encontrada, mas o IP configurado {ip_address} não foi encontrado nela. Deseja adicionar esse IP à interface?"
@@ -286,18 +414,23 @@ class PS2NetManagerGUIController:
             
             reply = message_box.exec()
             
-            if reply == QMessageBox.StandardButton.Yes:
-                # The user wants to add the IP address to the interface
-                self.__add_ip_address_to_interface(interface, ip_address)
-                self.__set_interface_and_ip_on_gui(interface, ip_address)
-                self.samba_manager.set_interface_and_ip(interface, ip_address)
-            else:
-                # The user doesn't want to add the IP address to the interface.
+            def use_interface_without_ip():
                 # We can't use the interface without the IP address. This is due to security vulnerabilities of the SMBv1 protocol and
                 # also because we don't know if this interface has any available IPv4 address.
                 # To guarantee the security of the system and reability of the PS2Manager, we will set the interface and IP address to None
                 self.samba_manager.set_interface_and_ip(None, None)
                 self.__load_interface_blank_labels()
+            
+            def use_added_ip():
+                self.__set_interface_and_ip_on_gui(interface, ip_address)
+                self.samba_manager.set_interface_and_ip(interface, ip_address)
+            
+            if reply == QMessageBox.StandardButton.Yes:
+                # The user wants to add the IP address to the interface. If it fails, we can't use the interface
+                self.__add_ip_address_to_interface(interface, ip_address, on_added=use_added_ip, on_failed=use_interface_without_ip)
+            else:
+                # The user doesn't want to add the IP address to the interface.
+                use_interface_without_ip()
         else:
             msg = "Por favor, escolha a interface de rede e o endereço IP que deseja usar para o servidor SAMBA."
             self.log(msg)
@@ -399,39 +532,68 @@ class PS2NetManagerGUIController:
         # This return should never be reached, but just in case
         return (None, None)
 
-    def __add_ip_address_to_interface(self, interface: str, ip_address: str, subnet_mask: str = "255.255.255.0") -> None:
-        """Adds a new IP address to the provided interface.
+    def __add_ip_address_to_interface(self, interface: str, ip_address: str, subnet_mask: str = "255.255.255.0",
+                                      on_added: callable = None, on_failed: callable = None) -> None:
+        """Adds a new IP address to the provided interface. The 'ip' command runs in a worker thread.
         
         Args:
             interface (str): The network interface to add the IP address to.
             ip_address (str): The new IP address to add.
             subnet_mask (str): The subnet mask for the new IP address. Defaults to 255.255.255.0
+            on_added (callable): Called without arguments in the GUI thread if the IP address was added.
+            on_failed (callable): Called without arguments in the GUI thread if the IP address couldn't be added.
         """
         
         def convert_to_cidr(mask):
+            import ipaddress
             return ipaddress.IPv4Network(f"0.0.0.0/{mask}", strict=False).prefixlen
         
-        # Add new IP address to the interface
-        try:
-            command = ["ip", "addr", "add", f"{ip_address}/{convert_to_cidr(subnet_mask)}", "dev", interface]
-            subprocess.run(command, check=True)
-            
+        command = ["ip", "addr", "add", f"{ip_address}/{convert_to_cidr(subnet_mask)}", "dev", interface]
+        
+        def add_ip(task):
+            task.report_progress(f"Adicionando o IP {ip_address} à interface {interface}...")
+            subprocess.run(command, check=True, timeout=self.IP_COMMAND_TIMEOUT)
+        
+        def on_finished(_):
             self.log_success(f"Novo IP {ip_address} adicionado à interface {interface}.")
             
-        except subprocess.CalledProcessError as e:
-            self.log_error(f"ERRO: {e}\nNão foi possível adicionar o novo IP à interface {interface}.")
-        except FileNotFoundError:
-            self.log_error("ERRO: O comando 'ip' não foi encontrado. Certifique-se de que o programa 'ip' está instalado.")
-        except Exception as e:
-            self.log_error(f"ERRO DESCONHECIDO: {e}")
+            if on_added is not None:
+                on_added()
+        
+        def on_error(e):
+            if isinstance(e, subprocess.CalledProcessError):
+                self.log_error(f"ERRO: {e}\nNão foi possível adicionar o novo IP à interface {interface}.")
+            elif isinstance(e, subprocess.TimeoutExpired):
+                self.log_error(f"ERRO: O comando 'ip' não terminou em {self.IP_COMMAND_TIMEOUT} segundos.\nNão foi possível adicionar o novo IP à interface {interface}.")
+            elif isinstance(e, FileNotFoundError):
+                self.log_error("ERRO: O comando 'ip' não foi encontrado. Certifique-se de que o programa 'ip' está instalado.")
+            else:
+                self.log_error(f"ERRO DESCONHECIDO: {e}")
+            
+            if on_failed is not None:
+                on_failed()
+        
+        # Add new IP address to the interface
+        submitted = self.command_runner.run(
+            f"add_ip {interface} {ip_address}",
+            add_ip,
+            [self.NETWORK_COMMANDS],
+            on_finished,
+            on_error
+        )
+        
+        if not submitted:
+            self.log_error("ERRO: Já existe uma alteração de IP em andamento. Aguarde ela terminar.")
 
-    def __create_new_ip_dialog(self, parent: LASDialog, interface: str, ip_mask_string_formatter: callable) -> None:
+    def __create_new_ip_dialog(self, parent: "LASDialog", interface: str, ip_mask_string_formatter: callable) -> None:
         """Dialog to create a new IP address and subnet-mask for the provided interface.
         
         Returns:
             None
         """
         
+        from modules.GUI.CreateNewIPDialog import CreateNewIPDialog as IPDialog
+
         create_ip_dialog = IPDialog(parent, interface)
         dialog_ret = create_ip_dialog.exec()
         
@@ -445,11 +607,11 @@ class PS2NetManagerGUIController:
         ip_address = create_ip_dialog.get_ip()
         subnet_mask = create_ip_dialog.get_mask()
         
-        # Add the new IP address to the interface
-        self.__add_ip_address_to_interface(interface, ip_address, subnet_mask)
-
-        # Add new IP and Mask to the list
-        parent.add_item_to_list(ip_mask_string_formatter(ip_address, subnet_mask))
+        # Add the new IP address to the interface. When it's done, the new IP and Mask are added to the list
+        self.__add_ip_address_to_interface(
+            interface, ip_address, subnet_mask,
+            on_added=lambda: parent.add_item_to_list(ip_mask_string_formatter(ip_address, subnet_mask))
+        )
         
         return
 
@@ -468,6 +630,8 @@ class PS2NetManagerGUIController:
         available_ips = self.samba_manager.get_ipv4_addresses_for_interface(interface)
         ip_mask_string_formatter = lambda ip, mask: f"{ip} / {mask}"
         
+        from modules.GUI.ListAddSelectDialog import ListAddSelectDialog as LASDialog
+
         ip_selection_dialog = LASDialog(
             self.gui,
             "Escolher IP",
@@ -497,50 +661,57 @@ class PS2NetManagerGUIController:
         """Loads the interface labels with blank values."""
         
         # Get GUI elements of the interface data
-        interface_name_label = self.gui.findChild(QLabel, WN.INTERFACE_NAME_LABEL.value)
-        interface_ip_label = self.gui.findChild(QLabel, WN.INTERFACE_IP_LABEL.value)
-        interface_mask_label = self.gui.findChild(QLabel, WN.INTERFACE_MASK_LABEL.value)
+        interface_name_label = self.gui.widgets.get(WN.INTERFACE_NAME_LABEL)
+        interface_ip_label = self.gui.widgets.get(WN.INTERFACE_IP_LABEL)
+        interface_mask_label = self.gui.widgets.get(WN.INTERFACE_MASK_LABEL)
         
         # Set blank values
         interface_name_label.setText("NENHUMA")
         interface_ip_label.setText("X.X.X.X")
         interface_mask_label.setText("X.X.X.X")
 
-    def __set_interface_and_ip_on_gui(self, interface: str, ip: str):
-        """Set the provided interface and IP address in the GUI."""
+    def __set_interface_and_ip_on_gui(self, interface: str, ip: str, subnet_mask: str | None = None):
+        """Set the provided interface and IP address in the GUI. The subnet mask is looked up if it isn't provided."""
         
         # Get GUI elements of the interface data
-        interface_name_label = self.gui.findChild(QLabel, WN.INTERFACE_NAME_LABEL.value)
-        interface_ip_label = self.gui.findChild(QLabel, WN.INTERFACE_IP_LABEL.value)
-        interface_mask_label = self.gui.findChild(QLabel, WN.INTERFACE_MASK_LABEL.value)
+        interface_name_label = self.gui.widgets.get(WN.INTERFACE_NAME_LABEL)
+        interface_ip_label = self.gui.widgets.get(WN.INTERFACE_IP_LABEL)
+        interface_mask_label = self.gui.widgets.get(WN.INTERFACE_MASK_LABEL)
         
         # Set the values in the GUI
         interface_name_label.setText(interface)
         interface_ip_label.setText(ip)
-        interface_mask_label.setText(self.samba_manager.get_subnet_mask_for_ip(ip))
+        interface_mask_label.setText(subnet_mask if subnet_mask is not None else self.samba_manager.get_subnet_mask_for_ip(ip))
 
     def log(self, text: str):
-        """Logs a message to the log display widget and the terminal."""
+        """Logs a message to the log display widget and the terminal. Can be called from any thread."""
         
-        self.log_display_widget.appendPlainText(f"\n{text}")
-        print(text)
+        logger.info(text)
     
     def log_success(self, text: str):
-        """Logs a success message to the log display widget and the terminal."""
+        """Logs a success message to the log display widget and the terminal. Can be called from any thread."""
         
-        self.log_display_widget.appendHtml(f"\n<p style='color: green;'>{text}</p>")
-        print(Fore.GREEN + text)
+        logger.success(text)
     
     def log_error(self, text: str):
-        """Logs an error message to the log display widget and the terminal."""
+        """Logs an error message to the log display widget and the terminal. Can be called from any thread."""
         
-        self.log_display_widget.appendHtml(f"\n<p style='color: red;'>{text}</p>")
-        print(Fore.RED + text)
+        logger.error(text)
+    
+    def __on_log_record(self, text: str, level: int) -> None:
+        """Shows a message of the controller in the log widget. Called from the logging thread."""
+        
+        if level >= logging.ERROR:
+            self.log_pane.append(text, LogPane.ERROR)
+        elif level == SUCCESS:
+            self.log_pane.append(text, LogPane.SUCCESS)
+        elif level >= logging.INFO:
+            self.log_pane.append(text)
 
     def on_netbios_ok_clicked(self):
         """Handles the 'OK' button click event for the NetBIOS name dialog."""
         
-        line_edit = self.gui.findChild(QLineEdit, WN.NETBIOS_LINE_EDIT.value)
+        line_edit = self.gui.widgets.get(WN.NETBIOS_LINE_EDIT)
         netbios_name = line_edit.text().strip()
         
         try:
@@ -548,6 +719,8 @@ class PS2NetManagerGUIController:
             
             msg = f"O nome NetBIOS foi alterado para: {netbios_name} com sucesso."
             self.log_success(msg)
+            
+            self.__apply_samba_changes("O nome foi alterado no arquivo de configuração, mas houve um erro ao reiniciar o serviço do SAMBA. Portanto, o novo nome ainda não está visível na rede.")
         
         except ValueError as e:
             self.log_error(f"ERRO: {e}")
@@ -555,19 +728,538 @@ class PS2NetManagerGUIController:
             # Put old NetBIOS name back
             line_edit.setText(self.samba_manager.get_netbios_name())
             
-        except SambaServiceFailure as e:
-            self.log_error(f"ERRO DE SERVIÇO: {e}")
-            
-            self.log("O nome foi alterado no arquivo de configuração, mas houve um erro ao reiniciar o serviço do SAMBA. Portanto, o novo nome ainda não está visível na rede.")        
         except Exception as e:
             self.log_error(f"ERRO DESCONHECIDO: {e}")
             
             sys.exit(1)
 
+    def on_library_button_clicked(self) -> None:
+        """Handles the 'Library' button click event. Shows the games of the PS2 share folder.
+        
+        The games come from the saved index. If there is no index for the current folder, the folder is scanned
+        in a worker thread and the dialog is filled when the scan ends.
+        """
+        
+        from modules.GUI.LibraryDialog import LibraryDialog
+        
+        library, index_loaded = self.__get_game_library()
+        
+        dialog = LibraryDialog(self.gui, library.get_games())
+        dialog.button_refresh.clicked.connect(lambda: self.__scan_game_library(dialog))
+        dialog.button_verify.clicked.connect(lambda: self.__verify_game_library(dialog))
+        dialog.button_dats.clicked.connect(lambda: self.__choose_dat_files(dialog))
+        dialog.button_import.clicked.connect(lambda: self.__import_games(dialog))
+        dialog.button_defrag.clicked.connect(lambda: self.__defragment_games(dialog))
+        dialog.button_convert.clicked.connect(lambda: self.__convert_games(dialog))
+        
+        if not index_loaded:
+            self.__scan_game_library(dialog)
+        else:
+            self.__scan_fragmentation(dialog)
+        
+        # While the dialog is open, the changes found by the library watcher are shown in it
+        self.library_dialog = dialog
+        dialog.exec()
+        self.library_dialog = None
+    
+    def __get_game_library(self):
+        """Returns the library of the current PS2 share folder, creating it from the saved index if needed.
+        
+        Returns:
+            tuple[GameLibrary, bool]: The library and whether it has games from an index or a scan.
+        """
+        
+        from modules.GameLibrary import GameLibrary
+        
+        share_path = self.samba_manager.get_ps2_share_folder_path()
+        
+        if self.game_library is not None and self.game_library.share_path == share_path:
+            return self.game_library, True
+        
+        self.game_library = GameLibrary(share_path)
+        return self.game_library, self.game_library.load_index()
+    
+    def __scan_game_library(self, dialog) -> None:
+        """Scans the PS2 share folder in a worker thread and shows the games found in the library dialog."""
+        
+        library = self.game_library
+        
+        def scan(task):
+            return library.scan(
+                progress=lambda count, total: task.report_progress(f"Indexando os jogos: {count}/{total}..."),
+                should_stop=lambda: task.cancelled
+            )
+        
+        def on_finished(games):
+            dialog.set_scanning(False)
+            
+            if games is not None:
+                dialog.set_games(games)
+                self.log_success(f"Biblioteca atualizada: {len(games)} jogo(s) encontrado(s) em {library.share_path}.")
+                self.__scan_fragmentation(dialog)
+        
+        def on_failed(error):
+            dialog.set_scanning(False)
+            dialog.set_games(library.get_games())
+            self.log_error(f"ERRO: Não foi possível indexar os jogos: {error}")
+        
+        submitted = self.command_runner.run("library_scan", scan, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+        
+        if submitted:
+            dialog.set_scanning(True)
+        else:
+            self.log_error("ERRO: Os jogos já estão sendo indexados. Aguarde.")
+    
+    def __scan_fragmentation(self, dialog) -> None:
+        """Reads the extent maps of the images in a worker thread and shows how fragmented they are in the library dialog.
+        
+        Only the images that changed since the last scan are read from the file system, so this runs every time the
+        library is shown. The images likely to stutter are logged, if the share is on a rotational disk.
+        """
+        
+        from modules.Fragmentation import FragmentationScanner
+        from modules.ImageVerifier import ImageVerifier
+        
+        library = self.game_library
+        games = library.get_games()
+        
+        if not games:
+            return
+        
+        if self.fragmentation_scanner is None:
+            self.fragmentation_scanner = FragmentationScanner()
+            cache_loaded = False
+        else:
+            cache_loaded = True
+        
+        scanner = self.fragmentation_scanner
+        
+        def scan(task):
+            if not cache_loaded:
+                scanner.load_cache()
+            
+            results = scanner.scan(
+                [os.path.join(library.share_path, game.path) for game in games],
+                progress=lambda count, total: task.report_progress(f"Analisando a fragmentação das imagens: {count}/{total}..."),
+                should_stop=lambda: task.cancelled
+            )
+            
+            if results is None:
+                return None
+            
+            # SSDs don't seek, so fragmented images only make OPL stutter on rotational (or unknown) disks
+            rotational = ImageVerifier.is_rotational(os.stat(library.share_path).st_dev)
+            return results, rotational
+        
+        def on_finished(scan_result):
+            if scan_result is None:
+                return
+            
+            results, rotational = scan_result
+            prefix_length = len(library.share_path.rstrip(os.sep)) + 1
+            dialog.set_fragmentation({info.path[prefix_length:]: info for info in results})
+            
+            stutter = [info for info in results if not info.error and info.seeks_per_gib >= FragmentationScanner.STUTTER_SEEKS_PER_GIB]
+            
+            if not stutter or rotational is False:
+                return
+            
+            self.log_error(f"AVISO: {len(stutter)} imagem(ns) muito fragmentada(s) podem travar no OPL. As piores:")
+            
+            for info in stutter[:5]:
+                self.log(f"    {info.path[prefix_length:]}: {info.fragments} fragmento(s), "
+                         f"{info.seeks_per_gib:.0f} saltos/GiB, maior salto de {info.max_seek / 1024 ** 2:.0f} MB")
+        
+        def on_failed(error):
+            self.log_error(f"ERRO: Não foi possível analisar a fragmentação das imagens: {error}")
+        
+        # The scan doesn't change the library, so it can run during the other library commands
+        self.command_runner.run("library_fragmentation", scan, [self.FRAGMENTATION_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+    
+    def __defragment_games(self, dialog) -> None:
+        """Rewrites the images selected in the library dialog into contiguous files in a worker thread.
+        
+        Images opened by a console are refused, and the copies are throttled so a console that is playing doesn't stutter.
+        """
+        
+        from modules.Defragmenter import Defragmenter
+        
+        library = self.game_library
+        paths = dialog.get_selected_paths()
+        
+        if not paths:
+            self.log_error("ERRO: Selecione na tabela as imagens a desfragmentar.")
+            return
+        
+        defragmenter = Defragmenter(self.fragmentation_scanner)
+        
+        def defragment(task):
+            results = []
+            
+            for index, path in enumerate(paths, start=1):
+                def progress(done, total):
+                    task.report_progress(f"Desfragmentando {path} ({index}/{len(paths)}): {done * 100 // total}%...")
+                
+                result = defragmenter.defragment(os.path.join(library.share_path, path), progress=progress,
+                                                 should_stop=lambda: task.cancelled)
+                
+                if result is None:
+                    return None
+                
+                results.append((path, result))
+            
+            return results
+        
+        def on_finished(results):
+            dialog.set_defragmenting(False)
+            
+            if results is None:
+                return
+            
+            for path, result in results:
+                if result.error:
+                    self.log_error(f"ERRO: {path} não foi desfragmentada: {result.error}")
+                elif result.replaced:
+                    self.log_success(f"{path} desfragmentada: {result.extents_before} -> {result.extents_after} extent(s), "
+                                     f"{result.fragments_before} -> {result.fragments_after} fragmento(s).")
+                else:
+                    self.log(f"{path} já está contígua ({result.extents_before} extent(s)).")
+            
+            self.__scan_fragmentation(dialog)
+        
+        def on_failed(error):
+            dialog.set_defragmenting(False)
+            self.log_error(f"ERRO: Não foi possível desfragmentar as imagens: {error}")
+        
+        submitted = self.command_runner.run("library_defrag", defragment, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+        
+        if submitted:
+            dialog.set_defragmenting(True)
+        else:
+            self.log_error("ERRO: Os jogos já estão sendo indexados, verificados ou importados. Aguarde.")
+    
+    def __convert_games(self, dialog) -> None:
+        """Converts the images selected in the library dialog between ISO and ZSO in a worker thread (which uses a process pool).
+        
+        The user chooses if the original images are replaced by the converted ones or kept.
+        """
+        
+        from modules.ZsoConverter import ZsoConverter
+        from modules.Defragmenter import Defragmenter
+        from modules.GUI.ThreeOptionsDialog import ThreeOptionsDialog as TODialog
+        
+        library = self.game_library
+        paths = dialog.get_selected_paths()
+        
+        if not paths:
+            self.log_error("ERRO: Selecione na tabela as imagens a converter.")
+            return
+        
+        response = TODialog(
+            dialog,
+            "Converter imagens",
+            f"{len(paths)} imagem(ns) serão convertidas (ISO para ZSO e ZSO para ISO). O que fazer com as imagens originais?",
+            ["Substituir", "Manter", "Cancelar"]
+        ).exec()
+        
+        if response not in (1, 2):
+            self.log("Operação cancelada pelo usuário.")
+            return
+        
+        replace = response == 1
+        
+        # The converted images belong to the user, like the share folder
+        user_info = self.samba_manager.get_user_info()
+        converter = ZsoConverter(owner=(user_info["user_id"], user_info["group_id"]))
+        
+        def convert(task):
+            results = []
+            
+            for index, path in enumerate(paths, start=1):
+                source = os.path.join(library.share_path, path)
+                destination = ZsoConverter.get_destination(source)
+                
+                if os.path.exists(destination):
+                    results.append((path, None, f"{os.path.basename(destination)} já existe."))
+                    continue
+                
+                start = time.monotonic()
+                
+                def progress(done, total):
+                    speed = done / max(time.monotonic() - start, 0.001) / 1024 ** 2
+                    task.report_progress(f"Convertendo {path} ({index}/{len(paths)}): {done / 1024 ** 3:.1f}/{total / 1024 ** 3:.1f} GB, {speed:.0f} MB/s...")
+                
+                try:
+                    if source.lower().endswith(".zso"):
+                        sizes = converter.decompress(source, destination, progress=progress, should_stop=lambda: task.cancelled)
+                    else:
+                        sizes = converter.compress(source, destination, progress=progress, should_stop=lambda: task.cancelled)
+                except (OSError, ValueError) as e:
+                    results.append((path, None, str(e)))
+                    continue
+                
+                if sizes is None:
+                    return None
+                
+                note = ""
+                
+                if replace:
+                    # An image being played is kept, smbd would keep serving the deleted file until the console closes it.
+                    # The conversion already succeeded, so an error here only keeps the original
+                    try:
+                        stat = os.stat(source)
+                        
+                        if (stat.st_dev, stat.st_ino) in Defragmenter.get_smbd_open_files():
+                            note = "a original está aberta pelo SAMBA e foi mantida"
+                        else:
+                            os.unlink(source)
+                    except OSError as e:
+                        note = f"a original não pôde ser removida e foi mantida ({e})"
+                
+                results.append((path, sizes, note))
+            
+            return results
+        
+        def on_finished(results):
+            dialog.set_converting(False)
+            
+            if results is None:
+                return
+            
+            for path, sizes, note in results:
+                if sizes is None:
+                    self.log_error(f"ERRO: {path} não foi convertida: {note}")
+                    continue
+                
+                self.log_success(f"{path} convertida: {sizes[0] / 1024 ** 2:.0f} MB -> {sizes[1] / 1024 ** 2:.0f} MB.")
+                
+                if note:
+                    self.log_error(f"AVISO: {path}: {note}.")
+            
+            self.__scan_game_library(dialog)
+        
+        def on_failed(error):
+            dialog.set_converting(False)
+            self.log_error(f"ERRO: Não foi possível converter as imagens: {error}")
+        
+        submitted = self.command_runner.run("library_convert", convert, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+        
+        if submitted:
+            dialog.set_converting(True)
+        else:
+            self.log_error("ERRO: Os jogos já estão sendo indexados, verificados ou importados. Aguarde.")
+    
+    def __verify_game_library(self, dialog) -> None:
+        """Hashes the images of the library in a worker thread (which uses a process pool) and shows the results in the library dialog.
+        
+        Images that didn't change since the last verification are not read again.
+        """
+        
+        from modules.ImageVerifier import ImageVerifier
+        from modules.DatIndex import DatIndex
+        
+        library = self.game_library
+        games = library.get_games()
+        
+        if self.image_verifier is None:
+            self.image_verifier = ImageVerifier()
+            cache_loaded = False
+        else:
+            cache_loaded = True
+        
+        if self.dat_index is None:
+            self.dat_index = DatIndex()
+        
+        verifier = self.image_verifier
+        dat_index = self.dat_index
+        
+        def verify(task):
+            if not cache_loaded:
+                verifier.load_cache()
+            
+            if dat_index.get_count() == 0:
+                dat_index.load()
+            
+            start = time.monotonic()
+            
+            def progress(bytes_done, bytes_total, files_done, files_total):
+                speed = bytes_done / max(time.monotonic() - start, 0.001) / 1024 ** 2
+                task.report_progress(
+                    f"Verificando as imagens: {bytes_done / 1024 ** 3:.1f}/{bytes_total / 1024 ** 3:.1f} GB, "
+                    f"{files_done}/{files_total} arquivo(s), {speed:.0f} MB/s..."
+                )
+            
+            results = verifier.verify(
+                [os.path.join(library.share_path, game.path) for game in games],
+                progress=progress,
+                should_stop=lambda: task.cancelled
+            )
+            
+            if results is None:
+                return None
+            
+            results = {game.path: result for game, result in zip(games, results)}
+            
+            # The images are recognized by the DAT files, if the user chose them
+            if dat_index.get_count() == 0:
+                return results, None
+            
+            matches = {game.path: dat_index.match(results[game.path], game.title) for game in games}
+            return results, matches
+        
+        def on_finished(verification):
+            dialog.set_verifying(False)
+            
+            if verification is None:
+                return
+            
+            results, matches = verification
+            dialog.set_verification(results, matches)
+            
+            failed = [(path, result) for path, result in results.items() if not result.ok]
+            
+            for path, result in failed:
+                self.log_error(f"ERRO: A imagem {path} tem problemas: {result.error or ' '.join(result.problems)}")
+            
+            hashed = sum(1 for result in results.values() if not result.cached)
+            self.log_success(f"Verificação concluída: {len(results)} imagem(ns), {hashed} lida(s), {len(failed)} com problemas.")
+            
+            if matches is None:
+                return
+            
+            bad_dumps = [(path, match) for path, match in matches.items() if match.status == DatIndex.BAD_DUMP]
+            
+            for path, match in bad_dumps:
+                self.log_error(f"ERRO: A imagem {path} não confere com o DAT ({match.game}): {match.reason}")
+            
+            mismatches = [(path, match) for path, match in matches.items() if match.status == DatIndex.MISMATCH]
+            
+            for path, match in mismatches:
+                self.log(f"AVISO: A imagem {path} não confere com o DAT ({match.game}) e não pôde ser verificada.")
+            
+            verified = sum(1 for match in matches.values() if match.status == DatIndex.VERIFIED)
+            unknown = sum(1 for match in matches.values() if match.status == DatIndex.UNKNOWN)
+            self.log(f"DATs: {verified} verificada(s), {len(bad_dumps)} bad dump(s), {len(mismatches)} divergente(s), "
+                     f"{unknown} desconhecida(s).")
+        
+        def on_failed(error):
+            dialog.set_verifying(False)
+            self.log_error(f"ERRO: Não foi possível verificar as imagens: {error}")
+        
+        submitted = self.command_runner.run("library_verify", verify, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+        
+        if submitted:
+            dialog.set_verifying(True)
+        else:
+            self.log_error("ERRO: Os jogos já estão sendo indexados ou verificados. Aguarde.")
+    
+    def __import_games(self, dialog) -> None:
+        """Asks the user for ISO images and copies them to the DVD or CD folder of the share in a worker thread."""
+        
+        from modules.GameImporter import GameImporter
+        
+        sources, _ = QFileDialog.getOpenFileNames(
+            dialog, # Parent widget
+            "Escolha as imagens dos jogos", # Title
+            os.path.join(os.sep, "home", self.samba_manager.get_user_name()), # Start at the user's home directory
+            "Imagens ISO, ZSO ou BIN/CUE (*.iso *.ISO *.zso *.ZSO *.cue *.CUE)" # Filter
+        )
+        
+        if not sources:
+            self.log("Operação cancelada pelo usuário.")
+            return
+        
+        # The copies belong to the user, like the share folder
+        user_info = self.samba_manager.get_user_info()
+        importer = GameImporter(self.samba_manager.get_ps2_share_folder_path(), (user_info["user_id"], user_info["group_id"]))
+        
+        def import_games(task):
+            jobs = importer.plan(sources)
+            
+            def progress(copied, total, files_done, files_total, speed, eta):
+                minutes, seconds = divmod(int(eta), 60)
+                task.report_progress(
+                    f"Importando os jogos: {copied / 1024 ** 3:.1f}/{total / 1024 ** 3:.1f} GB, {files_done}/{files_total} imagem(ns), "
+                    f"{speed / 1024 ** 2:.0f} MB/s, faltam {minutes:02d}:{seconds:02d}..."
+                )
+            
+            return importer.import_games(jobs, progress=progress, should_stop=lambda: task.cancelled)
+        
+        def on_finished(jobs):
+            dialog.set_importing(False)
+            
+            if jobs is None:
+                return
+            
+            for job in jobs:
+                if job.error:
+                    self.log_error(f"ERRO: {os.path.basename(job.source)} não foi importado: {job.error}")
+            
+            imported = [job for job in jobs if not job.error]
+            
+            if imported:
+                self.log_success(f"{len(imported)} jogo(s) importado(s) para {importer.share_path}.")
+                self.__scan_game_library(dialog)
+        
+        def on_failed(error):
+            dialog.set_importing(False)
+            self.log_error(f"ERRO: Não foi possível importar os jogos: {error}")
+        
+        submitted = self.command_runner.run("library_import", import_games, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed)
+        
+        if submitted:
+            dialog.set_importing(True)
+        else:
+            self.log_error("ERRO: Os jogos já estão sendo indexados, verificados ou importados. Aguarde.")
+    
+    def __choose_dat_files(self, dialog) -> None:
+        """Asks the user for the DAT files (Redump / No-Intro) and indexes them in a worker thread."""
+        
+        from modules.DatIndex import DatIndex
+        
+        paths, _ = QFileDialog.getOpenFileNames(
+            dialog, # Parent widget
+            "Escolha os arquivos DAT (Redump / No-Intro)", # Title
+            os.path.join(os.sep, "home", self.samba_manager.get_user_name()), # Start at the user's home directory
+            "Arquivos DAT (*.dat *.xml *.zip)" # Filter
+        )
+        
+        if not paths:
+            self.log("Operação cancelada pelo usuário.")
+            return
+        
+        if self.dat_index is None:
+            self.dat_index = DatIndex()
+        
+        dat_index = self.dat_index
+        
+        def build(task):
+            task.report_progress(f"Indexando {len(paths)} arquivo(s) DAT...")
+            
+            if dat_index.build(paths, should_stop=lambda: task.cancelled) is None:
+                return None
+            
+            return dat_index.get_count()
+        
+        def on_finished(count):
+            if count is None:
+                self.log("Indexação dos arquivos DAT interrompida.")
+                return
+            
+            self.log_success(f"DATs indexados: {count} entrada(s). Clique em VERIFICAR para reconhecer as imagens.")
+        
+        def on_failed(error):
+            self.log_error(f"ERRO: Não foi possível indexar os arquivos DAT: {error}")
+        
+        if not self.command_runner.run("dat_index", build, [self.LIBRARY_COMMANDS], on_finished=on_finished, on_failed=on_failed):
+            self.log_error("ERRO: Os jogos já estão sendo indexados ou verificados. Aguarde.")
+    
     def on_change_folder_button_clicked(self) -> None:
         """Handles the 'Change Folder' button click event."""
         
         # Launch a dialog to ask the user where to create the PS2 share folder
+        from modules.GUI.ThreeOptionsDialog import ThreeOptionsDialog as TODialog
+
         dialog = TODialog(
             self.gui,
             "Criar pasta compartilhada com o PS2",
@@ -605,23 +1297,21 @@ class PS2NetManagerGUIController:
             return
         
         # Now, let's save the new folder path in the configuration file and internally
-        try:
-            
-            self.samba_manager.set_ps2_share_folder_path(folder_path)
+        self.samba_manager.set_ps2_share_folder_path(folder_path)
         
-        except SambaServiceFailure as e:
-            err_msg = f"ERRO DE SERVIÇO: {e}"
-            err_description = "A pasta foi criada e o caminho foi salvo no arquivo de configuração, mas houve um erro ao reiniciar o serviço do SAMBA. Portanto, a pasta ainda não está visível na rede."
-            
-            self.log_error(f"{err_msg}\n{err_description}")
+        # Update the label in the GUI
+        share_folder_path_label = self.gui.widgets.get(WN.SHARE_FOLDER_PATH)
+        share_folder_path_label.setText(folder_path)
         
-        finally:
-            # Update the label in the GUI
-            share_folder_path_label = self.gui.findChild(QLabel, WN.SHARE_FOLDER_PATH.value)
-            share_folder_path_label.setText(folder_path)
-            
-            msg = "O caminho da pasta compartilhada foi atualizado com sucesso!"
-            self.log_success(msg)
+        msg = "O caminho da pasta compartilhada foi atualizado com sucesso!"
+        self.log_success(msg)
+        
+        # The library watcher follows the new folder from now on
+        if self.library_watcher is not None:
+            self.__stop_library_watcher()
+            self.__start_library_watcher()
+        
+        self.__apply_samba_changes("A pasta foi criada e o caminho foi salvo no arquivo de configuração, mas houve um erro ao recarregar o serviço do SAMBA. Portanto, a pasta ainda não está visível na rede.")
     
     def on_change_interface_button_clicked(self) -> None:
         """Shows a dialog to the user to select the network interface and another dialog to prompt for the IP address.
@@ -636,6 +1326,8 @@ class PS2NetManagerGUIController:
         self.log(f"Interfaces de rede disponíveis: {available_interfaces}")
         
         # Show dialog to the user choose the network interface he wants to use
+        from modules.GUI.ListSelectDialog import ListSelectDialog as LSDialog
+
         network_interface_selection_dialog = LSDialog(
             self.gui,
             "Escolher interface de rede",
@@ -662,6 +1354,8 @@ class PS2NetManagerGUIController:
             
             # Erase the interface and IP address in the SambaManager and config file
             self.samba_manager.set_interface_and_ip(None, None)
+            self.__set_monitored_interface(None)
+            self.__apply_samba_changes("A interface foi removida do arquivo de configuração, mas houve um erro ao aplicar a alteração no serviço do SAMBA.")
             
             return
         
@@ -678,52 +1372,76 @@ class PS2NetManagerGUIController:
         # in the SambaManager and in the GUI
         self.samba_manager.set_interface_and_ip(selected_interface, selected_ip)
         self.__set_interface_and_ip_on_gui(selected_interface, selected_ip)
+        self.__set_monitored_interface(selected_interface)
         
         self.log_success(f"Interface de rede {selected_interface} e endereço IP {selected_ip} escolhidos com sucesso.")
+        
+        self.__apply_samba_changes("A interface foi salva no arquivo de configuração, mas houve um erro ao reiniciar o serviço do SAMBA. Portanto, o servidor ainda usa a interface anterior.")
 
     def on_start_server_button_clicked(self) -> None:
-        """Handles the 'Start Server' button click event."""
+        """Handles the 'Start Server' button click event. The server is started in a worker thread."""
         
-        # Start the Samba server
-        try:
+        def start_server(task):
+            task.report_progress("Iniciando o servidor SAMBA...")
             self.samba_manager.start_server()
-            
+        
+        def on_started(_):
             msg = "Servidor SAMBA iniciado com sucesso."
             self.log_success(msg)
             
             # Start the NetSpeedMonitor thread to measure the network speed
-            # in the current interface
-            self.net_speed_monitor = NetSpeedMonitor(self.samba_manager.get_current_interface())
+            # in the current interface. It samples at a high rate to catch the bursts of OPL
+            # streaming a game, but the GUI is only updated once per second
+            from modules.NetSpeedMonitor import NetSpeedMonitor
+            from modules.SmbSessionMonitor import SmbSessionMonitor
+
+            self.net_speed_monitor = NetSpeedMonitor(self.samba_manager.get_current_interface(), sample_rate=self.NET_SPEED_SAMPLE_RATE)
             self.net_speed_monitor.speed_updated.connect(self.update_net_speed)
+            self.net_speed_monitor.stats_updated.connect(self.update_net_speed_stats)
             self.net_speed_monitor.interface_not_found.connect(self.__on_interface_not_found_error)
             self.net_speed_monitor.start()
             
-        except SambaServiceFailure as e:
-            err_msg = f"ERRO DE SERVIÇO: {e}"
-            err_description = "O servidor SAMBA não pôde ser iniciado. Verifique o log para mais detalhes."
+            # Start the SmbSessionMonitor thread to show which consoles are connected and what they are reading
+            self.smb_session_monitor = SmbSessionMonitor()
+            self.smb_session_monitor.clients_updated.connect(self.update_connected_clients)
+            self.smb_session_monitor.poll_failed.connect(self.__on_smb_poll_failed)
+            self.smb_session_monitor.start()
+            
+            # Keep the game library up to date while the PS2 can read the share folder
+            self.__start_library_watcher()
             
-            self.log_error(f"{err_msg}\n{err_description}")
+            # Update the server status in the GUI
+            self.__update_server_status(self.samba_manager.get_server_status())
         
-        except ValueError as e:
-            err_msg = f"ERRO: {e}"
+        def on_failed(e):
+            if isinstance(e, SambaServiceFailure):
+                err_msg = f"ERRO DE SERVIÇO: {e}"
+                err_description = "O servidor SAMBA não pôde ser iniciado. Verifique o log para mais detalhes."
+                
+                self.log_error(f"{err_msg}\n{err_description}")
             
-            self.log_error(err_msg)
+            elif isinstance(e, ValueError):
+                err_msg = f"ERRO: {e}"
+                
+                self.log_error(err_msg)
+                
+                message_box = QMessageBox(self.gui)
+                message_box.setWindowTitle("Erro")
+                message_box.setText(err_msg)
+                message_box.setIcon(QMessageBox.Icon.Critical)
+                message_box.setStandardButtons(QMessageBox.StandardButton.Ok)
+                message_box.exec()
             
-            message_box = QMessageBox(self.gui)
-            message_box.setWindowTitle("Erro")
-            message_box.setText(err_msg)
-            message_box.setIcon(QMessageBox.Icon.Critical)
-            message_box.setStandardButtons(QMessageBox.StandardButton.Ok)
-            message_box.exec()
-        
-        except Exception as e:
-            err_msg = f"ERRO DESCONHECIDO: {e}"
+            else:
+                err_msg = f"ERRO DESCONHECIDO: {e}"
+                
+                self.log_error(err_msg)
             
-            self.log_error(err_msg)
-        
-        finally:
             # Update the server status in the GUI
             self.__update_server_status(self.samba_manager.get_server_status())
+        
+        # Start the Samba server
+        self.__run_samba_command("start_server", start_server, on_started, on_failed)
     
     def __on_interface_not_found_error(self, interface: str) -> None:
         """Handles the case when the selected interface is not found in the speed monitor."""
@@ -746,60 +1464,252 @@ class PS2NetManagerGUIController:
         self.samba_manager.set_interface_and_ip(None, None) # Set the interface and IP address to None
         
     def on_stop_server_button_clicked(self) -> None:
-        """Handles the 'Stop Server' button click event."""
+        """Handles the 'Stop Server' button click event. The server is stopped in a worker thread."""
         
-        # Stop the Samba server
-        try:
+        def stop_server(task):
+            task.report_progress("Parando o servidor SAMBA...")
             self.samba_manager.stop_server()
-            
+        
+        def on_stopped(_):
             msg = "Servidor SAMBA parado com sucesso."
             self.log_success(msg)
-        
-        except SambaServiceFailure as e:
-            err_msg = f"ERRO DE SERVIÇO: {e}"
-            err_description = "O servidor SAMBA não pôde ser parado. Verifique o log para mais detalhes."
             
-            self.log_error(f"{err_msg}\n{err_description}")
-            self.__update_server_status(self.samba_manager.get_server_status())
+            self.__on_stop_server_done()
         
-        except Exception as e:
-            err_msg = f"ERRO DESCONHECIDO: {e}"
+        def on_failed(e):
+            if isinstance(e, SambaServiceFailure):
+                err_msg = f"ERRO DE SERVIÇO: {e}"
+                err_description = "O servidor SAMBA não pôde ser parado. Verifique o log para mais detalhes."
+                
+                self.log_error(f"{err_msg}\n{err_description}")
+            else:
+                err_msg = f"ERRO DESCONHECIDO: {e}"
+                
+                self.log_error(err_msg)
             
-            self.log_error(err_msg)
+            self.__on_stop_server_done()
         
-        finally:
-            # Update the server status in the GUI
-            self.__update_server_status(self.samba_manager.get_server_status())
-            
-            if self.net_speed_monitor is not None:
-                self.net_speed_monitor.stop() # Stop the NetSpeedMonitor thread
-                self.net_speed_monitor.wait() # Wait for the thread to finish
-                self.net_speed_monitor = None # Set the NetSpeedMonitor instance to None
-            
-            self.reset_net_speed_values() # Reset the network speed values in the GUI
-            
+        # Stop the Samba server
+        self.__run_samba_command("stop_server", stop_server, on_stopped, on_failed)
+    
+    def __on_stop_server_done(self) -> None:
+        """Updates the GUI and stops the network speed monitor after the server is stopped (or failed to stop)."""
+        
+        # Update the server status in the GUI
+        self.__update_server_status(self.samba_manager.get_server_status())
+        
+        self.__stop_net_speed_monitor()
+        self.__stop_smb_session_monitor()
+        self.__stop_library_watcher()
+        
+        self.reset_net_speed_values() # Reset the network speed values in the GUI
+    
+    def __set_monitored_interface(self, interface: str | None) -> None:
+        """Makes the running NetSpeedMonitor watch the given interface instead of the previous one, without restarting its thread."""
+        
+        if self.net_speed_monitor is None:
+            return
+        
+        for monitored_interface in self.net_speed_monitor.interfaces:
+            if monitored_interface != interface:
+                self.net_speed_monitor.remove_interface(monitored_interface)
+        
+        if interface is not None:
+            self.net_speed_monitor.add_interface(interface)
+    
+    def __stop_net_speed_monitor(self) -> None:
+        """Stops the NetSpeedMonitor thread, if it is running."""
+        
+        if self.net_speed_monitor is not None:
+            self.net_speed_monitor.stop() # Stop the NetSpeedMonitor thread
+            self.net_speed_monitor.wait() # Wait for the thread to finish
+            self.net_speed_monitor = None # Set the NetSpeedMonitor instance to None
+    
+    def __on_smb_poll_failed(self, error: str) -> None:
+        """Logs that the connected consoles could not be listed. The last list is kept until smbstatus answers again."""
+        
+        self.log_error(f"AVISO: Não foi possível listar os consoles conectados: {error}")
+    
+    def __stop_smb_session_monitor(self) -> None:
+        """Stops the SmbSessionMonitor thread, if it is running."""
+        
+        if self.smb_session_monitor is not None:
+            self.smb_session_monitor.stop()
+            self.smb_session_monitor.wait()
+            self.smb_session_monitor = None
+    
+    def __start_library_watcher(self) -> None:
+        """Starts the LibraryWatcher thread on the current PS2 share folder."""
+        
+        from modules.LibraryWatcher import LibraryWatcher
+        
+        library, _ = self.__get_game_library()
+        
+        self.library_watcher = LibraryWatcher(library)
+        self.library_watcher.library_updated.connect(self.__on_library_updated)
+        self.library_watcher.share_changed.connect(self.__on_share_changed)
+        self.library_watcher.watch_failed.connect(self.__on_library_watch_failed)
+        self.library_watcher.start()
+    
+    def __stop_library_watcher(self) -> None:
+        """Stops the LibraryWatcher thread."""
+        
+        if self.library_watcher is not None:
+            self.library_watcher.stop()
+            self.library_watcher.wait()
+            self.library_watcher = None
+    
+    def __on_library_updated(self, games: list) -> None:
+        """Shows the games updated by the library watcher in the library dialog, if it is open."""
+        
+        if self.library_watcher is None or self.library_watcher.library is not self.game_library:
+            return
+        
+        if self.library_dialog is not None:
+            self.library_dialog.set_games(games)
+        
+        logger.debug("Biblioteca sincronizada com a pasta compartilhada: %d jogo(s).", len(games))
+    
+    def __on_share_changed(self, relative_paths: list) -> None:
+        """Logs the files of the ART, CFG and VMC folders changed by the consoles or the user, e.g. the saves of a memory card."""
+        
+        counts = {}
+        
+        for relative_path in relative_paths:
+            folder = relative_path.split("/", 1)[0]
+            counts[folder] = counts.get(folder, 0) + 1
+            logger.debug("Arquivo alterado na pasta compartilhada: %s", relative_path)
+        
+        summary = ", ".join(f"{count} em {folder}" for folder, count in sorted(counts.items()))
+        self.log(f"Pasta compartilhada: arquivo(s) alterado(s) ({summary}).")
+    
+    def __on_library_watch_failed(self, error: str) -> None:
+        """Logs that the changes of the share folder are not being followed anymore."""
+        
+        self.log_error(f"ERRO: As alterações da pasta compartilhada não estão mais sendo acompanhadas: {error}")
+    
+    def __run_samba_command(self, name: str, function: callable, on_finished: callable = None, on_failed: callable = None) -> bool:
+        """Runs a SAMBA service command in a worker thread. Only one SAMBA service command can run at a time.
+
+        Args:
+            name (str): The name of the command.
+            function (callable): The function to execute. It receives the ServiceTask as its only argument.
+            on_finished (callable): Called in the GUI thread with the result of the function.
+            on_failed (callable): Called in the GUI thread with the exception raised by the function.
+
+        Returns:
+            bool: True if the command was started, False if another SAMBA service command is running.
+        """
+        
+        submitted = self.command_runner.run(
+            name,
+            function,
+            [self.SAMBA_SERVICE_COMMANDS],
+            on_finished,
+            on_failed,
+            cancel=self.samba_manager.cancel_service_commands
+        )
+        
+        if not submitted:
+            self.log_error("ERRO: Já existe uma operação do servidor SAMBA em andamento. Aguarde ela terminar.")
+        
+        return submitted
+    
+    def __apply_samba_changes(self, failure_description: str) -> None:
+        """Applies the changes made to smb.conf to the running server (reload or restart) in a worker thread.
+
+        Args:
+            failure_description (str): Message shown to the user if the changes couldn't be applied.
+        """
+        
+        if not self.samba_manager.has_pending_changes():
+            return
+        
+        def apply_changes(task):
+            task.report_progress("Aplicando as alterações no servidor SAMBA...")
+            self.samba_manager.apply_pending_changes()
+        
+        def on_failed(e):
+            if isinstance(e, SambaServiceFailure):
+                self.log_error(f"ERRO DE SERVIÇO: {e}\n{failure_description}")
+            else:
+                self.log_error(f"ERRO DESCONHECIDO: {e}")
+        
+        self.__run_samba_command("apply_changes", apply_changes, on_failed=on_failed)
+    
+    def __update_service_buttons(self, *args) -> None:
+        """Disables the buttons that run SAMBA service commands while one of them or the initial load is running."""
+        
+        enabled = not self.command_runner.is_busy(self.SAMBA_SERVICE_COMMANDS) and len(self.__pending_setup_stages) == 0
+        
+        for button_name in self.SERVICE_BUTTONS:
+            self.gui.widgets.get(button_name).setEnabled(enabled)
+    
     def update_net_speed(self, up_speed: float, down_speed: float) -> None:
-        """Updates the network speed labels in the GUI with the provided upload and download speeds."""
+        """Updates the network speed labels in the GUI with the provided upload and download speeds.
+        
+        The label is only touched when the formatted speeds or its color actually change.
+        """
         
-        # Get GUI elements of the network speed data
-        transmission_speed_label = self.gui.findChild(QLabel, WN.TRANSMISSION_SPEED_LABEL.value)
+        self.gui.renderer.set_text(WN.TRANSMISSION_SPEED_LABEL, f"UP: {up_speed:.2f} KB/s | DOWN: {down_speed:.2f} KB/s")
+        self.gui.renderer.set_style(WN.TRANSMISSION_SPEED_LABEL, f"color: {Colors.LIGHT_GREEN};")
+        
+    def update_net_speed_stats(self, stats: "ThroughputStats") -> None:
+        """Shows the peak and the 95th percentile of the network speed in the last interval as the tooltip of the speed label."""
+        
+        self.gui.renderer.set_tooltip(
+            WN.TRANSMISSION_SPEED_LABEL,
+            f"UP: pico {stats.up_peak:.2f} KB/s | p95 {stats.up_p95:.2f} KB/s\n"
+            f"DOWN: pico {stats.down_peak:.2f} KB/s | p95 {stats.down_p95:.2f} KB/s"
+        )
         
-        transmission_speed_label.setText(f"UP: {up_speed:.2f} KB/s | DOWN: {down_speed:.2f} KB/s")
-        transmission_speed_label.setStyleSheet(f"color: {Colors.LIGHT_GREEN};")
+    def update_connected_clients(self, clients: list) -> None:
+        """Updates the connected clients label. The tooltip shows the files each client is reading and its speed."""
+        
+        self.gui.renderer.set_text(WN.CONNECTED_CLIENTS_LABEL, str(len(clients)))
+        
+        lines = []
+        for client in clients:
+            files = ", ".join(os.path.basename(path) for path in client.open_files) or "nenhum arquivo aberto"
+            lines.append(f"{client.address}: {files} | UP: {client.up_speed:.2f} KB/s | DOWN: {client.down_speed:.2f} KB/s")
+        
+        self.gui.renderer.set_tooltip(WN.CONNECTED_CLIENTS_LABEL, "\n".join(lines))
         
     def reset_net_speed_values(self) -> None:
         """Resets the network speed labels in the GUI to blank values."""
         
-        # Get GUI elements of the network speed data
-        transmission_speed_label = self.gui.findChild(QLabel, WN.TRANSMISSION_SPEED_LABEL.value)
+        self.gui.renderer.set_text(WN.TRANSMISSION_SPEED_LABEL, "UP: 0.00 KB/s | DOWN: 0.00 KB/s")
+        self.gui.renderer.set_tooltip(WN.TRANSMISSION_SPEED_LABEL, "")
+        self.gui.renderer.set_style(WN.TRANSMISSION_SPEED_LABEL, f"color: {Colors.LIGHT_GOLD};")
         
-        transmission_speed_label.setText("UP: 0.00 KB/s | DOWN: 0.00 KB/s")
-        transmission_speed_label.setStyleSheet(f"color: {Colors.LIGHT_GOLD};")
+        self.gui.renderer.set_text(WN.CONNECTED_CLIENTS_LABEL, "0")
+        self.gui.renderer.set_tooltip(WN.CONNECTED_CLIENTS_LABEL, "")
     
     def on_close_event(self) -> None:
         """Handles the close event of the GUI."""
         
-        # Stop the Samba server
-        self.on_stop_server_button_clicked()
+        # Interrupt the commands that are still running and wait for the worker threads, but never forever
+        self.command_runner.cancel_all()
+        
+        if not self.command_runner.wait_for_done(self.SHUTDOWN_TIMEOUT * 1000):
+            pending = ", ".join(self.command_runner.get_pending_tasks())
+            self.log_error(f"AVISO: Os comandos a seguir não terminaram em {self.SHUTDOWN_TIMEOUT} segundos e serão abandonados: {pending}")
+        
+        # Stop the Samba server. The window is closing, so here we can wait for it
+        try:
+            self.samba_manager.stop_server()
+            self.log_success("Servidor SAMBA parado com sucesso.")
+        
+        except SambaServiceFailure as e:
+            self.log_error(f"ERRO DE SERVIÇO: {e}\nO servidor SAMBA não pôde ser parado.")
+        
+        finally:
+            self.__stop_net_speed_monitor()
+            self.__stop_smb_session_monitor()
+            self.__stop_library_watcher()
+        
+        self.log("Programa encerrado com sucesso!")
         
-        self.log("Programa encerrado com sucesso!")
\ No newline at end of file
+        # Deliver the last messages before the log widget is destroyed
+        shutdown_logging()
+        self.log_pane.stop()
\ No newline at end of file
@@ -1,12 +1,20 @@
 from typing import Protocol
 from PyQt6.QtWidgets import QWidget
 
+from modules.GUI.WidgetRegistry import WidgetRegistry, WidgetRenderer
+
 class GUIInterface(Protocol):
     """Interface for the GUI controller to interact with simulating the main GUI of the program.
     
     This interface is used to decouple the GUI controller from the actual GUI implementation. Not to mention that this avoids circular imports.
     """
     
+    # Handles of the named widgets, resolved once when the GUI is built
+    widgets: WidgetRegistry
+    
+    # Updates the named widgets only when their values change
+    renderer: WidgetRenderer
+    
     def findChild(self, type, name: str) -> QWidget:
         """Should return a child widget given its type and name."""
         pass
@@ -0,0 +1,301 @@
+from enum import Enum
+from PyQt6.QtWidgets import *
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QColor
+
+from modules.GUI.GUIColors import GUIColors as Colors
+from modules.GUI.GUIFonts import GUIFonts as Fonts
+from modules.GUI.GUICustomWidgets import GUICustomWidgets as Widgets
+from modules.GameLibrary import GameEntry
+from modules.ImageVerifier import ImageHash
+from modules.DatIndex import DatIndex, DatMatch
+from modules.Fragmentation import FragmentationInfo, FragmentationScanner
+
+class DialogDimensions(Enum):
+    """Enum for dialog dimensions."""
+    WIDTH = 960
+    HEIGHT = 560
+
+    @staticmethod
+    def rect():
+        """Returns a QRect object with the specified width and height."""
+        return QRect(0, 0, DialogDimensions.WIDTH.value, DialogDimensions.HEIGHT.value)
+
+class SizeItem(QTableWidgetItem):
+    """Table item that shows a formatted size (or any number) and is sorted by its value."""
+
+    def __init__(self, text: str, size: float):
+        super().__init__(text)
+        self.size = size
+        self.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+
+    def __lt__(self, other: QTableWidgetItem) -> bool:
+        if isinstance(other, SizeItem):
+            return self.size < other.size
+
+        return super().__lt__(other)
+
+class LibraryDialog(QDialog):
+    """Dialog that shows the games of the PS2 share folder, built from the library index.
+
+    The table is filled by set_games. The 'ATUALIZAR' (button_refresh), 'IMPORTAR' (button_import), 'VERIFICAR'
+    (button_verify), 'DATS' (button_dats), 'DESFRAGMENTAR' (button_defrag) and 'CONVERTER' (button_convert) buttons
+    are connected by the controller, which scans the share folder, copies games to it, verifies it, indexes the DAT
+    files, rewrites the selected images contiguously and converts them between ISO and ZSO in a worker thread.
+    """
+
+    COLUMNS = ["ID", "TÍTULO", "MÍDIA", "TAMANHO", "VERIFICAÇÃO", "FRAGMENTOS"]
+
+    def __init__(self, parent: QWidget, games: list[GameEntry]):
+        """Constructor for the LibraryDialog class.
+
+        Args:
+            parent (QWidget): The parent widget for the dialog.
+            games (list[GameEntry]): The games to show.
+        """
+
+        super().__init__(parent)
+
+        self.setWindowTitle("Biblioteca de jogos")
+
+        # Center the dialog on the screen
+        dialog_rect = DialogDimensions.rect()
+        dialog_rect.moveCenter(parent.geometry().center())
+        self.setGeometry(dialog_rect)
+
+        # Create widgets
+        self.summary_label = Widgets.create_label(self, "")
+        self.summary_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.table = self.__create_table()
+
+        # Results of the last verification and of the DAT matching, by path relative to the share folder
+        self.__verification = {}
+        self.__matches = {}
+        self.__fragmentation = {}
+
+        self.button_refresh = Widgets.create_button(self, "ATUALIZAR")
+        self.button_import = Widgets.create_button(self, "IMPORTAR")
+        self.button_import.setToolTip("Copiar imagens ISO ou ZSO para as pastas DVD e CD da pasta compartilhada. Imagens BIN/CUE são convertidas para ISO.")
+        self.button_verify = Widgets.create_button(self, "VERIFICAR")
+        self.button_dats = Widgets.create_button(self, "DATS")
+        self.button_dats.setToolTip("Escolher os arquivos DAT (Redump / No-Intro) usados para reconhecer as imagens.")
+        self.button_defrag = Widgets.create_button(self, "DESFRAGMENTAR")
+        self.button_defrag.setToolTip("Regravar as imagens selecionadas em uma área contígua do disco.")
+        self.button_convert = Widgets.create_button(self, "CONVERTER")
+        self.button_convert.setToolTip("Comprimir as imagens ISO selecionadas em ZSO (LZ4), ou descomprimir as imagens ZSO em ISO.")
+        self.button_close = Widgets.create_button(self, "FECHAR")
+
+        # Connect button actions
+        self.button_close.clicked.connect(self.accept)
+
+        # Set layouts
+        layout_v = QVBoxLayout()
+        buttons_layout = QHBoxLayout()
+
+        buttons_layout.addWidget(self.button_refresh)
+        buttons_layout.addWidget(self.button_import)
+        buttons_layout.addWidget(self.button_verify)
+        buttons_layout.addWidget(self.button_dats)
+        buttons_layout.addWidget(self.button_defrag)
+        buttons_layout.addWidget(self.button_convert)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.button_close)
+
+        layout_v.addWidget(self.summary_label)
+        layout_v.addWidget(self.table)
+        layout_v.addLayout(buttons_layout)
+
+        layout_v.setSpacing(15)
+
+        self.setLayout(layout_v)
+        self.setStyleSheet(f"background-color: {Colors.DEEP_PURPLE};")
+
+        self.set_games(games)
+
+    def __create_table(self) -> QTableWidget:
+        table = QTableWidget(0, len(self.COLUMNS), self)
+        table.setHorizontalHeaderLabels(self.COLUMNS)
+        table.setFont(Fonts.REGULAR_FONT)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        table.verticalHeader().setVisible(False)
+
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+
+        # Sorted by title, like OPL shows the games
+        header.setSortIndicator(1, Qt.SortOrder.AscendingOrder)
+
+        table.setStyleSheet(f"""
+            QTableWidget {{
+                background-color: {Colors.OFF_WHITE};
+                color: {Colors.OFF_BLACK};
+            }}
+
+            QTableWidget::item:selected {{
+                background-color: {Colors.DARK_LAVENDER};
+                color: {Colors.OFF_WHITE};
+            }}
+        """)
+
+        return table
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        """Formats a size in bytes as MB or GB."""
+
+        if size >= 1024 ** 3:
+            return f"{size / 1024 ** 3:.2f} GB"
+
+        return f"{size / 1024 ** 2:.1f} MB"
+
+    def set_games(self, games: list[GameEntry]) -> None:
+        """Shows the games in the table."""
+
+        # Sorting and repainting are disabled while the rows are inserted, so thousands of games are shown at once
+        self.table.setSortingEnabled(False)
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(games))
+
+        for row, game in enumerate(games):
+            title_item = QTableWidgetItem(game.title)
+            title_item.setToolTip(game.path)
+
+            self.table.setItem(row, 0, QTableWidgetItem(game.game_id or "?"))
+            self.table.setItem(row, 1, title_item)
+            self.table.setItem(row, 2, QTableWidgetItem(game.media))
+            self.table.setItem(row, 3, SizeItem(self.format_size(game.size), game.size))
+            self.table.setItem(row, 4, self.__create_verification_item(self.__verification.get(game.path), self.__matches.get(game.path)))
+            self.table.setItem(row, 5, self.__create_fragmentation_item(self.__fragmentation.get(game.path)))
+
+        self.table.setUpdatesEnabled(True)
+        self.table.setSortingEnabled(True)
+
+        total_size = sum(game.size for game in games)
+        self.summary_label.setText(f"{len(games)} JOGO(S) | {self.format_size(total_size)}")
+
+    def set_verification(self, results: dict[str, ImageHash], matches: dict[str, DatMatch] | None = None) -> None:
+        """Shows the results of a verification.
+
+        Args:
+            results (dict[str, ImageHash]): The results by path relative to the share folder (GameEntry.path).
+            matches (dict[str, DatMatch]): The results of the DAT matching by path, if there are DAT files.
+        """
+
+        self.__verification = results
+        self.__matches = matches or {}
+
+        self.table.setSortingEnabled(False)
+
+        for row in range(self.table.rowCount()):
+            path = self.table.item(row, 1).toolTip()
+            self.table.setItem(row, 4, self.__create_verification_item(results.get(path), self.__matches.get(path)))
+
+        self.table.setSortingEnabled(True)
+
+    @staticmethod
+    def __create_verification_item(result: ImageHash | None, match: DatMatch | None) -> QTableWidgetItem:
+        if result is None:
+            return QTableWidgetItem("-")
+
+        hashes = f"CRC32: {result.crc32:08X}\nSHA-1: {result.sha1}"
+
+        if result.error:
+            item = QTableWidgetItem("ILEGÍVEL")
+            item.setToolTip(result.error)
+        elif result.problems:
+            item = QTableWidgetItem("PROBLEMAS")
+            item.setToolTip("\n".join(result.problems))
+        elif match is not None and match.status == DatIndex.BAD_DUMP:
+            item = QTableWidgetItem("BAD DUMP")
+            item.setToolTip(f"{match.reason}\nDAT: {match.game}\n{hashes}")
+        elif match is not None and match.status == DatIndex.MISMATCH:
+            # Converted images (e.g. from BIN/CUE) never match, so this is not shown as an error
+            item = QTableWidgetItem("DIVERGENTE")
+            item.setToolTip(f"{match.reason}\nDAT: {match.game}\n{hashes}")
+            return item
+        elif match is not None and match.status == DatIndex.VERIFIED:
+            item = QTableWidgetItem("VERIFICADO")
+            item.setToolTip(f"DAT: {match.game}\n{hashes}")
+            return item
+        else:
+            item = QTableWidgetItem(f"OK {result.crc32:08X}")
+            item.setToolTip(hashes if match is None else f"Não encontrado nos DATs\n{hashes}")
+            return item
+
+        item.setForeground(QColor(Colors.SOFT_RED))
+        return item
+
+    def set_fragmentation(self, infos: dict[str, FragmentationInfo]) -> None:
+        """Shows the layout of the images on the disk.
+
+        Args:
+            infos (dict[str, FragmentationInfo]): The layouts by path relative to the share folder (GameEntry.path).
+        """
+
+        self.__fragmentation = infos
+
+        self.table.setSortingEnabled(False)
+
+        for row in range(self.table.rowCount()):
+            path = self.table.item(row, 1).toolTip()
+            self.table.setItem(row, 5, self.__create_fragmentation_item(infos.get(path)))
+
+        self.table.setSortingEnabled(True)
+
+    @staticmethod
+    def __create_fragmentation_item(info: FragmentationInfo | None) -> QTableWidgetItem:
+        if info is None or info.error:
+            item = QTableWidgetItem("-")
+
+            if info is not None:
+                item.setToolTip(info.error)
+
+            return item
+
+        # Sorted by the seeks per GiB, which is what makes OPL stutter, not by the number of fragments
+        item = SizeItem(str(info.fragments), info.seeks_per_gib)
+        item.setToolTip(f"{info.extents} extent(s), {info.seeks_per_gib:.1f} saltos/GiB\n"
+                        f"Maior salto: {info.max_seek / 1024 ** 2:.1f} MB")
+
+        if info.seeks_per_gib >= FragmentationScanner.STUTTER_SEEKS_PER_GIB:
+            item.setForeground(QColor(Colors.SOFT_RED))
+
+        return item
+
+    def get_selected_paths(self) -> list[str]:
+        """Returns the paths (relative to the share folder) of the selected games, in the order of the table."""
+
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        return [self.table.item(row, 1).toolTip() for row in rows]
+
+    def set_defragmenting(self, defragmenting: bool) -> None:
+        """Disables the defrag button while the images are being rewritten."""
+
+        self.button_defrag.setEnabled(not defragmenting)
+
+    def set_converting(self, converting: bool) -> None:
+        """Disables the convert button while the images are being converted."""
+
+        self.button_convert.setEnabled(not converting)
+
+    def set_importing(self, importing: bool) -> None:
+        """Disables the import button while the images are being copied."""
+
+        self.button_import.setEnabled(not importing)
+
+    def set_verifying(self, verifying: bool) -> None:
+        """Disables the verify button while the images are being verified."""
+
+        self.button_verify.setEnabled(not verifying)
+
+    def set_scanning(self, scanning: bool) -> None:
+        """Disables the refresh button while the share folder is being scanned."""
+
+        self.button_refresh.setEnabled(not scanning)
+
+        if scanning:
+            self.summary_label.setText("INDEXANDO OS JOGOS...")
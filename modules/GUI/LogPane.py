@@ -0,0 +1,135 @@
+import threading
+from collections import deque
+from PyQt6.QtWidgets import QPlainTextEdit
+from PyQt6.QtGui import QTextCharFormat, QTextCursor, QColor
+from PyQt6.QtCore import QObject, QTimer
+
+class LogPane(QObject):
+    """Shows the log messages in a QPlainTextEdit without slowing down the GUI.
+
+    The messages are enqueued in a fixed-capacity ring buffer and written to the widget in batches by a timer,
+    in the GUI thread. Repeated messages are coalesced into one line with a counter, the widget keeps at most
+    MAX_BLOCK_COUNT lines, and the colors come from pre-built char formats instead of HTML.
+
+    append can be called from any thread.
+    """
+
+    # Message levels
+    NORMAL = 0
+    SUCCESS = 1
+    ERROR = 2
+
+    # Maximum number of messages waiting to be written. When it is full, the oldest messages are dropped
+    BUFFER_CAPACITY = 1000
+
+    # Maximum number of lines kept in the widget
+    MAX_BLOCK_COUNT = 5000
+
+    # Interval between the writes to the widget, in milliseconds
+    FLUSH_INTERVAL = 100
+
+    def __init__(self, widget: QPlainTextEdit, parent: QObject | None = None):
+        """Initializes the log pane and starts the flush timer. Must be created in the GUI thread.
+
+        Args:
+            widget (QPlainTextEdit): The widget where the messages are shown.
+            parent (QObject): The parent object.
+        """
+
+        super().__init__(parent)
+
+        self.widget = widget
+        self.widget.setMaximumBlockCount(self.MAX_BLOCK_COUNT)
+
+        self.__formats = {
+            self.NORMAL: QTextCharFormat(),
+            self.SUCCESS: self.__create_format("green"),
+            self.ERROR: self.__create_format("red"),
+        }
+
+        self.__buffer = deque(maxlen=self.BUFFER_CAPACITY)
+        self.__buffer_lock = threading.Lock()
+        self.__dropped = 0
+
+        self.__timer = QTimer(self)
+        self.__timer.setInterval(self.FLUSH_INTERVAL)
+        self.__timer.timeout.connect(self.flush)
+        self.__timer.start()
+
+    @staticmethod
+    def __create_format(color: str) -> QTextCharFormat:
+        """Creates a char format with the given text color."""
+
+        char_format = QTextCharFormat()
+        char_format.setForeground(QColor(color))
+        return char_format
+
+    def append(self, text: str, level: int = NORMAL) -> None:
+        """Enqueues a message to be shown in the next flush. Thread safe.
+
+        Args:
+            text (str): The message.
+            level (int): NORMAL, SUCCESS or ERROR.
+        """
+
+        with self.__buffer_lock:
+            if len(self.__buffer) == self.__buffer.maxlen:
+                self.__dropped += 1
+
+            self.__buffer.append((text, level))
+
+    def flush(self) -> None:
+        """Writes the enqueued messages to the widget in a single edit. Must be called from the GUI thread."""
+
+        with self.__buffer_lock:
+            if not self.__buffer:
+                return
+
+            messages = list(self.__buffer)
+            self.__buffer.clear()
+
+            dropped = self.__dropped
+            self.__dropped = 0
+
+        # Coalesce the repeated messages
+        batch = []
+        for text, level in messages:
+            if batch and batch[-1][0] == text and batch[-1][1] == level:
+                batch[-1][2] += 1
+            else:
+                batch.append([text, level, 1])
+
+        scrollbar = self.widget.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+
+        cursor = QTextCursor(self.widget.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+
+        if dropped > 0:
+            self.__write(cursor, f"... {dropped} mensagem(ns) descartada(s) ...", self.__formats[self.ERROR])
+
+        for text, level, count in batch:
+            if count > 1:
+                text = f"{text} (x{count})"
+
+            self.__write(cursor, text, self.__formats[level])
+
+        cursor.endEditBlock()
+
+        # Only follow the new messages if the user was not reading the older ones
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def __write(self, cursor: QTextCursor, text: str, char_format: QTextCharFormat) -> None:
+        """Writes a message in a new paragraph, separated from the previous one by a blank line."""
+
+        cursor.insertBlock()
+        cursor.insertBlock()
+        cursor.insertText(text, char_format)
+
+    def stop(self) -> None:
+        """Writes the pending messages and stops the flush timer."""
+
+        self.__timer.stop()
+        self.flush()
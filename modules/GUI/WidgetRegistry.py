@@ -0,0 +1,152 @@
+import time
+from PyQt6.QtWidgets import QWidget, QLabel
+
+from modules.GUI.WidgetsNames import WidgetsNames as WN
+from modules.GUI.GUIColors import GUIColors as Colors
+
+class WidgetRegistry:
+    """Keeps the handles of all the named widgets of the GUI.
+
+    Every WidgetsNames entry is resolved once, when the GUI is built, so the controller never has to walk
+    the widget tree with findChild again.
+    """
+
+    def __init__(self, root: QWidget):
+        """Resolves all the WidgetsNames entries among the children of the root widget.
+
+        Args:
+            root (QWidget): The main window of the GUI.
+
+        Raises:
+            LookupError: If a widget of WidgetsNames was not created by the GUI.
+        """
+
+        self.__widgets = {}
+
+        for name in WN:
+            widget = root.findChild(QWidget, name.value)
+
+            if widget is None:
+                raise LookupError(f"O widget '{name.value}' não foi encontrado na GUI.")
+
+            self.__widgets[name] = widget
+
+    def get(self, name: WN) -> QWidget:
+        """Returns the widget with the given name."""
+
+        return self.__widgets[name]
+
+class WidgetRenderer:
+    """Updates the text, tooltip and style of the widgets only when they actually change.
+
+    Setting the same text again still makes Qt recompute the layout, and setting the same style sheet
+    makes it re-polish the widget. The renderer remembers the last values applied to each widget and
+    skips the calls when the new value is the same.
+    """
+
+    def __init__(self, registry: WidgetRegistry):
+        self.registry = registry
+
+        # Last values applied, by widget name
+        self.__texts = {}
+        self.__tooltips = {}
+        self.__styles = {}
+
+    def set_text(self, name: WN, text: str) -> bool:
+        """Sets the text of a widget, if it changed. Returns True if the widget was updated."""
+
+        if self.__texts.get(name) == text:
+            return False
+
+        self.registry.get(name).setText(text)
+        self.__texts[name] = text
+        return True
+
+    def set_tooltip(self, name: WN, tooltip: str) -> bool:
+        """Sets the tooltip of a widget, if it changed. Returns True if the widget was updated."""
+
+        if self.__tooltips.get(name) == tooltip:
+            return False
+
+        self.registry.get(name).setToolTip(tooltip)
+        self.__tooltips[name] = tooltip
+        return True
+
+    def set_style(self, name: WN, style: str) -> bool:
+        """Sets the style sheet of a widget, if it changed. Returns True if the widget was updated."""
+
+        if self.__styles.get(name) == style:
+            return False
+
+        self.registry.get(name).setStyleSheet(style)
+        self.__styles[name] = style
+        return True
+
+    def forget(self, name: WN) -> None:
+        """Forgets the values applied to a widget, e.g. after it was changed directly."""
+
+        self.__texts.pop(name, None)
+        self.__tooltips.pop(name, None)
+        self.__styles.pop(name, None)
+
+def benchmark(ticks: int = 10000, siblings: int = 200) -> dict:
+    """Micro-benchmark that compares the CPU time of one speed label update per tick with findChild and with the renderer.
+
+    The label is placed among many sibling widgets, like in the real window. The speed changes in one of
+    every ten ticks, the rate at which the displayed value actually changes at high update rates.
+
+    A QApplication must exist before calling it.
+
+    Args:
+        ticks (int): The number of updates.
+        siblings (int): The number of other widgets in the window.
+
+    Returns:
+        dict: The CPU time of one tick in microseconds, by method.
+    """
+
+    root = QWidget()
+
+    for index in range(siblings):
+        QLabel(f"{index}", root)
+
+    label = QLabel(root)
+    label.setObjectName(WN.TRANSMISSION_SPEED_LABEL.value)
+
+    # Other named widgets, so the registry can be built
+    for name in WN:
+        if name != WN.TRANSMISSION_SPEED_LABEL:
+            QLabel(root).setObjectName(name.value)
+
+    speeds = [float(tick // 10) for tick in range(ticks)]
+    results = {}
+
+    start = time.process_time_ns()
+    for speed in speeds:
+        speed_label = root.findChild(QLabel, WN.TRANSMISSION_SPEED_LABEL.value)
+        speed_label.setText(f"UP: {speed:.2f} KB/s | DOWN: {speed:.2f} KB/s")
+        speed_label.setStyleSheet(f"color: {Colors.LIGHT_GREEN};")
+    results["findChild + setStyleSheet"] = (time.process_time_ns() - start) / ticks / 1000
+
+    renderer = WidgetRenderer(WidgetRegistry(root))
+
+    start = time.process_time_ns()
+    for speed in speeds:
+        renderer.set_text(WN.TRANSMISSION_SPEED_LABEL, f"UP: {speed:.2f} KB/s | DOWN: {speed:.2f} KB/s")
+        renderer.set_style(WN.TRANSMISSION_SPEED_LABEL, f"color: {Colors.LIGHT_GREEN};")
+    results["WidgetRenderer"] = (time.process_time_ns() - start) / ticks / 1000
+
+    root.deleteLater()
+
+    return results
+
+if __name__ == "__main__":
+    import sys
+    from PyQt6.QtWidgets import QApplication
+
+    # Usage: python -m modules.GUI.WidgetRegistry [ticks]
+    app = QApplication(sys.argv)
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for method, cost in benchmark(ticks).items():
+        print(f"{method}: {cost:.2f} us/tick")
@@ -8,6 +8,7 @@ class WidgetsNames(Enum):
     
     SERVER_STATUS_LABEL = "server_status_label"
     TRANSMISSION_SPEED_LABEL = "transmission_speed_label"
+    CONNECTED_CLIENTS_LABEL = "connected_clients_label"
     
     CHANGE_FOLDER_BUTTON = "change_folder_button"
     
@@ -17,4 +18,5 @@ class WidgetsNames(Enum):
     
     START_SERVER_BUTTON = "start_server_button"
     STOP_SERVER_BUTTON = "stop_server_button"
-    CHANGE_INTERFACE_BUTTON = "change_interface_button"
\ No newline at end of file
+    CHANGE_INTERFACE_BUTTON = "change_interface_button"
+    LIBRARY_BUTTON = "library_button"
\ No newline at end of file
@@ -0,0 +1,375 @@
+import os
+import time
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.Logger import get_logger
+from modules.GameLibrary import GameLibrary
+from modules.ImageVerifier import ImageVerifier
+from modules.BinCueConverter import BinCueConverter, CueSheet
+
+logger = get_logger("library")
+
+class ImportJob:
+    """An image to be imported to the PS2 share folder.
+
+    Attributes:
+        source (str): The path of the image.
+        media (str): 'DVD' or 'CD', the folder of the share where it is copied.
+        destination (str): The path of the copy in the share folder.
+        size (int): Size of the image in bytes.
+        copied (int): Bytes copied so far.
+        error (str): Why the image was not imported. Empty if it was (or will be) imported.
+    """
+
+    __slots__ = ("source", "media", "destination", "size", "copied", "error")
+
+    def __init__(self, source: str, media: str = "", destination: str = "", size: int = 0, error: str = ""):
+        self.source = source
+        self.media = media
+        self.destination = destination
+        self.size = size
+        self.copied = 0
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"ImportJob({self.source!r}, {self.destination!r}, {self.size}, error={self.error!r})"
+
+class GameImporter:
+    """Copies game images to the DVD and CD folders of the PS2 share folder.
+
+    The data is copied by the kernel (copy_file_range, or sendfile if the file systems don't support it), without
+    passing through Python, and the destination is preallocated with posix_fallocate, so it is not fragmented and a
+    full disk is found before the copy starts. The copies run in parallel, but each disk only gets a few at a time
+    (one if it is rotational), so the heads don't jump between the files.
+
+    The image is copied to a hidden temporary file and renamed when it is complete, so OPL and the library watcher
+    never see a partial image. The copies get the owner and the permissions of the share folder (see
+    SambaManager.add_ps2_share_folder_permissions).
+
+    CD images in BIN/CUE format are given by their CUE sheet and converted to ISO while they are imported (see BinCueConverter).
+    """
+
+    # Bytes copied by each system call, so the progress and the cancellation are noticed often
+    CHUNK_SIZE = 64 * 1024 * 1024
+
+    # CUE sheets of BIN/CUE images, converted to ISO while imported
+    CUE_EXTENSION = ".cue"
+
+    # Copies running at the same time on the same disk (source or destination)
+    COPIES_PER_DEVICE = 2
+
+    # Interval in seconds between the calls of the progress callback
+    PROGRESS_INTERVAL = 1.0
+
+    # Same permissions of the share folder, and of the files created through SAMBA (create mask = 0777)
+    FOLDER_MODE = 0o777
+    FILE_MODE = 0o777
+
+    # Errors of copy_file_range when the kernel or the file systems can't copy between the files
+    COPY_RANGE_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL)
+
+    def __init__(self, share_path: str, owner: tuple[int, int] | None = None):
+        """
+        Args:
+            share_path (str): The PS2 share folder.
+            owner (tuple[int, int]): User and group IDs given to the copies and the folders created. None keeps the current user.
+        """
+
+        self.share_path = share_path
+        self.owner = owner
+
+        self.__progress_lock = threading.Lock()
+
+    def plan(self, sources: list[str], overwrite: bool = False) -> list[ImportJob]:
+        """Finds the media type and the destination of each image. Images that can't be imported get an error.
+
+        Args:
+            sources (list[str]): The paths of the images.
+            overwrite (bool): If images that already exist in the share folder are replaced.
+
+        Returns:
+            list[ImportJob]: The jobs, in the order of the sources.
+        """
+
+        jobs = []
+        destinations = set()
+
+        for source in sources:
+            source = os.path.abspath(source)
+            file_name = os.path.basename(source)
+
+            if not file_name.lower().endswith(GameLibrary.IMAGE_EXTENSIONS + (self.CUE_EXTENSION,)):
+                jobs.append(ImportJob(source, error="O arquivo não é uma imagem ISO, ZSO ou BIN/CUE."))
+                continue
+
+            try:
+                if file_name.lower().endswith(self.CUE_EXTENSION):
+                    # The size of the ISO that will be written, not of the BIN
+                    media, destination = BinCueConverter.get_destination(self.share_path, source)
+                    size = BinCueConverter.get_sectors(CueSheet.get_data_track(CueSheet.parse(source))) * BinCueConverter.ISO_SECTOR_SIZE
+                else:
+                    size = os.stat(source).st_size
+                    media = GameLibrary.detect_media(source)
+                    destination = os.path.join(self.share_path, media, file_name)
+            except OSError as e:
+                jobs.append(ImportJob(source, error=e.strerror or str(e)))
+                continue
+            except ValueError as e:
+                jobs.append(ImportJob(source, error=str(e)))
+                continue
+
+            job = ImportJob(source, media, destination, size)
+
+            if destination in destinations:
+                job.error = "Outra imagem com o mesmo nome já está na lista."
+            elif os.path.exists(destination) and not overwrite:
+                job.error = "A imagem já existe na pasta compartilhada."
+            elif os.path.exists(destination) and os.path.samefile(source, destination):
+                job.error = "A imagem já está na pasta compartilhada."
+
+            destinations.add(destination)
+            jobs.append(job)
+
+        return jobs
+
+    def check_free_space(self, jobs: list[ImportJob]) -> None:
+        """Checks if the share folder has space for the images.
+
+        Raises:
+            ValueError: If there is not enough free space.
+        """
+
+        needed = sum(job.size for job in jobs if not job.error)
+        free = shutil.disk_usage(self.share_path).free
+
+        if needed > free:
+            raise ValueError(f"Espaço insuficiente na pasta compartilhada: são necessários {needed / 1024 ** 3:.1f} GB, "
+                             f"mas há {free / 1024 ** 3:.1f} GB livres.")
+
+    def import_games(self, jobs: list[ImportJob], progress: callable = None, should_stop: callable = None) -> list[ImportJob] | None:
+        """Copies the images of the jobs without errors. Can be called from a worker thread.
+
+        Args:
+            jobs (list[ImportJob]): The jobs created by plan.
+            progress (callable): Called about once per second with the bytes copied, the bytes to copy, the images
+                copied, the images to copy, the throughput in bytes per second and the estimated seconds left.
+            should_stop (callable): Checked during the copies. If it returns True, the copies stop and the partial files are removed.
+
+        Returns:
+            list[ImportJob]: The jobs, with the errors of the copies that failed. None if the import was stopped.
+
+        Raises:
+            OSError: If the DVD or CD folder can't be created.
+            ValueError: If there is not enough free space.
+        """
+
+        pending = [job for job in jobs if not job.error]
+
+        if not pending:
+            return jobs
+
+        self.check_free_space(pending)
+
+        for media in {job.media for job in pending}:
+            self.__create_media_folder(media)
+
+        # The copies are limited by the disks they read from and write to
+        devices = {}
+
+        for job in list(pending):
+            try:
+                devices[id(job)] = (os.stat(job.source).st_dev, os.stat(os.path.dirname(job.destination)).st_dev)
+            except OSError as e:
+                job.error = e.strerror or str(e)
+                pending.remove(job)
+
+        if not pending:
+            return jobs
+
+        total_bytes = sum(job.size for job in pending)
+        total_files = len(pending)
+        stop_event = threading.Event()
+
+        running = {}  # device -> copies running
+        futures = {}
+        done_count = 0
+        start = time.monotonic()
+        last_progress = start
+
+        def get_limit(device: int) -> int:
+            return 1 if ImageVerifier.is_rotational(device) else self.COPIES_PER_DEVICE
+
+        limits = {device: get_limit(device) for pair in devices.values() for device in pair}
+        workers = min(len(pending), sum(limits.values()))
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="import") as executor:
+            def submit():
+                for job in list(pending):
+                    job_devices = set(devices[id(job)])
+
+                    if all(running.get(device, 0) < limits[device] for device in job_devices):
+                        pending.remove(job)
+                        futures[executor.submit(self.copy_image, job, stop_event)] = (job, job_devices)
+
+                        for device in job_devices:
+                            running[device] = running.get(device, 0) + 1
+
+            submit()
+
+            while futures:
+                try:
+                    done, _ = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+                except BaseException:
+                    # e.g. KeyboardInterrupt in the CLI: the partial copies are removed before leaving
+                    stop_event.set()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+                if should_stop is not None and should_stop():
+                    stop_event.set()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    return None
+
+                for future in done:
+                    job, job_devices = futures.pop(future)
+                    done_count += 1
+
+                    for device in job_devices:
+                        running[device] -= 1
+
+                    try:
+                        future.result()
+                    except OSError as e:
+                        job.error = e.strerror or str(e)
+                        logger.warning("Não foi possível importar '%s': %s", job.source, job.error)
+                    except ValueError as e:
+                        job.error = str(e)
+                        logger.warning("Não foi possível importar '%s': %s", job.source, job.error)
+
+                submit()
+
+                now = time.monotonic()
+                if progress is not None and (now - last_progress >= self.PROGRESS_INTERVAL or not futures):
+                    self.__report_progress(jobs, total_bytes, done_count, total_files, now - start, progress)
+                    last_progress = now
+
+        return jobs
+
+    def __report_progress(self, jobs: list[ImportJob], total_bytes: int, done_count: int, total_files: int, elapsed: float, progress: callable) -> None:
+        with self.__progress_lock:
+            copied = sum(job.copied for job in jobs)
+
+        speed = copied / max(elapsed, 0.001)
+        eta = (total_bytes - copied) / speed if speed > 0 else 0.0
+
+        progress(copied, total_bytes, done_count, total_files, speed, eta)
+
+    def __create_media_folder(self, media: str) -> None:
+        folder = os.path.join(self.share_path, media)
+
+        if os.path.isdir(folder):
+            return
+
+        os.makedirs(folder, exist_ok=True)
+        self.__set_permissions(folder, self.FOLDER_MODE)
+
+    def __set_permissions(self, path: str, mode: int) -> None:
+        if self.owner is not None:
+            os.chown(path, *self.owner)
+
+        os.chmod(path, mode)
+
+    def copy_image(self, job: ImportJob, stop_event: threading.Event | None = None) -> None:
+        """Copies the image of a job to a temporary file in the destination folder and renames it when it is complete.
+
+        Raises:
+            OSError: If the copy fails or was stopped. The temporary file is removed.
+            ValueError: If the CUE sheet of a BIN/CUE image is invalid.
+        """
+
+        if job.source.lower().endswith(self.CUE_EXTENSION):
+            self.__convert_image(job, stop_event)
+            return
+
+        folder, file_name = os.path.split(job.destination)
+        temp_path = os.path.join(folder, f".{file_name}.part")
+
+        source_fd = os.open(job.source, os.O_RDONLY | os.O_CLOEXEC)
+
+        try:
+            destination_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, self.FILE_MODE)
+
+            try:
+                self.__preallocate(destination_fd, job.size)
+                os.posix_fadvise(source_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                self.__copy_data(source_fd, destination_fd, job, stop_event)
+            finally:
+                os.close(destination_fd)
+
+            self.__set_permissions(temp_path, self.FILE_MODE)
+            os.replace(temp_path, job.destination)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        finally:
+            os.close(source_fd)
+
+    def __convert_image(self, job: ImportJob, stop_event: threading.Event | None) -> None:
+        def report(done: int, _total: int) -> None:
+            with self.__progress_lock:
+                job.copied = done
+
+        should_stop = stop_event.is_set if stop_event is not None else None
+
+        if BinCueConverter(self.owner).convert(job.source, job.destination, report, should_stop) is None:
+            raise InterruptedError(errno.EINTR, "Importação interrompida", job.source)
+
+    @staticmethod
+    def __preallocate(fd: int, size: int) -> None:
+        if size == 0:
+            return
+
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            # Some file systems (e.g. FUSE or network mounts) can't preallocate, but a full disk is an error
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise
+
+    def __copy_data(self, source_fd: int, destination_fd: int, job: ImportJob, stop_event: threading.Event | None) -> None:
+        copy_range = True
+        offset = 0
+
+        while offset < job.size:
+            if stop_event is not None and stop_event.is_set():
+                raise InterruptedError(errno.EINTR, "Importação interrompida", job.source)
+
+            count = min(self.CHUNK_SIZE, job.size - offset)
+
+            if copy_range:
+                try:
+                    copied = os.copy_file_range(source_fd, destination_fd, count, offset, offset)
+                except OSError as e:
+                    if e.errno not in self.COPY_RANGE_UNSUPPORTED or offset > 0:
+                        raise
+
+                    copy_range = False
+                    continue
+            else:
+                os.lseek(destination_fd, offset, os.SEEK_SET)
+                copied = os.sendfile(destination_fd, source_fd, offset, count)
+
+            if copied == 0:
+                raise OSError(errno.EIO, "A imagem terminou antes do esperado (foi alterada durante a cópia?)", job.source)
+
+            offset += copied
+
+            # The pages of the source won't be read again, so they don't need to stay in the cache
+            os.posix_fadvise(source_fd, offset - copied, copied, os.POSIX_FADV_DONTNEED)
+
+            with self.__progress_lock:
+                job.copied = offset
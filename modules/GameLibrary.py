@@ -0,0 +1,537 @@
+import os
+import re
+import mmap
+import struct
+import tempfile
+import threading
+from stat import S_ISREG
+
+from modules.Logger import get_logger
+from modules.ZsoConverter import ZsoImage
+
+logger = get_logger("library")
+
+# File where the index of the games is kept between the executions
+LIBRARY_INDEX_PATH = "/var/cache/ps2_network_manager/library.idx"
+
+class GameEntry:
+    """A game image found in the PS2 share folder.
+
+    Attributes:
+        path (str): Path of the image, relative to the share folder (e.g. 'DVD/Game.iso').
+        game_id (str): ID of the game read from SYSTEM.CNF (e.g. 'SLUS_123.45'). Empty if it couldn't be read.
+        title (str): Title of the game, from the file name as OPL shows it.
+        size (int): Size of the image in bytes.
+        media (str): 'DVD' or 'CD'.
+        mtime_ns (int): Modification time of the image when it was read, in nanoseconds.
+        inode (int): Inode of the image when it was read.
+    """
+
+    __slots__ = ("path", "game_id", "title", "size", "media", "mtime_ns", "inode")
+
+    def __init__(self, path: str, game_id: str, title: str, size: int, media: str, mtime_ns: int = 0, inode: int = 0):
+        self.path = path
+        self.game_id = game_id
+        self.title = title
+        self.size = size
+        self.media = media
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+
+    @property
+    def signature(self) -> tuple[int, int, int]:
+        """(size, mtime_ns, inode) of the image. If it didn't change, the image doesn't need to be read again."""
+
+        return (self.size, self.mtime_ns, self.inode)
+
+    @staticmethod
+    def get_signature(stat: os.stat_result) -> tuple[int, int, int]:
+        """Returns the signature of a file from its stat."""
+
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def __repr__(self) -> str:
+        return f"GameEntry({self.path!r}, {self.game_id!r}, {self.title!r}, {self.size}, {self.media})"
+
+class GameLibrary:
+    """Indexes the games of the PS2 share folder, the way OPL organizes them.
+
+    OPL reads the images from the DVD and CD folders of the share. For each .iso file, the ISO9660 primary
+    volume descriptor and the SYSTEM.CNF file of the disc are read through a memory map, so only the few
+    sectors needed are loaded from the disk, even for images of several GB. For .zso files (LZ4 compressed),
+    only the blocks of those sectors are decompressed.
+
+    The index is saved to a compact binary file and loaded in the next execution, so the library can be shown
+    without reading the images again. Each entry keeps the (size, mtime_ns, inode) signature of its image, so a
+    rescan only reads the images that were added or changed; renamed images keep their inode and are not read again.
+    """
+
+    # Folders of the share where OPL looks for the images, and the media type of each one
+    MEDIA_FOLDERS = ("DVD", "CD")
+
+    IMAGE_EXTENSIONS = (".iso", ".zso")
+
+    # ISO9660 layout
+    SECTOR_SIZE = 2048
+    FIRST_DESCRIPTOR_SECTOR = 16
+    ROOT_RECORD_OFFSET = 156
+    MAX_SYSTEM_CNF_SIZE = 4096
+    VOLUME_SPACE_OFFSET = 80
+
+    # Sectors of an 80 minutes CD. Bigger images can only be DVDs
+    MAX_CD_SECTORS = 360000
+
+    # Game ID in the name of the file, used by the old OPL naming (e.g. 'SLUS_123.45.Game Title.iso')
+    FILE_NAME_ID_PATTERN = re.compile(r"^([A-Z]{4}[_-]\d{3}\.\d{2})\.(.+)$")
+
+    # Boot line of SYSTEM.CNF (e.g. 'BOOT2 = cdrom0:\SLUS_123.45;1'). PS1 discs use 'BOOT = cdrom:...'
+    BOOT_LINE_PATTERN = re.compile(rb"^\s*BOOT2?\s*=\s*cdrom0?:\\?\\?([^;\r\n]+)", re.IGNORECASE | re.MULTILINE)
+
+    # Index file: magic, version, number of games and length of the share path, then the path and the games
+    INDEX_MAGIC = b"PS2NMLIB"
+    INDEX_VERSION = 2
+    INDEX_HEADER = struct.Struct("<8sHIH")
+    INDEX_ENTRY = struct.Struct("<QqQBHBH")  # size, mtime_ns, inode, media, len(path), len(game_id), len(title)
+
+    def __init__(self, share_path: str, index_path: str = LIBRARY_INDEX_PATH):
+        """
+        Args:
+            share_path (str): The PS2 share folder.
+            index_path (str): The file where the index is saved.
+        """
+
+        self.share_path = share_path
+        self.index_path = index_path
+
+        self.__games = []
+        self.__scan_lock = threading.Lock()
+
+    def get_games(self) -> list[GameEntry]:
+        """Returns the games of the last scan or of the loaded index."""
+
+        return self.__games
+
+    def get_total_size(self) -> int:
+        """Returns the size in bytes of all the games."""
+
+        return sum(game.size for game in self.__games)
+
+    # --- SCAN ---
+
+    def list_images(self) -> list[tuple[str, str, os.DirEntry]]:
+        """Lists the images of the DVD and CD folders of the share.
+
+        Returns:
+            list[tuple[str, str, os.DirEntry]]: The relative path, the media type and the directory entry of each image.
+        """
+
+        images = []
+
+        for media in self.MEDIA_FOLDERS:
+            folder = os.path.join(self.share_path, media)
+
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name.lower().endswith(self.IMAGE_EXTENSIONS) and entry.is_file():
+                            images.append((f"{media}/{entry.name}", media, entry))
+            except FileNotFoundError:
+                continue
+
+        return images
+
+    def scan(self, progress: callable = None, should_stop: callable = None) -> list[GameEntry] | None:
+        """Updates the index with the images of the share and saves it. Can be called from a worker thread.
+
+        Only the images whose signature changed are read, so rescanning a share that didn't change only costs
+        the listing of its folders.
+
+        Args:
+            progress (callable): Called with the number of images checked and the total, every 100 images.
+            should_stop (callable): Checked before each image. If it returns True, the scan stops and the index is kept as it was.
+
+        Returns:
+            list[GameEntry]: The games found, sorted by title. None if the scan was stopped.
+        """
+
+        with self.__scan_lock:
+            images = self.list_images()
+            by_path, by_signature = self.__map_games()
+            games = []
+            read_count = 0
+
+            for count, (relative_path, media, entry) in enumerate(images, start=1):
+                if should_stop is not None and should_stop():
+                    return None
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Removed or renamed since the folders were listed (e.g. during a copy), left out like a removed image
+                    continue
+
+                game, was_read = self.__get_entry(relative_path, media, entry.path, stat, by_path, by_signature)
+                games.append(game)
+                read_count += was_read
+
+                if progress is not None and count % 100 == 0:
+                    progress(count, len(images))
+
+            logger.debug("Biblioteca verificada: %d imagem(ns), %d lida(s).", len(images), read_count)
+
+            self.__set_games(games)
+            return games
+
+    def apply_changes(self, relative_paths: list[str]) -> list[GameEntry]:
+        """Updates only the given images in the index (e.g. the files reported by inotify) and saves it.
+
+        Paths that no longer exist are removed, new or changed images are read and the others are kept. Paths
+        outside the DVD and CD folders or without an image extension are ignored.
+
+        Args:
+            relative_paths (list[str]): Paths relative to the share folder (e.g. 'DVD/Game.iso').
+
+        Returns:
+            list[GameEntry]: The games of the updated index, sorted by title.
+        """
+
+        with self.__scan_lock:
+            by_path, by_signature = self.__map_games()
+            games = {game.path: game for game in self.__games}
+
+            for relative_path in set(relative_paths):
+                media, _, file_name = relative_path.partition("/")
+
+                if media not in self.MEDIA_FOLDERS or "/" in file_name or not file_name.lower().endswith(self.IMAGE_EXTENSIONS):
+                    continue
+
+                path = os.path.join(self.share_path, relative_path)
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+
+                if stat is None or not S_ISREG(stat.st_mode):
+                    games.pop(relative_path, None)
+                    continue
+
+                games[relative_path], _ = self.__get_entry(relative_path, media, path, stat, by_path, by_signature)
+
+            games = list(games.values())
+            self.__set_games(games)
+            return games
+
+    def __map_games(self) -> tuple[dict[str, GameEntry], dict[tuple[int, int, int], GameEntry]]:
+        """Returns the games of the index by path and by signature."""
+
+        return {game.path: game for game in self.__games}, {game.signature: game for game in self.__games}
+
+    def __get_entry(self, relative_path: str, media: str, path: str, stat: os.stat_result,
+                    by_path: dict[str, GameEntry], by_signature: dict[tuple[int, int, int], GameEntry]) -> tuple[GameEntry, bool]:
+        """Returns the entry of an image, reusing the indexed one if the image didn't change.
+
+        Returns:
+            tuple[GameEntry, bool]: The entry and whether the image was read.
+        """
+
+        signature = GameEntry.get_signature(stat)
+        game = by_path.get(relative_path)
+
+        if game is not None and game.signature == signature:
+            return game, False
+
+        # Renamed or moved between DVD and CD: same inode, size and mtime. Only the title comes from the new name
+        game = by_signature.get(signature)
+
+        if game is not None:
+            game_id_from_name, title = self.parse_file_name(os.path.basename(relative_path))
+            return GameEntry(relative_path, game.game_id or game_id_from_name, title, game.size, media, game.mtime_ns, game.inode), False
+
+        return self.read_game(relative_path, media, path, stat), True
+
+    def __set_games(self, games: list[GameEntry]) -> None:
+        """Sorts the games and saves the index if it changed."""
+
+        games.sort(key=lambda game: (game.title.lower(), game.path))
+
+        changed = [(game.path, game.signature) for game in games] != [(game.path, game.signature) for game in self.__games]
+        self.__games = games
+
+        if not changed and os.path.exists(self.index_path):
+            return
+
+        try:
+            self.save_index()
+        except OSError as e:
+            logger.warning("Não foi possível salvar o índice da biblioteca em %s: %s", self.index_path, e)
+
+    def read_game(self, relative_path: str, media: str, path: str, stat: os.stat_result) -> GameEntry:
+        """Reads the game ID of an image and creates its entry. Images that can't be read get an empty ID."""
+
+        game_id_from_name, title = self.parse_file_name(os.path.basename(relative_path))
+
+        try:
+            game_id = self.read_game_id(path) or game_id_from_name
+        except (OSError, ValueError) as e:
+            logger.warning("Não foi possível ler o ID do jogo em '%s': %s", relative_path, e)
+            game_id = game_id_from_name
+
+        return GameEntry(relative_path, game_id, title, stat.st_size, media, stat.st_mtime_ns, stat.st_ino)
+
+    @classmethod
+    def detect_media(cls, path: str) -> str:
+        """Detects if an image is a CD or a DVD, to know in which folder of the share OPL looks for it.
+
+        The size of the volume is read from the ISO9660 primary volume descriptor. If the image has none, the size
+        of the file (uncompressed, for ZSO images) is used.
+
+        Args:
+            path (str): The path of the image.
+
+        Returns:
+            str: 'CD' or 'DVD'.
+
+        Raises:
+            OSError: If the image can't be read.
+            ValueError: If a ZSO image is invalid.
+        """
+
+        offset = cls.FIRST_DESCRIPTOR_SECTOR * cls.SECTOR_SIZE
+
+        if path.lower().endswith(".zso"):
+            with ZsoImage(path) as image:
+                sectors = image.total_bytes // cls.SECTOR_SIZE
+                descriptor = image[offset:offset + cls.SECTOR_SIZE]
+        else:
+            with open(path, "rb") as image_file:
+                sectors = os.fstat(image_file.fileno()).st_size // cls.SECTOR_SIZE
+                descriptor = os.pread(image_file.fileno(), cls.SECTOR_SIZE, offset)
+
+        if len(descriptor) == cls.SECTOR_SIZE and descriptor[0] == 1 and descriptor[1:6] == b"CD001":
+            sectors = struct.unpack_from("<I", descriptor, cls.VOLUME_SPACE_OFFSET)[0]
+
+        return "CD" if sectors <= cls.MAX_CD_SECTORS else "DVD"
+
+    @classmethod
+    def parse_file_name(cls, file_name: str) -> tuple[str, str]:
+        """Returns the game ID (empty if the name has none) and the title of an image from its file name."""
+
+        stem = os.path.splitext(file_name)[0]
+        match = cls.FILE_NAME_ID_PATTERN.match(stem)
+
+        if match is not None:
+            return match.group(1).replace("-", "_"), match.group(2)
+
+        return "", stem
+
+    @classmethod
+    def read_game_id(cls, path: str) -> str:
+        """Reads the game ID from the SYSTEM.CNF file of an ISO9660 image (or of a ZSO image of it).
+
+        Args:
+            path (str): The path of the image.
+
+        Returns:
+            str: The game ID (e.g. 'SLUS_123.45'), or an empty string if the disc has no SYSTEM.CNF.
+
+        Raises:
+            OSError: If the image can't be read.
+            ValueError: If the file is not an ISO9660 image.
+        """
+
+        if path.lower().endswith(".zso"):
+            with ZsoImage(path) as image:
+                if image.total_bytes < (cls.FIRST_DESCRIPTOR_SECTOR + 1) * cls.SECTOR_SIZE:
+                    raise ValueError("O arquivo é pequeno demais para ser uma imagem ISO9660.")
+
+                system_cnf = cls.read_root_file(image, b"SYSTEM.CNF")
+        else:
+            with open(path, "rb") as image_file:
+                if os.fstat(image_file.fileno()).st_size < (cls.FIRST_DESCRIPTOR_SECTOR + 1) * cls.SECTOR_SIZE:
+                    raise ValueError("O arquivo é pequeno demais para ser uma imagem ISO9660.")
+
+                with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                    system_cnf = cls.read_root_file(image, b"SYSTEM.CNF")
+
+        if system_cnf is None:
+            return ""
+
+        return cls.parse_system_cnf(system_cnf)
+
+    @classmethod
+    def read_root_file(cls, image: mmap.mmap | ZsoImage, name: bytes) -> bytes | None:
+        """Reads a file of the root directory of an ISO9660 image.
+
+        Args:
+            image (mmap.mmap | ZsoImage): The memory map of the image, or the ZSO image.
+            name (bytes): The name of the file, without the version (';1').
+
+        Returns:
+            bytes: The contents of the file (up to MAX_SYSTEM_CNF_SIZE), or None if it was not found.
+
+        Raises:
+            ValueError: If the image has no primary volume descriptor.
+        """
+
+        # Looking for the primary volume descriptor (type 1) in the volume descriptor set
+        sector = cls.FIRST_DESCRIPTOR_SECTOR
+
+        while True:
+            offset = sector * cls.SECTOR_SIZE
+            descriptor = image[offset:offset + cls.SECTOR_SIZE]
+
+            if len(descriptor) < cls.SECTOR_SIZE or descriptor[1:6] != b"CD001" or descriptor[0] == 255:
+                raise ValueError("Descritor de volume primário ISO9660 não encontrado.")
+
+            if descriptor[0] == 1:
+                break
+
+            sector += 1
+
+        block_size = struct.unpack_from("<H", descriptor, 128)[0] or cls.SECTOR_SIZE
+        root_extent, root_size = struct.unpack_from("<I4xI", descriptor, cls.ROOT_RECORD_OFFSET + 2)
+
+        directory = image[root_extent * block_size:root_extent * block_size + root_size]
+        name = name.upper()
+        position = 0
+
+        while position < len(directory):
+            record_length = directory[position]
+
+            if record_length == 0:
+                # The records don't cross sector boundaries, the rest of the sector is padding
+                position = (position // cls.SECTOR_SIZE + 1) * cls.SECTOR_SIZE
+                continue
+
+            if record_length < 34 or position + record_length > len(directory):
+                raise ValueError("Registro de diretório ISO9660 inválido.")
+
+            record = directory[position:position + record_length]
+            name_length = record[32]
+            record_name = record[33:33 + name_length].split(b";")[0].upper()
+
+            if record_name == name:
+                extent, size = struct.unpack_from("<I4xI", record, 2)
+                size = min(size, cls.MAX_SYSTEM_CNF_SIZE)
+
+                return image[extent * block_size:extent * block_size + size]
+
+            position += record_length
+
+        return None
+
+    @classmethod
+    def parse_system_cnf(cls, system_cnf: bytes) -> str:
+        """Returns the game ID of the boot line of a SYSTEM.CNF file, or an empty string if it has none."""
+
+        match = cls.BOOT_LINE_PATTERN.search(system_cnf)
+
+        if match is None:
+            return ""
+
+        # The boot file is the executable of the game, named after its ID (e.g. 'SLUS_123.45')
+        boot_file = match.group(1).decode("ascii", errors="replace").strip()
+        return boot_file.replace("/", "\\").split("\\")[-1]
+
+    # --- INDEX ---
+
+    def load_index(self) -> bool:
+        """Loads the games from the index file.
+
+        Returns:
+            bool: True if the index was loaded, False if it doesn't exist, is invalid or belongs to another share folder.
+        """
+
+        try:
+            with open(self.index_path, "rb") as index_file:
+                data = index_file.read()
+        except OSError:
+            return False
+
+        try:
+            games = self.__decode_index(data)
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+            logger.warning("O índice da biblioteca %s é inválido e será ignorado: %s", self.index_path, e)
+            return False
+
+        if games is None:
+            return False
+
+        self.__games = games
+        return True
+
+    def save_index(self) -> None:
+        """Saves the games to the index file atomically.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+
+        index_dir = os.path.dirname(self.index_path)
+        os.makedirs(index_dir, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".library.", dir=index_dir)
+
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(self.__encode_index(self.__games))
+
+            os.replace(temp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def __encode_index(self, games: list[GameEntry]) -> bytes:
+        share_path = self.share_path.encode("utf-8")
+        parts = [self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, len(games), len(share_path)), share_path]
+
+        for game in games:
+            path, game_id, title = game.path.encode("utf-8"), game.game_id.encode("ascii", errors="replace"), game.title.encode("utf-8")
+
+            parts.append(self.INDEX_ENTRY.pack(game.size, game.mtime_ns, game.inode, self.MEDIA_FOLDERS.index(game.media),
+                                               len(path), len(game_id), len(title)))
+            parts.append(path)
+            parts.append(game_id)
+            parts.append(title)
+
+        return b"".join(parts)
+
+    def __decode_index(self, data: bytes) -> list[GameEntry] | None:
+        """Decodes the index. Returns None if it belongs to another version or share folder."""
+
+        magic, version, count, share_path_length = self.INDEX_HEADER.unpack_from(data, 0)
+
+        if magic != self.INDEX_MAGIC:
+            raise ValueError("assinatura inválida")
+
+        if version != self.INDEX_VERSION:
+            return None
+
+        offset = self.INDEX_HEADER.size
+        share_path = data[offset:offset + share_path_length].decode("utf-8")
+        offset += share_path_length
+
+        if share_path != self.share_path:
+            return None
+
+        games = []
+
+        for _ in range(count):
+            size, mtime_ns, inode, media, path_length, game_id_length, title_length = self.INDEX_ENTRY.unpack_from(data, offset)
+            offset += self.INDEX_ENTRY.size
+
+            path = data[offset:offset + path_length].decode("utf-8")
+            offset += path_length
+            game_id = data[offset:offset + game_id_length].decode("ascii")
+            offset += game_id_length
+            title = data[offset:offset + title_length].decode("utf-8")
+            offset += title_length
+
+            games.append(GameEntry(path, game_id, title, size, self.MEDIA_FOLDERS[media], mtime_ns, inode))
+
+        if offset != len(data):
+            raise ValueError("tamanho inconsistente")
+
+        return games
@@ -0,0 +1,562 @@
+import os
+import zlib
+import time
+import errno
+import struct
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.Logger import get_logger
+from modules.GameLibrary import GameLibrary
+from modules.ZsoConverter import ZsoImage, ZSO_PLAIN_FLAG, decompress_blocks
+
+logger = get_logger("library")
+
+# File where the hashes of the images are kept between the executions
+HASH_CACHE_PATH = "/var/cache/ps2_network_manager/hashes.idx"
+
+class ImageHash:
+    """The result of the verification of an image.
+
+    Attributes:
+        path (str): The path of the image.
+        size (int): Size of the image in bytes.
+        data_size (int): Size of the hashed data: the uncompressed size for ZSO images, the size of the file otherwise.
+        crc32 (int): CRC32 of the whole image (of the uncompressed data, for ZSO images).
+        sha1 (str): SHA-1 of the whole image (of the uncompressed data, for ZSO images), in hexadecimal.
+        cached (bool): If the hashes came from the cache or the xattrs instead of reading the image.
+        problems (list[str]): Problems found in the structure of the image (e.g. truncated file).
+        error (str): Why the image couldn't be read. Empty if it was read.
+    """
+
+    __slots__ = ("path", "size", "data_size", "crc32", "sha1", "cached", "problems", "error")
+
+    def __init__(self, path: str, size: int = 0, crc32: int = 0, sha1: str = "", cached: bool = False, error: str = ""):
+        self.path = path
+        self.size = size
+        self.data_size = size
+        self.crc32 = crc32
+        self.sha1 = sha1
+        self.cached = cached
+        self.problems = []
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """If the image was read and no problems were found."""
+
+        return not self.error and not self.problems
+
+    def __repr__(self) -> str:
+        return f"ImageHash({self.path!r}, {self.size}, {self.crc32:08x}, {self.sha1!r})"
+
+# --- WORKER PROCESSES ---
+
+# Shared with the worker processes by the pool initializer
+_bytes_hashed = None
+_stop_event = None
+
+def _init_worker(bytes_hashed, stop_event) -> None:
+    global _bytes_hashed, _stop_event
+
+    _bytes_hashed = bytes_hashed
+    _stop_event = stop_event
+
+def hash_image(path: str, chunk_size: int) -> tuple[int, str]:
+    """Computes the CRC32 and the SHA-1 of a file, reading it in chunks into a reused buffer.
+
+    Runs in the worker processes. The pages already hashed are dropped from the page cache, so verifying the
+    library doesn't evict the files smbd is serving. ZSO images are hashed decompressed (see hash_zso_image).
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): Size of each read in bytes.
+
+    Returns:
+        tuple[int, str]: The CRC32 and the SHA-1 in hexadecimal.
+
+    Raises:
+        OSError: If the file can't be read.
+        ValueError: If a ZSO image is corrupted, or lz4 is not installed.
+        InterruptedError: If the verification was stopped.
+    """
+
+    if path.lower().endswith(".zso"):
+        return hash_zso_image(path, chunk_size)
+
+    crc32 = 0
+    sha1 = hashlib.sha1()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    offset = 0
+
+    with open(path, "rb", buffering=0) as image_file:
+        fd = image_file.fileno()
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        while True:
+            if _stop_event is not None and _stop_event.is_set():
+                raise InterruptedError(errno.EINTR, "Verificação interrompida", path)
+
+            length = image_file.readinto(buffer)
+
+            if not length:
+                break
+
+            # zlib and hashlib release the GIL and don't copy the memoryview
+            chunk = view[:length]
+            crc32 = zlib.crc32(chunk, crc32)
+            sha1.update(chunk)
+
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+            offset += length
+
+            if _bytes_hashed is not None:
+                with _bytes_hashed.get_lock():
+                    _bytes_hashed.value += length
+
+    return crc32, sha1.hexdigest()
+
+def hash_zso_image(path: str, chunk_size: int) -> tuple[int, str]:
+    """Computes the CRC32 and the SHA-1 of the uncompressed data of a ZSO image, so they match the ISO in the DATs.
+
+    Runs in the worker processes. The blocks are decompressed in ranges of about chunk_size bytes of ISO.
+
+    Raises:
+        OSError: If the image can't be read or is truncated.
+        ValueError: If the image is not a ZSO image, a block is corrupted, or lz4 is not installed.
+        InterruptedError: If the verification was stopped.
+    """
+
+    crc32 = 0
+    sha1 = hashlib.sha1()
+
+    with open(path, "rb", buffering=0) as zso_file:
+        total_bytes, block_size, align, index = ZsoImage.read_header(zso_file)
+        os.posix_fadvise(zso_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    total_blocks = len(index) - 1
+    batch_blocks = max(chunk_size // block_size, 1)
+
+    for first in range(0, total_blocks, batch_blocks):
+        if _stop_event is not None and _stop_event.is_set():
+            raise InterruptedError(errno.EINTR, "Verificação interrompida", path)
+
+        last = min(first + batch_blocks, total_blocks)
+        data = decompress_blocks(path, first, index[first:last + 1], align, block_size, total_bytes)
+
+        crc32 = zlib.crc32(data, crc32)
+        sha1.update(data)
+
+        if _bytes_hashed is not None:
+            # The progress counts the bytes read from the disk, as the total is the size of the files
+            with _bytes_hashed.get_lock():
+                _bytes_hashed.value += ((index[last] & ~ZSO_PLAIN_FLAG) - (index[first] & ~ZSO_PLAIN_FLAG)) << align
+
+    return crc32, sha1.hexdigest()
+
+class ImageVerifier:
+    """Verifies the integrity of the images of the PS2 share folder by hashing them (CRC32 and SHA-1).
+
+    The images are hashed by a pool of processes. Each disk gets as many readers as it handles well (one for
+    rotational disks, so the heads don't seek between files, and one per core for SSDs), and the files of
+    different disks are hashed at the same time, so the throughput grows with the cores and the disks.
+
+    The hashes are saved in a cache keyed on the (size, mtime_ns, inode) signature of each file and, if enabled,
+    in the 'user.ps2nm.hash' xattr of the file, so an image is only read again when it changes. The xattr goes
+    with the file when it is moved or copied with its attributes.
+
+    ZSO images are hashed decompressed, so their hashes are the ones of the ISO and can be found in the DATs.
+    """
+
+    CHUNK_SIZE = 8 * 1024 * 1024
+
+    SECTOR_SIZE = 2048
+
+    XATTR_NAME = "user.ps2nm.hash"
+
+    # Last field of the xattr of the ZSO images, whose hashes are of the uncompressed data. The xattrs written
+    # without it have the hashes of the compressed file
+    XATTR_ZSO_TAG = "iso"
+
+    # Interval in seconds between the calls of the progress callback
+    PROGRESS_INTERVAL = 1.0
+
+    # Readers of a disk whose type couldn't be found (network or virtual file systems)
+    DEFAULT_READERS_PER_DEVICE = 2
+
+    # Cache file: magic, version and number of entries, then the entries
+    CACHE_MAGIC = b"PS2NMHSH"
+    CACHE_VERSION = 2
+    CACHE_HEADER = struct.Struct("<8sHI")
+    CACHE_ENTRY = struct.Struct("<QqQI20sH")  # size, mtime_ns, inode, crc32, sha1, len(path)
+
+    def __init__(self, cache_path: str = HASH_CACHE_PATH, use_xattrs: bool = True, max_workers: int | None = None):
+        """
+        Args:
+            cache_path (str): The file where the hashes are saved.
+            use_xattrs (bool): If the hashes are also read from and written to the xattrs of the images.
+            max_workers (int): Maximum number of worker processes. Defaults to the number of cores.
+        """
+
+        self.cache_path = cache_path
+        self.use_xattrs = use_xattrs
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+        self.__cache = {}  # path -> ((size, mtime_ns, inode), crc32, sha1)
+        self.__cache_changed = False
+        self.__cache_lock = threading.Lock()
+        self.__verify_lock = threading.Lock()
+
+    # --- CACHE ---
+
+    def get_cached(self, path: str, stat: os.stat_result) -> ImageHash | None:
+        """Returns the hashes of a file from the cache or its xattr, or None if they are unknown or the file changed."""
+
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        with self.__cache_lock:
+            entry = self.__cache.get(path)
+
+        if entry is not None and entry[0] == signature:
+            return ImageHash(path, stat.st_size, entry[1], entry[2], cached=True)
+
+        if not self.use_xattrs:
+            return None
+
+        try:
+            value = os.getxattr(path, self.XATTR_NAME).decode("ascii")
+
+            if path.lower().endswith(".zso"):
+                value, tag = value.rsplit(":", 1)
+
+                if tag != self.XATTR_ZSO_TAG:
+                    return None
+
+            size, mtime_ns, crc32, sha1 = value.split(":")
+
+            if (int(size), int(mtime_ns)) != signature[:2] or len(sha1) != 40:
+                return None
+
+            result = ImageHash(path, stat.st_size, int(crc32, 16), sha1, cached=True)
+        except (OSError, ValueError):
+            return None
+
+        self.__store(path, signature, result, write_xattr=False)
+        return result
+
+    def __store(self, path: str, signature: tuple[int, int, int], result: ImageHash, write_xattr: bool = True) -> None:
+        with self.__cache_lock:
+            self.__cache[path] = (signature, result.crc32, result.sha1)
+            self.__cache_changed = True
+
+        if not (write_xattr and self.use_xattrs):
+            return
+
+        value = f"{signature[0]}:{signature[1]}:{result.crc32:08x}:{result.sha1}"
+
+        if path.lower().endswith(".zso"):
+            value += f":{self.XATTR_ZSO_TAG}"
+
+        try:
+            os.setxattr(path, self.XATTR_NAME, value.encode("ascii"))
+        except OSError as e:
+            # File systems without user xattrs (e.g. some FUSE and network mounts) only use the cache
+            logger.debug("Não foi possível gravar o xattr de '%s': %s", path, e)
+
+    def load_cache(self) -> bool:
+        """Loads the hashes from the cache file.
+
+        Returns:
+            bool: True if the cache was loaded, False if it doesn't exist or is invalid.
+        """
+
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return False
+
+        try:
+            cache = self.__decode_cache(data)
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            logger.warning("O cache de verificação %s é inválido e será ignorado: %s", self.cache_path, e)
+            return False
+
+        with self.__cache_lock:
+            self.__cache = cache
+            self.__cache_changed = False
+
+        return True
+
+    def save_cache(self) -> None:
+        """Saves the hashes to the cache file atomically, if they changed. Entries of files that don't exist anymore are dropped.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+
+        with self.__cache_lock:
+            if not self.__cache_changed:
+                return
+
+            self.__cache = {path: entry for path, entry in self.__cache.items() if os.path.exists(path)}
+            data = self.__encode_cache(self.__cache)
+            self.__cache_changed = False
+
+        cache_dir = os.path.dirname(self.cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".hashes.", dir=cache_dir)
+
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+
+            os.replace(temp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def __encode_cache(self, cache: dict) -> bytes:
+        parts = [self.CACHE_HEADER.pack(self.CACHE_MAGIC, self.CACHE_VERSION, len(cache))]
+
+        for path, ((size, mtime_ns, inode), crc32, sha1) in cache.items():
+            encoded_path = os.fsencode(path)
+
+            parts.append(self.CACHE_ENTRY.pack(size, mtime_ns, inode, crc32, bytes.fromhex(sha1), len(encoded_path)))
+            parts.append(encoded_path)
+
+        return b"".join(parts)
+
+    def __decode_cache(self, data: bytes) -> dict:
+        magic, version, count = self.CACHE_HEADER.unpack_from(data, 0)
+
+        if magic != self.CACHE_MAGIC:
+            raise ValueError("assinatura inválida")
+
+        if version not in (1, self.CACHE_VERSION):
+            return {}
+
+        offset = self.CACHE_HEADER.size
+        cache = {}
+
+        for _ in range(count):
+            size, mtime_ns, inode, crc32, sha1, path_length = self.CACHE_ENTRY.unpack_from(data, offset)
+            offset += self.CACHE_ENTRY.size
+
+            path = os.fsdecode(data[offset:offset + path_length])
+            offset += path_length
+
+            # The version 1 has the hashes of the compressed ZSO images, which are hashed again
+            if version == 1 and path.lower().endswith(".zso"):
+                continue
+
+            cache[path] = ((size, mtime_ns, inode), crc32, sha1.hex())
+
+        if offset != len(data):
+            raise ValueError("tamanho inconsistente")
+
+        return cache
+
+    # --- VERIFICATION ---
+
+    def verify(self, paths: list[str], progress: callable = None, should_stop: callable = None) -> list[ImageHash] | None:
+        """Verifies the images, hashing only the ones that are not in the cache. Can be called from a worker thread.
+
+        Args:
+            paths (list[str]): The paths of the images.
+            progress (callable): Called about once per second with the bytes hashed, the bytes to hash, the files
+                done and the files to hash.
+            should_stop (callable): Checked while the images are hashed. If it returns True, the verification stops.
+
+        Returns:
+            list[ImageHash]: The results, in the order of the paths. None if the verification was stopped.
+        """
+
+        with self.__verify_lock:
+            results = {}
+            pending = {}  # device -> [(path, stat)]
+
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    results[path] = ImageHash(path, error=e.strerror or str(e))
+                    continue
+
+                cached = self.get_cached(path, stat)
+
+                if cached is not None:
+                    results[path] = cached
+                else:
+                    pending.setdefault(stat.st_dev, []).append((path, stat))
+
+            if pending:
+                hashed = self.__hash_pending(pending, progress, should_stop)
+
+                if hashed is None:
+                    return None
+
+                results.update(hashed)
+
+            for result in results.values():
+                if not result.error:
+                    self.check_structure(result)
+
+            try:
+                self.save_cache()
+            except OSError as e:
+                logger.warning("Não foi possível salvar o cache de verificação em %s: %s", self.cache_path, e)
+
+            return [results[path] for path in paths]
+
+    def __hash_pending(self, pending: dict, progress: callable, should_stop: callable) -> dict[str, ImageHash] | None:
+        """Hashes the files of each device in the process pool, respecting the number of readers of each device."""
+
+        total_files = sum(len(files) for files in pending.values())
+        total_bytes = sum(stat.st_size for files in pending.values() for _, stat in files)
+
+        readers = {device: self.get_readers_per_device(device) for device in pending}
+        running = {device: 0 for device in pending}
+        workers = min(self.max_workers, total_files, sum(readers.values()))
+
+        logger.debug("Verificando %d arquivo(s) em %d disco(s) com %d processo(s).", total_files, len(pending), workers)
+
+        # forkserver: the workers are not forked from the GUI process and its threads
+        context = multiprocessing.get_context("forkserver")
+        bytes_hashed = context.Value("Q", 0)
+        stop_event = context.Event()
+
+        results = {}
+        futures = {}
+
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(bytes_hashed, stop_event)) as executor:
+            def submit():
+                for device, files in pending.items():
+                    while files and running[device] < readers[device] and len(futures) < workers:
+                        path, stat = files.pop(0)
+                        futures[executor.submit(hash_image, path, self.CHUNK_SIZE)] = (device, path, stat)
+                        running[device] += 1
+
+            submit()
+            last_progress = time.monotonic()
+
+            while futures:
+                done, _ = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+
+                if should_stop is not None and should_stop():
+                    stop_event.set()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    return None
+
+                for future in done:
+                    device, path, stat = futures.pop(future)
+                    running[device] -= 1
+
+                    try:
+                        crc32, sha1 = future.result()
+                    except OSError as e:
+                        results[path] = ImageHash(path, stat.st_size, error=e.strerror or str(e))
+                        continue
+                    except ValueError as e:
+                        # A corrupted ZSO image
+                        results[path] = ImageHash(path, stat.st_size, error=str(e))
+                        continue
+
+                    result = ImageHash(path, stat.st_size, crc32, sha1)
+                    results[path] = result
+                    self.__store(path, (stat.st_size, stat.st_mtime_ns, stat.st_ino), result)
+
+                submit()
+
+                now = time.monotonic()
+                if progress is not None and now - last_progress >= self.PROGRESS_INTERVAL:
+                    progress(bytes_hashed.value, total_bytes, len(results), total_files)
+                    last_progress = now
+
+        if progress is not None:
+            progress(bytes_hashed.value, total_bytes, len(results), total_files)
+
+        return results
+
+    def check_structure(self, result: ImageHash) -> None:
+        """Looks for problems in the structure of an ISO (or ZSO) image that was read, like an incomplete copy. Other files are only hashed."""
+
+        if not result.path.lower().endswith(GameLibrary.IMAGE_EXTENSIONS):
+            return
+
+        if result.path.lower().endswith(".zso"):
+            if not self.__check_zso_structure(result):
+                return
+
+        # The size of a ZSO image doesn't follow the sectors, its blocks are checked by the index
+        elif result.size % self.SECTOR_SIZE != 0:
+            result.problems.append(f"O tamanho não é múltiplo de {self.SECTOR_SIZE} bytes (cópia incompleta?).")
+
+        try:
+            GameLibrary.read_game_id(result.path)
+        except ValueError as e:
+            result.problems.append(f"Imagem ISO9660 inválida: {e}")
+        except OSError as e:
+            result.error = e.strerror or str(e)
+
+    @staticmethod
+    def __check_zso_structure(result: ImageHash) -> bool:
+        """Reads the index of a ZSO image, checks that the file has all its blocks and sets the size of its data.
+
+        Returns:
+            bool: False if the image is invalid and nothing else can be checked.
+        """
+
+        try:
+            with open(result.path, "rb", buffering=0) as zso_file:
+                total_bytes, _, align, index = ZsoImage.read_header(zso_file)
+        except ValueError as e:
+            result.problems.append(f"Imagem ZSO inválida: {e}")
+            return False
+        except OSError as e:
+            result.error = e.strerror or str(e)
+            return False
+
+        result.data_size = total_bytes
+
+        # A cached result (from the xattr, which is copied with the file) doesn't read the blocks
+        end = (index[-1] & ~ZSO_PLAIN_FLAG) << align
+
+        if result.size < end:
+            result.problems.append(f"O arquivo tem {result.size} bytes, mas o índice vai até {end} bytes (cópia incompleta?).")
+            return False
+
+        return True
+
+    @classmethod
+    def get_readers_per_device(cls, device: int) -> int:
+        """Returns how many files of a device are read at the same time: 1 for rotational disks, one per core for SSDs."""
+
+        rotational = cls.is_rotational(device)
+
+        if rotational is None:
+            return cls.DEFAULT_READERS_PER_DEVICE
+
+        return 1 if rotational else os.cpu_count() or 1
+
+    @staticmethod
+    def is_rotational(device: int) -> bool | None:
+        """Checks if a device (st_dev) is a rotational disk. Returns None if it is not a block device (e.g. network file systems)."""
+
+        block_path = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+
+        # Partitions don't have a queue, it belongs to the whole disk
+        for queue_path in (f"{block_path}/queue/rotational", f"{block_path}/../queue/rotational"):
+            try:
+                with open(queue_path) as rotational_file:
+                    return rotational_file.read().strip() == "1"
+            except OSError:
+                continue
+
+        return None
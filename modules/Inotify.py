@@ -0,0 +1,124 @@
+import os
+import ctypes
+import select
+import struct
+
+class InotifyEvent:
+    """An event read from inotify.
+
+    Attributes:
+        wd (int): The watch descriptor of the folder where the event happened.
+        mask (int): The IN_* flags of the event.
+        cookie (int): Connects the IN_MOVED_FROM and IN_MOVED_TO events of the same rename.
+        name (str): The name of the file inside the watched folder. Empty for events of the folder itself.
+    """
+
+    __slots__ = ("wd", "mask", "cookie", "name")
+
+    def __init__(self, wd: int, mask: int, cookie: int, name: str):
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"InotifyEvent(wd={self.wd}, mask={self.mask:#x}, cookie={self.cookie}, name={self.name!r})"
+
+class Inotify:
+    """Minimal wrapper of the Linux inotify API (through libc), to watch folders without polling them.
+
+    Raises:
+        OSError: If inotify is not available or a watch can't be added.
+    """
+
+    # Events (from <sys/inotify.h>)
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+
+    # Flags of the events read
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    # Flags of inotify_add_watch and inotify_init1
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.__libc = ctypes.CDLL(None, use_errno=True)
+        self.__libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.__fd = self.__libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+
+        if self.__fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def fileno(self) -> int:
+        return self.__fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watches a folder. Returns the watch descriptor, which is the same if the folder was already watched."""
+
+        wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), mask)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """Stops watching a folder. Errors are ignored, the watch is already gone if the folder was removed."""
+
+        self.__libc.inotify_rm_watch(self.__fd, wd)
+
+    def read_events(self, timeout: float | None = None) -> list[InotifyEvent]:
+        """Waits for events and returns all the events available.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds. None waits forever.
+
+        Returns:
+            list[InotifyEvent]: The events read. Empty if the time ran out.
+        """
+
+        readable, _, _ = select.select([self.__fd], [], [], timeout)
+
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.__fd, self.READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            events.append(InotifyEvent(wd, mask, cookie, name))
+
+        return events
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
@@ -0,0 +1,196 @@
+import os
+import time
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from modules.Inotify import Inotify
+from modules.GameLibrary import GameLibrary
+from modules.Logger import get_logger
+
+logger = get_logger("library")
+
+class LibraryWatcher(QThread):
+    """Watches the PS2 share folder with inotify and keeps the game library up to date while the server runs.
+
+    The DVD and CD folders are applied to the library incrementally: only the images that were added, changed,
+    removed or renamed are updated. The events are debounced, so a burst (e.g. copying many games) is applied
+    at once when the folder is quiet for DEBOUNCE_INTERVAL seconds, or after MAX_DELAY seconds at most.
+    Changes to the folders themselves (created, removed, renamed) or lost events cause a full scan, which is
+    still cheap because the unchanged images are not read again.
+
+    Attributes:
+        library (GameLibrary): The library of the share folder that is watched.
+        running (bool): Flag to control the thread execution.
+    """
+
+    # Folders of the share used by OPL
+    WATCHED_FOLDERS = ("DVD", "CD", "ART", "CFG", "VMC")
+
+    # Seconds without events before the pending changes are applied, and the maximum wait during a long burst
+    DEBOUNCE_INTERVAL = 1.0
+    MAX_DELAY = 10.0
+
+    # Seconds to wait for events, so stop() is noticed quickly
+    POLL_INTERVAL = 0.2
+
+    ROOT_MASK = Inotify.IN_CREATE | Inotify.IN_DELETE | Inotify.IN_MOVED_FROM | Inotify.IN_MOVED_TO | \
+                Inotify.IN_DELETE_SELF | Inotify.IN_MOVE_SELF | Inotify.IN_ONLYDIR
+
+    # IN_CREATE is not watched in the folders: a file being copied is only read when it is closed (IN_CLOSE_WRITE)
+    FOLDER_MASK = Inotify.IN_CLOSE_WRITE | Inotify.IN_ATTRIB | Inotify.IN_DELETE | Inotify.IN_MOVED_FROM | \
+                  Inotify.IN_MOVED_TO | Inotify.IN_ONLYDIR
+
+    # Signal to send the games (list[GameEntry]) after the library is updated
+    library_updated = pyqtSignal(object)
+
+    # Signal to send the changed paths (list[str], relative to the share) of the ART, CFG and VMC folders
+    share_changed = pyqtSignal(object)
+
+    # Signal to notify that the share folder can't be watched anymore: (error message)
+    watch_failed = pyqtSignal(str)
+
+    def __init__(self, library: GameLibrary):
+        """
+        Args:
+            library (GameLibrary): The library of the share folder to watch.
+        """
+
+        super().__init__()
+        self.library = library
+        self.running = True  # Control flag to stop the thread
+
+        self.__inotify = None
+        self.__root_wd = -1
+        self.__folders = {}  # Watch descriptor -> folder name
+
+    def run(self):
+        """Watches the share folder until the thread is stopped."""
+
+        try:
+            self.__inotify = Inotify()
+            self.__root_wd = self.__inotify.add_watch(self.library.share_path, self.ROOT_MASK)
+            self.__watch_folders()
+        except OSError as e:
+            logger.error("ERROR: The share folder %s can't be watched: %s", self.library.share_path, e)
+            self.watch_failed.emit(str(e))
+            self.__close()
+            return
+
+        try:
+            # Catch up with the changes made while the folder wasn't watched
+            self.__update_library(None)
+            self.__watch()
+        finally:
+            self.__close()
+
+    def __watch(self) -> None:
+        pending = set()
+        share_pending = set()
+        full_scan = False
+        first_event = last_event = 0.0
+
+        while self.running:
+            events = self.__inotify.read_events(self.POLL_INTERVAL)
+            now = time.monotonic()
+
+            for event in events:
+                if event.mask & Inotify.IN_Q_OVERFLOW:
+                    # Events were lost, only a scan knows what changed
+                    full_scan = True
+
+                elif event.wd == self.__root_wd:
+                    if event.mask & (Inotify.IN_DELETE_SELF | Inotify.IN_MOVE_SELF):
+                        logger.error("ERROR: The share folder %s was removed or moved.", self.library.share_path)
+                        self.watch_failed.emit("A pasta compartilhada foi removida ou movida.")
+                        return
+
+                    if event.name in self.WATCHED_FOLDERS:
+                        full_scan = True
+
+                elif event.mask & Inotify.IN_IGNORED:
+                    # The folder was removed or moved, the root watch reports it
+                    self.__folders.pop(event.wd, None)
+
+                elif event.wd in self.__folders and event.name:
+                    folder = self.__folders[event.wd]
+                    relative_path = f"{folder}/{event.name}"
+
+                    if folder in GameLibrary.MEDIA_FOLDERS:
+                        pending.add(relative_path)
+                    else:
+                        share_pending.add(relative_path)
+
+                else:
+                    continue
+
+                if not first_event:
+                    first_event = now
+                last_event = now
+
+            if not first_event:
+                continue
+
+            if now - last_event < self.DEBOUNCE_INTERVAL and now - first_event < self.MAX_DELAY:
+                continue
+
+            if full_scan:
+                self.__watch_folders()
+                self.__update_library(None)
+            elif pending:
+                self.__update_library(list(pending))
+
+            if share_pending:
+                self.share_changed.emit(sorted(share_pending))
+
+            pending.clear()
+            share_pending.clear()
+            full_scan = False
+            first_event = last_event = 0.0
+
+    def __watch_folders(self) -> None:
+        """Watches the OPL folders that exist in the share and forgets the ones that don't exist anymore."""
+
+        watched = {}
+
+        for folder in self.WATCHED_FOLDERS:
+            try:
+                wd = self.__inotify.add_watch(os.path.join(self.library.share_path, folder), self.FOLDER_MASK)
+            except OSError:
+                continue
+
+            watched[wd] = folder
+
+        for wd in self.__folders.keys() - watched.keys():
+            self.__inotify.remove_watch(wd)
+
+        self.__folders = watched
+
+    def __update_library(self, relative_paths: list[str] | None) -> None:
+        """Applies the changed paths to the library, or scans the share if relative_paths is None."""
+
+        start = time.perf_counter()
+
+        try:
+            if relative_paths is None:
+                games = self.library.scan(should_stop=lambda: not self.running)
+            else:
+                games = self.library.apply_changes(relative_paths)
+        except OSError as e:
+            logger.warning("The library of %s could not be updated: %s", self.library.share_path, e)
+            return
+
+        if games is None:
+            return
+
+        logger.debug("Library updated in %.1f ms (%s).", (time.perf_counter() - start) * 1000,
+                     "full scan" if relative_paths is None else f"{len(relative_paths)} path(s)")
+
+        self.library_updated.emit(games)
+
+    def __close(self) -> None:
+        if self.__inotify is not None:
+            self.__inotify.close()
+            self.__inotify = None
+
+    def stop(self):
+        """Stops the thread gracefully."""
+        self.running = False
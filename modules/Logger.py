@@ -0,0 +1,233 @@
+import sys
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from colorama import Fore, Style
+
+# Name of the logger of the application. The modules use child loggers (e.g. 'ps2netmanager.samba')
+ROOT_LOGGER_NAME = "ps2netmanager"
+
+# Level for the messages of operations that were successful (between INFO and WARNING)
+SUCCESS = 25
+logging.addLevelName(SUCCESS, "SUCCESS")
+
+# File written by the rotating file sink in debug mode
+LOG_FILE_PATH = "/var/log/ps2_network_manager.log"
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+
+class Logger(logging.LoggerAdapter):
+    """Logger of the application. Works like a logging.Logger with an extra 'success' method."""
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def success(self, msg, *args, **kwargs) -> None:
+        """Logs a message with the SUCCESS level."""
+
+        self.log(SUCCESS, msg, *args, **kwargs)
+
+class LazyMessage:
+    """A debug payload that is only built if the message is actually logged.
+
+    Pass it as an argument of the message, e.g. logger.debug("Config:\\n%s", LazyMessage(conf.dumps)).
+    The function is not called if the level of the message is disabled.
+    """
+
+    __slots__ = ("function",)
+
+    def __init__(self, function: callable):
+        self.function = function
+
+    def __str__(self) -> str:
+        return str(self.function())
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Sends the records to the listener thread without formatting them.
+
+    Only the lazy payloads are resolved in the caller thread, so they reflect the state at the moment of the
+    call. The formatting of the message and the I/O of the sinks happen in the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            if isinstance(record.args, tuple):
+                record.args = tuple(str(arg) if isinstance(arg, LazyMessage) else arg for arg in record.args)
+            elif isinstance(record.args, dict):
+                record.args = {key: str(arg) if isinstance(arg, LazyMessage) else arg for key, arg in record.args.items()}
+
+        return record
+
+class SinkDispatcher(logging.Handler):
+    """The handler of the listener thread. Delivers each record to the sinks, which can be added and removed at any time."""
+
+    def __init__(self):
+        super().__init__()
+        self.__sinks = []
+        self.__sinks_lock = threading.Lock()
+
+    def add_sink(self, sink: logging.Handler) -> None:
+        with self.__sinks_lock:
+            if sink not in self.__sinks:
+                self.__sinks = self.__sinks + [sink]
+
+    def remove_sink(self, sink: logging.Handler) -> None:
+        with self.__sinks_lock:
+            self.__sinks = [s for s in self.__sinks if s is not sink]
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for sink in self.__sinks:
+            if record.levelno >= sink.level:
+                sink.handle(record)
+
+    def close(self) -> None:
+        with self.__sinks_lock:
+            sinks = self.__sinks
+            self.__sinks = []
+
+        for sink in sinks:
+            sink.close()
+
+        super().close()
+
+class TerminalSink(logging.StreamHandler):
+    """Writes the messages to the terminal, colored by level."""
+
+    COLORS = {
+        logging.DEBUG: Fore.CYAN,
+        logging.INFO: "",
+        SUCCESS: Fore.GREEN,
+        logging.WARNING: Fore.YELLOW,
+        logging.ERROR: Fore.RED,
+        logging.CRITICAL: Fore.RED + Style.BRIGHT,
+    }
+
+    def __init__(self, stream=None):
+        super().__init__(stream if stream is not None else sys.stdout)
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def format(self, record: logging.LogRecord) -> str:
+        color = self.COLORS.get(record.levelno, "")
+        text = super().format(record)
+
+        return f"{color}{text}{Style.RESET_ALL}" if color else text
+
+class CallbackSink(logging.Handler):
+    """Delivers the formatted messages to a function, e.g. the log pane of the GUI.
+
+    The function is called from the listener thread, so it must be thread safe.
+    """
+
+    def __init__(self, callback: callable, level: int = logging.NOTSET):
+        """
+        Args:
+            callback (callable): Receives the formatted message and the level of the record.
+            level (int): Minimum level of the records delivered.
+        """
+
+        super().__init__(level)
+        self.callback = callback
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.callback(self.format(record), record.levelno)
+        except Exception:
+            self.handleError(record)
+
+def create_file_sink(path: str = LOG_FILE_PATH) -> logging.Handler:
+    """Creates a sink that writes the messages, with time and origin, to a file rotated at LOG_FILE_MAX_BYTES.
+
+    Raises:
+        OSError: If the file can't be opened.
+    """
+
+    sink = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf-8")
+    sink.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    return sink
+
+# State of the logging subsystem, created by setup_logging
+_listener = None
+_dispatcher = None
+_queue_handler = None
+
+def get_logger(name: str | None = None) -> Logger:
+    """Returns the logger of a part of the application (e.g. 'samba', 'gui').
+
+    The messages are only delivered to the sinks after setup_logging is called.
+    """
+
+    full_name = ROOT_LOGGER_NAME if name is None else f"{ROOT_LOGGER_NAME}.{name}"
+    return Logger(logging.getLogger(full_name))
+
+def setup_logging(debug: bool = False, terminal: bool = True, stream=None) -> None:
+    """Starts the listener thread and connects the application logger to it. Calling it again only changes the level.
+
+    Args:
+        debug (bool): If the DEBUG messages should be logged.
+        terminal (bool): If the terminal sink should be added.
+        stream: Stream written by the terminal sink. Defaults to sys.stdout.
+    """
+
+    global _listener, _dispatcher, _queue_handler
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    _dispatcher = SinkDispatcher()
+    _listener = logging.handlers.QueueListener(log_queue, _dispatcher)
+
+    _queue_handler = AsyncQueueHandler(log_queue)
+
+    root_logger.addHandler(_queue_handler)
+    root_logger.propagate = False
+
+    if terminal:
+        _dispatcher.add_sink(TerminalSink(stream))
+
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def set_debug(debug: bool) -> None:
+    """Enables or disables the DEBUG messages."""
+
+    logging.getLogger(ROOT_LOGGER_NAME).setLevel(logging.DEBUG if debug else logging.INFO)
+
+def add_sink(sink: logging.Handler) -> None:
+    """Adds a sink. It receives the records of all the loggers of the application, from the listener thread."""
+
+    if _dispatcher is None:
+        raise RuntimeError("O sistema de log não foi iniciado.")
+
+    _dispatcher.add_sink(sink)
+
+def remove_sink(sink: logging.Handler) -> None:
+    """Removes a sink added with add_sink."""
+
+    if _dispatcher is not None:
+        _dispatcher.remove_sink(sink)
+
+def shutdown_logging() -> None:
+    """Delivers the pending records and stops the listener thread."""
+
+    global _listener, _dispatcher, _queue_handler
+
+    if _listener is None:
+        return
+
+    logging.getLogger(ROOT_LOGGER_NAME).removeHandler(_queue_handler)
+
+    _listener.stop()
+    _dispatcher.close()
+
+    _listener = None
+    _dispatcher = None
+    _queue_handler = None
@@ -0,0 +1,269 @@
+import os
+import time
+
+class NetSampler:
+    """Base class for the samplers that read the byte counters of a set of network interfaces.
+
+    One call to sample() reads the counters of all the interfaces at once. The counters are stored in lists
+    aligned with the interfaces list and updated in place, so no objects are created for the caller on every sample.
+
+    Use NetSampler.create to get the fastest sampler available on the system.
+
+    Attributes:
+        interfaces (list[str]): The network interfaces to sample.
+        bytes_sent (list[int]): Total bytes sent by each interface in the last sample.
+        bytes_recv (list[int]): Total bytes received by each interface in the last sample.
+        found (list[bool]): If each interface was found in the last sample.
+    """
+
+    def __init__(self, interfaces: list[str] = ()):
+        self.interfaces = []
+        self.bytes_sent = []
+        self.bytes_recv = []
+        self.found = []
+
+        for interface in interfaces:
+            self.add_interface(interface)
+
+    def add_interface(self, interface: str) -> bool:
+        """Adds an interface to the sampler. Its counters are only read in the next sample.
+
+        Returns:
+            bool: True if the interface was added, False if it was already sampled.
+        """
+
+        if interface in self.interfaces:
+            return False
+
+        self.interfaces.append(interface)
+        self.bytes_sent.append(0)
+        self.bytes_recv.append(0)
+        self.found.append(False)
+
+        return True
+
+    def remove_interface(self, interface: str) -> bool:
+        """Removes an interface from the sampler.
+
+        Returns:
+            bool: True if the interface was removed, False if it was not sampled.
+        """
+
+        if interface not in self.interfaces:
+            return False
+
+        index = self.interfaces.index(interface)
+
+        del self.interfaces[index]
+        del self.bytes_sent[index]
+        del self.bytes_recv[index]
+        del self.found[index]
+
+        return True
+
+    def sample(self) -> bool:
+        """Reads the counters of all the interfaces into bytes_sent and bytes_recv.
+
+        Returns:
+            bool: True if all the interfaces were found, False otherwise (check the found list).
+        """
+
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases the resources used by the sampler."""
+
+        pass
+
+    @staticmethod
+    def create(interfaces: list[str] = ()) -> "NetSampler":
+        """Creates the fastest sampler available for the interfaces.
+
+        /proc/net/dev is used if it can be opened, otherwise psutil is used.
+
+        Args:
+            interfaces (list[str]): The network interfaces to sample.
+
+        Returns:
+            NetSampler: The sampler.
+        """
+
+        try:
+            return ProcNetDevSampler(interfaces)
+        except OSError:
+            return PsutilSampler(interfaces)
+
+class ProcNetDevSampler(NetSampler):
+    """Reads the interface counters straight from /proc/net/dev.
+
+    The file is kept open and read with pread into a preallocated buffer, once per sample no matter how many
+    interfaces are sampled. Only the lines of the sampled interfaces are parsed.
+    """
+
+    PROC_NET_DEV_PATH = "/proc/net/dev"
+    INITIAL_BUFFER_SIZE = 16 * 1024
+
+    # Position of the counters in the line, after the 'interface:' prefix
+    RECV_BYTES_FIELD = 0
+    SENT_BYTES_FIELD = 8
+
+    def __init__(self, interfaces: list[str] = ()):
+        """Opens /proc/net/dev.
+
+        Raises:
+            OSError: If /proc/net/dev can't be opened.
+        """
+
+        self.__fd = os.open(self.PROC_NET_DEV_PATH, os.O_RDONLY)
+        self.__buffer = bytearray(self.INITIAL_BUFFER_SIZE)
+        self.__names = []  # Interface names as they appear in the file, aligned with the interfaces list
+
+        super().__init__(interfaces)
+
+    def add_interface(self, interface: str) -> bool:
+        if not super().add_interface(interface):
+            return False
+
+        self.__names.append(interface.encode() + b":")
+        return True
+
+    def remove_interface(self, interface: str) -> bool:
+        if interface not in self.interfaces:
+            return False
+
+        del self.__names[self.interfaces.index(interface)]
+        return super().remove_interface(interface)
+
+    def __read(self) -> int:
+        """Reads the whole file into the buffer, growing it if needed. Returns the number of bytes read."""
+
+        while True:
+            size = os.preadv(self.__fd, [self.__buffer], 0)
+
+            if size < len(self.__buffer):
+                return size
+
+            # The buffer was filled, so the file may be bigger than it
+            self.__buffer = bytearray(len(self.__buffer) * 2)
+
+    def sample(self) -> bool:
+        size = self.__read()
+        buffer = self.__buffer
+        all_found = True
+
+        for index, name in enumerate(self.__names):
+            # The interface names are right aligned, so the name is preceded by a space or a new line
+            position = buffer.find(name, 0, size)
+            while position > 0 and buffer[position - 1] not in b" \n":
+                position = buffer.find(name, position + 1, size)
+
+            if position == -1:
+                self.found[index] = False
+                all_found = False
+                continue
+
+            start = position + len(name)
+            end = buffer.find(b"\n", start, size)
+            if end == -1:
+                end = size
+
+            fields = buffer[start:end].split()
+
+            self.bytes_recv[index] = int(fields[self.RECV_BYTES_FIELD])
+            self.bytes_sent[index] = int(fields[self.SENT_BYTES_FIELD])
+            self.found[index] = True
+
+        return all_found
+
+    def close(self) -> None:
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+class PsutilSampler(NetSampler):
+    """Reads the interface counters with psutil. Used when /proc/net/dev is not available."""
+
+    def __init__(self, interfaces: list[str] = ()):
+        # psutil is only imported when this fallback is used, since it is slow to import
+        import psutil
+        self.__psutil = psutil
+
+        super().__init__(interfaces)
+
+    def sample(self) -> bool:
+        all_counters = self.__psutil.net_io_counters(pernic=True)
+        all_found = True
+
+        for index, interface in enumerate(self.interfaces):
+            counters = all_counters.get(interface)
+
+            if counters is None:
+                self.found[index] = False
+                all_found = False
+                continue
+
+            self.bytes_sent[index] = counters.bytes_sent
+            self.bytes_recv[index] = counters.bytes_recv
+            self.found[index] = True
+
+        return all_found
+
+# Maximum value of the counters on systems that still use 32 bits counters
+COUNTER_32_BITS_MAX = 2**32 - 1
+
+def counter_delta(before: int, after: int) -> int:
+    """Returns the number of bytes counted between two samples of a counter.
+
+    Handles 32 bits counters that wrapped around and counters that were reset (e.g. the interface was
+    recreated), in which case the counter restarted from zero.
+    """
+
+    if after >= before:
+        return after - before
+
+    if before <= COUNTER_32_BITS_MAX:
+        wrapped = after + COUNTER_32_BITS_MAX + 1 - before
+
+        # A real wrap around moves the counter forward by less than half of its range
+        if wrapped <= COUNTER_32_BITS_MAX // 2:
+            return wrapped
+
+    return after
+
+def benchmark(interfaces: list[str], samples: int = 10000) -> dict:
+    """Micro-benchmark that compares the cost of one sample with each sampler.
+
+    Args:
+        interfaces (list[str]): The network interfaces to sample.
+        samples (int): The number of samples taken with each sampler.
+
+    Returns:
+        dict: The average cost of one sample in microseconds, by sampler name.
+    """
+
+    results = {}
+
+    for sampler_class in (ProcNetDevSampler, PsutilSampler):
+        sampler = sampler_class(interfaces)
+
+        try:
+            start = time.perf_counter_ns()
+
+            for _ in range(samples):
+                sampler.sample()
+
+            results[sampler_class.__name__] = (time.perf_counter_ns() - start) / samples / 1000
+        finally:
+            sampler.close()
+
+    return results
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m modules.NetSampler [interface[,interface...]] [samples]
+    interfaces = sys.argv[1].split(",") if len(sys.argv) > 1 else ["lo"]
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    for name, cost in benchmark(interfaces, samples).items():
+        print(f"{name}: {cost:.2f} us/amostra")
@@ -1,71 +1,296 @@
-import psutil
+import math
 import time
-from colorama import Fore
+import threading
 from PyQt6.QtCore import QThread, pyqtSignal
 
+from modules.NetSampler import NetSampler, counter_delta
+from modules.ThroughputHistory import ThroughputHistory
+from modules.Logger import get_logger
+
+logger = get_logger("net")
+
 class NetSpeedMonitor(QThread):
-    """A class to monitor network speed for a given interface.
+    """A class to monitor network speed for a set of interfaces.
     Inherits from QThread to run in a separate thread.
-    
+
+    All the interfaces are read by the same sampler, in one read per tick. Interfaces can be added and
+    removed while the thread is running.
+
     Attributes:
-        interface (str): The network interface to monitor.
-        interval (int): The interval in seconds to measure speed.
+        interval (int): The interval in seconds to measure speed. In the high frequency mode, it is the interval
+            between the emissions of the signals.
+        sample_rate (float): Samples per second in the high frequency mode, or None.
+        history (ThroughputHistory): The aggregate speeds (all interfaces) sampled in the last HISTORY_SECONDS.
         running (bool): Flag to control the thread execution.
     """
-    
-    # Signal to send upload & download speeds
-    speed_updated = pyqtSignal(float, float) 
-    
+
+    # Signal to send the aggregate upload & download speeds of all the interfaces
+    speed_updated = pyqtSignal(float, float)
+
+    # Signal to send the aggregates (ThroughputStats) of the samples taken in the last interval
+    stats_updated = pyqtSignal(object)
+
+    # Signal to send the speeds of each interface in one batch: {interface: (upload speed, download speed)}
+    interfaces_updated = pyqtSignal(object)
+
     # Signal to notify about interface not found
     interface_not_found = pyqtSignal(str)
 
-    def __init__(self, interface, interval=1):
-        """Initializes the NetSpeedMonitor with the specified interface and interval.
-        
+    # Limits of the high frequency mode, in samples per second
+    MIN_SAMPLE_RATE = 10
+    MAX_SAMPLE_RATE = 100
+
+    # How many seconds of samples are kept in the history
+    HISTORY_SECONDS = 60
+
+    def __init__(self, interfaces, interval=1, sample_rate=None):
+        """Initializes the NetSpeedMonitor with the specified interfaces and interval.
+
         This class inherits from QThread to allow for concurrent execution.
-        
+
         Args:
-            interface (str): The network interface to monitor.
+            interfaces (str | list[str]): The network interface (or interfaces) to monitor. More can be added later.
             interval (int): The interval in seconds to measure speed.
+            sample_rate (float): Samples per second for the high frequency mode (10 to 100 Hz). If None, one sample
+                is taken per interval.
         """
-        
+
         super().__init__()
-        self.interface = interface
         self.interval = interval
+        self.sample_rate = sample_rate
         self.running = True  # Control flag to stop the thread
 
+        if sample_rate is not None and not self.MIN_SAMPLE_RATE <= sample_rate <= self.MAX_SAMPLE_RATE:
+            raise ValueError(f"A taxa de amostragem deve estar entre {self.MIN_SAMPLE_RATE} e {self.MAX_SAMPLE_RATE} Hz.")
+
+        self.sample_interval = 1 / sample_rate if sample_rate is not None else interval
+
+        # Speeds sampled in the last HISTORY_SECONDS
+        self.history = ThroughputHistory(max(math.ceil(self.HISTORY_SECONDS / self.sample_interval), 1))
+
+        if interfaces is None:
+            interfaces = []
+        elif isinstance(interfaces, str):
+            interfaces = [interfaces]
+
+        # Interfaces requested by the user. The sampler is only changed by the monitor thread, that
+        # applies the pending changes at the beginning of each tick
+        self.__interfaces = list(dict.fromkeys(interfaces))
+        self.__pending_changes = []
+        self.__interfaces_lock = threading.Lock()
+
+    @property
+    def interfaces(self) -> list[str]:
+        """The network interfaces being monitored."""
+
+        with self.__interfaces_lock:
+            return list(self.__interfaces)
+
+    def add_interface(self, interface: str) -> bool:
+        """Starts monitoring an interface. Can be called from any thread while the monitor is running.
+
+        Returns:
+            bool: True if the interface was added, False if it was already monitored.
+        """
+
+        with self.__interfaces_lock:
+            if interface in self.__interfaces:
+                return False
+
+            self.__interfaces.append(interface)
+            self.__pending_changes.append((True, interface))
+
+        return True
+
+    def remove_interface(self, interface: str) -> bool:
+        """Stops monitoring an interface. Can be called from any thread while the monitor is running.
+
+        Returns:
+            bool: True if the interface was removed, False if it was not monitored.
+        """
+
+        with self.__interfaces_lock:
+            if interface not in self.__interfaces:
+                return False
+
+            self.__interfaces.remove(interface)
+            self.__pending_changes.append((False, interface))
+
+        return True
+
     def run(self):
-        """Runs the speed measurement in a separate thread."""
-        while self.running:
-            net_before = psutil.net_io_counters(pernic=True).get(self.interface)
+        """Runs the speed measurement in a separate thread.
 
-            if not net_before:
-                print(f"{Fore.RED} ERROR: Interface {self.interface} not found.")
-                self.running = False
-                self.interface_not_found.emit(self.interface)
-                return
+        Only one sample is taken per tick. The speed is computed against the previous sample, using the time
+        actually elapsed between them (monotonic clock) instead of the nominal interval.
 
-            bytes_sent_before = net_before.bytes_sent
-            bytes_recv_before = net_before.bytes_recv
+        Every aggregate sample is stored in the history, but the signals are only emitted once per interval, with
+        the aggregates of the samples taken since the last emission.
+        """
+        with self.__interfaces_lock:
+            sampler = NetSampler.create(self.__interfaces)
+            self.__pending_changes.clear()
 
-            time.sleep(self.interval)
+        # Previous counters of each interface, aligned with sampler.interfaces (None until the first sample)
+        previous_sent = [None] * len(sampler.interfaces)
+        previous_recv = [None] * len(sampler.interfaces)
 
-            net_after = psutil.net_io_counters(pernic=True).get(self.interface)
-            if not net_after:
-                print(f"{Fore.RED} ERROR: Interface {self.interface} not found.")
-                self.running = False
-                self.interface_not_found.emit(self.interface)
+        # Bytes counted by each interface since the last emission
+        window_sent = [0] * len(sampler.interfaces)
+        window_recv = [0] * len(sampler.interfaces)
+
+        counters = (previous_sent, previous_recv, window_sent, window_recv)
+
+        try:
+            sampler.sample()
+            self.__store_counters(sampler, previous_sent, previous_recv)
+
+            if not self.__remove_missing_interfaces(sampler, counters):
                 return
 
-            bytes_sent_after = net_after.bytes_sent
-            bytes_recv_after = net_after.bytes_recv
+            previous_time = time.monotonic_ns()
+
+            sample_interval_ns = int(self.sample_interval * 1_000_000_000)
+            display_interval_ns = int(self.interval * 1_000_000_000)
+
+            next_tick = previous_time + sample_interval_ns
+            next_display = previous_time + display_interval_ns
+            window = 0  # Samples taken since the last emission
+            window_start = previous_time
+
+            while self.running:
+                # Sleep until the next tick, so the time spent sampling and emitting doesn't accumulate
+                delay = next_tick - time.monotonic_ns()
+                if delay > 0:
+                    time.sleep(delay / 1_000_000_000)
+
+                if not self.running:
+                    return
+
+                self.__apply_pending_changes(sampler, counters)
+
+                sampler.sample()
+
+                now = time.monotonic_ns()
+                elapsed = (now - previous_time) / 1_000_000_000
+
+                # If a tick was missed (e.g. the system was suspended), don't try to catch up
+                next_tick = max(next_tick + sample_interval_ns, now)
+
+                if elapsed <= 0:
+                    continue
+
+                sent = 0
+                recv = 0
+
+                for index in range(len(sampler.interfaces)):
+                    if not sampler.found[index] or previous_sent[index] is None:
+                        continue
+
+                    sent_delta = counter_delta(previous_sent[index], sampler.bytes_sent[index])
+                    recv_delta = counter_delta(previous_recv[index], sampler.bytes_recv[index])
+
+                    window_sent[index] += sent_delta
+                    window_recv[index] += recv_delta
+                    sent += sent_delta
+                    recv += recv_delta
+
+                self.__store_counters(sampler, previous_sent, previous_recv)
+
+                if not self.__remove_missing_interfaces(sampler, counters):
+                    return
+
+                previous_time = now
+
+                # Calculate speed in KB/s
+                self.history.append(sent / elapsed / 1024, recv / elapsed / 1024)
+                window += 1
+
+                if now < next_display:
+                    continue
 
-            # Calculate speed in KB/s
-            upload_speed = (bytes_sent_after - bytes_sent_before) / self.interval / 1024
-            download_speed = (bytes_recv_after - bytes_recv_before) / self.interval / 1024
+                next_display = max(next_display + display_interval_ns, now)
+
+                # Emit signals with the aggregates of the window
+                stats = self.history.get_stats(window)
+                window_seconds = (now - window_start) / 1_000_000_000
+
+                speeds = {}
+                for index, interface in enumerate(sampler.interfaces):
+                    speeds[interface] = (window_sent[index] / window_seconds / 1024, window_recv[index] / window_seconds / 1024)
+                    window_sent[index] = 0
+                    window_recv[index] = 0
+
+                window = 0
+                window_start = now
+
+                self.speed_updated.emit(stats.up_mean, stats.down_mean)
+                self.stats_updated.emit(stats)
+                self.interfaces_updated.emit(speeds)
+        finally:
+            sampler.close()
+
+    def __store_counters(self, sampler: NetSampler, previous_sent: list, previous_recv: list) -> None:
+        """Keeps the counters of the last sample to compute the speed in the next tick."""
+        for index in range(len(sampler.interfaces)):
+            if sampler.found[index]:
+                previous_sent[index] = sampler.bytes_sent[index]
+                previous_recv[index] = sampler.bytes_recv[index]
+
+    def __apply_pending_changes(self, sampler: NetSampler, counters: tuple[list, list, list, list]) -> None:
+        """Adds and removes the interfaces requested since the last tick. Called only by the monitor thread."""
+        with self.__interfaces_lock:
+            changes = self.__pending_changes
+            self.__pending_changes = []
+
+        previous_sent, previous_recv, window_sent, window_recv = counters
+
+        for add, interface in changes:
+            if add:
+                if sampler.add_interface(interface):
+                    # The speed of the new interface is only computed from its second sample on
+                    previous_sent.append(None)
+                    previous_recv.append(None)
+                    window_sent.append(0)
+                    window_recv.append(0)
+            elif interface in sampler.interfaces:
+                index = sampler.interfaces.index(interface)
+                sampler.remove_interface(interface)
+
+                for values in counters:
+                    del values[index]
+
+    def __remove_missing_interfaces(self, sampler: NetSampler, counters: tuple[list, list, list, list]) -> bool:
+        """Stops monitoring the interfaces that were not found in the last sample and notifies them.
+
+        Returns:
+            bool: False if the monitor was stopped because there are no interfaces left, True otherwise.
+        """
+        for index in range(len(sampler.interfaces) - 1, -1, -1):
+            if sampler.found[index]:
+                continue
+
+            interface = sampler.interfaces[index]
+            sampler.remove_interface(interface)
+
+            for values in counters:
+                del values[index]
+
+            with self.__interfaces_lock:
+                if interface in self.__interfaces:
+                    self.__interfaces.remove(interface)
+
+                # Stop when the last interface is lost and no other one is about to be added
+                stop = not sampler.interfaces and not self.__pending_changes
+
+            logger.error("ERROR: Interface %s not found.", interface)
+            self.interface_not_found.emit(interface)
+
+            if stop:
+                self.running = False
+                return False
 
-            # Emit signal with updated speeds
-            self.speed_updated.emit(upload_speed, download_speed)
+        return True
 
     def stop(self):
         """Stops the thread gracefully."""
@@ -0,0 +1,568 @@
+import os
+import copy
+import tempfile
+
+from modules.Exceptions import *
+
+class SambaConfEntry:
+    """A single 'key = value' setting inside a section of the SAMBA configuration file.
+
+    Attributes:
+        key (str): The setting name as written in the file.
+        value (str): The setting value.
+        raw (str | None): The original line from the file. It is None when the entry was created or modified,
+            so it will be rendered again when the file is written.
+    """
+
+    INDENTATION = "   "
+
+    def __init__(self, key: str, value: str, raw: str | None = None):
+        self.key = key
+        self.value = value
+        self.raw = raw
+
+    def render(self) -> str:
+        """Returns the line that represents this entry in the configuration file."""
+
+        if self.raw is not None:
+            return self.raw
+
+        return f"{self.INDENTATION}{self.key} = {self.value}"
+
+class SambaConfSection:
+    """A section (tag) of the SAMBA configuration file, like [global] or [PS2SMB].
+
+    The section keeps every line in the original order (settings, comments and blank lines),
+    and an index of its settings by normalized name to allow O(1) lookups.
+
+    Attributes:
+        name (str): The section name without the brackets.
+        raw (str | None): The original header line. None if the section was created by us.
+    """
+
+    def __init__(self, name: str, raw: str | None = None):
+        self.name = name
+        self.raw = raw
+
+        # Ordered list of lines of the section. Each item is a SambaConfEntry or a raw string (comment, blank line...)
+        self.__items = []
+        # Index of the settings by normalized name. If a setting is repeated, the last one wins, like in SAMBA
+        self.__index = {}
+
+    @staticmethod
+    def normalize_key(key: str) -> str:
+        """Normalizes a setting name the same way SAMBA does: case and whitespace are ignored.
+
+        Args:
+            key (str): The setting name.
+
+        Returns:
+            str: The normalized setting name.
+        """
+
+        return "".join(key.split()).lower()
+
+    def add_raw_line(self, line: str) -> None:
+        """Appends a line that is not a setting (comment, blank line...) to the section."""
+
+        self.__items.append(line)
+
+    def add_entry(self, entry: SambaConfEntry) -> None:
+        """Appends a parsed setting to the end of the section."""
+
+        self.__items.append(entry)
+        self.__index[self.normalize_key(entry.key)] = entry
+
+    def has(self, key: str) -> bool:
+        """Checks if a setting exists in this section."""
+
+        return self.normalize_key(key) in self.__index
+
+    def get(self, key: str) -> str:
+        """Returns the value of a setting in this section.
+
+        Args:
+            key (str): The setting name.
+
+        Returns:
+            str: The value of the setting.
+
+        Raises:
+            SettingNotFound: If the setting is not found in the section.
+        """
+
+        entry = self.__index.get(self.normalize_key(key))
+
+        if entry is None:
+            raise SettingNotFound(key)
+
+        return entry.value
+
+    def set(self, key: str, value: str) -> bool:
+        """Sets the value of a setting. If the setting doesn't exist, it is added at the end of the section.
+
+        Args:
+            key (str): The setting name.
+            value (str): The new value.
+
+        Returns:
+            bool: True if the section was changed, False if the setting already had this value.
+        """
+
+        entry = self.__index.get(self.normalize_key(key))
+
+        if entry is not None:
+            if entry.value == value:
+                return False
+
+            entry.value = value
+            entry.raw = None
+            return True
+
+        entry = SambaConfEntry(key, value)
+
+        # New settings are placed before the trailing blank lines, so the section keeps its spacing
+        position = len(self.__items)
+        while position > 0 and isinstance(self.__items[position - 1], str) and self.__items[position - 1].strip() == "":
+            position -= 1
+
+        self.__items.insert(position, entry)
+        self.__index[self.normalize_key(key)] = entry
+
+        return True
+
+    def remove(self, key: str) -> bool:
+        """Removes every occurrence of a setting from the section. If the setting doesn't exist, nothing is done.
+
+        Returns:
+            bool: True if the section was changed, False otherwise.
+        """
+
+        normalized_key = self.normalize_key(key)
+
+        if normalized_key not in self.__index:
+            return False
+
+        self.__items = [
+            item for item in self.__items
+            if isinstance(item, str) or self.normalize_key(item.key) != normalized_key
+        ]
+        del self.__index[normalized_key]
+
+        return True
+
+    def clear_settings(self) -> None:
+        """Removes all the settings of the section. Comments and blank lines are kept."""
+
+        self.__items = [item for item in self.__items if isinstance(item, str)]
+        self.__index.clear()
+
+    def settings(self) -> list[tuple[str, str]]:
+        """Returns the effective settings of the section as a list of (key, value) tuples."""
+
+        return [(entry.key, entry.value) for entry in self.__index.values()]
+
+    def render(self) -> list[str]:
+        """Returns the lines that represent this section in the configuration file."""
+
+        lines = [self.raw if self.raw is not None else f"[{self.name}]"]
+
+        for item in self.__items:
+            lines.append(item if isinstance(item, str) else item.render())
+
+        return lines
+
+    def ends_with_blank_line(self) -> bool:
+        """Checks if the last line of the section is blank."""
+
+        return len(self.__items) > 0 and isinstance(self.__items[-1], str) and self.__items[-1].strip() == ""
+
+class SambaConf:
+    """In-memory model of the SAMBA configuration file (smb.conf).
+
+    The file is parsed in a single pass into an ordered list of sections. Sections are indexed by name
+    and settings are indexed by section and name, so every query is O(1). Lines that are not changed are
+    written back exactly as they were read, including comments.
+    """
+
+    COMMENT_CHARS = ("#", ";")
+
+    def __init__(self):
+        # Lines before the first section
+        self.__preamble = []
+        # Ordered list of sections and index by normalized section name
+        self.__sections = []
+        self.__index = {}
+
+    @staticmethod
+    def normalize_section_name(name: str) -> str:
+        """Normalizes a section name. SAMBA section names are case insensitive."""
+
+        return name.strip().lower()
+
+    @classmethod
+    def parse(cls, text: str) -> "SambaConf":
+        """Parses the SAMBA configuration file contents.
+
+        Args:
+            text (str): The configuration file contents.
+
+        Returns:
+            SambaConf: The parsed configuration.
+        """
+
+        conf = cls()
+        current_section = None
+
+        lines = text.splitlines()
+        i = 0
+
+        while i < len(lines):
+            line = lines[i]
+            i += 1
+
+            stripped = line.strip()
+
+            if stripped == "" or stripped.startswith(cls.COMMENT_CHARS):
+                conf.__add_raw_line(current_section, line)
+                continue
+
+            # Lines ending with a backslash continue in the next line
+            while stripped.endswith("\\") and i < len(lines):
+                line += "\n" + lines[i]
+                stripped = stripped[:-1].rstrip() + " " + lines[i].strip()
+                i += 1
+
+            if stripped.startswith("[") and stripped.endswith("]"):
+                current_section = SambaConfSection(stripped[1:-1].strip(), line)
+                conf.__append_section(current_section)
+                continue
+
+            key, separator, value = stripped.partition("=")
+
+            if separator == "" or current_section is None:
+                # Invalid line or setting outside of a section. SAMBA ignores it, so we just keep it
+                conf.__add_raw_line(current_section, line)
+                continue
+
+            current_section.add_entry(SambaConfEntry(key.strip(), value.strip(), line))
+
+        return conf
+
+    def __add_raw_line(self, section: SambaConfSection | None, line: str) -> None:
+        if section is None:
+            self.__preamble.append(line)
+        else:
+            section.add_raw_line(line)
+
+    def __append_section(self, section: SambaConfSection) -> None:
+        self.__sections.append(section)
+
+        # If a section is repeated, SAMBA merges it with the first one. We keep the first one indexed
+        self.__index.setdefault(self.normalize_section_name(section.name), section)
+
+    def has_section(self, name: str) -> bool:
+        """Checks if a section exists in the configuration."""
+
+        return self.normalize_section_name(name) in self.__index
+
+    def get_section(self, name: str) -> SambaConfSection:
+        """Returns a section of the configuration.
+
+        Args:
+            name (str): The section name without the brackets.
+
+        Returns:
+            SambaConfSection: The section.
+
+        Raises:
+            TagNotFound: If the section is not found in the configuration.
+        """
+
+        section = self.__index.get(self.normalize_section_name(name))
+
+        if section is None:
+            raise TagNotFound(name)
+
+        return section
+
+    def add_section(self, name: str) -> SambaConfSection:
+        """Creates an empty section at the end of the configuration. If the section already exists, it is returned.
+
+        Args:
+            name (str): The section name without the brackets.
+
+        Returns:
+            SambaConfSection: The new (or existing) section.
+        """
+
+        if self.has_section(name):
+            return self.get_section(name)
+
+        # Separating the new section from the previous content with a blank line
+        if len(self.__sections) > 0:
+            if not self.__sections[-1].ends_with_blank_line():
+                self.__sections[-1].add_raw_line("")
+        elif len(self.__preamble) > 0 and self.__preamble[-1].strip() != "":
+            self.__preamble.append("")
+
+        section = SambaConfSection(name)
+        self.__append_section(section)
+
+        return section
+
+    def sections(self) -> list[str]:
+        """Returns the names of the sections in the configuration, in file order."""
+
+        return [section.name for section in self.__sections]
+
+    def get(self, section: str, key: str) -> str:
+        """Returns the value of a setting in a section.
+
+        Raises:
+            TagNotFound: If the section is not found.
+            SettingNotFound: If the setting is not found in the section.
+        """
+
+        return self.get_section(section).get(key)
+
+    def has(self, section: str, key: str) -> bool:
+        """Checks if a setting exists in a section. Returns False if the section doesn't exist."""
+
+        return self.has_section(section) and self.get_section(section).has(key)
+
+    def set(self, section: str, key: str, value: str) -> bool:
+        """Sets the value of a setting in a section. The setting is created if it doesn't exist.
+
+        Returns:
+            bool: True if the configuration was changed, False otherwise.
+
+        Raises:
+            TagNotFound: If the section is not found.
+        """
+
+        return self.get_section(section).set(key, value)
+
+    def remove(self, section: str, key: str) -> bool:
+        """Removes a setting from a section. If the setting doesn't exist, nothing is done.
+
+        Returns:
+            bool: True if the configuration was changed, False otherwise.
+
+        Raises:
+            TagNotFound: If the section is not found.
+        """
+
+        return self.get_section(section).remove(key)
+
+    def dumps(self) -> str:
+        """Returns the configuration file contents."""
+
+        lines = list(self.__preamble)
+
+        for section in self.__sections:
+            lines.extend(section.render())
+
+        return "\n".join(lines) + "\n"
+
+    def copy(self) -> "SambaConf":
+        """Returns an independent copy of the configuration, which can be changed without affecting this one."""
+
+        return copy.deepcopy(self)
+
+class SambaConfCache:
+    """Cache of the parsed SAMBA configuration file.
+
+    The parsed SambaConf is kept in memory together with the file signature (mtime in nanoseconds, size and inode).
+    Every load only stats the file: if the signature is the same, the cached model is returned, otherwise the file
+    is read and parsed again. This way, edits made by other programs or admins are always noticed.
+
+    The returned model is shared between calls (and threads), so it is never changed: changes are made to a copy
+    (see SambaConf.copy), which becomes the cached model when it is written with the write method.
+
+    Attributes:
+        path (str): The path of the SAMBA configuration file.
+        hits (int): Number of loads served from memory.
+        misses (int): Number of loads that had to read and parse the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self.__conf = None
+        self.__signature = None
+
+    @staticmethod
+    def __signature_of(stat_result: os.stat_result) -> tuple[int, int, int]:
+        """Returns the signature used to detect changes in the file."""
+
+        return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+    def load(self) -> SambaConf:
+        """Returns the parsed configuration file, reading it from disk only if it changed since the last load.
+
+        Returns:
+            SambaConf: The parsed configuration.
+
+        Raises:
+            SambaConfNotFound: If the configuration file doesn't exist.
+        """
+
+        try:
+            if self.__conf is not None and self.__signature == self.__signature_of(os.stat(self.path)):
+                self.hits += 1
+                return self.__conf
+
+            self.misses += 1
+
+            with open(self.path, "r") as conf_file:
+                # The signature is taken before reading. If the file changes while we read it,
+                # the next load will see a different signature and parse it again
+                signature = self.__signature_of(os.fstat(conf_file.fileno()))
+                conf = SambaConf.parse(conf_file.read())
+
+        except FileNotFoundError:
+            self.invalidate()
+            raise SambaConfNotFound(self.path)
+
+        self.__conf = conf
+        self.__signature = signature
+
+        return conf
+
+    def write(self, conf: SambaConf) -> None:
+        """Writes the configuration to disk atomically and keeps it as the cached model.
+
+        The contents are written to a temporary file in the same folder, synced to disk and then renamed over
+        the original file. A crash in the middle of the write never leaves a truncated configuration file behind.
+
+        Args:
+            conf (SambaConf): The configuration to write.
+        """
+
+        # If the configuration file is a symlink, we replace the file it points to
+        target_path = os.path.realpath(self.path)
+        target_dir = os.path.dirname(target_path)
+
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target_path)}.", dir=target_dir)
+
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                temp_file.write(conf.dumps())
+                temp_file.flush()
+
+                # Keeping the permissions and owner of the original file
+                try:
+                    original_stat = os.stat(target_path)
+                    os.fchmod(temp_file.fileno(), original_stat.st_mode & 0o7777)
+                    os.fchown(temp_file.fileno(), original_stat.st_uid, original_stat.st_gid)
+                except FileNotFoundError:
+                    os.fchmod(temp_file.fileno(), 0o644)
+                except PermissionError:
+                    pass
+
+                os.fsync(temp_file.fileno())
+
+            os.replace(temp_path, target_path)
+
+        except BaseException:
+            self.invalidate()
+
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+            raise
+
+        # Syncing the folder so the rename itself is persisted
+        dir_fd = os.open(target_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self.__conf = conf
+        self.__signature = self.__signature_of(os.stat(self.path))
+
+    def invalidate(self) -> None:
+        """Discards the cached model. The next load will read the file again."""
+
+        self.__conf = None
+        self.__signature = None
+
+    def get_stats(self) -> dict:
+        """Returns the cache counters.
+
+        Returns:
+            dict: A dictionary with the number of hits and misses.
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class SambaConfTransaction:
+    """A batch of changes to the SAMBA configuration file.
+
+    The changes are applied to a copy of the parsed model as they are made and the file is written only once, when
+    the transaction is committed. Transactions are created by SambaManager.transaction() and used as context managers.
+
+    Attributes:
+        conf (SambaConf): The copy of the configuration being changed.
+        changes (list): The (section, setting) pairs changed in this transaction, in order. The setting is None
+            when the whole section was created or replaced.
+    """
+
+    def __init__(self, conf: SambaConf):
+        self.conf = conf
+        self.changes = []
+
+    def __record(self, section: str, key: str, changed: bool) -> bool:
+        if changed:
+            self.changes.append((section, key))
+
+        return changed
+
+    def has_changes(self) -> bool:
+        """Checks if the transaction changed the configuration."""
+
+        return len(self.changes) > 0
+
+    def set(self, section: str, key: str, value: str) -> bool:
+        """Sets the value of a setting in a section. See SambaConf.set."""
+
+        return self.__record(section, key, self.conf.set(section, key, value))
+
+    def remove(self, section: str, key: str) -> bool:
+        """Removes a setting from a section. See SambaConf.remove."""
+
+        return self.__record(section, key, self.conf.remove(section, key))
+
+    def add_section(self, name: str) -> SambaConfSection:
+        """Creates a section if it doesn't exist. See SambaConf.add_section."""
+
+        if not self.conf.has_section(name):
+            self.changes.append((name, None))
+
+        return self.conf.add_section(name)
+
+    def replace_section_settings(self, name: str, settings: list[tuple[str, str]]) -> None:
+        """Replaces all the settings of a section with the given ones. The section is created if it doesn't exist.
+
+        Args:
+            name (str): The section name without the brackets.
+            settings (list): The new settings as (setting, value) tuples, in order.
+        """
+
+        section = self.add_section(name)
+
+        old_settings = section.settings()
+        section.clear_settings()
+
+        for key, value in settings:
+            section.set(key, value)
+
+        if old_settings != section.settings():
+            self.changes.append((name, None))
@@ -2,17 +2,38 @@ import os
 import re
 import sys
 import pwd
-import psutil
 import socket
-from colorama import Fore
+import subprocess
+import threading
+from contextlib import contextmanager
 
 from modules.Exceptions import *
+from modules.Logger import get_logger, LazyMessage
+from modules.SambaConf import SambaConf, SambaConfSection, SambaConfCache, SambaConfTransaction
+
+logger = get_logger("samba")
 
 class SambaManager:
     SAMBA_CONF_PATH = "/etc/samba/smb.conf"
     DEFAULT_NETBIOS_NAME = "SAMBA"
     PS2_SHARE_NAME = "PS2SMB"
 
+    # Settings that must be in the [global] section to communicate with the PS2 (SMBv1)
+    GLOBAL_REQUIRED_SETTINGS = [("server min protocol", "NT1"), ("client min protocol", "NT1")]
+
+    SAMBA_SERVICES = ["smbd", "nmbd"]
+    
+    # Maximum time (in seconds) a service command (systemctl, smbcontrol) can take
+    SERVICE_COMMAND_TIMEOUT = 60
+
+    # [global] settings that are only applied when the daemons restart (normalized name -> daemons to restart).
+    # Every other change is applied live by asking smbd to reload its configuration.
+    RESTART_REQUIRED_SETTINGS = {
+        "interfaces": ["smbd", "nmbd"],
+        "bindinterfacesonly": ["smbd", "nmbd"],
+        "netbiosname": ["nmbd"],
+    }
+
     __netbios_name = ""
     __user_name = ""
     __shared_ps2_folder_path = ""
@@ -21,241 +42,171 @@ class SambaManager:
     
     __server_ip = None
     __server_interface = None
+    
+    __transaction = None
+    
+    # If False, the changes made to smb.conf are not applied to the running server when a transaction ends.
+    # They are kept as pending changes, to be applied later with apply_pending_changes (from a worker thread, for example)
+    apply_changes_automatically = True
+
+    def __init__(self, debug=False, stop_on_init=True):
+        """Initializes the SambaManager.
 
-    def __init__(self, debug=False):
+        Args:
+            debug (bool): If the debug mode is enabled.
+            stop_on_init (bool): If the SAMBA service should be stopped here. The GUI stops it itself in a worker thread
+                when the window is shown, and the CLI keeps it as it is.
+        """
         self.debug = debug
 
         # Check if samba config file exists
         if not os.path.exists(self.SAMBA_CONF_PATH):
             raise SambaConfNotFound(self.SAMBA_CONF_PATH)
         
+        # Service commands currently running. They can be running in other threads, so they are protected by a lock
+        self.__running_processes = set()
+        self.__running_processes_lock = threading.Lock()
+        
+        # Changes written to smb.conf that were not applied to the running server yet
+        self.__pending_changes = []
+        self.__pending_changes_lock = threading.Lock()
+        
+        # Parsed SAMBA configuration, read again only when the file changes on disk
+        self.__conf_cache = SambaConfCache(self.SAMBA_CONF_PATH)
+        
+        # The configuration can be read and changed from worker threads. The lock is held during the whole outermost
+        # transaction, so a transaction never joins one of another thread. Transactions change a copy of the cached
+        # model, which replaces it only when written: readers keep the model they got, which never changes
+        self.__conf_lock = threading.RLock()
+        
         # Get user name
         try:
             self.__user_name = os.getlogin()
         except OSError:
-            print(Fore.RED + "ERRO: Não foi possível obter o nome de usuário do sistema.")
-            sys.exit(1)
+            # There is no controlling terminal (e.g. the CLI running from a service), so we use the user that called sudo
+            self.__user_name = os.environ.get("SUDO_USER", "")
+            
+            if self.__user_name == "":
+                logger.error("ERRO: Não foi possível obter o nome de usuário do sistema.")
+                sys.exit(1)
         except Exception as e:
-            print(Fore.RED + f"ERRO DESCONHECIDO: {e}")
+            logger.error("ERRO DESCONHECIDO: %s", e)
             sys.exit(1)
             
-        if self.debug:
-            print(Fore.LIGHTGREEN_EX + f"Nome de usuário do sistema: {self.__user_name}")
+        logger.debug("Nome de usuário do sistema: %s", self.__user_name)
         
-        self.stop_server()
+        if stop_on_init:
+            self.stop_server()
 
     # --- UTILITY METHODS ---
     
-    def __read_samba_conf(self) -> list:
-        """Reads the SAMBA configuration file and returns its contents as a list of strings, removing comments and blank lines.
+    def __load_samba_conf(self) -> SambaConf:
+        """Returns the parsed SAMBA configuration file. The file is only read again if it changed on disk.
+        
+        The returned model is a snapshot that is never changed. Inside a transaction, its thread gets the copy being
+        changed, with the changes made so far (the other threads wait for the lock until the transaction ends).
 
         Returns:
-            list: The SAMBA configuration file contents as a list of strings.
+            SambaConf: The parsed SAMBA configuration file.
         """
-        conf_file = open(self.SAMBA_CONF_PATH, "r")
-        original_conf_data = conf_file.readlines()
-        conf_file.close()
+        with self.__conf_lock:
+            if self.__transaction is not None:
+                return self.__transaction.conf
+            
+            return self.__conf_cache.load()
 
-        conf_data = []
-        # Reoving comments and blank lines
-        for line in original_conf_data:
-            if line[0] != "#" and line[0] != ";" and line != "\n":
-                conf_data.append(line)
+    @staticmethod
+    def __format_settings(settings: list[tuple[str, str]]) -> str:
+        """Formats the settings of a section as 'key = value' lines, for the debug messages."""
+        return "\n".join(f"{key} = {value}" for key, value in settings)
 
-        return conf_data
+    @contextmanager
+    def transaction(self):
+        """Groups changes to the SAMBA configuration file so they are written only once.
 
-    def __check_if_tag_exists(self, tag: str, conf_data: str) -> bool:
-        """Checks if a tag exists in a configuration file.
+        Used as a context manager. The changes are applied to a copy of the parsed configuration inside the block,
+        and the file is written atomically when the block ends, replacing the cached configuration. If an exception
+        is raised, nothing is written and the cached configuration is not changed.
+        If the server is active, the changes are applied to it only once, after the write.
 
-        Args:
-            tag (str): The tag to search for.
-            conf_data (str): The configuration file data as a unique string.
-        
-        Returns:
-            bool: True if the tag exists, False otherwise.
-        """
-        tag_data = re.search(rf"\[{tag.strip()}\]\s*", conf_data)
+        Transactions can be nested: the inner blocks join the outermost transaction. Transactions of different
+        threads are executed one at a time.
 
-        if tag_data is not None:
-            return True
-        else:
-            return False
-
-    def __check_if_setting_exists(self, tag: str, setting: str, conf_data: str) -> bool:
-        """Checks if a setting exists in a tag in a configuration file.
+        Yields:
+            SambaConfTransaction: The transaction used to make the changes.
 
-        Args:
-            tag (str): The tag to search for.
-            setting (str): The setting to search for in the tag.
-            conf_data (str): The configuration file data as a unique string.
-        
-        Returns:
-            bool: True if the setting exists, False otherwise.
+        Raises:
+            SambaServiceFailure: If the command to apply the changes to the running server returns a non-zero value.
         """
         
-        tag_data = self.__extract_tag_content(tag, conf_data)
-        setting_data = re.search(rf"\s*{setting} = .*", tag_data)
-
-        if setting_data is not None:
-            return True
-        else:
-            return False
-
-    def __create_tag(self, tag: str, conf_data: str) -> str:
-        """Creates an empty tag in a configuration file.
-
-        Args:
-            tag (str): The tag to create.
-            conf_data (str): The configuration file data as a unique string.
-        
-        Returns:
-            str: The new configuration file data with the created tag at the end.
-        """
+        with self.__conf_lock:
+            if self.__transaction is not None:
+                # Nested transaction: the changes will be written by the outermost one
+                yield self.__transaction
+                return
+            
+            # The changes are made in a copy, so the cached model stays as it is if the transaction is aborted
+            transaction = SambaConfTransaction(self.__load_samba_conf().copy())
+            self.__transaction = transaction
+            
+            try:
+                yield transaction
+            finally:
+                self.__transaction = None
+            
+            if not transaction.has_changes():
+                return
+            
+            self.__conf_cache.write(transaction.conf)
         
-        # Adding the tag header to the new content
-        tag_header = f"\n\n[{tag}]\n"
-
-        # Removing trailing spaces only at the end of the file
-        conf_data = conf_data.rstrip() + tag_header
-
-        return conf_data
-
-    def __extract_tag_content(self, tag: str, conf_data: str) -> str:
-        """Extracts the content of a tag from a configuration file.
-
-        Args:
-            tag (str): The tag to search for.
-            conf_data (str): The configuration file data as a unique string.
+        logger.debug("%d alteração(ões) salva(s) em %s.", len(transaction.changes), self.SAMBA_CONF_PATH)
         
-        Returns:
-            str: The content of the tag.
+        # Apply the changes to the server (if active)
+        if self.__server_active:
+            if self.apply_changes_automatically:
+                self.__apply_changes_to_server(transaction.changes)
+            else:
+                with self.__pending_changes_lock:
+                    self.__pending_changes.extend(transaction.changes)
+    
+    def has_pending_changes(self) -> bool:
+        """Checks if there are changes written to smb.conf that were not applied to the running server yet.
         
-        Raises:
-            TagNotFound: If the tag is not found in the configuration file.
+        Changes are only kept as pending when apply_changes_automatically is False.
         """
-
-        tag_data = re.search(rf"\[{tag}\]\s*(?P<tag_data>.*?)(?=\[|$)", conf_data, flags=re.DOTALL)
-
-        if tag_data is not None:
-            return tag_data.group("tag_data").strip()
-        else:
-            raise TagNotFound(tag)
+        
+        with self.__pending_changes_lock:
+            return len(self.__pending_changes) > 0
     
-    def __update_tag_content(self, tag: str, new_content: list, conf_data: str) -> str:
-        """Updates the content of a tag in a configuration file.
-
-        Args:
-            tag (str): The tag to search for.
-            new_content (list): The new content of the tag (only the content, not the tag itself) as list of strings.
-            conf_data (str): The configuration file to update as a unique string.
+    def apply_pending_changes(self) -> None:
+        """Applies the pending changes to the running server, restarting or reloading only what is needed.
+        
+        This method can be called from a worker thread.
 
-        Returns:
-            str: The new configuration file data with the updated tag content.
+        Raises:
+            SambaServiceFailure: If the reload or restart command returns a non-zero value.
         """
-
-        # Adding the tag header to the new content
-        new_content.insert(0, f"[{tag}]")
         
-        # Strip new content for consistency indentation
-        for i in range(len(new_content)):
-            new_content[i] = new_content[i].strip()
-        
-        # Removing empty lines
-        new_content = [line for line in new_content if line != ""]
-
-        # Joining the new content and adding 3 spaces before each line
-        indentation = "\n   "
-        new_content = indentation.join(new_content)
-        new_content += "\n"
+        with self.__pending_changes_lock:
+            changes = self.__pending_changes
+            self.__pending_changes = []
         
-        # Escaping backslashes
-        new_content = new_content.replace("\\", "\\\\")
-
-        # Updating the tag content
-        conf_data = re.sub(rf"\[{tag}\]\s*(.*?)(?=\[|$)", new_content, conf_data, flags=re.DOTALL)
-
-        return conf_data
+        if len(changes) > 0 and self.__server_active:
+            self.__apply_changes_to_server(changes)
     
-    def __update_setting_in_tag(self, tag: str, setting: str, new_value: str, conf_data: str) -> str:
-        """Updates a setting in a tag in a configuration file.
-        
-        If the setting doesn't exist, it will be added at the end of the tag.
-
-        Args:
-            tag (str): The tag to search for.
-            setting (str): The setting to update.
-            new_value (str): The new value of the setting.
-            conf_data (str): The configuration file to update as a unique string.
-
-        Returns:
-            str: The new configuration file data with the updated setting.
-        """
-        # Extract tag content
-        tag_data = self.__extract_tag_content(tag, conf_data)
-
-        # Escape backslashes in new value for setting
-        new_value = new_value.replace("\\", "\\\\")
-
-        if not self.__check_if_setting_exists(tag, setting, conf_data):
-            # If the setting doesn't exist, we add it to the end of the tag
-            tag_data += f"\n   {setting} = {new_value}"
-        else:
-            # If the setting exists, we update it
-            tag_data = re.sub(rf"{setting} = .*", f"{setting} = {new_value}", tag_data)
-
-        # Update tag content in configuration data
-        conf_data = self.__update_tag_content(tag, tag_data.split("\n"), conf_data)
-
-        return conf_data
-
-    def __remove_setting_from_tag(self, tag: str, setting: str, conf_data: str) -> str:
-        """Removes a setting from a tag in a configuration file.
+    def __clear_pending_changes(self) -> None:
+        """Discards the pending changes. Used when the server is started or stopped, since it reads the whole configuration again."""
         
-        If the setting doesn't exist, this method does nothing.
+        with self.__pending_changes_lock:
+            self.__pending_changes = []
 
-        Args:
-            tag (str): The tag to search for.
-            setting (str): The setting to remove.
-            conf_data (str): The configuration file to update as a unique string.
+    def get_samba_conf_cache_stats(self) -> dict:
+        """Returns the hit and miss counters of the SAMBA configuration cache.
 
         Returns:
-            str: The new configuration file data with the setting removed.
-        """
-        # Extract tag content
-        tag_data = self.__extract_tag_content(tag, conf_data)
-
-        # Remove the setting from the tag content
-        tag_data = re.sub(rf"\s*{setting} = .*", "", tag_data)
-
-        # Update tag content in configuration data
-        conf_data = self.__update_tag_content(tag, tag_data.split("\n"), conf_data)
-
-        return conf_data
-
-    def __extract_setting_from_tag(self, tag: str, setting: str, conf_data: str) -> str:
-        """Extracts a setting from a tag in a configuration file.
-
-        Args:
-            tag (str): The tag to search for.
-            setting (str): The setting to extract.
-            conf_data (str): The configuration file to search in as a unique string.
-
-        Returns:
-            str: The value of the setting.
-
-        Raises:
-            SettingNotFound: If the setting is not found in the tag.
+            dict: A dictionary with the number of hits and misses.
         """
-        # Extract tag content
-        tag_data = self.__extract_tag_content(tag, conf_data)
-
-        # Extract setting value
-        setting_value = re.search(rf"\s*{setting} = (.*)", tag_data)
-
-        if setting_value is not None:
-            return setting_value.group(1).strip()
-        else:
-            raise SettingNotFound(setting)
+        return self.__conf_cache.get_stats()
 
     def __validate_netbios_name(self, netbios_name: str) -> None:
         """Validates a NetBIOS name.
@@ -305,35 +256,29 @@ class SambaManager:
         Raises:
             GlobalSettingsNotFound: If the [global] section is not found in the SAMBA configuration.
         """
-        conf_data = self.__read_samba_conf()
-
-        if self.debug:
-            print()
-            print(Fore.CYAN + "Verificando a seção [global] do arquivo de configuração do SAMBA...")
-            print(Fore.CYAN + f"Dados lidos de {self.SAMBA_CONF_PATH}:")
-            for line in conf_data:
-                print(line, end='')
-            print()
+        conf = self.__load_samba_conf()
 
-        conf_data = "".join(conf_data)
-        global_config_data = self.__extract_tag_content("global", conf_data)
+        logger.debug("Verificando a seção [global] do arquivo de configuração do SAMBA...\nDados lidos de %s:\n%s",
+                     self.SAMBA_CONF_PATH, LazyMessage(conf.dumps))
 
-        if global_config_data is None:
+        if not conf.has_section("global"):
             raise GlobalSettingsNotFound()
 
-        if self.debug:
-            print(Fore.CYAN + "Dados da seção [global]:")
-            print(global_config_data)
+        global_section = conf.get_section("global")
+
+        logger.debug("Dados da seção [global]:\n%s", LazyMessage(lambda: self.__format_settings(global_section.settings())))
         
         # Validando a seção [global]
         global_valid = True
 
-        global_regexes = [r"\s*netbios name = .*", r"\s*server min protocol = NT1", r"\s*client min protocol = NT1"]
+        if not global_section.has("netbios name"):
+            global_valid = False
+            logger.error("Erro: netbios name não encontrado no arquivo de configuração.")
 
-        for regex in global_regexes:
-            if not re.search(regex, global_config_data):
+        for setting, value in self.GLOBAL_REQUIRED_SETTINGS:
+            if not global_section.has(setting) or global_section.get(setting).upper() != value:
                 global_valid = False
-                print(Fore.RED + f"Erro: {regex} não encontrado no arquivo de configuração.")
+                logger.error("Erro: %s = %s não encontrado no arquivo de configuração.", setting, value)
 
         return global_valid    
 
@@ -343,61 +288,22 @@ class SambaManager:
         # Creating a backup of the original SAMBA configuration file (if it doesn't already exist)
         os.system(f"cp --update=none {self.SAMBA_CONF_PATH} {self.SAMBA_CONF_PATH}.bak")
 
-        # Reading the SAMBA configuration file
-        conf_data = self.__read_samba_conf()
-
-        # Extracting the [global] section content
-        global_config_data = self.__extract_tag_content("global", "".join(conf_data))
+        with self.transaction() as transaction:
+            conf = transaction.conf
 
-        # Check for netbios name
-        netbios_name = re.search(r"\s*netbios name = (.*)", global_config_data)
+            if not conf.has_section("global"):
+                raise GlobalSettingsNotFound()
 
-        if netbios_name is not None:
-            # If we find the netbios name, we remove the line with it to add it later
-            global_config_data = re.sub(r"\s*netbios name = (.*)", "", global_config_data)
-            # Save the netbios name already set
-            netbios_name = netbios_name.group(1)
-        else:
             # If we don't find the netbios name, we'll add a default name
-            netbios_name = self.DEFAULT_NETBIOS_NAME
-
-        # Removing settings that may already exist but we need to ensure they are correct
-        global_config_data = re.sub(r"\bserver min protocol = .*|\bclient min protocol = .*", "", global_config_data).strip()
-        print(Fore.GREEN + "Configurações antigas removidas.")
+            if not conf.has("global", "netbios name"):
+                transaction.set("global", "netbios name", self.DEFAULT_NETBIOS_NAME)
 
-        if self.debug:
-            print()
-            print(Fore.CYAN + "Arquivo sem as configurações antigas:")
-            print(global_config_data)
-            print()
+            # Ensuring the protocol settings are correct (they are updated in place or added)
+            for setting, value in self.GLOBAL_REQUIRED_SETTINGS:
+                transaction.set("global", setting, value)
 
-        # Splitting the global configuration data into lines
-        global_config_data = global_config_data.split("\n")
-
-        for i in range(len(global_config_data)):
-            # Removing leading and trailing whitespaces
-            global_config_data[i] = global_config_data[i].strip()
-        
-        # Adding the new settings
-        global_config_data.insert(0, "netbios name = " + netbios_name)
-        global_config_data.insert(1, "server min protocol = NT1")
-        global_config_data.insert(2, "client min protocol = NT1")
-
-        # Removing the old [global] section from the original configuration file
-        conf_data = self.__update_tag_content("global", global_config_data, "".join(conf_data))
-
-        # Writing the new configuration file
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
-
-        print(Fore.GREEN + "Configurações globais do compartilhamento SAMBA atualizadas com sucesso!")
-
-        if self.debug:
-            print()
-            print(Fore.CYAN + "Novo arquivo de configuração do SAMBA:")
-            print(conf_data.strip())
-            print()
+        logger.success("Configurações globais do compartilhamento SAMBA atualizadas com sucesso!")
+        logger.debug("Novo arquivo de configuração do SAMBA:\n%s", LazyMessage(lambda: conf.dumps().strip()))
     
     def get_netbios_name(self) -> str:
         """Returns the NetBIOS name of the SAMBA server.
@@ -406,8 +312,7 @@ class SambaManager:
             str: The NetBIOS name of the SAMBA server.
         """
         if self.__netbios_name == "":
-            conf_data = self.__read_samba_conf()
-            self.__netbios_name = self.__extract_setting_from_tag("global", "netbios name", "".join(conf_data))
+            self.__netbios_name = self.__load_samba_conf().get("global", "netbios name")
         
         return self.__netbios_name
     
@@ -419,7 +324,7 @@ class SambaManager:
 
         Raises:
             ValueError: If the NetBIOS name is the same, empty, has more than 15 characters or contains invalid characters.
-            SambeServiceFailure: If the service restart command returns a non-zero value.
+            SambaServiceFailure: If the command to apply the change to the running server returns a non-zero value.
         """
 
         self.__validate_netbios_name(netbios_name)
@@ -427,21 +332,12 @@ class SambaManager:
         if self.__netbios_name == netbios_name:
             raise ValueError("O nome NetBIOS informado é o mesmo que já está configurado.")
 
-        conf_data = self.__read_samba_conf()
-        conf_data = self.__update_setting_in_tag("global", "netbios name", netbios_name, "".join(conf_data))
-
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
+        with self.transaction() as transaction:
+            transaction.set("global", "netbios name", netbios_name)
 
-        self.__netbios_name = netbios_name
+            self.__netbios_name = netbios_name
         
-        if self.debug:
-            print(Fore.GREEN + f"Nome NetBIOS alterado para '{netbios_name}' com sucesso!")
-        
-        # Restart server (if active) to changes take effect
-        if self.__server_active:
-            self.restart_server()
+        logger.debug("Nome NetBIOS alterado para '%s' com sucesso!", netbios_name)
     
     # --- PS2 SHARE METHODS ---
     
@@ -471,57 +367,45 @@ class SambaManager:
         
         return ps2_force_user
     
-    def __get_default_ps2_share_settings(self) -> list:
+    def __get_default_ps2_share_settings(self) -> list[tuple[str, str]]:
         """Returns the default settings for the PS2 share configuration.
         The user_name is used to create the default shared folder path, wich is /home/#user_name/PS2SMB.
         
         Returns:
-            list: The default settings for the PS2 share configuration.
+            list: The default settings for the PS2 share configuration as (setting, value) tuples.
         """
         
         ps2_default_settings = [
-            "comment = Pasta compartilhada com o PS2",
-            "guest ok = yes",
-            "read only = no",
-            "browseable = yes",
-            "create mask = 0777",
-            "directory mask = 0777"
+            ("comment", "Pasta compartilhada com o PS2"),
+            ("guest ok", "yes"),
+            ("read only", "no"),
+            ("browseable", "yes"),
+            ("create mask", "0777"),
+            ("directory mask", "0777")
         ]
         
         # Creating default folder path: /home/<user_name>/PS2SMB
         default_shared_folder = self.__get_ps2_default_folder_path()
         
         # Add path to the default settings
-        ps2_default_settings.insert(1, f"path = {default_shared_folder}")
+        ps2_default_settings.insert(1, ("path", default_shared_folder))
         # Add force user to the default settings
-        ps2_default_settings.append(f"force user = {self.__get_ps2_force_user()}")
+        ps2_default_settings.append(("force user", self.__get_ps2_force_user()))
         
         return ps2_default_settings
     
-    def __get_default_ps2_share_settings_regex(self) -> list:
-        """Uses the default settings for the PS2 share configuration to create regexes and validate the configuration.
-        These regexes are used to check if the configuration is correct in the SAMBA configuration file.
+    def __get_required_ps2_share_settings(self) -> list[tuple[str, str]]:
+        """Uses the default settings for the PS2 share configuration to get the settings that must be validated.
+        These settings are used to check if the configuration is correct in the SAMBA configuration file.
 
         Returns:
-            list: The default settings for the PS2 share configuration as regexes. Comments and path settings are ignored.
+            list: The required settings for the PS2 share configuration as (setting, value) tuples. Comments and path settings are ignored.
         """
         
-        default_settings = self.__get_default_ps2_share_settings()
-        
-        # Creating regex for the default settings
-        
-        ps2_default_settings_regex = []
-        for setting in default_settings:
-            # Ignoring the path and comment settings
-            if setting.startswith("path = ") or setting.startswith("comment = "):
-                continue
-            
-            # Creating regex for the setting
-            setting_regex = "\\s*" + setting.strip()
-            
-            ps2_default_settings_regex.append(setting_regex)
-        
-        return ps2_default_settings_regex
+        return [
+            (setting, value) for setting, value in self.__get_default_ps2_share_settings()
+            if setting not in ("path", "comment")
+        ]
     
     def check_ps2_share_settings(self) -> None:
         """Checks if the PS2 share configurations are correct in the SAMBA configuration file for communicating with the PS2.
@@ -529,47 +413,36 @@ class SambaManager:
         
         Regarding the path, THIS METHOD ONLY CHECKS IF THE PATH IS SET. IT DOESN'T CHECK IF IT IS CORRECT OR EXISTS.
         
-        If the configuration is correct, it prints a success message.
+        If the configuration is correct, it logs a success message.
         
         Raises:
             TagNotFound: If the [PS2SMB] section is not found in the SAMBA configuration file.
             SettingNotFound: If any of the settings are not found in the [PS2SMB] section.
         """
         
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
+        conf = self.__load_samba_conf()
         
-        if self.debug:
-            print()
-            print(Fore.CYAN + "Verificando a seção [PS2SMB] do arquivo de configuração do SAMBA...")
-            print(Fore.CYAN + f"Dados lidos de {self.SAMBA_CONF_PATH}:")
-            print(conf_data)
-            print()
+        logger.debug("Verificando a seção [%s] do arquivo de configuração do SAMBA...\nDados lidos de %s:\n%s",
+                     self.PS2_SHARE_NAME, self.SAMBA_CONF_PATH, LazyMessage(conf.dumps))
         
         # If the share config [PS2SMB] is not found, this line will raise an exception and stop the execution
-        share_config_data = self.__extract_tag_content(self.PS2_SHARE_NAME, conf_data)
+        share_section = conf.get_section(self.PS2_SHARE_NAME)
         
-        if self.debug:
-            print(Fore.CYAN + f"Dados lidos da seção [{self.PS2_SHARE_NAME}]:")
-            print(share_config_data)
+        logger.debug("Dados lidos da seção [%s]:\n%s", self.PS2_SHARE_NAME,
+                     LazyMessage(lambda: self.__format_settings(share_section.settings())))
         
         # If the config was found, we'll first check for the path
-        folder_path_regex = r"\s*path = (.*)"
-        
-        folder_path = re.search(folder_path_regex, share_config_data)
-        if folder_path == None:
+        if not share_section.has("path"):
             # If the path is not found, we raise this exception
             raise SettingNotFound("path")
         
-        # If the path was found we'll check for the other settings using generated regexes
-        other_settings_regexes = self.__get_default_ps2_share_settings_regex()
-        
-        for regex in other_settings_regexes:
-            if not re.search(regex, share_config_data):
-                raise SettingNotFound(regex.split("=")[0].strip().replace("\\s*", ""))
+        # If the path was found we'll check for the other settings
+        for setting, value in self.__get_required_ps2_share_settings():
+            if not share_section.has(setting) or share_section.get(setting).lower() != value.lower():
+                raise SettingNotFound(setting)
         
-        # If everything is ok, this will be printed
-        print(Fore.GREEN + "Configuração de compartilhamento do PS2 está correta.")
+        # If everything is ok, this will be logged
+        logger.success("Configuração de compartilhamento do PS2 está correta.")
     
     def create_default_ps2_share_config(self) -> None:
         """Add the PS2 share configuration with the default settings in the SAMBA configuration file.
@@ -577,34 +450,20 @@ class SambaManager:
         If the configuration doesn't exist, it will be created with the default values.
         """
         
-        # Reading the SAMBA configuration file
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
-
-        if not self.__check_if_tag_exists(self.PS2_SHARE_NAME, conf_data):
-            # If the tag doesn't exist, we create it
-            conf_data = self.__create_tag(self.PS2_SHARE_NAME, conf_data)
-            print(Fore.GREEN + f"Tag [{self.PS2_SHARE_NAME}] criada com sucesso!")
-        
         # Getting the default settings for the PS2 share configuration
         default_settings = self.__get_default_ps2_share_settings()
         
-        # Replacing the old settings with the default settings
-        conf_data = self.__update_tag_content(self.PS2_SHARE_NAME, default_settings, conf_data)
-        
-        # Writing the new configuration file
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
+        with self.transaction() as transaction:
+            if not transaction.conf.has_section(self.PS2_SHARE_NAME):
+                # If the tag doesn't exist, we create it
+                transaction.add_section(self.PS2_SHARE_NAME)
+                logger.success("Tag [%s] criada com sucesso!", self.PS2_SHARE_NAME)
+            
+            # Replacing the old settings with the default settings
+            transaction.replace_section_settings(self.PS2_SHARE_NAME, default_settings)
 
-        print(Fore.GREEN + f"Configuração de compartilhamento do PS2 criada com sucesso em {self.SAMBA_CONF_PATH}!")
-        
-        if self.debug:
-            print()
-            print(Fore.CYAN + "Dados da configuração de compartilhamento do PS2:")
-            for line in default_settings:
-                print(line)
-            print()
+        logger.success("Configuração de compartilhamento do PS2 criada com sucesso em %s!", self.SAMBA_CONF_PATH)
+        logger.debug("Dados da configuração de compartilhamento do PS2:\n%s", LazyMessage(lambda: self.__format_settings(default_settings)))
     
     def check_ps2_share_folder_exists(self) -> bool:
         """Checks if the PS2 share folder exists.
@@ -616,10 +475,10 @@ class SambaManager:
         path = self.get_ps2_share_folder_path()
         
         if os.path.exists(path):
-            print(Fore.GREEN + f"A pasta compartilhada do PS2 '{path}' existe.")
+            logger.success("A pasta compartilhada do PS2 '%s' existe.", path)
             return True
         else:
-            print(Fore.RED + f"A pasta compartilhada do PS2 '{path}' não existe.")
+            logger.error("A pasta compartilhada do PS2 '%s' não existe.", path)
             return False
     
     def check_ps2_share_folder_permissions(self) -> bool:
@@ -634,10 +493,10 @@ class SambaManager:
         path = self.get_ps2_share_folder_path()
         
         if os.access(path, os.W_OK | os.R_OK):
-            print(Fore.GREEN + f"A pasta compartilhada do PS2 '{path}' possui permissão de leitura e escrita.")
+            logger.success("A pasta compartilhada do PS2 '%s' possui permissão de leitura e escrita.", path)
             return True
         else:
-            print(Fore.RED + f"A pasta compartilhada do PS2 '{path}' não possui permissão de leitura e escrita.")
+            logger.error("A pasta compartilhada do PS2 '%s' não possui permissão de leitura e escrita.", path)
             return False
     
     def create_ps2_share_folder(self, path: str = "") -> str:
@@ -665,14 +524,14 @@ class SambaManager:
             
             os.chmod(path, 0o777)
             
-            print(Fore.GREEN + f"Pasta compartilhada do PS2 criada com sucesso em '{path}'!")
+            logger.success("Pasta compartilhada do PS2 criada com sucesso em '%s'!", path)
         
         except OSError as e:
-            print(Fore.RED + f"Erro ao criar a pasta compartilhada do PS2: {e}")
+            logger.error("Erro ao criar a pasta compartilhada do PS2: %s", e)
             raise e
         
         except Exception as e:
-            print(Fore.RED + f"Erro desconhecido: {e}")
+            logger.error("Erro desconhecido: %s", e)
             raise e
         
         return path
@@ -690,7 +549,7 @@ class SambaManager:
         
         os.chmod(self.__shared_ps2_folder_path, 0o777)
         
-        print(Fore.GREEN + f"Permissões de leitura e escrita adicionadas à pasta compartilhada do PS2 '{self.__shared_ps2_folder_path}'!")
+        logger.success("Permissões de leitura e escrita adicionadas à pasta compartilhada do PS2 '%s'!", self.__shared_ps2_folder_path)
     
     def load_from_conf_ps2_folder_path(self) -> None:
         """Loads the PS2 share folder path from the SAMBA configuration file into the internal variable.
@@ -699,11 +558,10 @@ class SambaManager:
         If the path is not found, it will be set to an empty string.
         """
         
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
+        conf = self.__load_samba_conf()
         
         try:
-            self.__shared_ps2_folder_path = self.__extract_setting_from_tag(self.PS2_SHARE_NAME, "path", conf_data)
+            self.__shared_ps2_folder_path = conf.get(self.PS2_SHARE_NAME, "path")
         
         except SettingNotFound:
             self.__shared_ps2_folder_path = ""
@@ -728,7 +586,7 @@ class SambaManager:
 
         Raises:
             ValueError: If the path is empty or doesn't exist.
-            SambaServiceFailure: If the service restart command returns a non-zero value.
+            SambaServiceFailure: If the command to apply the change to the running server returns a non-zero value.
         """
         
         if path == "":
@@ -736,20 +594,12 @@ class SambaManager:
         elif not os.path.exists(path):
             raise ValueError("O caminho da pasta compartilhada não existe.")
         
-        conf_data = self.__read_samba_conf()
-        conf_data = self.__update_setting_in_tag(self.PS2_SHARE_NAME, "path", path, "".join(conf_data))
-
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
+        with self.transaction() as transaction:
+            transaction.set(self.PS2_SHARE_NAME, "path", path)
 
-        self.__shared_ps2_folder_path = path
+            self.__shared_ps2_folder_path = path
         
-        print(Fore.GREEN + f"Caminho da pasta compartilhada alterado para '{path}' com sucesso!")
-        
-        # Restart server (if active) to changes take effect
-        if self.__server_active:
-            self.restart_server()
+        logger.success("Caminho da pasta compartilhada alterado para '%s' com sucesso!", path)
     
     # --- NETWORK INTERFACE METHODS ---
     
@@ -760,6 +610,9 @@ class SambaManager:
             list: A list of network interfaces available on the system.
         """
         
+        # psutil is only imported when needed, so the commands of the CLI that don't use it start faster
+        import psutil
+        
         interfaces = psutil.net_if_addrs()
         interface_list = []
         
@@ -782,6 +635,8 @@ class SambaManager:
             If the interface is not found, an empty list is returned.
         """
         
+        import psutil
+        
         interfaces = psutil.net_if_addrs()
         ipv4_addresses = []
         
@@ -802,6 +657,8 @@ class SambaManager:
             str: The subnet mask for the given IPv4 address or None if the address is not found.
         """
         
+        import psutil
+        
         interfaces = psutil.net_if_addrs()
         
         for interface in interfaces:
@@ -857,6 +714,8 @@ class SambaManager:
             bool: True if the network interface exists, False otherwise.
         """
         
+        import psutil
+        
         interfaces = psutil.net_if_addrs()
         
         if interface in interfaces:
@@ -867,24 +726,16 @@ class SambaManager:
     def __erase_interface_and_ip(self) -> None:
         """Erases the network interface and IP address from the SAMBA configuration file and internal variables."""
         
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
-        
-        # Removing the interface and IP address from the [global] section
-        conf_data = self.__remove_setting_from_tag("global", "interfaces", conf_data)
-        conf_data = self.__remove_setting_from_tag("global", "bind interfaces only", conf_data)
-        
-        # Writing the new configuration file
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
-        
-        # Erasing the internal variables
-        self.__server_interface = None
-        self.__server_ip = None
+        with self.transaction() as transaction:
+            # Removing the interface and IP address from the [global] section
+            transaction.remove("global", "interfaces")
+            transaction.remove("global", "bind interfaces only")
+            
+            # Erasing the internal variables
+            self.__server_interface = None
+            self.__server_ip = None
         
-        if self.debug:
-            print(Fore.GREEN + "Interface e IP apagados do arquivo de configuração do SAMBA.")
+        logger.debug("Interface e IP apagados do arquivo de configuração do SAMBA.")
     
     def set_interface_and_ip(self, interface: str | None, ip: str | None) -> None:
         """Sets the network interface and IP address in the SAMBA configuration file and internally.
@@ -901,29 +752,17 @@ class SambaManager:
             self.__erase_interface_and_ip()
             return
         
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
-        
-        # Adding the interface and IP address to the [global] section
-        conf_data = self.__update_setting_in_tag("global", "interfaces", f"{interface} {ip}", conf_data)
-        # Adding binding to the interface
-        conf_data = self.__update_setting_in_tag("global", "bind interfaces only", "yes", conf_data)
-        
-        # Writing the new configuration file
-        conf_file = open(self.SAMBA_CONF_PATH, "w")
-        conf_file.write(conf_data)
-        conf_file.close()
-        
-        # Saving the interface and IP address in the internal variables
-        self.__server_interface = interface
-        self.__server_ip = ip
-        
-        if self.debug:
-            print(Fore.GREEN + f"Interface {interface} e IP {ip} foram carregados no arquivo de configuração do SAMBA.")
+        with self.transaction() as transaction:
+            # Adding the interface and IP address to the [global] section
+            transaction.set("global", "interfaces", f"{interface} {ip}")
+            # Adding binding to the interface
+            transaction.set("global", "bind interfaces only", "yes")
+            
+            # Saving the interface and IP address in the internal variables
+            self.__server_interface = interface
+            self.__server_ip = ip
         
-        # Restart server (if active) to changes take effect
-        if self.__server_active:
-            self.restart_server()
+        logger.debug("Interface %s e IP %s foram carregados no arquivo de configuração do SAMBA.", interface, ip)
     
     def get_interfaces_in_samba_conf(self) -> list[str]:
         """Returns the network interfaces set in the SAMBA configuration file.
@@ -933,11 +772,10 @@ class SambaManager:
 
             If there are no interfaces set, an empty list is returned.
         """
-        conf_data = self.__read_samba_conf()
-        conf_data = "".join(conf_data)
+        conf = self.__load_samba_conf()
         
         try:
-            interface = self.__extract_setting_from_tag("global", "interfaces", conf_data)
+            interface = conf.get("global", "interfaces")
             
             interface = interface.split(" ")
             
@@ -949,6 +787,42 @@ class SambaManager:
         
         return interface
     
+    def load_interface_and_ip_from_conf(self) -> bool:
+        """Loads the interface and IP address set in the SAMBA configuration file into the internal variables.
+        
+        Nothing is loaded if the interface doesn't exist or the IP address is not bound to it.
+
+        Returns:
+            bool: True if the interface and IP address were loaded, False otherwise.
+        """
+        
+        samba_interfaces = self.get_interfaces_in_samba_conf()
+        
+        if len(samba_interfaces) != 2:
+            return False
+        
+        interface, ip = samba_interfaces
+        
+        if not self.check_if_interface_exists(interface) or not self.check_if_ip_is_valid(ip):
+            return False
+        
+        if not self.check_if_ip_is_bound(ip, interface):
+            return False
+        
+        self.__server_interface = interface
+        self.__server_ip = ip
+        
+        return True
+    
+    def get_current_ip(self) -> str | None:
+        """Returns the current IP address set for the SAMBA server.
+        
+        Returns:
+            str: The current IP address set for the SAMBA server or None if not set.
+        """
+        
+        return self.__server_ip
+    
     def get_current_interface(self) -> str | None:
         """Returns the current network interface set for the SAMBA server.
         
@@ -960,6 +834,161 @@ class SambaManager:
     
     # --- SAMBA SERVICE METHODS ---
     
+    def __run_service_command(self, command: list[str]) -> int:
+        """Runs a service command and returns its return code.
+        
+        This method is thread safe, so it can be called from worker threads. The command can be interrupted
+        from any thread with cancel_service_commands.
+
+        Args:
+            command (list[str]): The command and its arguments.
+
+        Returns:
+            int: The return code of the command. If the program is not found, 127 is returned, like in the shell.
+        
+        Raises:
+            ServiceCommandTimeout: If the command takes more than SERVICE_COMMAND_TIMEOUT seconds.
+            ServiceCommandCancelled: If the command was cancelled with cancel_service_commands.
+        """
+        
+        try:
+            process = subprocess.Popen(command)
+        except FileNotFoundError:
+            return 127
+        
+        # The cancelled flag is stored in the process object, so cancel_service_commands can mark it
+        process.cancelled = False
+        
+        with self.__running_processes_lock:
+            self.__running_processes.add(process)
+        
+        try:
+            ret = process.wait(timeout=self.SERVICE_COMMAND_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise ServiceCommandTimeout(" ".join(command), self.SERVICE_COMMAND_TIMEOUT)
+        finally:
+            with self.__running_processes_lock:
+                self.__running_processes.discard(process)
+        
+        if process.cancelled:
+            raise ServiceCommandCancelled(" ".join(command))
+        
+        return ret
+    
+    def cancel_service_commands(self) -> None:
+        """Interrupts the service commands that are running (in any thread).
+        
+        The methods that were running them raise ServiceCommandCancelled.
+        """
+        
+        with self.__running_processes_lock:
+            for process in self.__running_processes:
+                process.cancelled = True
+                process.terminate()
+    
+    def __classify_changes(self, changes: list[tuple[str, str | None]]) -> tuple[list[str], bool]:
+        """Decides how the changes made to the SAMBA configuration file must be applied to the running server.
+        
+        Changes in the [global] settings listed in RESTART_REQUIRED_SETTINGS need a restart of the daemons
+        that use them. Every other change (like share settings) is applied live by reloading the smbd configuration.
+
+        Args:
+            changes (list): The (section, setting) pairs changed, as in SambaConfTransaction.changes.
+
+        Returns:
+            tuple: The list of daemons to restart and if smbd must reload its configuration.
+        """
+        
+        daemons_to_restart = set()
+        reload_config = False
+        
+        for section, setting in changes:
+            daemons = None
+            
+            if SambaConf.normalize_section_name(section) == "global" and setting is not None:
+                daemons = self.RESTART_REQUIRED_SETTINGS.get(SambaConfSection.normalize_key(setting))
+            
+            if daemons is None:
+                reload_config = True
+            else:
+                daemons_to_restart.update(daemons)
+        
+        # smbd reads the whole configuration again when it restarts
+        if "smbd" in daemons_to_restart:
+            reload_config = False
+        
+        return [daemon for daemon in self.SAMBA_SERVICES if daemon in daemons_to_restart], reload_config
+    
+    def __apply_changes_to_server(self, changes: list[tuple[str, str | None]]) -> None:
+        """Applies the changes made to the SAMBA configuration file to the running server, restarting only what is needed.
+
+        Args:
+            changes (list): The (section, setting) pairs changed, as in SambaConfTransaction.changes.
+
+        Raises:
+            SambaServiceFailure: If the reload or restart command returns a non-zero value.
+        """
+        
+        daemons_to_restart, reload_config = self.__classify_changes(changes)
+        
+        if len(daemons_to_restart) > 0:
+            if self.__server_interface is None or self.__server_ip is None:
+                # Without an interface the daemons would listen on every interface with SMBv1, so we don't restart them.
+                # The changes will be applied the next time the server is started
+                logger.debug("Interface e IP não definidos. As alterações serão aplicadas quando o servidor for iniciado novamente.")
+                return
+            
+            self.restart_services(daemons_to_restart)
+        
+        if reload_config:
+            self.reload_server_config()
+    
+    def reload_server_config(self) -> int:
+        """Asks smbd to reload its configuration without dropping the active sessions.
+        
+        'smbcontrol smbd reload-config' is used. If it fails, the reload is done by systemd (SIGHUP to smbd).
+
+        Returns:
+            int: The return code of the reload command.
+
+        Raises:
+            SambaServiceFailure: If the reload command returns a non-zero value.
+        """
+        
+        ret = self.__run_service_command(["smbcontrol", "smbd", "reload-config"])
+        
+        if ret != 0:
+            ret = self.__run_service_command(["systemctl", "reload", "smbd"])
+        
+        if ret != 0:
+            raise SambaServiceFailure(ret)
+        
+        logger.success("Configuração do servidor SAMBA recarregada com sucesso!")
+        return ret
+    
+    def restart_services(self, daemons: list[str]) -> int:
+        """Restarts only the given SAMBA daemons.
+
+        Args:
+            daemons (list[str]): The daemons to restart (smbd and/or nmbd).
+
+        Returns:
+            int: The return code of the service restart command.
+
+        Raises:
+            SambaServiceFailure: If the service restart command returns a non-zero value.
+        """
+        
+        ret = self.__run_service_command(["systemctl", "restart", *daemons])
+        
+        if ret != 0:
+            raise SambaServiceFailure(ret)
+        
+        logger.success("Serviço(s) %s reiniciado(s) com sucesso!", ", ".join(daemons))
+        return ret
+    
     def start_server(self) -> int:
         """Starts the SAMBA and NetBIOS service.
 
@@ -977,13 +1006,14 @@ class SambaManager:
         if self.__server_ip is None:
             raise ValueError("O IP do servidor não foi definido. Defina o IP do servidor antes de iniciar o servidor!")
         
-        ret = os.system("systemctl start smbd nmbd")
+        ret = self.__run_service_command(["systemctl", "start", *self.SAMBA_SERVICES])
         
         if ret != 0:
             raise SambaServiceFailure(ret)
         else:
-            print(Fore.GREEN + "Servidor SAMBA e NetBIOS iniciado com sucesso!")
+            logger.success("Servidor SAMBA e NetBIOS iniciado com sucesso!")
             self.__server_active = True
+            self.__clear_pending_changes()
             return ret
     
     def stop_server(self) -> int:
@@ -996,13 +1026,14 @@ class SambaManager:
             SambaServiceFailure: If the service stop command returns a non-zero value.
         """
         
-        ret = os.system("systemctl stop smbd nmbd")
+        ret = self.__run_service_command(["systemctl", "stop", *self.SAMBA_SERVICES])
         
         if ret != 0:
             raise SambaServiceFailure(ret)
         else:
-            print(Fore.GREEN + "Servidor SAMBA e NetBIOS parados com sucesso!")
+            logger.success("Servidor SAMBA e NetBIOS parados com sucesso!")
             self.__server_active = False
+            self.__clear_pending_changes()
             return ret
     
     def restart_server(self) -> int:
@@ -1022,15 +1053,28 @@ class SambaManager:
         if self.__server_interface is None:
             raise ValueError("A interface do servidor não foi definida. Defina a interface do servidor antes de reiniciar o servidor!")
         
-        ret = os.system("systemctl restart smbd nmbd")
+        ret = self.__run_service_command(["systemctl", "restart", *self.SAMBA_SERVICES])
         
         if ret != 0:
             raise SambaServiceFailure(ret)
         else:
-            print(Fore.GREEN + "Servidor SAMBA e NetBIOS reiniciados com sucesso!")
+            logger.success("Servidor SAMBA e NetBIOS reiniciados com sucesso!")
             self.__server_active = True
+            self.__clear_pending_changes()
             return ret
 
+    def refresh_server_status(self) -> bool:
+        """Asks systemd if the SAMBA and NetBIOS services are running and updates the server status.
+
+        Returns:
+            bool: True if all the services are active, False otherwise.
+        """
+        
+        ret = self.__run_service_command(["systemctl", "is-active", "--quiet", *self.SAMBA_SERVICES])
+        self.__server_active = ret == 0
+        
+        return self.__server_active
+
     def get_server_status(self) -> bool:
         """Returns the status of the SAMBA and NetBIOS service.
 
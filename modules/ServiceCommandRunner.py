@@ -0,0 +1,232 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+
+from modules.Exceptions import *
+from modules.Logger import get_logger
+
+logger = get_logger("gui")
+
+class ServiceTask(QRunnable):
+    """A command executed by the ServiceCommandRunner in a worker thread.
+
+    The function receives the task itself, so it can report progress with report_progress
+    and check if it was cancelled with the cancelled attribute.
+
+    Attributes:
+        name (str): The name of the task. Only one task with the same name can run at a time.
+        conflicts (set[str]): Groups of commands this task conflicts with. Tasks that share a group never run at the same time.
+        cancelled (bool): If the task was cancelled.
+        done (bool): If the function returned in the worker thread. Set before the result reaches the GUI thread.
+    """
+
+    def __init__(self, runner: "ServiceCommandRunner", name: str, function: callable, conflicts: set[str], cancel: callable = None):
+        super().__init__()
+        self.setAutoDelete(False)  # The runner keeps the reference until the task is done
+
+        self.runner = runner
+        self.name = name
+        self.function = function
+        self.conflicts = conflicts
+        self.cancel_function = cancel
+        self.cancelled = False
+        self.done = False
+
+        # Callbacks executed in the GUI thread
+        self.on_finished = None
+        self.on_failed = None
+
+    def report_progress(self, message: str) -> None:
+        """Reports the progress of the task. The message is delivered in the GUI thread by the command_progress signal."""
+
+        self.runner._progress_reported.emit(self.name, message)
+
+    def run(self) -> None:
+        """Executes the function in the worker thread and sends the result to the GUI thread."""
+
+        if self.cancelled:
+            self.__send_result(None, ServiceCommandCancelled(self.name))
+            return
+
+        try:
+            result = self.function(self)
+        except BaseException as e:
+            # The traceback only reaches the sinks when the DEBUG messages are enabled
+            logger.debug("A tarefa %s falhou.", self.name, exc_info=True)
+
+            self.__send_result(None, e)
+            return
+
+        self.__send_result(result, None)
+
+    def __send_result(self, result, error: BaseException | None) -> None:
+        self.done = True
+
+        try:
+            self.runner._task_done.emit(self, result, error)
+        except RuntimeError:
+            # The runner was destroyed while the task ran (abandoned when the program closed)
+            logger.debug("A tarefa %s terminou depois do encerramento do programa.", self.name)
+
+class ServiceCommandRunner(QObject):
+    """Runs blocking service commands (systemctl, ip...) in a thread pool, so the GUI never freezes while they run.
+
+    Tasks that share a conflict group are never run concurrently: a new task is refused while a conflicting one is running.
+    Running tasks can be cancelled through the cancel function given when they were submitted.
+
+    All the signals and callbacks are delivered in the thread that owns the runner (the GUI thread).
+    """
+
+    # Signal sent when a task starts: (name)
+    command_started = pyqtSignal(str)
+
+    # Signal sent when a task reports progress: (name, message)
+    command_progress = pyqtSignal(str, str)
+
+    # Signal sent when a task finishes successfully: (name, result)
+    command_finished = pyqtSignal(str, object)
+
+    # Signal sent when a task raises an exception or is cancelled: (name, exception)
+    command_failed = pyqtSignal(str, object)
+
+    # Signal sent when there are no more tasks running
+    idle = pyqtSignal()
+
+    # Internal signals used to move the results from the worker threads to the GUI thread
+    _task_done = pyqtSignal(object, object, object)
+    _progress_reported = pyqtSignal(str, str)
+
+    def __init__(self, max_threads: int = 2, parent: QObject | None = None):
+        """Initializes the runner with its own thread pool.
+
+        Args:
+            max_threads (int): Maximum number of tasks running at the same time.
+            parent (QObject): The parent object.
+        """
+
+        super().__init__(parent)
+
+        self.__pool = QThreadPool(self)
+        self.__pool.setMaxThreadCount(max_threads)
+
+        # Tasks submitted and not finished yet, by name
+        self.__tasks = {}
+
+        self._task_done.connect(self.__on_task_done, Qt.ConnectionType.QueuedConnection)
+        self._progress_reported.connect(self.command_progress, Qt.ConnectionType.QueuedConnection)
+
+    def run(self, name: str, function: callable, conflicts: list[str] = (), on_finished: callable = None,
+            on_failed: callable = None, cancel: callable = None) -> bool:
+        """Submits a task to be executed in a worker thread.
+
+        Args:
+            name (str): The name of the task.
+            function (callable): The function to execute. It receives the ServiceTask as its only argument.
+            conflicts (list[str]): Conflict groups of the task. It is refused if a running task shares one of them.
+            on_finished (callable): Called in the GUI thread with the result of the function.
+            on_failed (callable): Called in the GUI thread with the exception raised by the function.
+            cancel (callable): Called (from the GUI thread) to interrupt the function when the task is cancelled.
+
+        Returns:
+            bool: True if the task was submitted, False if it was refused because of a conflict.
+        """
+
+        conflicts = set(conflicts)
+
+        if name in self.__tasks or any(task.conflicts & conflicts for task in self.__tasks.values()):
+            return False
+
+        task = ServiceTask(self, name, function, conflicts, cancel)
+        task.on_finished = on_finished
+        task.on_failed = on_failed
+
+        self.__tasks[name] = task
+        self.__pool.start(task)
+
+        self.command_started.emit(name)
+
+        return True
+
+    def cancel(self, name: str) -> bool:
+        """Cancels a task. If it is still waiting in the queue, it never runs. If it is running, its cancel function is called.
+
+        Args:
+            name (str): The name of the task.
+
+        Returns:
+            bool: True if the task was found, False otherwise.
+        """
+
+        task = self.__tasks.get(name)
+
+        if task is None:
+            return False
+
+        task.cancelled = True
+
+        if self.__pool.tryTake(task):
+            # The task was still in the queue, so it will never run
+            self.__on_task_done(task, None, ServiceCommandCancelled(name))
+        elif task.cancel_function is not None:
+            task.cancel_function()
+
+        return True
+
+    def cancel_all(self) -> None:
+        """Cancels all the tasks."""
+
+        for name in list(self.__tasks):
+            self.cancel(name)
+
+    def is_running(self, name: str) -> bool:
+        """Checks if a task with the given name was submitted and is not finished yet."""
+
+        return name in self.__tasks
+
+    def is_busy(self, conflict_group: str | None = None) -> bool:
+        """Checks if there are tasks running. If a conflict group is given, only the tasks of that group are considered."""
+
+        if conflict_group is None:
+            return len(self.__tasks) > 0
+
+        return any(conflict_group in task.conflicts for task in self.__tasks.values())
+
+    def get_pending_tasks(self) -> list[str]:
+        """Returns the names of the tasks whose function didn't return yet, e.g. the ones still running after wait_for_done timed out."""
+
+        return [name for name, task in self.__tasks.items() if not task.done]
+
+    def wait_for_done(self, msecs: int = -1) -> bool:
+        """Blocks until all the tasks are done. Should only be used when the application is closing.
+
+        The callbacks of the tasks that finish while waiting are not called.
+
+        Args:
+            msecs (int): Maximum time to wait in milliseconds. -1 waits forever.
+
+        Returns:
+            bool: True if all the tasks are done, False if the time ran out.
+        """
+
+        return self.__pool.waitForDone(msecs)
+
+    def __on_task_done(self, task: ServiceTask, result, error: BaseException | None) -> None:
+        """Called in the GUI thread when a task finishes, fails or is cancelled."""
+
+        if self.__tasks.get(task.name) is not task:
+            # Already handled (cancelled while in the queue)
+            return
+
+        del self.__tasks[task.name]
+
+        if error is None:
+            self.command_finished.emit(task.name, result)
+
+            if task.on_finished is not None:
+                task.on_finished(result)
+        else:
+            self.command_failed.emit(task.name, error)
+
+            if task.on_failed is not None:
+                task.on_failed(error)
+
+        if len(self.__tasks) == 0:
+            self.idle.emit()
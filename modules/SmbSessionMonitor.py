@@ -0,0 +1,73 @@
+import subprocess
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from modules.SmbSessions import SmbSessionTracker
+from modules.Logger import get_logger
+
+logger = get_logger("smb")
+
+class SmbSessionMonitor(QThread):
+    """Polls the SAMBA sessions in a separate thread and reports the connected clients.
+
+    The clients of the last poll are cached by the tracker, so get_clients can be called from the GUI
+    thread at any moment without waiting for smbstatus.
+
+    Attributes:
+        interval (int): The interval in seconds between the polls.
+        tracker (SmbSessionTracker): The tracker that runs smbstatus and keeps the last snapshot.
+        running (bool): Flag to control the thread execution.
+    """
+
+    # Signal to send the connected clients (list[SmbClient]) after each poll
+    clients_updated = pyqtSignal(object)
+
+    # Signal to notify that smbstatus could not be executed: (error message).
+    # A failure that repeats in the following polls is only notified once
+    poll_failed = pyqtSignal(str)
+
+    def __init__(self, interval=2):
+        """Initializes the SmbSessionMonitor with the specified interval.
+
+        Args:
+            interval (int): The interval in seconds between the polls.
+        """
+
+        super().__init__()
+        self.interval = interval
+        self.tracker = SmbSessionTracker()
+        self.running = True  # Control flag to stop the thread
+
+    def get_clients(self) -> list:
+        """Returns the clients found in the last poll."""
+        return self.tracker.get_clients()
+
+    def run(self):
+        """Polls the sessions until the thread is stopped."""
+        last_error = None
+
+        while self.running:
+            try:
+                clients = self.tracker.poll()
+            except FileNotFoundError:
+                logger.error("ERROR: smbstatus not found. The clients can't be monitored.")
+                self.running = False
+                self.poll_failed.emit("O comando smbstatus não foi encontrado.")
+                return
+            except (subprocess.TimeoutExpired, ValueError) as e:
+                # A slow or failed answer only skips this poll, the cached clients are kept
+                if str(e) != last_error:
+                    last_error = str(e)
+                    self.poll_failed.emit(last_error)
+            else:
+                last_error = None
+                self.clients_updated.emit(clients)
+
+            # Sleep in small steps, so stop() doesn't wait for the whole interval
+            for _ in range(int(self.interval * 10)):
+                if not self.running:
+                    break
+                self.msleep(100)
+
+    def stop(self):
+        """Stops the thread gracefully."""
+        self.running = False
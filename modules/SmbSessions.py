@@ -0,0 +1,352 @@
+import re
+import json
+import time
+import threading
+import subprocess
+
+from modules.NetSampler import counter_delta
+from modules.Logger import get_logger
+
+logger = get_logger("smb")
+
+class SmbClient:
+    """A client (console) connected to the SAMBA server.
+
+    Attributes:
+        address (str): IP address of the client.
+        machine (str): Name (or address) of the client machine as reported by smbstatus.
+        username (str): User the client is logged in as.
+        protocol (str): SMB dialect of the session (NT1 for OPL).
+        pids (set[str]): PIDs of the smbd processes serving the client.
+        services (set[str]): Shares the client is connected to.
+        open_files (list[str]): Paths of the files opened by the client (e.g. the ISO being played).
+        bytes_sent (int): Total bytes sent to the client by its SMB connections.
+        bytes_recv (int): Total bytes received from the client by its SMB connections.
+        up_speed (float): Speed (KB/s) the server is sending data to the client.
+        down_speed (float): Speed (KB/s) the server is receiving data from the client.
+    """
+
+    __slots__ = ("address", "machine", "username", "protocol", "pids", "services", "open_files",
+                 "bytes_sent", "bytes_recv", "up_speed", "down_speed")
+
+    def __init__(self, address: str, machine: str = "", username: str = "", protocol: str = ""):
+        self.address = address
+        self.machine = machine or address
+        self.username = username
+        self.protocol = protocol
+        self.pids = set()
+        self.services = set()
+        self.open_files = []
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+        self.up_speed = 0.0
+        self.down_speed = 0.0
+
+    def __repr__(self) -> str:
+        return (f"SmbClient({self.address}, user={self.username!r}, files={self.open_files}, "
+                f"up={self.up_speed:.2f} KB/s, down={self.down_speed:.2f} KB/s)")
+
+class SmbSessionTracker:
+    """Tracks the clients connected to the SAMBA server, the files they opened and their transfer rates.
+
+    The sessions and open files come from 'smbstatus --json' (or its text output, on versions without JSON
+    support). The rates come from the byte counters of the SMB TCP connections, read with 'ss'.
+
+    poll() runs the commands and is slow, so it should be called from a worker thread. The result is cached:
+    get_clients() always returns the last snapshot without running anything.
+    """
+
+    SMBSTATUS_JSON_COMMAND = ["smbstatus", "--json"]
+    SMBSTATUS_TEXT_COMMAND = ["smbstatus"]
+    SS_COMMAND = ["ss", "-tinH", "state", "established", "( sport = :445 or sport = :139 )"]
+
+    # Maximum time (in seconds) each command can take
+    COMMAND_TIMEOUT = 10
+
+    # Regular expressions to extract the counters of a socket from the output of 'ss -i'
+    SS_BYTES_SENT_REGEX = re.compile(r"\bbytes_acked:(\d+)")
+    SS_BYTES_RECV_REGEX = re.compile(r"\bbytes_received:(\d+)")
+
+    def __init__(self):
+        self.__clients = []
+        self.__clients_lock = threading.Lock()
+
+        self.__json_supported = True
+        self.__last_poll_time = None
+        self.__last_counters = {}  # {address: (bytes sent, bytes received)}
+
+    def get_clients(self) -> list[SmbClient]:
+        """Returns the clients found in the last poll. Never blocks on smbstatus."""
+
+        with self.__clients_lock:
+            return list(self.__clients)
+
+    def poll(self) -> list[SmbClient]:
+        """Runs smbstatus and ss, updates the cached clients and computes their rates since the last poll.
+
+        Returns:
+            list[SmbClient]: The connected clients.
+
+        Raises:
+            FileNotFoundError: If smbstatus is not installed.
+            subprocess.TimeoutExpired: If smbstatus takes more than COMMAND_TIMEOUT seconds.
+            ValueError: If smbstatus fails (e.g. while smbd restarts). The cached clients are kept.
+        """
+
+        clients = self.__read_smbstatus()
+        counters = self.__read_socket_counters()
+        now = time.monotonic_ns()
+
+        elapsed = None
+        if self.__last_poll_time is not None:
+            elapsed = (now - self.__last_poll_time) / 1_000_000_000
+
+        for address, client in clients.items():
+            client.bytes_sent, client.bytes_recv = counters.get(address, (0, 0))
+            previous = self.__last_counters.get(address)
+
+            if previous is not None and elapsed:
+                client.up_speed = counter_delta(previous[0], client.bytes_sent) / elapsed / 1024
+                client.down_speed = counter_delta(previous[1], client.bytes_recv) / elapsed / 1024
+
+        self.__last_poll_time = now
+        self.__last_counters = {address: (client.bytes_sent, client.bytes_recv) for address, client in clients.items()}
+
+        result = sorted(clients.values(), key=lambda client: client.address)
+
+        with self.__clients_lock:
+            self.__clients = result
+
+        return list(result)
+
+    def clear(self) -> None:
+        """Discards the cached clients, e.g. when the server is stopped."""
+
+        with self.__clients_lock:
+            self.__clients = []
+
+        self.__last_poll_time = None
+        self.__last_counters = {}
+
+    def __read_smbstatus(self) -> dict[str, SmbClient]:
+        """Runs smbstatus, preferring the JSON output, and returns the clients by address."""
+
+        if self.__json_supported:
+            result = subprocess.run(self.SMBSTATUS_JSON_COMMAND, capture_output=True, text=True, timeout=self.COMMAND_TIMEOUT)
+
+            if result.returncode == 0 and result.stdout.lstrip().startswith("{"):
+                return self.parse_smbstatus_json(result.stdout)
+
+            # Versions older than 4.16 don't know the --json option: they complain about it or print the text output.
+            # Any other failure (e.g. smbd restarting while the interfaces are applied) is transient, so --json is
+            # tried again in the next poll
+            if result.returncode != 0 and "--json" not in result.stderr + result.stdout:
+                raise ValueError(self.__describe_failure(result))
+
+            logger.debug("smbstatus não aceita --json, a saída em texto será usada.")
+            self.__json_supported = False
+
+        result = subprocess.run(self.SMBSTATUS_TEXT_COMMAND, capture_output=True, text=True, timeout=self.COMMAND_TIMEOUT)
+
+        if result.returncode != 0:
+            raise ValueError(self.__describe_failure(result))
+
+        return self.parse_smbstatus_text(result.stdout)
+
+    @staticmethod
+    def __describe_failure(result: subprocess.CompletedProcess) -> str:
+        """Returns the error message of a failed smbstatus command."""
+
+        error = result.stderr.strip().splitlines()
+        return f"O comando smbstatus falhou (código {result.returncode})" + (f": {error[-1]}" if error else ".")
+
+    def __read_socket_counters(self) -> dict[str, tuple[int, int]]:
+        """Runs ss and returns the bytes sent and received by the SMB connections of each client address."""
+
+        try:
+            result = subprocess.run(self.SS_COMMAND, capture_output=True, text=True, timeout=self.COMMAND_TIMEOUT)
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            # Without ss the sessions are still listed, only the rates are missing
+            return {}
+
+        return self.parse_ss_output(result.stdout)
+
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """Removes the port, the brackets and the IPv4-mapped prefix from an address (e.g. '[::ffff:10.0.0.2]:445')."""
+
+        address = address.strip()
+
+        if address.startswith("ipv4:") or address.startswith("ipv6:"):
+            address = address[5:]
+
+        if address.startswith("["):
+            address = address[1:address.index("]")]
+        elif address.count(":") == 1:
+            address = address.split(":")[0]
+
+        if address.startswith("::ffff:"):
+            address = address[7:]
+
+        return address
+
+    @classmethod
+    def parse_smbstatus_json(cls, output: str) -> dict[str, SmbClient]:
+        """Parses the output of 'smbstatus --json'.
+
+        The open files are correlated with the sessions by the PID of the smbd process that serves them.
+
+        Args:
+            output (str): The output of the command.
+
+        Returns:
+            dict[str, SmbClient]: The clients by address.
+        """
+
+        status = json.loads(output)
+
+        clients = {}
+        clients_by_pid = {}
+
+        for session in status.get("sessions", {}).values():
+            # 'hostname' has the address used by the connection, 'remote_machine' may be a NetBIOS name
+            address = cls.normalize_address(session.get("hostname") or session.get("remote_machine", ""))
+
+            client = clients.get(address)
+            if client is None:
+                client = SmbClient(address, session.get("remote_machine", ""), session.get("username", ""),
+                                   session.get("session_dialect", ""))
+                clients[address] = client
+
+            pid = str(session.get("server_id", {}).get("pid", ""))
+            client.pids.add(pid)
+            clients_by_pid[pid] = client
+
+        for tcon in status.get("tcons", {}).values():
+            client = clients_by_pid.get(str(tcon.get("server_id", {}).get("pid", "")))
+
+            if client is not None:
+                client.services.add(tcon.get("service", ""))
+
+        for path, open_file in status.get("open_files", {}).items():
+            for file_open in open_file.get("opens", {}).values():
+                client = clients_by_pid.get(str(file_open.get("server_id", {}).get("pid", "")))
+
+                if client is not None and path not in client.open_files:
+                    client.open_files.append(path)
+
+        return clients
+
+    @classmethod
+    def parse_smbstatus_text(cls, output: str) -> dict[str, SmbClient]:
+        """Parses the text output of 'smbstatus', used when the JSON output is not supported.
+
+        The output has three tables (sessions, shares and locked files), each one with a header followed by a
+        line of dashes.
+
+        Args:
+            output (str): The output of the command.
+
+        Returns:
+            dict[str, SmbClient]: The clients by address.
+        """
+
+        clients = {}
+        clients_by_pid = {}
+        table = None
+
+        for line in output.splitlines():
+            stripped = line.strip()
+
+            if not stripped:
+                continue
+
+            if stripped.startswith("PID") and "Username" in stripped:
+                table = "sessions"
+                continue
+            if stripped.startswith("Service") and "pid" in stripped:
+                table = "shares"
+                continue
+            if stripped.startswith("Pid") and "DenyMode" in stripped:
+                table = "files"
+                continue
+            if stripped.startswith("-") or table is None:
+                continue
+
+            tokens = stripped.split()
+
+            if table == "sessions" and len(tokens) >= 4:
+                # PID Username Group Machine (ipv4:address:port) Protocol ...
+                pid, username, machine = tokens[0], tokens[1], tokens[3]
+                address = machine
+
+                if len(tokens) > 4 and tokens[4].startswith("("):
+                    address = tokens[4].strip("()")
+
+                protocol = tokens[5] if len(tokens) > 5 else ""
+                address = cls.normalize_address(address)
+
+                client = clients.get(address)
+                if client is None:
+                    client = SmbClient(address, machine, username, protocol)
+                    clients[address] = client
+
+                client.pids.add(pid)
+                clients_by_pid[pid] = client
+
+            elif table == "shares" and len(tokens) >= 2:
+                client = clients_by_pid.get(tokens[1])
+
+                if client is not None:
+                    client.services.add(tokens[0])
+
+            elif table == "files" and len(tokens) >= 13:
+                # Pid User DenyMode Access R/W Oplock SharePath Name Time (5 tokens: 'Sat Oct 17 10:00:00 2026')
+                client = clients_by_pid.get(tokens[0])
+
+                if client is not None:
+                    path = tokens[6].rstrip("/") + "/" + " ".join(tokens[7:-5])
+
+                    if path not in client.open_files:
+                        client.open_files.append(path)
+
+        return clients
+
+    @classmethod
+    def parse_ss_output(cls, output: str) -> dict[str, tuple[int, int]]:
+        """Parses the output of 'ss -tinH' and sums the counters of the connections of each client.
+
+        Each socket has a line with the addresses, followed by an indented line with its TCP info.
+
+        Args:
+            output (str): The output of the command.
+
+        Returns:
+            dict[str, tuple[int, int]]: The bytes sent and received by client address.
+        """
+
+        counters = {}
+        address = None
+
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+
+            if not line[0].isspace():
+                # Recv-Q Send-Q Local-Address:Port Peer-Address:Port
+                tokens = line.split()
+                address = cls.normalize_address(tokens[3]) if len(tokens) >= 4 else None
+                continue
+
+            if address is None:
+                continue
+
+            sent = cls.SS_BYTES_SENT_REGEX.search(line)
+            recv = cls.SS_BYTES_RECV_REGEX.search(line)
+
+            total_sent, total_recv = counters.get(address, (0, 0))
+            counters[address] = (total_sent + (int(sent.group(1)) if sent else 0),
+                                 total_recv + (int(recv.group(1)) if recv else 0))
+            address = None
+
+        return counters
@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+
+class TimedLoader:
+    """Wraps the loader of a module to measure the time spent creating and executing it."""
+
+    def __init__(self, loader, name: str, timer: "ImportTimer"):
+        self.__loader = loader
+        self.__name = name
+        self.__timer = timer
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.__loader, attribute)
+
+    def create_module(self, spec):
+        # Extension modules (e.g. the PyQt6 libraries) are loaded here, so this time is counted too
+        self.__timer.enter(self.__name)
+        return self.__loader.create_module(spec)
+
+    def exec_module(self, module):
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            self.__timer.exit(self.__name)
+
+class ImportTimer:
+    """Measures the time of each import, like 'python -X importtime'.
+
+    It is installed as the first finder of sys.meta_path. The module is found by the other finders and its
+    loader is wrapped, so the time of a module includes the modules it imports (cumulative) and the time spent
+    only in its own code is also kept (self).
+
+    Attributes:
+        records (list[tuple[str, int, int, int]]): (name, self ns, cumulative ns, depth) of each imported module, in the order they finished.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.__stack = []  # [name, start ns, children ns] of the imports in progress
+
+    def find_spec(self, fullname: str, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, fullname, self)
+                return spec
+
+        return None
+
+    def enter(self, name: str) -> None:
+        self.__stack.append([name, time.perf_counter_ns(), 0])
+
+    def exit(self, name: str) -> None:
+        # A module that failed before being executed doesn't have a matching enter
+        if not self.__stack or self.__stack[-1][0] != name:
+            return
+
+        _, start, children = self.__stack.pop()
+        cumulative = time.perf_counter_ns() - start
+
+        if self.__stack:
+            self.__stack[-1][2] += cumulative
+
+        self.records.append((name, cumulative - children, cumulative, len(self.__stack)))
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+class StartupProfiler:
+    """Measures the startup of the application, from the start of the process to the first painted frame of the window.
+
+    The startup is divided in phases, marked by the entry script with mark(). The imports done while the
+    profiler runs are measured by an ImportTimer. PyQt6 is only imported by watch_first_frame, so the
+    profiler can be created before any other module.
+
+    Attributes:
+        start_ns (int): perf_counter_ns when the profiler was created.
+        process_start_ns (int): Time between the start of the process and the creation of the profiler, or 0 if unknown.
+        phases (list[tuple[str, int]]): (name, perf_counter_ns at the end) of each phase.
+        import_timer (ImportTimer): The timer of the imports.
+    """
+
+    # Number of imports shown in the report, the slowest by cumulative time
+    REPORT_IMPORTS = 25
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.process_start_ns = self.__get_process_age_ns()
+        self.phases = []
+        self.import_timer = ImportTimer()
+        self.__first_frame_filter = None
+
+    @staticmethod
+    def __get_process_age_ns() -> int:
+        """Returns the time since the process started (interpreter startup included), read from /proc. Resolution of one clock tick."""
+
+        try:
+            with open("/proc/self/stat") as stat_file:
+                # The name of the process can have spaces, the fields are counted after it
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+
+            start_ticks = int(fields[19])
+            age = time.clock_gettime_ns(time.CLOCK_BOOTTIME) - start_ticks * 1_000_000_000 // os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError, AttributeError):
+            return 0
+
+        return max(age, 0)
+
+    def start(self) -> None:
+        """Starts measuring the imports."""
+
+        self.import_timer.install()
+
+    def mark(self, phase: str) -> None:
+        """Marks the end of a startup phase, which began at the end of the previous one."""
+
+        self.phases.append((phase, time.perf_counter_ns()))
+
+    def watch_first_frame(self, window, on_first_frame: callable = None) -> None:
+        """Marks the 'first frame' phase when the window is painted for the first time.
+
+        Args:
+            window (QWidget): The main window.
+            on_first_frame (callable): Called without arguments after the first paint, e.g. to print the report.
+        """
+
+        from PyQt6.QtCore import QObject, QEvent, QTimer
+
+        profiler = self
+
+        class FirstFrameFilter(QObject):
+            def eventFilter(self, watched, event):
+                if event.type() == QEvent.Type.Paint:
+                    watched.removeEventFilter(self)
+
+                    # The paint event is delivered before the frame is drawn, so the mark is made right after it
+                    def frame_painted():
+                        profiler.mark("primeiro quadro")
+                        profiler.import_timer.uninstall()
+
+                        if on_first_frame is not None:
+                            on_first_frame()
+
+                    QTimer.singleShot(0, frame_painted)
+
+                return False
+
+        self.__first_frame_filter = FirstFrameFilter(window)
+        window.installEventFilter(self.__first_frame_filter)
+
+    def report(self, stream=None) -> None:
+        """Writes the duration of the phases and the slowest imports.
+
+        Args:
+            stream: Where the report is written. Defaults to sys.stderr.
+        """
+
+        stream = stream if stream is not None else sys.stderr
+
+        def ms(nanoseconds: int) -> str:
+            return f"{nanoseconds / 1_000_000:9.1f} ms"
+
+        lines = ["", "=== Inicialização (desde o início do processo) ==="]
+        lines.append(f"{'fase':<28}{'duração':>12}{'acumulado':>14}")
+
+        if self.process_start_ns:
+            lines.append(f"{'interpretador':<28}{ms(self.process_start_ns):>12}{ms(self.process_start_ns):>14}")
+
+        previous = self.start_ns
+        for phase, end in self.phases:
+            elapsed = self.process_start_ns + end - self.start_ns
+            lines.append(f"{phase:<28}{ms(end - previous):>12}{ms(elapsed):>14}")
+            previous = end
+
+        records = sorted(self.import_timer.records, key=lambda record: record[2], reverse=True)[:self.REPORT_IMPORTS]
+
+        lines.append("")
+        lines.append(f"=== Importações mais lentas ({len(records)} de {len(self.import_timer.records)}) ===")
+        lines.append("import time: self [us] | cumulative | imported package")
+
+        for name, self_ns, cumulative_ns, depth in records:
+            lines.append(f"import time: {self_ns // 1000:>9} | {cumulative_ns // 1000:>10} | {'  ' * depth}{name}")
+
+        print("\n".join(lines), file=stream, flush=True)
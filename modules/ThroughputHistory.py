@@ -0,0 +1,119 @@
+import math
+from array import array
+
+class ThroughputStats:
+    """Aggregates of the throughput over a window of samples, in KB/s.
+
+    Attributes:
+        samples (int): Number of samples in the window.
+        up_mean (float): Mean upload speed.
+        up_peak (float): Highest upload speed.
+        up_p95 (float): 95th percentile of the upload speed.
+        down_mean (float): Mean download speed.
+        down_peak (float): Highest download speed.
+        down_p95 (float): 95th percentile of the download speed.
+    """
+
+    __slots__ = ("samples", "up_mean", "up_peak", "up_p95", "down_mean", "down_peak", "down_p95")
+
+    def __init__(self, samples: int, up: tuple[float, float, float], down: tuple[float, float, float]):
+        self.samples = samples
+        self.up_mean, self.up_peak, self.up_p95 = up
+        self.down_mean, self.down_peak, self.down_p95 = down
+
+    def __repr__(self) -> str:
+        return (f"ThroughputStats(samples={self.samples}, "
+                f"up={self.up_mean:.2f}/{self.up_peak:.2f}/{self.up_p95:.2f}, "
+                f"down={self.down_mean:.2f}/{self.down_peak:.2f}/{self.down_p95:.2f})")
+
+class ThroughputHistory:
+    """Fixed-size ring buffer with the last upload and download speeds sampled.
+
+    The speeds are stored in preallocated arrays of doubles, so appending a sample doesn't create any
+    Python object and the memory used never grows. When the buffer is full, the oldest samples are overwritten.
+
+    Attributes:
+        capacity (int): Maximum number of samples kept.
+    """
+
+    PERCENTILE = 0.95
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("A capacidade do histórico deve ser maior que zero.")
+
+        self.capacity = capacity
+
+        self.__up = array("d", bytes(8 * capacity))
+        self.__down = array("d", bytes(8 * capacity))
+        self.__next = 0  # Position where the next sample is written
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def append(self, up_speed: float, down_speed: float) -> None:
+        """Stores a sample, overwriting the oldest one if the buffer is full."""
+
+        position = self.__next
+
+        self.__up[position] = up_speed
+        self.__down[position] = down_speed
+
+        position += 1
+        self.__next = 0 if position == self.capacity else position
+
+        if self.__size < self.capacity:
+            self.__size += 1
+
+    def clear(self) -> None:
+        """Discards all the samples."""
+
+        self.__next = 0
+        self.__size = 0
+
+    def last(self, count: int) -> tuple[array, array]:
+        """Returns copies of the last samples, from the oldest to the newest.
+
+        Args:
+            count (int): Number of samples. Limited to the number of samples stored.
+
+        Returns:
+            tuple[array, array]: The upload and download speeds.
+        """
+
+        count = min(count, self.__size)
+        start = self.__next - count
+
+        if start >= 0:
+            return self.__up[start:self.__next], self.__down[start:self.__next]
+
+        # The window wraps around the end of the buffer
+        return (self.__up[start:] + self.__up[:self.__next],
+                self.__down[start:] + self.__down[:self.__next])
+
+    def get_stats(self, count: int) -> ThroughputStats:
+        """Computes the mean, peak and 95th percentile of the last samples.
+
+        Args:
+            count (int): Number of samples in the window. Limited to the number of samples stored.
+
+        Returns:
+            ThroughputStats: The aggregates of the window. All zeros if there are no samples.
+        """
+
+        up, down = self.last(count)
+
+        return ThroughputStats(len(up), self.__aggregate(up), self.__aggregate(down))
+
+    @classmethod
+    def __aggregate(cls, values: array) -> tuple[float, float, float]:
+        """Returns the mean, peak and 95th percentile (nearest rank) of the values."""
+
+        if len(values) == 0:
+            return 0.0, 0.0, 0.0
+
+        ordered = sorted(values)
+        rank = max(math.ceil(cls.PERCENTILE * len(ordered)) - 1, 0)
+
+        return math.fsum(values) / len(values), ordered[-1], ordered[rank]
@@ -0,0 +1,595 @@
+import os
+import sys
+import time
+import errno
+import struct
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.Logger import get_logger
+
+logger = get_logger("library")
+
+# ZSO layout: a 24 bytes header, the index of the blocks and the data of the blocks
+ZSO_MAGIC = b"ZISO"
+ZSO_HEADER = struct.Struct("<4sIQIBB2x")  # magic, header size, uncompressed size, block size, version, index alignment
+ZSO_VERSION = 1
+ZSO_BLOCK_SIZE = 2048
+
+# Flag of the index entries of the blocks stored without compression. The rest of the entry is the offset >> alignment
+ZSO_PLAIN_FLAG = 0x80000000
+
+def load_lz4():
+    """Returns the lz4.block module.
+
+    Raises:
+        ValueError: If the lz4 package is not installed.
+    """
+
+    # lz4 is only imported when a ZSO image is read or written, so the rest of the program doesn't need it
+    try:
+        import lz4.block
+    except ImportError:
+        raise ValueError("O pacote lz4 não está instalado (pip install lz4).") from None
+
+    return lz4.block
+
+def decompress_block(lz4_block, data: bytes, entry: int, size: int, align: int) -> bytes:
+    """Decompresses a block of a ZSO image.
+
+    Args:
+        lz4_block: The lz4.block module.
+        data (bytes): The bytes of the block in the file, from its offset to the offset of the next block.
+        entry (int): The index entry of the block.
+        size (int): Size of the block uncompressed (the last block of the image can be smaller).
+        align (int): The index alignment of the image.
+
+    Raises:
+        ValueError: If the block is corrupted.
+    """
+
+    if entry & ZSO_PLAIN_FLAG:
+        if len(data) < size:
+            raise ValueError("Bloco sem compressão truncado na imagem ZSO.")
+
+        return data[:size]
+
+    # With alignment, the block is followed by up to (1 << align) - 1 padding bytes
+    for padding in range(min(1 << align, len(data))):
+        try:
+            block = lz4_block.decompress(data[:len(data) - padding] if padding else data, uncompressed_size=size)
+        except lz4_block.LZ4BlockError:
+            continue
+
+        if len(block) == size:
+            return block
+
+    raise ValueError("Bloco LZ4 corrompido na imagem ZSO.")
+
+# --- WORKER PROCESSES ---
+
+# Shared with the worker processes by the pool initializer
+_stop_event = None
+
+def _init_worker(stop_event) -> None:
+    global _stop_event
+
+    _stop_event = stop_event
+
+def compress_blocks(path: str, offset: int, length: int, block_size: int, level: int) -> tuple[bytes, array]:
+    """Compresses a range of an image with LZ4, block by block. Runs in the worker processes.
+
+    Args:
+        path (str): The path of the image.
+        offset (int): Offset of the first block.
+        length (int): Bytes to compress, a multiple of block_size except for the last range of the image.
+        block_size (int): Size of each block.
+        level (int): 0 for the fast LZ4 compression, or the level (1 to 12) of LZ4 HC.
+
+    Returns:
+        tuple[bytes, array]: The compressed blocks, one after the other, and the length of each one in the data,
+            with ZSO_PLAIN_FLAG set on the blocks stored without compression.
+
+    Raises:
+        OSError: If the image can't be read.
+        InterruptedError: If the conversion was stopped.
+    """
+
+    if _stop_event is not None and _stop_event.is_set():
+        raise InterruptedError(errno.EINTR, "Conversão interrompida", path)
+
+    lz4_block = load_lz4()
+    mode = "high_compression" if level > 0 else "default"
+
+    with open(path, "rb", buffering=0) as image_file:
+        data = os.pread(image_file.fileno(), length, offset)
+
+        # The pages won't be read again, so they don't push the files smbd is serving out of the cache
+        os.posix_fadvise(image_file.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+
+    if len(data) != length:
+        raise OSError(errno.EIO, "A imagem terminou antes do esperado (foi alterada durante a conversão?)", path)
+
+    view = memoryview(data)
+    blocks = []
+    lengths = array("I")
+
+    for start in range(0, length, block_size):
+        block = view[start:start + block_size]
+        compressed = lz4_block.compress(block, mode=mode, compression=level, store_size=False)
+
+        # Blocks that don't compress (e.g. videos) are stored as they are, and read without decompression
+        if len(compressed) >= len(block):
+            blocks.append(block)
+            lengths.append(len(block) | ZSO_PLAIN_FLAG)
+        else:
+            blocks.append(compressed)
+            lengths.append(len(compressed))
+
+    return b"".join(blocks), lengths
+
+def decompress_blocks(path: str, first_block: int, entries: array, align: int, block_size: int, total_bytes: int) -> bytes:
+    """Decompresses consecutive blocks of a ZSO image. Runs in the worker processes.
+
+    Args:
+        path (str): The path of the ZSO image.
+        first_block (int): Number of the first block.
+        entries (array): The index entries of the blocks, plus the entry of the block after the last one.
+        align (int): The index alignment of the image.
+        block_size (int): Size of the blocks uncompressed.
+        total_bytes (int): Size of the image uncompressed.
+
+    Returns:
+        bytes: The data of the blocks.
+
+    Raises:
+        OSError: If the image can't be read.
+        ValueError: If a block is corrupted.
+        InterruptedError: If the conversion was stopped.
+    """
+
+    if _stop_event is not None and _stop_event.is_set():
+        raise InterruptedError(errno.EINTR, "Conversão interrompida", path)
+
+    lz4_block = load_lz4()
+
+    start = (entries[0] & ~ZSO_PLAIN_FLAG) << align
+    end = (entries[-1] & ~ZSO_PLAIN_FLAG) << align
+
+    with open(path, "rb", buffering=0) as zso_file:
+        data = os.pread(zso_file.fileno(), end - start, start)
+        os.posix_fadvise(zso_file.fileno(), start, end - start, os.POSIX_FADV_DONTNEED)
+
+    if len(data) != end - start:
+        raise OSError(errno.EIO, "A imagem ZSO terminou antes do esperado", path)
+
+    view = memoryview(data)
+    blocks = []
+
+    for index in range(len(entries) - 1):
+        block_start = ((entries[index] & ~ZSO_PLAIN_FLAG) << align) - start
+        block_end = ((entries[index + 1] & ~ZSO_PLAIN_FLAG) << align) - start
+        size = min(block_size, total_bytes - (first_block + index) * block_size)
+
+        blocks.append(decompress_block(lz4_block, view[block_start:block_end], entries[index], size, align))
+
+    return b"".join(blocks)
+
+class ZsoImage:
+    """Random access to the data of a ZSO image, decompressing only the blocks that are read.
+
+    Supports slicing (image[start:end]) like the mmap of an ISO, so GameLibrary reads SYSTEM.CNF from both the same way.
+
+    Attributes:
+        path (str): The path of the image.
+        total_bytes (int): Size of the image uncompressed.
+        block_size (int): Size of the blocks uncompressed.
+        align (int): The index alignment. The offsets of the index are shifted left by it.
+    """
+
+    def __init__(self, path: str):
+        """
+        Raises:
+            OSError: If the image can't be read.
+            ValueError: If the file is not a ZSO image, or lz4 is not installed.
+        """
+
+        self.path = path
+        self.__lz4_block = load_lz4()
+        self.__file = open(path, "rb", buffering=0)
+
+        try:
+            self.total_bytes, self.block_size, self.align, self.index = self.read_header(self.__file)
+        except BaseException:
+            self.__file.close()
+            raise
+
+    @staticmethod
+    def read_header(zso_file) -> tuple[int, int, int, array]:
+        """Reads the header and the index of a ZSO image.
+
+        Args:
+            zso_file: The image, opened in binary mode.
+
+        Returns:
+            tuple[int, int, int, array]: The size uncompressed, the block size, the index alignment and the index entries.
+
+        Raises:
+            ValueError: If the file is not a ZSO image.
+        """
+
+        header = os.pread(zso_file.fileno(), ZSO_HEADER.size, 0)
+
+        if len(header) < ZSO_HEADER.size:
+            raise ValueError("O arquivo é pequeno demais para ser uma imagem ZSO.")
+
+        magic, header_size, total_bytes, block_size, _, align = ZSO_HEADER.unpack(header)
+
+        if magic != ZSO_MAGIC or block_size == 0 or header_size < ZSO_HEADER.size:
+            raise ValueError("O arquivo não é uma imagem ZSO.")
+
+        total_blocks = (total_bytes + block_size - 1) // block_size
+        index = array("I")
+        index.frombytes(os.pread(zso_file.fileno(), (total_blocks + 1) * 4, header_size))
+
+        if len(index) != total_blocks + 1:
+            raise ValueError("O índice da imagem ZSO está truncado.")
+
+        # The index is little-endian
+        if sys.byteorder == "big":
+            index.byteswap()
+
+        return total_bytes, block_size, align, index
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Reads size bytes of the uncompressed image from offset. Returns less at the end of the image."""
+
+        end = min(offset + size, self.total_bytes)
+        data = []
+
+        for block in range(offset // self.block_size, (end + self.block_size - 1) // self.block_size):
+            entry = self.index[block]
+            start = (entry & ~ZSO_PLAIN_FLAG) << self.align
+            length = ((self.index[block + 1] & ~ZSO_PLAIN_FLAG) << self.align) - start
+            block_bytes = min(self.block_size, self.total_bytes - block * self.block_size)
+
+            raw = os.pread(self.__file.fileno(), length, start)
+            data.append(decompress_block(self.__lz4_block, raw, entry, block_bytes, self.align))
+
+        first = offset - offset // self.block_size * self.block_size
+        return b"".join(data)[first:first + max(end - offset, 0)]
+
+    def __getitem__(self, key: slice) -> bytes:
+        start, stop, _ = key.indices(self.total_bytes)
+        return self.read(start, stop - start)
+
+    def __len__(self) -> int:
+        return self.total_bytes
+
+    def close(self) -> None:
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class ZsoConverter:
+    """Converts images between ISO and ZSO (LZ4 compressed images, loaded by OPL), in parallel.
+
+    The image is split in ranges of BATCH_BLOCKS blocks, which are compressed (or decompressed) by a pool of
+    processes, one per core. The worker processes read their ranges themselves, so only the results pass through
+    the pipes, and the results are written in order as they arrive: only a few ranges per worker are in memory
+    at any time, whatever the size of the image. Blocks that don't get smaller are stored without compression.
+
+    The output is written to a hidden temporary file in the destination folder and renamed when it is complete,
+    so OPL and the library watcher never see a partial image.
+    """
+
+    # Blocks of each task of the pool (8 MB of ISO)
+    BATCH_BLOCKS = 4096
+
+    # Tasks waiting to be written, per worker
+    TASKS_PER_WORKER = 2
+
+    # Interval in seconds between the calls of the progress callback
+    PROGRESS_INTERVAL = 1.0
+
+    # Same permissions of the files created through SAMBA (see GameImporter)
+    FILE_MODE = 0o777
+
+    def __init__(self, max_workers: int | None = None, level: int = 0, owner: tuple[int, int] | None = None):
+        """
+        Args:
+            max_workers (int): Number of worker processes. None uses one per core.
+            level (int): 0 for the fast LZ4 compression, or the level (1 to 12) of LZ4 HC, which compresses more but slower.
+            owner (tuple[int, int]): User and group IDs given to the converted images. None keeps the current user.
+        """
+
+        if not 0 <= level <= 12:
+            raise ValueError("O nível de compressão deve estar entre 0 e 12.")
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.level = level
+        self.owner = owner
+
+    @staticmethod
+    def get_destination(path: str) -> str:
+        """Returns the path of the converted image: the .iso becomes .zso and the .zso becomes .iso."""
+
+        stem, extension = os.path.splitext(path)
+        return stem + (".iso" if extension.lower() == ".zso" else ".zso")
+
+    @staticmethod
+    def get_align(total_bytes: int, block_size: int) -> int:
+        """Returns the smallest index alignment that lets the offsets of an image of total_bytes fit in the index.
+
+        The offsets have 31 bits, so images that can be bigger than 2 GB after the compression need an alignment.
+        """
+
+        total_blocks = (total_bytes + block_size - 1) // block_size
+        data_start = ZSO_HEADER.size + (total_blocks + 1) * 4
+        align = 0
+
+        # Worst case: no block compresses, and each one is padded to the alignment
+        while data_start + total_bytes + total_blocks * ((1 << align) - 1) > (ZSO_PLAIN_FLAG - 1) << align:
+            align += 1
+
+        return align
+
+    def compress(self, source: str, destination: str, progress: callable = None, should_stop: callable = None) -> tuple[int, int] | None:
+        """Compresses an ISO image into a ZSO image. Can be called from a worker thread.
+
+        Args:
+            source (str): The path of the ISO image.
+            destination (str): The path of the ZSO image.
+            progress (callable): Called about once per second with the bytes of the ISO processed and its size.
+            should_stop (callable): Checked while the image is converted. If it returns True, the conversion stops.
+
+        Returns:
+            tuple[int, int]: The sizes of the ISO and of the ZSO. None if the conversion was stopped.
+
+        Raises:
+            OSError: If the images can't be read or written.
+            ValueError: If lz4 is not installed.
+        """
+
+        load_lz4()
+
+        total_bytes = os.stat(source).st_size
+        block_size = ZSO_BLOCK_SIZE
+        total_blocks = (total_bytes + block_size - 1) // block_size
+        align = self.get_align(total_bytes, block_size)
+
+        index = array("I", bytes(4 * (total_blocks + 1)))
+        data_start = ZSO_HEADER.size + len(index) * 4
+
+        tasks = ((source, offset, min(self.BATCH_BLOCKS * block_size, total_bytes - offset), block_size, self.level)
+                 for offset in range(0, total_bytes, self.BATCH_BLOCKS * block_size))
+
+        position = data_start
+        block = 0
+        padding = bytes(1 << align)
+
+        def write_batch(output_fd: int, result: tuple[bytes, array]) -> int:
+            nonlocal position, block
+
+            data, lengths = result
+
+            if align == 0:
+                for length in lengths:
+                    index[block] = position | (length & ZSO_PLAIN_FLAG)
+                    position += length & ~ZSO_PLAIN_FLAG
+                    block += 1
+
+                self.__write_all(output_fd, data)
+                return len(lengths) * block_size
+
+            # Each block starts at a multiple of 1 << align
+            pieces = []
+            data_offset = 0
+
+            for length in lengths:
+                gap = -position & ((1 << align) - 1)
+
+                if gap:
+                    pieces.append(padding[:gap])
+                    position += gap
+
+                size = length & ~ZSO_PLAIN_FLAG
+                pieces.append(data[data_offset:data_offset + size])
+                index[block] = (position >> align) | (length & ZSO_PLAIN_FLAG)
+
+                data_offset += size
+                position += size
+                block += 1
+
+            self.__write_all(output_fd, b"".join(pieces))
+            return len(lengths) * block_size
+
+        def write_header(output_fd: int) -> None:
+            nonlocal position
+
+            # The end of the last block is aligned too, so it is not cut by the shift
+            gap = -position & ((1 << align) - 1)
+            self.__write_all(output_fd, padding[:gap])
+            position += gap
+
+            index[total_blocks] = position >> align
+
+            if sys.byteorder == "big":
+                index.byteswap()
+
+            os.pwrite(output_fd, ZSO_HEADER.pack(ZSO_MAGIC, ZSO_HEADER.size, total_bytes, block_size, ZSO_VERSION, align), 0)
+            os.pwrite(output_fd, index.tobytes(), ZSO_HEADER.size)
+
+        converted = self.__convert(compress_blocks, tasks, destination, data_start, write_batch, write_header,
+                                   total_bytes, progress, should_stop)
+
+        if not converted:
+            return None
+
+        return total_bytes, os.stat(destination).st_size
+
+    def decompress(self, source: str, destination: str, progress: callable = None, should_stop: callable = None) -> tuple[int, int] | None:
+        """Decompresses a ZSO image into an ISO image. Can be called from a worker thread.
+
+        Args:
+            source (str): The path of the ZSO image.
+            destination (str): The path of the ISO image.
+            progress (callable): Called about once per second with the bytes of the ISO written and its size.
+            should_stop (callable): Checked while the image is converted. If it returns True, the conversion stops.
+
+        Returns:
+            tuple[int, int]: The sizes of the ZSO and of the ISO. None if the conversion was stopped.
+
+        Raises:
+            OSError: If the images can't be read or written.
+            ValueError: If the source is not a valid ZSO image, or lz4 is not installed.
+        """
+
+        load_lz4()
+
+        with open(source, "rb", buffering=0) as zso_file:
+            total_bytes, block_size, align, index = ZsoImage.read_header(zso_file)
+
+        total_blocks = len(index) - 1
+        tasks = ((source, first, index[first:min(first + self.BATCH_BLOCKS, total_blocks) + 1], align, block_size, total_bytes)
+                 for first in range(0, total_blocks, self.BATCH_BLOCKS))
+
+        def write_batch(output_fd: int, data: bytes) -> int:
+            self.__write_all(output_fd, data)
+            return len(data)
+
+        def write_header(output_fd: int) -> None:
+            if os.lseek(output_fd, 0, os.SEEK_CUR) != total_bytes:
+                raise ValueError("O tamanho da imagem ZSO não confere com o cabeçalho.")
+
+        converted = self.__convert(decompress_blocks, tasks, destination, 0, write_batch, write_header,
+                                   total_bytes, progress, should_stop, preallocate=total_bytes)
+
+        if not converted:
+            return None
+
+        return os.stat(source).st_size, total_bytes
+
+    def __convert(self, function: callable, tasks, destination: str, data_start: int, write_batch: callable,
+                  write_header: callable, total_bytes: int, progress: callable, should_stop: callable, preallocate: int = 0) -> bool:
+        """Runs the tasks in the pool and writes their results in order to a temporary file, then renames it to destination.
+
+        Returns:
+            bool: True if the image was converted, False if the conversion was stopped.
+        """
+
+        folder, file_name = os.path.split(os.path.abspath(destination))
+        temp_path = os.path.join(folder, f".{file_name}.part")
+
+        context = multiprocessing.get_context("forkserver")
+        stop_event = context.Event()
+
+        output_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, self.FILE_MODE)
+
+        try:
+            if preallocate:
+                os.posix_fallocate(output_fd, 0, preallocate)
+
+            os.lseek(output_fd, data_start, os.SEEK_SET)
+
+            with ProcessPoolExecutor(self.max_workers, mp_context=context, initializer=_init_worker, initargs=(stop_event,)) as executor:
+                try:
+                    stopped = not self.__run_tasks(executor, function, tasks, output_fd, write_batch, total_bytes, progress, should_stop)
+                except BaseException:
+                    stop_event.set()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+                if stopped:
+                    stop_event.set()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    os.close(output_fd)
+                    os.unlink(temp_path)
+                    return False
+
+            write_header(output_fd)
+            os.close(output_fd)
+
+            if self.owner is not None:
+                os.chown(temp_path, *self.owner)
+
+            os.chmod(temp_path, self.FILE_MODE)
+            os.replace(temp_path, destination)
+        except BaseException:
+            try:
+                os.close(output_fd)
+            except OSError:
+                pass
+
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return True
+
+    def __run_tasks(self, executor: ProcessPoolExecutor, function: callable, tasks, output_fd: int, write_batch: callable,
+                    total_bytes: int, progress: callable, should_stop: callable) -> bool:
+        """Keeps TASKS_PER_WORKER tasks per worker in the pool and writes the results in the order of the tasks.
+
+        Returns:
+            bool: True if all the tasks were written, False if should_stop returned True.
+        """
+
+        pending = deque()
+        done_bytes = 0
+        last_progress = time.monotonic()
+        tasks = iter(tasks)
+
+        def submit() -> None:
+            while len(pending) < self.max_workers * self.TASKS_PER_WORKER:
+                arguments = next(tasks, None)
+
+                if arguments is None:
+                    return
+
+                pending.append(executor.submit(function, *arguments))
+
+        submit()
+
+        while pending:
+            future = pending[0]
+
+            # Waits in steps, so a request to stop is noticed while a slow range is converted
+            while not future.done():
+                if should_stop is not None and should_stop():
+                    return False
+
+                try:
+                    future.result(timeout=0.2)
+                except TimeoutError:
+                    continue
+                except BaseException:
+                    break
+
+            if should_stop is not None and should_stop():
+                return False
+
+            pending.popleft()
+            done_bytes += write_batch(output_fd, future.result())
+            submit()
+
+            now = time.monotonic()
+            if progress is not None and (now - last_progress >= self.PROGRESS_INTERVAL or not pending):
+                progress(min(done_bytes, total_bytes), total_bytes)
+                last_progress = now
+
+        return True
+
+    @staticmethod
+    def __write_all(fd: int, data: bytes) -> None:
+        view = memoryview(data)
+
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
@@ -0,0 +1,83 @@
+import os
+import sys
+import struct
+
+# The tests import the modules package from the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SECTOR_SIZE = 2048
+
+def make_directory_record(name: bytes, extent: int, size: int, flags: int = 0) -> bytes:
+    """Returns an ISO9660 directory record."""
+
+    length = 33 + len(name) + (1 if len(name) % 2 == 0 else 0)
+    record = bytearray(length)
+
+    record[0] = length
+    struct.pack_into("<I", record, 2, extent)
+    struct.pack_into(">I", record, 6, extent)
+    struct.pack_into("<I", record, 10, size)
+    struct.pack_into(">I", record, 14, size)
+    record[25] = flags
+    record[32] = len(name)
+    record[33:33 + len(name)] = name
+
+    return bytes(record)
+
+def make_iso(path: str, game_id: str = "SLUS_202.31", data_sectors: int = 0, seed: int = 0) -> bytes:
+    """Writes a minimal ISO9660 image with a SYSTEM.CNF that boots the given game ID, and returns its data.
+
+    Args:
+        path (str): Where the image is written.
+        game_id (str): The game ID in SYSTEM.CNF.
+        data_sectors (int): Sectors of pseudo-random data added after the file system (e.g. to compress).
+        seed (int): Seed of the pseudo-random data.
+    """
+
+    system_cnf = f"BOOT2 = cdrom0:\\{game_id};1\r\nVER = 1.00\r\n".encode("ascii")
+    image = bytearray(SECTOR_SIZE * 20)
+
+    # Primary volume descriptor, with the root directory in sector 18
+    descriptor = bytearray(SECTOR_SIZE)
+    descriptor[0] = 1
+    descriptor[1:6] = b"CD001"
+    descriptor[6] = 1
+    descriptor[40:72] = b"GAME".ljust(32)
+    struct.pack_into("<I", descriptor, 80, 20 + data_sectors)
+    struct.pack_into(">I", descriptor, 84, 20 + data_sectors)
+    struct.pack_into("<H", descriptor, 128, SECTOR_SIZE)
+    struct.pack_into(">H", descriptor, 130, SECTOR_SIZE)
+    descriptor[156:190] = make_directory_record(b"\x00", 18, SECTOR_SIZE, 2)
+    image[16 * SECTOR_SIZE:17 * SECTOR_SIZE] = descriptor
+
+    terminator = bytearray(SECTOR_SIZE)
+    terminator[0] = 255
+    terminator[1:6] = b"CD001"
+    image[17 * SECTOR_SIZE:18 * SECTOR_SIZE] = terminator
+
+    directory = (make_directory_record(b"\x00", 18, SECTOR_SIZE, 2) + make_directory_record(b"\x01", 18, SECTOR_SIZE, 2)
+                 + make_directory_record(b"SYSTEM.CNF;1", 19, len(system_cnf)))
+    image[18 * SECTOR_SIZE:18 * SECTOR_SIZE + len(directory)] = directory
+    image[19 * SECTOR_SIZE:19 * SECTOR_SIZE + len(system_cnf)] = system_cnf
+
+    # Half compressible text and half random bytes, so the ZSO images have both kinds of blocks
+    state = seed or 1
+
+    for sector in range(data_sectors):
+        if sector % 2:
+            data = bytearray(SECTOR_SIZE)
+
+            for offset in range(0, SECTOR_SIZE, 4):
+                state = (state * 1103515245 + 12345) & 0xFFFFFFFF
+                struct.pack_into("<I", data, offset, state)
+        else:
+            data = (f"sector {sector} ".encode("ascii") * SECTOR_SIZE)[:SECTOR_SIZE]
+
+        image += data
+
+    with open(path, "wb") as image_file:
+        image_file.write(image)
+
+    return bytes(image)
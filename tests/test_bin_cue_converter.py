@@ -0,0 +1,21 @@
+import pytest
+
+from modules.BinCueConverter import CueSheet
+
+CUE_SHEET = """FILE "Ação (Track 1).bin" BINARY
+  TRACK 01 MODE2/2352
+    INDEX 01 00:00:00
+"""
+
+@pytest.mark.parametrize("encoding", ["latin-1", "utf-8", "utf-8-sig"])
+def test_cue_sheet_encodings(tmp_path, encoding):
+    bin_path = tmp_path / "Ação (Track 1).bin"
+    bin_path.write_bytes(bytes(2352))
+
+    cue_path = tmp_path / "Ação.cue"
+    cue_path.write_bytes(CUE_SHEET.encode(encoding))
+
+    (track,) = CueSheet.parse(str(cue_path))
+
+    assert track.file == str(bin_path)
+    assert track.is_data
@@ -0,0 +1,73 @@
+import zlib
+import hashlib
+
+import pytest
+
+from modules.DatIndex import DatIndex
+from modules.ImageVerifier import ImageHash
+
+GOOD_DATA = b"good dump" * 1000
+BAD_DATA = b"bad dump" * 1000
+CD_TRACK_DATA = b"raw track" * 1000
+
+def rom_entry(name: str, data: bytes, status: str = "") -> str:
+    status = f' status="{status}"' if status else ""
+    return (f'<rom name="{name}" size="{len(data)}" crc="{zlib.crc32(data):08x}" '
+            f'sha1="{hashlib.sha1(data).hexdigest()}"{status}/>')
+
+DAT = f"""<?xml version="1.0"?>
+<datafile>
+    <header><name>Sony - PlayStation 2</name></header>
+    <game name="Final Fantasy X (USA)">
+        {rom_entry("Final Fantasy X (USA).iso", GOOD_DATA)}
+    </game>
+    <game name="Broken Game (USA)">
+        {rom_entry("Broken Game (USA).iso", BAD_DATA, "baddump")}
+    </game>
+    <game name="Gran Turismo 3 (USA)">
+        {rom_entry("Gran Turismo 3 (USA) (Track 1).bin", CD_TRACK_DATA)}
+    </game>
+</datafile>
+"""
+
+@pytest.fixture
+def dat_index(tmp_path):
+    dat_path = tmp_path / "ps2.dat"
+    dat_path.write_text(DAT)
+
+    index = DatIndex(str(tmp_path / "dat.idx"))
+    assert index.build([str(dat_path)])
+
+    yield index
+
+    index.close()
+
+def image_hash(data: bytes) -> ImageHash:
+    return ImageHash("/srv/PS2SMB/DVD/game.iso", len(data), zlib.crc32(data), hashlib.sha1(data).hexdigest())
+
+def test_match_statuses(dat_index):
+    match = dat_index.match(image_hash(GOOD_DATA), "Final Fantasy X (USA)")
+    assert (match.status, match.game) == (DatIndex.VERIFIED, "Final Fantasy X (USA)")
+
+    # Only the entries the DAT marks as bad dumps are reported as bad dumps
+    match = dat_index.match(image_hash(BAD_DATA), "Broken Game (USA)")
+    assert match.status == DatIndex.BAD_DUMP
+
+    # A known game with other hashes (e.g. an ISO converted from the BIN/CUE listed in the DAT) is only a mismatch
+    match = dat_index.match(image_hash(b"converted iso"), "Gran Turismo 3 (USA)")
+    assert (match.status, match.game) == (DatIndex.MISMATCH, "Gran Turismo 3 (USA)")
+
+    assert dat_index.match(image_hash(b"homebrew"), "Homebrew").status == DatIndex.UNKNOWN
+
+def test_unreadable_image_is_unknown(dat_index):
+    result = ImageHash("/srv/PS2SMB/DVD/game.iso", error="Input/output error")
+
+    assert dat_index.match(result, "Final Fantasy X (USA)").status == DatIndex.UNKNOWN
+
+def test_build_is_skipped_when_unchanged(dat_index, tmp_path):
+    assert not dat_index.build([str(tmp_path / "ps2.dat")])
+    assert dat_index.get_count() == 3
+
+def test_stopped_build_keeps_the_index(dat_index, tmp_path):
+    assert dat_index.build([str(tmp_path / "ps2.dat")], force=True, should_stop=lambda: True) is None
+    assert dat_index.get_count() == 3
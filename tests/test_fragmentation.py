@@ -0,0 +1,135 @@
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from modules.Fragmentation import FragmentationScanner
+
+CHUNK_SIZE = 64 * 1024
+CHUNKS = 32
+
+# 'ext: logical_offset: physical_offset: length: expected: flags:' rows of 'filefrag -v'
+FILEFRAG_EXTENT_PATTERN = re.compile(r"^\s*\d+:\s+\d+\.\.\s*\d+:\s+(\d+)\.\.\s*(\d+):\s+(\d+):", re.MULTILINE)
+FILEFRAG_BLOCK_SIZE_PATTERN = re.compile(r"\(\d+ blocks? of (\d+) bytes\)")
+
+pytestmark = pytest.mark.skipif(os.geteuid() != 0 or not all(shutil.which(tool) for tool in ("mkfs.ext4", "mount", "umount", "filefrag")),
+                                reason="needs root, mkfs.ext4, mount and filefrag")
+
+@pytest.fixture
+def ext4_path(tmp_path):
+    """Mounts a small ext4 file system built in a loopback image and returns the mount point."""
+
+    image_path = tmp_path / "ext4.img"
+    mount_path = tmp_path / "mnt"
+    mount_path.mkdir()
+
+    with open(image_path, "wb") as image_file:
+        image_file.truncate(64 * 1024 * 1024)
+
+    subprocess.run(["mkfs.ext4", "-q", "-F", str(image_path)], check=True, capture_output=True)
+    result = subprocess.run(["mount", "-o", "loop", str(image_path), str(mount_path)], capture_output=True, text=True)
+
+    if result.returncode != 0:
+        pytest.skip(f"loop devices are not available: {result.stderr.strip()}")
+
+    try:
+        yield mount_path
+    finally:
+        subprocess.run(["umount", str(mount_path)], check=True)
+
+def write_interleaved(first_path, second_path) -> None:
+    """Writes two files chunk by chunk, flushing each chunk, so their blocks are interleaved on the disk."""
+
+    first_fd = os.open(first_path, os.O_WRONLY | os.O_CREAT, 0o644)
+    second_fd = os.open(second_path, os.O_WRONLY | os.O_CREAT, 0o644)
+
+    try:
+        for index in range(CHUNKS):
+            for fd in (first_fd, second_fd):
+                os.write(fd, bytes([index]) * CHUNK_SIZE)
+                os.fsync(fd)
+    finally:
+        os.close(first_fd)
+        os.close(second_fd)
+
+def write_contiguous(path) -> None:
+    with open(path, "wb") as image_file:
+        os.posix_fallocate(image_file.fileno(), 0, CHUNK_SIZE * CHUNKS)
+        image_file.write(b"\xa5" * CHUNK_SIZE * CHUNKS)
+        image_file.flush()
+        os.fsync(image_file.fileno())
+
+def read_filefrag(path) -> tuple[int, int]:
+    """Returns the fragments and the largest seek of a file, from the extents listed by 'filefrag -v'."""
+
+    output = subprocess.run(["filefrag", "-v", str(path)], check=True, capture_output=True, text=True).stdout
+    block_size = int(FILEFRAG_BLOCK_SIZE_PATTERN.search(output).group(1))
+
+    fragments = 0
+    max_seek = 0
+    end = None
+
+    for first, last, _ in FILEFRAG_EXTENT_PATTERN.findall(output):
+        physical = int(first) * block_size
+
+        if end is None or physical != end:
+            fragments += 1
+
+            if end is not None:
+                max_seek = max(max_seek, abs(physical - end))
+
+        end = (int(last) + 1) * block_size
+
+    return fragments, max_seek
+
+def test_fragmentation_matches_filefrag(ext4_path, tmp_path):
+    fragmented_path = ext4_path / "SLUS_203.12.Fragmented.iso"
+    contiguous_path = ext4_path / "SLUS_200.71.Contiguous.iso"
+
+    write_interleaved(fragmented_path, ext4_path / "other.bin")
+    write_contiguous(contiguous_path)
+
+    scanner = FragmentationScanner(str(tmp_path / "fragmentation.idx"))
+    infos = scanner.scan([str(contiguous_path), str(fragmented_path)])
+
+    # The fragmented image is ranked first
+    assert [info.path for info in infos] == [str(fragmented_path), str(contiguous_path)]
+
+    for info in infos:
+        assert not info.error
+        assert not info.cached
+        assert info.size == CHUNK_SIZE * CHUNKS
+        assert (info.fragments, info.max_seek) == read_filefrag(info.path)
+
+    fragmented, contiguous = infos
+
+    assert fragmented.fragments > 1
+    assert fragmented.max_seek > 0
+    assert fragmented.total_seek >= fragmented.max_seek
+    assert (contiguous.fragments, contiguous.max_seek, contiguous.total_seek) == (1, 0, 0)
+
+    # A rescan, and a new scanner that loads the saved cache, don't call the ioctl again
+    loaded = FragmentationScanner(scanner.cache_path)
+    assert loaded.load_cache()
+
+    for cached_scanner in (scanner, loaded):
+        (info,) = cached_scanner.scan([str(fragmented_path)])
+
+        assert info.cached
+        assert (info.fragments, info.max_seek, info.total_seek) == (fragmented.fragments, fragmented.max_seek, fragmented.total_seek)
+
+    # An image that changed is read again
+    with open(fragmented_path, "ab") as image_file:
+        image_file.write(b"\x00" * CHUNK_SIZE)
+
+    (info,) = scanner.scan([str(fragmented_path)])
+    assert not info.cached
+    assert (info.fragments, info.max_seek) == read_filefrag(fragmented_path)
+
+def test_read_extents_unsupported_file_system(tmp_path):
+    # /proc doesn't support FIEMAP, the error is reported for the image instead of raised
+    info = FragmentationScanner(str(tmp_path / "fragmentation.idx")).get_info("/proc/self/status")
+
+    assert info.error
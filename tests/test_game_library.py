@@ -0,0 +1,25 @@
+import os
+
+from conftest import make_iso
+from modules.GameLibrary import GameLibrary
+
+def test_scan_skips_images_removed_while_listed(tmp_path, monkeypatch):
+    share_path = tmp_path / "share"
+    (share_path / "DVD").mkdir(parents=True)
+    make_iso(str(share_path / "DVD" / "SLUS_202.31.Kept.iso"))
+    make_iso(str(share_path / "DVD" / "SLUS_203.12.Removed.iso"), game_id="SLUS_203.12")
+
+    library = GameLibrary(str(share_path), str(tmp_path / "library.idx"))
+    list_images = library.list_images
+
+    def list_and_remove():
+        images = list_images()
+        os.unlink(share_path / "DVD" / "SLUS_203.12.Removed.iso")
+        return images
+
+    monkeypatch.setattr(library, "list_images", list_and_remove)
+
+    games = library.scan()
+
+    assert [game.path for game in games] == ["DVD/SLUS_202.31.Kept.iso"]
+    assert games[0].game_id == "SLUS_202.31"
@@ -0,0 +1,99 @@
+import os
+import zlib
+import hashlib
+
+import pytest
+
+from conftest import make_iso
+from modules.DatIndex import DatIndex
+from modules.GameLibrary import GameLibrary
+from modules.ImageVerifier import ImageVerifier, ImageHash
+
+pytest.importorskip("lz4")
+
+from modules.ZsoConverter import ZsoConverter  # noqa: E402
+
+@pytest.fixture
+def images(tmp_path):
+    """An ISO image, a ZSO image of it and the data of the ISO."""
+
+    iso_path = str(tmp_path / "SLUS_202.31.Game.iso")
+    zso_path = str(tmp_path / "SLUS_202.31.Game.zso")
+
+    data = make_iso(iso_path, data_sectors=300)
+    ZsoConverter(max_workers=1).compress(iso_path, zso_path)
+
+    return iso_path, zso_path, data
+
+@pytest.fixture
+def verifier(tmp_path):
+    return ImageVerifier(str(tmp_path / "hashes.idx"), use_xattrs=False, max_workers=1)
+
+@pytest.fixture
+def dat_index(tmp_path, images):
+    _, _, data = images
+
+    dat_path = tmp_path / "ps2.dat"
+    dat_path.write_text(f"""<?xml version="1.0"?>
+<datafile>
+    <game name="Game (USA)">
+        <rom name="Game (USA).iso" size="{len(data)}" crc="{zlib.crc32(data):08x}" sha1="{hashlib.sha1(data).hexdigest()}"/>
+    </game>
+</datafile>
+""")
+
+    index = DatIndex(str(tmp_path / "dat.idx"))
+    index.build([str(dat_path)])
+
+    yield index
+
+    index.close()
+
+def test_zso_is_hashed_decompressed(images, verifier, dat_index):
+    iso_path, zso_path, data = images
+
+    iso, zso = verifier.verify([iso_path, zso_path])
+
+    assert iso.ok and zso.ok
+    assert (zso.crc32, zso.sha1) == (iso.crc32, iso.sha1) == (zlib.crc32(data), hashlib.sha1(data).hexdigest())
+    assert zso.size == os.path.getsize(zso_path) < len(data)
+    assert zso.data_size == iso.data_size == len(data)
+
+    # The ZSO is verified by the DAT of the ISO, not reported as a mismatch
+    for result in (iso, zso):
+        assert dat_index.match(result, "Game (USA)").status == DatIndex.VERIFIED
+
+    # The cached results keep the size of the data
+    _, cached = verifier.verify([iso_path, zso_path])
+
+    assert cached.cached
+    assert cached.data_size == len(data)
+    assert dat_index.match(cached, "Game (USA)").status == DatIndex.VERIFIED
+
+def test_truncated_zso(images, verifier):
+    _, zso_path, _ = images
+
+    with open(zso_path, "r+b") as zso_file:
+        zso_file.truncate(os.path.getsize(zso_path) - 100)
+
+    (result,) = verifier.verify([zso_path])
+
+    assert not result.ok
+
+def test_check_structure_finds_missing_blocks(images, verifier):
+    _, zso_path, _ = images
+
+    with open(zso_path, "r+b") as zso_file:
+        zso_file.truncate(os.path.getsize(zso_path) - 100)
+
+    # Only the index is read, not the blocks (as for the hashes that came from the cache)
+    result = ImageHash(zso_path, os.path.getsize(zso_path), cached=True)
+    verifier.check_structure(result)
+
+    assert result.problems
+    assert "cópia incompleta" in result.problems[0]
+
+def test_zso_game_id(images):
+    _, zso_path, _ = images
+
+    assert GameLibrary.read_game_id(zso_path) == "SLUS_202.31"
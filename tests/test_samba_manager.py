@@ -0,0 +1,157 @@
+import os
+import stat
+
+import pytest
+
+from modules.Exceptions import SambaServiceFailure
+from modules.SambaManager import SambaManager
+
+SMB_CONF = """[global]
+   netbios name = SAMBA
+   server min protocol = NT1
+   client min protocol = NT1
+
+[PS2SMB]
+   comment = Pasta compartilhada com o PS2
+   path = /srv/PS2SMB
+   guest ok = yes
+   read only = no
+   browseable = yes
+   create mask = 0777
+   directory mask = 0777
+   force user = tester
+"""
+
+# Records the command line and exits with the code in FAKE_<NAME>_EXIT (0 by default)
+STUB_SCRIPT = """#!/bin/sh
+echo "{name} $*" >> "$FAKE_CALLS"
+exit ${{FAKE_{variable}_EXIT:-0}}
+"""
+
+@pytest.fixture
+def calls_path(tmp_path, monkeypatch):
+    """Puts fake systemctl and smbcontrol on PATH and returns the file where they record their calls."""
+
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+
+    for name in ("systemctl", "smbcontrol"):
+        script = bin_path / name
+        script.write_text(STUB_SCRIPT.format(name=name, variable=name.upper()))
+        script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    calls = tmp_path / "calls"
+    calls.touch()
+
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_CALLS", str(calls))
+
+    return calls
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, calls_path):
+    """A SambaManager of a temporary smb.conf, with the server active."""
+
+    conf_path = tmp_path / "smb.conf"
+    conf_path.write_text(SMB_CONF)
+
+    monkeypatch.setattr(SambaManager, "SAMBA_CONF_PATH", str(conf_path))
+    monkeypatch.setattr(os, "getlogin", lambda: "tester")
+
+    samba_manager = SambaManager(stop_on_init=False)
+    assert samba_manager.refresh_server_status()
+
+    # Only the calls made by the changes are checked
+    calls_path.write_text("")
+
+    return samba_manager
+
+def read_calls(calls_path) -> list[str]:
+    return calls_path.read_text().splitlines()
+
+def bind_interface(manager, calls_path) -> None:
+    """Binds the server to an interface, so the daemons can be restarted, and forgets the calls made for it."""
+
+    manager.set_interface_and_ip("lo", "127.0.0.1")
+    calls_path.write_text("")
+
+def test_share_change_reloads_smbd_config(manager, calls_path, tmp_path):
+    manager.set_ps2_share_folder_path(str(tmp_path))
+
+    assert read_calls(calls_path) == ["smbcontrol smbd reload-config"]
+
+def test_netbios_change_restarts_nmbd(manager, calls_path):
+    bind_interface(manager, calls_path)
+
+    manager.set_netbios_name("PS2SERVER")
+
+    assert read_calls(calls_path) == ["systemctl restart nmbd"]
+
+def test_interface_change_restarts_daemons(manager, calls_path):
+    manager.set_interface_and_ip("lo", "127.0.0.1")
+
+    assert read_calls(calls_path) == ["systemctl restart smbd nmbd"]
+
+def test_batched_changes_are_applied_once(manager, calls_path, tmp_path):
+    bind_interface(manager, calls_path)
+
+    with manager.transaction():
+        manager.set_netbios_name("PS2SERVER")
+        manager.set_ps2_share_folder_path(str(tmp_path))
+
+    # nmbd is restarted for the NetBIOS name, smbd keeps the sessions of the consoles and reloads the share
+    assert read_calls(calls_path) == ["systemctl restart nmbd", "smbcontrol smbd reload-config"]
+
+def test_restart_waits_for_an_interface(manager, calls_path):
+    manager.set_netbios_name("PS2SERVER")
+
+    # Without an interface the daemons would listen on every interface, the change is applied on the next start
+    assert read_calls(calls_path) == []
+
+def test_reload_falls_back_to_systemctl(manager, calls_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SMBCONTROL_EXIT", "1")
+
+    manager.set_ps2_share_folder_path(str(tmp_path))
+
+    assert read_calls(calls_path) == ["smbcontrol smbd reload-config", "systemctl reload smbd"]
+
+def test_reload_failure_raises(manager, calls_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SMBCONTROL_EXIT", "1")
+    monkeypatch.setenv("FAKE_SYSTEMCTL_EXIT", "3")
+
+    with pytest.raises(SambaServiceFailure):
+        manager.set_ps2_share_folder_path(str(tmp_path))
+
+def test_inactive_server_is_not_touched(manager, calls_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SYSTEMCTL_EXIT", "3")
+    assert not manager.refresh_server_status()
+    calls_path.write_text("")
+
+    manager.set_netbios_name("PS2SERVER")
+
+    assert read_calls(calls_path) == []
+
+def test_readers_keep_their_snapshot(manager):
+    snapshot = manager._SambaManager__load_samba_conf()
+
+    with manager.transaction() as transaction:
+        transaction.set("global", "netbios name", "PS2SERVER")
+
+        # The thread of the transaction reads its changes, the snapshot of a reader doesn't change
+        assert manager._SambaManager__load_samba_conf().get("global", "netbios name") == "PS2SERVER"
+        assert snapshot.get("global", "netbios name") == "SAMBA"
+
+    assert snapshot.get("global", "netbios name") == "SAMBA"
+    assert manager._SambaManager__load_samba_conf().get("global", "netbios name") == "PS2SERVER"
+
+def test_aborted_transaction_changes_nothing(manager, calls_path):
+    conf_before = open(SambaManager.SAMBA_CONF_PATH).read()
+
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as transaction:
+            transaction.set("global", "netbios name", "PS2SERVER")
+            raise RuntimeError("aborted")
+
+    assert manager._SambaManager__load_samba_conf().get("global", "netbios name") == "SAMBA"
+    assert open(SambaManager.SAMBA_CONF_PATH).read() == conf_before
+    assert read_calls(calls_path) == []
@@ -0,0 +1,149 @@
+import os
+import stat
+
+import pytest
+
+from conftest import FIXTURES_PATH
+from modules.SmbSessions import SmbSessionTracker
+
+GAME_DVD = "/srv/PS2SMB/DVD/SLUS_203.12.Final Fantasy X.iso"
+GAME_CD = "/srv/PS2SMB/CD/SLUS_200.71.Gran Turismo 3.iso"
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_PATH, name)) as fixture_file:
+        return fixture_file.read()
+
+def check_clients(clients: dict) -> None:
+    assert sorted(clients) == ["192.168.0.10", "192.168.0.11"]
+
+    first, second = clients["192.168.0.10"], clients["192.168.0.11"]
+
+    assert first.pids == {"2345"}
+    assert second.pids == {"2399"}
+    assert first.username == "nobody"
+    assert first.protocol == "NT1"
+
+    # The shares and the files are matched to the sessions by the PID of smbd
+    assert first.services == {"PS2SMB", "IPC$"}
+    assert second.services == {"PS2SMB"}
+    assert first.open_files == [GAME_DVD]
+    assert second.open_files == [GAME_CD]
+
+def test_parse_smbstatus_json():
+    check_clients(SmbSessionTracker.parse_smbstatus_json(read_fixture("smbstatus.json")))
+
+def test_parse_smbstatus_text():
+    check_clients(SmbSessionTracker.parse_smbstatus_text(read_fixture("smbstatus.txt")))
+
+def test_parse_ss_output():
+    counters = SmbSessionTracker.parse_ss_output(read_fixture("ss_tinH.txt"))
+
+    # The peer address (4th column) is used, never the local address of the server
+    assert "192.168.0.2" not in counters
+
+    # The connections of a client (ports 445 and 139) are summed, using the acknowledged bytes
+    assert counters["192.168.0.10"] == (734003200 + 2048, 1048576 + 1024)
+
+    # IPv4-mapped IPv6 addresses are reported as IPv4
+    assert counters["192.168.0.11"] == (104857600, 524288)
+
+@pytest.mark.parametrize("address, expected", [
+    ("ipv4:192.168.0.10:50512", "192.168.0.10"),
+    ("[::ffff:192.168.0.11]:49800", "192.168.0.11"),
+    ("ipv6:[fe80::1]:445", "fe80::1"),
+    ("192.168.0.10", "192.168.0.10"),
+])
+def test_normalize_address(address, expected):
+    assert SmbSessionTracker.normalize_address(address) == expected
+
+@pytest.fixture
+def ss_output_path(tmp_path, monkeypatch):
+    """Puts fake smbstatus and ss on PATH, which print the fixtures. Returns the file printed by ss.
+
+    smbstatus records its arguments in $FAKE_CALLS. FAKE_SMBSTATUS_JSON makes --json fail: 'down' as when smbd
+    isn't running, 'unknown' as the versions without the option.
+    """
+
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+
+    scripts = {
+        "smbstatus": f"""echo "smbstatus $*" >> "$FAKE_CALLS"
+if [ "$1" != "--json" ]; then cat "{FIXTURES_PATH}/smbstatus.txt"; exit 0; fi
+case "$FAKE_SMBSTATUS_JSON" in
+    down) echo "Failed to connect to smbd" >&2; exit 1 ;;
+    unknown) echo "smbstatus: --json: unknown option" >&2; exit 1 ;;
+esac
+cat "{FIXTURES_PATH}/smbstatus.json"
+""",
+        "ss": 'cat "$FAKE_SS_OUTPUT"\n',
+    }
+
+    for name, body in scripts.items():
+        script = bin_path / name
+        script.write_text("#!/bin/sh\n" + body)
+        script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    output_path = tmp_path / "ss_output.txt"
+    output_path.write_text(read_fixture("ss_tinH.txt"))
+
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_SS_OUTPUT", str(output_path))
+    monkeypatch.setenv("FAKE_CALLS", str(tmp_path / "calls"))
+
+    return output_path
+
+def test_poll_counters_and_rates(ss_output_path):
+    tracker = SmbSessionTracker()
+    assert tracker.get_clients() == []
+
+    clients = {client.address: client for client in tracker.poll()}
+
+    check_clients(clients)
+    assert (clients["192.168.0.10"].bytes_sent, clients["192.168.0.10"].bytes_recv) == (734005248, 1049600)
+    assert (clients["192.168.0.11"].bytes_sent, clients["192.168.0.11"].bytes_recv) == (104857600, 524288)
+
+    # No rates in the first poll, there is nothing to compare with
+    assert all(client.up_speed == 0.0 and client.down_speed == 0.0 for client in clients.values())
+
+    # The first console reads 64 MB more, the second one is idle
+    ss_output_path.write_text(ss_output_path.read_text().replace("bytes_acked:734003200", f"bytes_acked:{734003200 + 64 * 1024 ** 2}"))
+
+    clients = {client.address: client for client in tracker.poll()}
+
+    assert clients["192.168.0.10"].bytes_sent == 734005248 + 64 * 1024 ** 2
+    assert clients["192.168.0.10"].up_speed > 0
+    assert clients["192.168.0.10"].down_speed == 0.0
+    assert clients["192.168.0.11"].up_speed == 0.0
+
+    # The snapshot is cached for the GUI
+    assert [client.address for client in tracker.get_clients()] == ["192.168.0.10", "192.168.0.11"]
+
+    tracker.clear()
+    assert tracker.get_clients() == []
+
+def test_transient_failure_keeps_json(ss_output_path, monkeypatch):
+    calls_path = ss_output_path.parent / "calls"
+    tracker = SmbSessionTracker()
+
+    monkeypatch.setenv("FAKE_SMBSTATUS_JSON", "down")
+
+    with pytest.raises(ValueError, match="Failed to connect to smbd"):
+        tracker.poll()
+
+    monkeypatch.delenv("FAKE_SMBSTATUS_JSON")
+    check_clients({client.address: client for client in tracker.poll()})
+
+    assert calls_path.read_text().splitlines() == ["smbstatus --json", "smbstatus --json"]
+
+def test_unknown_json_option_falls_back_to_text(ss_output_path, monkeypatch):
+    calls_path = ss_output_path.parent / "calls"
+    tracker = SmbSessionTracker()
+
+    monkeypatch.setenv("FAKE_SMBSTATUS_JSON", "unknown")
+
+    check_clients({client.address: client for client in tracker.poll()})
+    check_clients({client.address: client for client in tracker.poll()})
+
+    # --json is not tried again
+    assert [call.strip() for call in calls_path.read_text().splitlines()] == ["smbstatus --json", "smbstatus", "smbstatus"]
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from conftest import make_iso
+
+pytest.importorskip("lz4")
+
+from modules.ZsoConverter import ZsoConverter, ZsoImage, ZSO_BLOCK_SIZE  # noqa: E402
+
+@pytest.fixture
+def iso(tmp_path):
+    """An ISO image whose size is not a multiple of the block size, and its data."""
+
+    path = str(tmp_path / "SLUS_202.31.Game.iso")
+    data = make_iso(path, data_sectors=300) + b"partial block"
+
+    with open(path, "ab") as iso_file:
+        iso_file.write(b"partial block")
+
+    return path, data
+
+@pytest.mark.parametrize("align", [0, 2])
+def test_round_trip(iso, tmp_path, monkeypatch, align):
+    iso_path, data = iso
+    zso_path = str(tmp_path / "game.zso")
+    output_path = str(tmp_path / "game.iso")
+
+    # Small batches, so the index is written across several of them
+    monkeypatch.setattr(ZsoConverter, "BATCH_BLOCKS", 64)
+    monkeypatch.setattr(ZsoConverter, "get_align", staticmethod(lambda total_bytes, block_size: align))
+
+    converter = ZsoConverter(max_workers=1)
+
+    assert converter.compress(iso_path, zso_path) == (len(data), os.path.getsize(zso_path))
+
+    with ZsoImage(zso_path) as image:
+        assert (image.align, image.total_bytes, len(image)) == (align, len(data), len(data))
+        assert image[:] == data
+
+        # Reads that start and end inside blocks, across blocks and past the end
+        for start, stop in ((0, 1), (100, 5000), (ZSO_BLOCK_SIZE - 1, ZSO_BLOCK_SIZE + 1), (len(data) - 20, len(data) + 100)):
+            assert image[start:stop] == data[start:stop]
+
+    assert converter.decompress(zso_path, output_path) == (os.path.getsize(zso_path), len(data))
+
+    with open(output_path, "rb") as output_file:
+        assert output_file.read() == data
+
+def test_align_fits_the_index():
+    assert ZsoConverter.get_align(700 * 1024 ** 2, ZSO_BLOCK_SIZE) == 0
+    assert ZsoConverter.get_align(4 * 1024 ** 3, ZSO_BLOCK_SIZE) > 0